@@ -2,9 +2,17 @@ import os
 from dotenv import load_dotenv
 from fastapi import Depends, HTTPException, Request
 from app.models.auth import UserInDB
+from app.service.dynamodb import DynamoDBPool
+from app.service.extraction_cache import ExtractionCache
 from app.service.transaction_db import DB
 from app.service.gemini import Gemini
-from app.service.gmail_service import GmailService
+from app.service.gmail_service import GmailClientCache, GmailService
+from app.service.outbox import OutboxRelay
+from app.service.sns import EventBus
+from app.service.sync_jobs import SyncJobs
+from app.service.transaction_feed import TopicSubscription, TransactionFeed
+from app.service.transaction_parsers import ParserRegistry, default_registry
+from app.service.user_cache import UserCache
 from google import genai
 from google.oauth2 import id_token
 from google.auth.transport import requests
@@ -13,20 +21,50 @@ from app.service.user_db import UserDB
 
 load_dotenv()
 
-def get_db() -> DB:
-    return DB()
+def get_dynamodb(request: Request) -> DynamoDBPool:
+    return request.app.state.dynamodb
 
-def get_user_db() -> UserDB:
-    return UserDB()
+def get_outbox_relay(request: Request) -> OutboxRelay | None:
+    return getattr(request.app.state, "outbox_relay", None)
+
+def get_db(dynamodb: DynamoDBPool = Depends(get_dynamodb), relay: OutboxRelay | None = Depends(get_outbox_relay)) -> DB:
+    return DB(dynamodb, relay=relay)
+
+def get_user_cache(request: Request) -> UserCache | None:
+    return getattr(request.app.state, "user_cache", None)
+
+def get_user_db(dynamodb: DynamoDBPool = Depends(get_dynamodb), cache: UserCache | None = Depends(get_user_cache)) -> UserDB:
+    return UserDB(dynamodb, cache=cache)
 
 def get_gmail_service() -> GmailService:
     return GmailService()
 
-def get_gemini_client() -> Gemini:
+def get_gmail_clients(request: Request) -> GmailClientCache | None:
+    return getattr(request.app.state, "gmail_clients", None)
+
+def get_parser_registry() -> ParserRegistry:
+    return default_registry
+
+def get_transaction_feed(request: Request) -> TransactionFeed:
+    return request.app.state.transaction_feed
+
+def get_event_bus(request: Request) -> EventBus | None:
+    return getattr(request.app.state, "event_bus", None)
+
+def get_topic_subscription(request: Request) -> TopicSubscription | None:
+    return getattr(request.app.state, "topic_subscription", None)
+
+def get_sync_jobs(request: Request) -> SyncJobs:
+    return request.app.state.sync_jobs
+
+def get_extraction_cache(request: Request) -> ExtractionCache | None:
+    return getattr(request.app.state, "extraction_cache", None)
+
+def get_gemini_client(cache: ExtractionCache | None = Depends(get_extraction_cache)) -> Gemini:
 
     GEMINI_API_KEY = os.getenv('GEMINI_API_KEY')
 
     gemini_client = Gemini(
-        client=genai.Client(api_key =  GEMINI_API_KEY))
+        client=genai.Client(api_key =  GEMINI_API_KEY), cache=cache)
     
     return gemini_client
\ No newline at end of file
@@ -1,15 +1,53 @@
+from contextlib import asynccontextmanager
 from fastapi import Depends, FastAPI
 from app.api.dependencies import get_db, get_gemini_client
 from app.routers import auth, genai, home, transaction
+from app.routers.transaction import NEXT_CURSOR_HEADER
 from fastapi.middleware.cors import CORSMiddleware
 
 
+from app.service.dynamodb import DynamoDBPool
+from app.service.extraction_cache import create_extraction_cache
+from app.service.outbox import OutboxRelay
+from app.service.sns import EventBus
+from app.service.sync_jobs import ExpenseSync, create_sync_jobs
+from app.service.transaction_feed import TopicSubscription, TransactionFeed
+from app.service.user_cache import UserCache
 from app.service.transaction_db import DB
 from app.service.gemini import Gemini
-from app.service.gmail_service import GmailService
+from app.service.gmail_service import GmailClientCache, GmailService
+from app.service.google_oauth import client_config
 
 
-app = FastAPI()
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # closed in reverse: sync workers stop, the relay makes a last pass over
+    # the outbox, then the event bus closes its SNS client
+    # decoded once up front, so a bad GOOGLE_CREDENTIALS_B64 fails startup
+    client_config()
+    transaction_feed = TransactionFeed()
+    async with DynamoDBPool() as dynamodb, EventBus() as event_bus, \
+            TopicSubscription(transaction_feed) as topic_subscription, \
+            OutboxRelay(dynamodb, event_bus,
+                        # without the topic, clients get this process's events only
+                        feed=None if topic_subscription.active else transaction_feed) as outbox_relay:
+        app.state.dynamodb = dynamodb
+        app.state.transaction_feed = transaction_feed
+        app.state.topic_subscription = topic_subscription
+        app.state.event_bus = event_bus
+        app.state.outbox_relay = outbox_relay
+        app.state.extraction_cache = create_extraction_cache(dynamodb)
+        app.state.user_cache = UserCache()
+        app.state.gmail_clients = GmailClientCache()
+        handler = ExpenseSync(dynamodb, relay=outbox_relay, user_cache=app.state.user_cache,
+                              extraction_cache=app.state.extraction_cache,
+                              gmail_clients=app.state.gmail_clients)
+        async with create_sync_jobs(dynamodb, handler) as sync_jobs:
+            app.state.sync_jobs = sync_jobs
+            yield
+
+
+app = FastAPI(lifespan=lifespan)
 app.include_router(transaction.router)
 app.include_router(home.router)
 app.include_router(genai.router)
@@ -23,4 +61,5 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=[NEXT_CURSOR_HEADER],
 )
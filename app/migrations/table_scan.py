@@ -0,0 +1,34 @@
+import asyncio
+import inspect
+from typing import Awaitable, Callable
+
+from boto3.dynamodb.conditions import Key
+
+DEFAULT_SEGMENTS = 4
+
+
+async def read_pages(table, on_items: Callable[[list[dict]], Awaitable[None] | None],
+                     user_id: str | None = None, segments: int = DEFAULT_SEGMENTS, **read_kwargs):
+    """Feeds every page of `table` to `on_items`, which may be sync or async.
+
+    With `user_id` only that user's partition is queried; otherwise the table
+    is read with a parallel scan of `segments` segments.
+    """
+    async def read(method, **kwargs):
+        while True:
+            response = await method(**kwargs)
+            result = on_items(response.get('Items', []))
+            if inspect.isawaitable(result):
+                await result
+            last_evaluated_key = response.get('LastEvaluatedKey')
+            if not last_evaluated_key:
+                return
+            kwargs['ExclusiveStartKey'] = last_evaluated_key
+
+    if user_id:
+        await read(table.query, KeyConditionExpression=Key('user_id').eq(user_id), **read_kwargs)
+    else:
+        await asyncio.gather(*(
+            read(table.scan, Segment=segment, TotalSegments=segments, **read_kwargs)
+            for segment in range(segments)
+        ))
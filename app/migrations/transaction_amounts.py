@@ -0,0 +1,129 @@
+"""Rewrite legacy string amounts and dates on existing transactions.
+
+    python -m app.migrations.transaction_amounts [--segments N] [--concurrency N] [--dry-run]
+
+Items written before typed amounts store `amount` as free-form text
+("$1,234.50") and `date` as MM/DD/YYYY. Reads still accept those through
+TransactionDB.from_item, but every read of such an item pays for reparsing
+them and neither can be summed or range-filtered in DynamoDB. This sets
+`amount_minor`/`currency`, the canonical `amount` string and an ISO `date` on
+every such item.
+
+Each rewrite is conditional on `amount` and `date` being unchanged since the
+scan, so edits made while the migration runs win. Items with a value that
+cannot be parsed are left untouched and reported. Safe to re-run.
+"""
+import argparse
+import asyncio
+from dataclasses import dataclass
+
+from boto3.dynamodb.conditions import Attr
+from botocore.exceptions import ClientError
+from pydantic import ValidationError
+
+from app.migrations.table_scan import DEFAULT_SEGMENTS, read_pages
+from app.models.transaction import TransactionDB
+from app.service.dynamodb import DynamoDBPool
+from app.service.transaction_db import TRANSACTION_TABLE
+
+MIGRATION_CONCURRENCY = 16
+
+
+@dataclass
+class MigrationStats:
+    scanned: int = 0
+    updated: int = 0
+    skipped: int = 0
+    unparseable: int = 0
+
+
+def typed_fields(item: dict) -> tuple[dict, bool]:
+    """Returns (attributes to set, whether a legacy value could not be parsed)."""
+    try:
+        # a value that cannot be read comes back as None, reported below
+        transaction = TransactionDB.from_item(item)
+    except ValidationError:
+        return {}, True
+    typed = transaction.model_dump(include={'amount_minor', 'currency', 'date', 'amount'})
+    updates = {}
+    unparseable = False
+
+    if item.get('amount') is not None and item.get('amount_minor') is None:
+        if transaction.amount_minor is None:
+            unparseable = True
+        else:
+            updates.update({name: typed[name] for name in ('amount_minor', 'currency', 'amount')})
+    if item.get('date') and item['date'] != typed['date']:
+        if transaction.date is None:
+            unparseable = True
+        else:
+            updates['date'] = typed['date']
+    # all or nothing: reads take an item with amount_minor for fully typed,
+    # so a half-migrated one would fail on its legacy date
+    return ({} if unparseable else updates), unparseable
+
+
+async def _migrate_item(table, item: dict, stats: MigrationStats, dry_run: bool):
+    updates, unparseable = typed_fields(item)
+    stats.unparseable += unparseable
+    if not updates:
+        stats.skipped += 1
+        return
+    if dry_run:
+        stats.updated += 1
+        return
+
+    condition = Attr('transaction_id').exists()
+    for name in ('amount', 'date'):
+        condition &= Attr(name).eq(item[name]) if name in item else Attr(name).not_exists()
+    try:
+        await table.update_item(
+            Key={'user_id': item['user_id'], 'transaction_id': item['transaction_id']},
+            UpdateExpression="SET " + ", ".join(f"#{name} = :{name}" for name in updates),
+            ConditionExpression=condition,
+            ExpressionAttributeNames={f"#{name}": name for name in updates},
+            ExpressionAttributeValues={f":{name}": value for name, value in updates.items()},
+        )
+        stats.updated += 1
+    except ClientError as e:
+        # deleted or edited since the scan; the writer stored typed values
+        if e.response['Error']['Code'] != 'ConditionalCheckFailedException':
+            raise
+        stats.skipped += 1
+
+
+async def migrate_amounts(dynamodb: DynamoDBPool,
+                          segments: int = DEFAULT_SEGMENTS,
+                          concurrency: int = MIGRATION_CONCURRENCY,
+                          dry_run: bool = False) -> MigrationStats:
+    table = await dynamodb.table(TRANSACTION_TABLE)
+    stats = MigrationStats()
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def migrate(item: dict):
+        async with semaphore:
+            await _migrate_item(table, item, stats, dry_run)
+
+    async def migrate_page(items: list[dict]):
+        stats.scanned += len(items)
+        await asyncio.gather(*(migrate(item) for item in items))
+
+    await read_pages(table, migrate_page, segments=segments)
+    return stats
+
+
+async def main(args: argparse.Namespace):
+    async with DynamoDBPool() as dynamodb:
+        stats = await migrate_amounts(
+            dynamodb, segments=args.segments, concurrency=args.concurrency, dry_run=args.dry_run)
+        action = "would update" if args.dry_run else "updated"
+        print(f"scanned {stats.scanned}, {action} {stats.updated}, skipped {stats.skipped}, "
+              f"{stats.unparseable} with values that could not be parsed")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--segments", type=int, default=DEFAULT_SEGMENTS)
+    parser.add_argument("--concurrency", type=int, default=MIGRATION_CONCURRENCY)
+    parser.add_argument("--dry-run", action="store_true")
+    asyncio.run(main(parser.parse_args()))
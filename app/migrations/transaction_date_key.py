@@ -0,0 +1,146 @@
+"""Backfill `date_key` on existing transactions and create the date index.
+
+    python -m app.migrations.transaction_date_key [--create-index] [--segments N]
+                                                  [--concurrency N] [--dry-run]
+
+Items written before `TransactionDB.date_key` existed are missing from the
+(user_id, date_key) index, so date-ordered listings skip them until this has
+run. The table is read with a parallel scan and only items whose stored
+`date_key` is missing or stale are rewritten. Each rewrite is a conditional
+update of that one attribute, so edits made while the migration runs are never
+overwritten; items whose date changed in the meantime already carry the new
+key and are skipped. Safe to re-run.
+"""
+import argparse
+import asyncio
+from dataclasses import dataclass
+
+from boto3.dynamodb.conditions import Attr
+from botocore.exceptions import ClientError
+
+from app.migrations.table_scan import DEFAULT_SEGMENTS, read_pages
+from app.service.dynamodb import DynamoDBPool
+from app.service.transaction_db import TRANSACTION_DATE_INDEX, TRANSACTION_TABLE
+from app.utils.transaction_key_utils import transaction_date_key
+
+MIGRATION_CONCURRENCY = 16
+INDEX_POLL_SECONDS = 5
+
+
+@dataclass
+class MigrationStats:
+    scanned: int = 0
+    updated: int = 0
+    skipped: int = 0
+
+
+async def ensure_date_index(dynamodb: DynamoDBPool, wait: bool = True):
+    table = await dynamodb.table(TRANSACTION_TABLE)
+    client = table.meta.client
+    description = (await client.describe_table(TableName=TRANSACTION_TABLE))['Table']
+    indexes = {index['IndexName']: index
+               for index in description.get('GlobalSecondaryIndexes', [])}
+
+    if TRANSACTION_DATE_INDEX not in indexes:
+        create = {
+            'IndexName': TRANSACTION_DATE_INDEX,
+            'KeySchema': [
+                {'AttributeName': 'user_id', 'KeyType': 'HASH'},
+                {'AttributeName': 'date_key', 'KeyType': 'RANGE'},
+            ],
+            'Projection': {'ProjectionType': 'ALL'},
+        }
+        # provisioned tables need the index's own throughput; on-demand ones reject it
+        throughput = description.get('ProvisionedThroughput', {})
+        if throughput.get('ReadCapacityUnits'):
+            create['ProvisionedThroughput'] = {
+                'ReadCapacityUnits': throughput['ReadCapacityUnits'],
+                'WriteCapacityUnits': throughput['WriteCapacityUnits'],
+            }
+        await client.update_table(
+            TableName=TRANSACTION_TABLE,
+            AttributeDefinitions=[
+                {'AttributeName': 'user_id', 'AttributeType': 'S'},
+                {'AttributeName': 'date_key', 'AttributeType': 'S'},
+            ],
+            GlobalSecondaryIndexUpdates=[{'Create': create}],
+        )
+        print(f"Creating index {TRANSACTION_DATE_INDEX}")
+
+    while wait:
+        description = (await client.describe_table(TableName=TRANSACTION_TABLE))['Table']
+        status = next(index['IndexStatus']
+                      for index in description.get('GlobalSecondaryIndexes', [])
+                      if index['IndexName'] == TRANSACTION_DATE_INDEX)
+        if status == 'ACTIVE':
+            return
+        await asyncio.sleep(INDEX_POLL_SECONDS)
+
+
+async def _backfill_item(table, item: dict, stats: MigrationStats, dry_run: bool):
+    date_key = transaction_date_key(item.get('date'), item['transaction_id'])
+    if item.get('date_key') == date_key:
+        stats.skipped += 1
+        return
+    if dry_run:
+        stats.updated += 1
+        return
+
+    date_unchanged = (Attr('date').eq(item['date']) if 'date' in item
+                      else Attr('date').not_exists())
+    try:
+        await table.update_item(
+            Key={'user_id': item['user_id'], 'transaction_id': item['transaction_id']},
+            UpdateExpression="SET #date_key = :date_key",
+            ConditionExpression=Attr('transaction_id').exists() & date_unchanged,
+            ExpressionAttributeNames={'#date_key': 'date_key'},
+            ExpressionAttributeValues={':date_key': date_key},
+        )
+        stats.updated += 1
+    except ClientError as e:
+        # deleted or re-dated since the scan; the writer set its own key
+        if e.response['Error']['Code'] != 'ConditionalCheckFailedException':
+            raise
+        stats.skipped += 1
+
+
+async def backfill_date_keys(dynamodb: DynamoDBPool,
+                             segments: int = DEFAULT_SEGMENTS,
+                             concurrency: int = MIGRATION_CONCURRENCY,
+                             dry_run: bool = False) -> MigrationStats:
+    table = await dynamodb.table(TRANSACTION_TABLE)
+    stats = MigrationStats()
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def backfill(item: dict):
+        async with semaphore:
+            await _backfill_item(table, item, stats, dry_run)
+
+    async def backfill_page(items: list[dict]):
+        stats.scanned += len(items)
+        await asyncio.gather(*(backfill(item) for item in items))
+
+    await read_pages(table, backfill_page, segments=segments)
+    return stats
+
+
+async def main(args: argparse.Namespace):
+    async with DynamoDBPool() as dynamodb:
+        # backfill first: the index then builds from items that already have
+        # their key, and readers switch over once it is ACTIVE
+        stats = await backfill_date_keys(
+            dynamodb, segments=args.segments, concurrency=args.concurrency, dry_run=args.dry_run)
+        action = "would update" if args.dry_run else "updated"
+        print(f"scanned {stats.scanned}, {action} {stats.updated}, skipped {stats.skipped}")
+        if args.create_index and not args.dry_run:
+            await ensure_date_index(dynamodb)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--create-index", action="store_true",
+                        help=f"create {TRANSACTION_DATE_INDEX} if missing and wait until it is active")
+    parser.add_argument("--segments", type=int, default=DEFAULT_SEGMENTS)
+    parser.add_argument("--concurrency", type=int, default=MIGRATION_CONCURRENCY)
+    parser.add_argument("--dry-run", action="store_true")
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,78 @@
+"""Rebuild the monthly rollups from the Transaction table.
+
+    python -m app.migrations.transaction_rollups [--user USER_ID] [--segments N]
+
+Recomputes every (user_id, month) rollup from the transactions themselves,
+overwrites the stored items and deletes rollups for months that no longer
+have transactions. Use it to backfill rollups for data written before they
+existed, or to repair drift after a failed incremental update.
+
+Incremental ADD updates that land on a user's rollups while that user is
+being rebuilt can be overwritten; rebuild during quiet periods, or per user
+with --user.
+"""
+import argparse
+import asyncio
+from dataclasses import dataclass
+
+from app.migrations.table_scan import DEFAULT_SEGMENTS, read_pages
+from app.service.dynamodb import DynamoDBPool
+from app.service.transaction_db import TRANSACTION_TABLE
+from app.service.transaction_rollups import ROLLUP_TABLE, RollupDeltas
+
+
+@dataclass
+class RebuildStats:
+    transactions: int = 0
+    written: int = 0
+    deleted: int = 0
+
+
+async def rebuild_rollups(dynamodb: DynamoDBPool, user_id: str | None = None,
+                          segments: int = DEFAULT_SEGMENTS) -> RebuildStats:
+    transactions = await dynamodb.table(TRANSACTION_TABLE)
+    rollups = await dynamodb.table(ROLLUP_TABLE)
+    stats = RebuildStats()
+
+    totals = RollupDeltas()
+
+    def add_transactions(items: list[dict]):
+        stats.transactions += len(items)
+        for item in items:
+            totals.add(item)
+
+    stored_keys = set()
+
+    def add_stored_keys(items: list[dict]):
+        stored_keys.update((item['user_id'], item['month']) for item in items)
+
+    await read_pages(transactions, add_transactions, user_id=user_id, segments=segments)
+    await read_pages(rollups, add_stored_keys, user_id=user_id, segments=segments,
+                     ProjectionExpression="user_id, #month",
+                     ExpressionAttributeNames={'#month': 'month'})
+
+    rebuilt = totals.items()
+    stale_keys = stored_keys - {key for key, _ in rebuilt}
+    async with rollups.batch_writer(overwrite_by_pkeys=['user_id', 'month']) as batch:
+        for (rollup_user_id, month), counters in rebuilt:
+            await batch.put_item(Item={'user_id': rollup_user_id, 'month': month, **counters})
+        for rollup_user_id, month in stale_keys:
+            await batch.delete_item(Key={'user_id': rollup_user_id, 'month': month})
+
+    stats.written = len(rebuilt)
+    stats.deleted = len(stale_keys)
+    return stats
+
+
+async def main(args: argparse.Namespace):
+    async with DynamoDBPool() as dynamodb:
+        stats = await rebuild_rollups(dynamodb, user_id=args.user, segments=args.segments)
+        print(f"read {stats.transactions} transactions, wrote {stats.written} rollups, "
+              f"deleted {stats.deleted} stale rollups")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--user", help="rebuild only this user's rollups")
+    parser.add_argument("--segments", type=int, default=DEFAULT_SEGMENTS)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,42 @@
+import datetime
+from decimal import Decimal
+from pydantic import BaseModel
+
+
+class MonthlySpending(BaseModel):
+    month: str
+    amount: Decimal
+    count: int
+
+
+class DailySpending(BaseModel):
+    date: datetime.date
+    amount: Decimal
+    rolling_7d: float
+    rolling_30d: float
+
+
+class MerchantSpending(BaseModel):
+    merchant: str
+    amount: Decimal
+    count: int
+
+
+class SpendingAnomaly(BaseModel):
+    transaction_id: str
+    date: datetime.date
+    merchant: str
+    amount: Decimal
+    score: float
+    reason: str
+
+
+class TransactionAnalytics(BaseModel):
+    currency: str
+    transaction_count: int
+    # transactions left out: other currencies, no amount or no date
+    excluded_count: int
+    monthly: list[MonthlySpending]
+    daily: list[DailySpending]
+    merchants: list[MerchantSpending]
+    anomalies: list[SpendingAnomaly]
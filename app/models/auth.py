@@ -6,3 +6,7 @@ class UserInDB(BaseModel):
     user_id: str
     hashed_password: str
     google_credentials: Optional[str] = None
+    gmail_history_id: Optional[str] = None
+    # set once a Gmail push watch is registered for the account
+    gmail_address: Optional[str] = None
+    gmail_watch_expiration: Optional[int] = None  # epoch milliseconds
@@ -1,6 +1,21 @@
+from typing import Optional
 from pydantic import BaseModel
 
 
 class Email(BaseModel):
     id: str
     body: str
+    sender: Optional[str] = None
+
+
+class EmailSync(BaseModel):
+    emails: list[Email]
+    history_id: Optional[str] = None
+    # messages that could not be fetched; the history id must not move past them
+    failed_ids: list[str] = []
+
+
+class GmailWatch(BaseModel):
+    email_address: str
+    history_id: str
+    expiration: int  # epoch milliseconds
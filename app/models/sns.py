@@ -4,3 +4,4 @@ from enum import StrEnum, auto
 class ExpenseEventType(StrEnum):
     EXPENSE_CREATED = auto()
     EXPENSE_DELETED = auto()
+    EXPENSE_UPDATED = auto()
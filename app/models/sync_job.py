@@ -0,0 +1,34 @@
+from datetime import datetime
+from enum import StrEnum, auto
+from typing import Optional
+from pydantic import BaseModel
+
+
+class SyncJobStatus(StrEnum):
+    QUEUED = auto()
+    RUNNING = auto()
+    SUCCEEDED = auto()
+    FAILED = auto()
+
+
+class SyncStage(StrEnum):
+    LISTING = auto()
+    EXTRACTING = auto()
+    SAVING = auto()
+
+
+class SyncJob(BaseModel):
+    job_id: str
+    user_id: str
+    status: SyncJobStatus = SyncJobStatus.QUEUED
+    stage: Optional[SyncStage] = None
+    emails_found: int = 0
+    # emails a bank template parsed; the rest are sent to Gemini
+    parsed: int = 0
+    sent_to_gemini: int = 0
+    created: int = 0
+    transaction_ids: list[str] = []
+    message: Optional[str] = None
+    error: Optional[str] = None
+    created_at: datetime
+    updated_at: datetime
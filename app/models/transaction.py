@@ -1,16 +1,225 @@
 import datetime
-from typing import Optional
-from pydantic import BaseModel, Field
+from decimal import Decimal
+from typing import Literal, Optional
+from pydantic import BaseModel, Field, PrivateAttr, TypeAdapter, computed_field, field_serializer, model_validator
 
+from app.utils.money_utils import (DEFAULT_CURRENCY, ISO_4217_CURRENCIES, detect_currency, format_minor,
+                                   normalize_currency, parse_amount, to_minor)
+from app.utils.transaction_key_utils import parse_legacy_date, transaction_date_key
 
-class Transaction(BaseModel):
+CurrencyCode = Literal[tuple(sorted(ISO_4217_CURRENCIES))]
+
+# items per /transactions/bulk request
+MAX_BULK_SIZE = 500
+
+
+def _is_iso_date(value) -> bool:
+    # only strings can be legacy; anything else is left to pydantic
+    return not isinstance(value, str) or (len(value) == 10 and value[4] == "-" and value[7] == "-")
+
+
+def _read_legacy_amount(data: dict, lenient: bool) -> tuple[dict, Optional[Decimal]]:
+    """Scales a legacy `amount` in major units into `amount_minor` by the
+    exponent of the currency sent with it, else the one named in the text,
+    else the default. Returns the new data and, when the currency was not
+    sent or named, the amount in major units."""
+    amount = data["amount"]
+    if isinstance(amount, str) and not amount.strip():
+        return data, None
+
+    sent = data.get("currency")
+    currency = normalize_currency(sent) if isinstance(sent, str) else None
+    if sent is not None and currency is None and not lenient:
+        raise ValueError(f"currency {sent!r} is not an ISO 4217 code")
+    named = detect_currency(amount) if isinstance(amount, str) else None
+    if currency and named and named != currency and not lenient:
+        raise ValueError(f"amount {amount!r} is in {named}, not {currency}")
+    currency = currency or named
+
+    major = parse_amount(amount)
+    if major is None:
+        if lenient:
+            return data, None
+        raise ValueError(f"amount {amount!r} is not a number")
+    data = {**data, "amount_minor": to_minor(major, currency or DEFAULT_CURRENCY),
+            "currency": currency or DEFAULT_CURRENCY}
+    return data, None if currency else major
+
+
+def _read_legacy_date(value: str, lenient: bool) -> Optional[datetime.date]:
+    if not value.strip():
+        return None
+    parsed = parse_legacy_date(value)
+    if parsed is None and not lenient:
+        raise ValueError(f"date {value!r} is not a recognized date")
+    return parsed
+
+
+def is_legacy(data: dict) -> bool:
+    """Whether `data` still has a string amount or a date in another format
+    than YYYY-MM-DD, as items written before typed amounts and Gemini's
+    output do."""
+    # typed writes always store amount_minor, null or not, next to an ISO date
+    if "amount_minor" in data:
+        return False
+    return data.get("amount") is not None or not _is_iso_date(data.get("date"))
+
+
+def legacy_fields(data: dict, lenient: bool = False) -> tuple[dict, Optional[Decimal]]:
+    """Reads the legacy string `amount` ("$1,234.50") and dates such as
+    MM/DD/YYYY into typed values, and currency codes in any case.
+
+    Values that cannot be read raise ValueError, or are dropped when
+    `lenient`: stored items and extraction output are read that way, client
+    input is not. Also returns a legacy amount sent without a currency, in
+    major units, for updates to scale by the stored currency instead."""
+    unpriced = None
+    if data.get("amount_minor") is None and data.get("amount") is not None:
+        data, unpriced = _read_legacy_amount(data, lenient)
+    date = data.get("date")
+    if not _is_iso_date(date):
+        data = {**data, "date": _read_legacy_date(date, lenient)}
+    currency = data.get("currency")
+    if isinstance(currency, str) and currency not in ISO_4217_CURRENCIES:
+        code = normalize_currency(currency)
+        if code is None and not lenient:
+            raise ValueError(f"currency {currency!r} is not an ISO 4217 code")
+        data = {**data, "currency": code or currency}
+    return data, unpriced
+
+
+class TransactionBase(BaseModel):
+    """Amounts are integer minor units plus an ISO 4217 currency code, and
+    dates are calendar dates serialized as YYYY-MM-DD. `amount` is still
+    returned as a decimal string for existing clients."""
     title: Optional[str] = None
-    date: Optional[str] = None
-    amount: Optional[str] = None
+    date: Optional[datetime.date] = None
+    amount_minor: Optional[int] = None
+    currency: Optional[str] = None
     description: Optional[str] = Field(max_length=50, default=None)
     status: Optional[bool] = None
 
+    @field_serializer("date")
+    def _serialize_date(self, date: Optional[datetime.date]) -> Optional[str]:
+        # a string in python mode too, so model_dump() goes straight to boto3
+        return date.isoformat() if date else None
+
+    @computed_field
+    @property
+    def amount(self) -> Optional[str]:
+        if self.amount_minor is None:
+            return None
+        return format_minor(self.amount_minor, self.currency or DEFAULT_CURRENCY)
+
+
+class Transaction(TransactionBase):
+    """A transaction as a client sends it, to create or change one.
+
+    The legacy string `amount` and MM/DD/YYYY dates are still accepted and
+    read with legacy_fields; input that cannot be read is rejected.
+    """
+    currency: Optional[CurrencyCode] = None
+    # a legacy amount a client sent without a currency, for updates to
+    # scale by the stored currency instead of the default
+    _unpriced_amount: Optional[Decimal] = PrivateAttr(default=None)
+
+    @model_validator(mode="wrap")
+    @classmethod
+    def _read_legacy_fields(cls, data, handler):
+        unpriced = None
+        if isinstance(data, dict):
+            data, unpriced = legacy_fields(data)
+        transaction = handler(data)
+        transaction._unpriced_amount = unpriced
+        return transaction
 
-class TransactionDB(Transaction):
+    def in_currency_of(self, item: dict) -> "Transaction":
+        """For a partial update of `item`: an amount sent without a currency
+        is read in the stored currency, which is then kept."""
+        currency = item.get("currency")
+        if self._unpriced_amount is None or not currency:
+            return self
+        return self.model_copy(update={
+            "amount_minor": to_minor(self._unpriced_amount, currency), "currency": currency})
+
+
+class TransactionDB(TransactionBase):
+    """A stored transaction. Validation is plain field checks, as reads
+    validate every item; use `from_item` for data that may be legacy."""
     user_id: str
     transaction_id: str
+
+    @classmethod
+    def from_item(cls, item: dict) -> "TransactionDB":
+        """Reads a stored item or extraction output. Items the amounts
+        migration has not rewritten yet go through legacy_fields, dropping
+        values that cannot be read rather than failing the read."""
+        return cls.from_items([item])[0]
+
+    @staticmethod
+    def from_items(items: list[dict]) -> list["TransactionDB"]:
+        """`from_item` for a page of items, validated in one call.
+
+        boto3 returns numbers as Decimal, and pydantic's Decimal to int
+        check costs more than the rest of the item; `amount_minor`, only ever
+        written as an int, is turned back into one here first, in the item
+        itself.
+        """
+        typed = []
+        for item in items:
+            minor = item.get("amount_minor")
+            if minor.__class__ is Decimal:
+                item["amount_minor"] = int(minor)
+            elif minor is None and is_legacy(item):
+                item = legacy_fields(item, lenient=True)[0]
+            typed.append(item)
+        return _transaction_list.validate_python(typed)
+
+    # sort key of the (user_id, date_key) index; derived, so every write of
+    # the model keeps it in step with `date`
+    @computed_field
+    @property
+    def date_key(self) -> str:
+        return transaction_date_key(self.date, self.transaction_id)
+
+
+_transaction_list = TypeAdapter(list[TransactionDB])
+
+
+class TransactionPage(BaseModel):
+    items: list[TransactionDB]
+    next_cursor: Optional[str] = None
+
+
+class TransactionUpdate(Transaction):
+    transaction_id: str
+
+
+class BulkDelete(BaseModel):
+    transaction_ids: list[str] = Field(min_length=1, max_length=MAX_BULK_SIZE)
+
+
+class BulkItemResult(BaseModel):
+    """Outcome of one item of a bulk request, in request order; status_code
+    is what the single-item endpoint would have answered."""
+    transaction_id: Optional[str] = None
+    status_code: int
+    transaction: Optional[TransactionDB] = None
+    detail: Optional[str] = None
+
+
+class SpendingBreakdown(BaseModel):
+    amount: Decimal
+    count: int
+
+
+class MonthlySummary(BaseModel):
+    """Totals of one month's transactions in `currency`; `currencies` lists
+    every currency the month has transactions in."""
+    month: str
+    currency: str
+    currencies: list[str] = []
+    amount: Decimal
+    count: int
+    by_status: dict[str, SpendingBreakdown]
+    by_category: dict[str, SpendingBreakdown]
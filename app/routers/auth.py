@@ -1,4 +1,4 @@
-import base64
+import asyncio
 import os
 from typing import Annotated
 from dotenv import load_dotenv
@@ -7,24 +7,21 @@ from fastapi.responses import RedirectResponse
 from fastapi.security import OAuth2PasswordRequestForm, OAuth2PasswordBearer
 import jwt
 from pydantic import BaseModel, EmailStr
-from passlib.context import CryptContext
 from datetime import datetime, timedelta, timezone
-from google_auth_oauthlib.flow import Flow
 
 
 from app.api.dependencies import get_db, get_user_db
 from app.models.auth import UserInDB
+from app.service.gmail_push import register_watch
+from app.service.google_oauth import exchange_code, oauth_flow
+from app.service.gmail_service import GmailService
 from app.service.transaction_db import DB
 from app.service.user_db import UserDB
 from app.utils.encrytion_utils import encrypt_credentials
+from app.utils.password_utils import hash_password, hash_password_async, verify_password, verify_password_async
 
 router = APIRouter(prefix="/auth", tags=["auth"])
 load_dotenv()
-b64_creds = os.getenv("GOOGLE_CREDENTIALS_B64")
-decoded = base64.b64decode(b64_creds)
-
-with open("temp_credentials.json", "wb") as f:
-    f.write(decoded)
 
 SCOPES = ["https://www.googleapis.com/auth/gmail.readonly"]
 REDIRECT_URI = "https://expensenotify.onrender.com/auth/google-callback"
@@ -35,8 +32,6 @@ TOKEN_KEY = os.getenv("TOKEN_KEY")
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 30
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
-
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/auth/login")
 
 
@@ -50,14 +45,6 @@ class Token(BaseModel):
     token_type: str
 
 
-def hash_password(password: str) -> str:
-    return pwd_context.hash(password)
-
-
-def verify_password(plain: str, hashed: str) -> bool:
-    return pwd_context.verify(plain, hashed)
-
-
 def create_access_token(data: dict, expires_delta: timedelta = None):
     to_encode = data.copy()
     if expires_delta:
@@ -68,6 +55,19 @@ def create_access_token(data: dict, expires_delta: timedelta = None):
     return jwt.encode(to_encode, TOKEN_KEY, algorithm=ALGORITHM)
 
 
+def get_current_user_id(token: str = Depends(oauth2_scheme)) -> str:
+    """Claims-only auth: trusts the signed token without loading the user.
+    For routes that need nothing but the user id."""
+    try:
+        payload = jwt.decode(token, TOKEN_KEY, algorithms=[ALGORITHM])
+        user_id = payload.get("sub")
+        if user_id is None:
+            raise HTTPException(status_code=401, detail="Invalid token")
+        return user_id
+    except jwt.InvalidTokenError:
+        raise HTTPException(status_code=401, detail="Invalid token")
+
+
 async def get_current_user(token: str = Depends(oauth2_scheme), db: UserDB = Depends(get_user_db)) -> UserInDB:
     try:
         payload = jwt.decode(token, TOKEN_KEY, algorithms=[ALGORITHM])
@@ -101,7 +101,7 @@ async def signup(user_in: User,  db: UserDB = Depends(get_user_db)):
     user = await db.get_user_by_userid(user_id=user_in.user_id)
     if user:
         raise HTTPException(status_code=400, detail="User already exists")
-    hashed = hash_password(user_in.password)
+    hashed = await hash_password_async(user_in.password)
     await db.create_user(UserInDB(
         user_id=user_in.user_id,
         hashed_password=hashed
@@ -112,8 +112,13 @@ async def signup(user_in: User,  db: UserDB = Depends(get_user_db)):
 @router.post("/login", response_model=Token)
 async def login(form_data: OAuth2PasswordRequestForm = Depends(), db: UserDB = Depends(get_user_db)):
     user = await db.get_user_by_userid(user_id=form_data.username)
-    if not user or not verify_password(form_data.password, user.hashed_password):
+    if not user:
+        raise HTTPException(status_code=401, detail="Invalid credentials")
+    verified, new_hash = await verify_password_async(form_data.password, user.hashed_password)
+    if not verified:
         raise HTTPException(status_code=401, detail="Invalid credentials")
+    if new_hash:
+        await db.update_user_password(user_id=user.user_id, hashed_password=new_hash)
     access_token_expires = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
     token = create_access_token(
         data={"sub": user.user_id}, expires_delta=access_token_expires)
@@ -137,11 +142,7 @@ async def google_login(request: Request, db: UserDB = Depends(get_user_db)):
     if not user:
         raise HTTPException(status_code=401, detail="Invalid token")
 
-    flow = Flow.from_client_secrets_file(
-        "temp_credentials.json",
-        scopes=SCOPES,
-        redirect_uri=REDIRECT_URI
-    )
+    flow = oauth_flow(SCOPES, REDIRECT_URI)
 
     auth_url, state = flow.authorization_url(
         access_type="offline",
@@ -161,18 +162,18 @@ async def google_callback(request: Request, db: UserDB = Depends(get_user_db)):
     if not user:
         raise HTTPException(status_code=401, detail="Invalid token")
 
-    flow = Flow.from_client_secrets_file(
-        "temp_credentials.json",
-        scopes=SCOPES,
-        redirect_uri=REDIRECT_URI
-    )
-    flow.fetch_token(code=code)
-    credentials = flow.credentials
+    try:
+        credentials = await exchange_code(code, SCOPES, REDIRECT_URI)
+    except asyncio.TimeoutError:
+        print(f"Timed out exchanging the Google authorization code for {user.user_id}")
+        raise HTTPException(status_code=504, detail="Google did not respond in time. Please try again.")
 
     await db.update_user_credentials(
         user_id=user.user_id,
         google_credentials=encrypt_credentials(credentials.to_json())
     )
+    # new mail now triggers a sync through the push webhook
+    await register_watch(user, db, GmailService(credentials))
 
     frontend_url = "https://expense-notify-fe-f3uc.vercel.app//google-link-success?status=success"
     return RedirectResponse(frontend_url)
@@ -1,89 +1,72 @@
-from datetime import datetime, timezone
-import json
-from fastapi import APIRouter, Depends, HTTPException, Request
-from google.oauth2.credentials import Credentials
+from fastapi import APIRouter, Body, Depends, HTTPException, Query, Response
 
-from app.api.dependencies import get_db, get_gemini_client, get_user_db
-from app.models.transaction import TransactionDB
+from app.api.dependencies import get_extraction_cache, get_gmail_clients, get_sync_jobs, get_user_cache, get_user_db
 from app.models.auth import UserInDB
-from app.routers.auth import SCOPES, get_current_user
-from app.service.transaction_db import DB
-from app.service.gemini import Gemini
-from app.service.gmail_service import GmailService
+from app.models.sync_job import SyncJob
+from app.routers.auth import get_current_user
+from app.service.extraction_cache import ExtractionCache
+from app.service.gmail_push import is_new_history, parse_push_message, push_token_valid
+from app.service.gmail_service import GmailClientCache, GmailService, load_gmail_service
+from app.service.sync_jobs import SyncJobs
+from app.service.user_cache import UserCache
 from app.service.user_db import UserDB
-from app.utils.encrytion_utils import decrypt_credentials, encrypt_credentials
-from dateutil.parser import parse as parse_date
 
 
 router = APIRouter(prefix="/genai", tags=["genai"])
 
 
-async def get_gmail_service(user: UserInDB = Depends(get_current_user), db: UserDB = Depends(get_user_db)) -> GmailService:
-    try:
-        creds_data = json.loads(decrypt_credentials(user.google_credentials))
-
-        expiry_str = creds_data.get("expiry")
-        expiry_dt = parse_date(expiry_str) if expiry_str else None
-        if expiry_dt and expiry_dt.tzinfo is None:
-            expiry_dt = expiry_dt.replace(tzinfo=timezone.utc)
-
-        creds = Credentials(
-            token=creds_data.get("token"),
-            refresh_token=creds_data.get("refresh_token"),
-            token_uri=creds_data.get("token_uri"),
-            client_id=creds_data.get("client_id"),
-            client_secret=creds_data.get("client_secret"),
-            scopes=creds_data.get("scopes"),
-        )
-
-        now = datetime.now(timezone.utc)
-        if expiry_dt and now >= expiry_dt:
-            if creds.refresh_token:
-                try:
-                    creds.refresh(Request())
-                    await db.update_user_credentials(
-                        user_id=user.user_id,
-                        google_credentials=encrypt_credentials(creds.to_json())
-                    )
-                except Exception as e:
-                    print(f"Failed to refresh credentials: {e}")
-                    raise HTTPException(
-                        status_code=401, detail="Google credentials expired or invalid. Please re-link your account.")
-            else:
-                raise HTTPException(
-                    status_code=500, detail="Failed")
-
-        return GmailService(creds)
-
-    except Exception as e:
-        print(f"Failed to load credentials: {e}")
-        raise HTTPException(
-            status_code=401, detail="Invalid or missing Google credentials.")
-
-
-@router.get("/extract", response_model=list[TransactionDB] | dict)
-async def addTransaction(user: UserInDB = Depends(get_current_user), db: DB = Depends(get_db), gmail_service: GmailService = Depends(get_gmail_service), gemini_client: Gemini = Depends(get_gemini_client)):
-    try:
-        decoded_body_list = gmail_service.get_expense_emails()
+async def get_gmail_service(user: UserInDB = Depends(get_current_user), db: UserDB = Depends(get_user_db),
+                            clients: GmailClientCache | None = Depends(get_gmail_clients)) -> GmailService:
+    return await load_gmail_service(user, db, clients)
 
-        if decoded_body_list is None:
-            return {"message": "No emails found or an error occurred."}
 
-        existing_transactions = await db.get_all_transactions(user_id=user.user_id)
-        existing_transaction_ids = [
-            transaction.transaction_id for transaction in existing_transactions]
-        transactions_to_add = [
-            transaction.id for transaction in decoded_body_list if transaction.id not in existing_transaction_ids]
+@router.get("/extract", status_code=202, response_model=SyncJob)
+async def addTransaction(response: Response, user: UserInDB = Depends(get_current_user), gmail_service: GmailService = Depends(get_gmail_service), sync_jobs: SyncJobs = Depends(get_sync_jobs)):
+    # gmail_service is only resolved so missing or revoked credentials fail
+    # here with a 401; the worker loads them again when the job runs
+    job = await sync_jobs.submit(user.user_id)
+    response.headers["Location"] = f"/genai/jobs/{job.job_id}"
+    return job
 
-        # ask gemini to create transaction
-        if not transactions_to_add:
-            return {"message": "No new transactions to add."}
 
-        print("new transactions found")
-        transaction_list = gemini_client.get_transaction_from_gemini(
-            user=user, emails=[body for body in decoded_body_list if body.id in transactions_to_add])
-        return await db.create_transaction_from_gmail(transaction_list)
+@router.get("/jobs/{job_id}", response_model=SyncJob)
+async def get_sync_job(job_id: str, user: UserInDB = Depends(get_current_user), sync_jobs: SyncJobs = Depends(get_sync_jobs)):
+    job = await sync_jobs.get(job_id)
+    if job is None or job.user_id != user.user_id:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
 
-    except Exception as error:
-        print(f"An error occurred: {error}")
-        return {"error": str(error)}
+
+@router.post("/gmail/push", status_code=204)
+async def gmail_push(envelope: dict = Body(...), token: str | None = Query(default=None), user_db: UserDB = Depends(get_user_db), sync_jobs: SyncJobs = Depends(get_sync_jobs)):
+    """Pub/Sub push endpoint for Gmail watch notifications. Anything that is
+    not worth retrying is acknowledged with 204; errors reading the user or
+    queueing the sync return 500 so Pub/Sub delivers the message again."""
+    if not push_token_valid(token):
+        raise HTTPException(status_code=403, detail="Invalid push token")
+    try:
+        notification = parse_push_message(envelope)
+    except ValueError as e:
+        print(f"Ignoring push message: {e}")
+        return Response(status_code=204)
+
+    user = await user_db.get_user_by_gmail_address(notification.email_address)
+    if user is None or not user.google_credentials:
+        return Response(status_code=204)
+    if is_new_history(user, notification):
+        await sync_jobs.submit(user.user_id)
+    return Response(status_code=204)
+
+
+@router.get("/cache-stats")
+async def get_cache_stats(user: UserInDB = Depends(get_current_user), cache: ExtractionCache | None = Depends(get_extraction_cache)):
+    if cache is None:
+        return {"backend": None}
+    return cache.stats()
+
+
+@router.get("/user-cache-stats")
+async def get_user_cache_stats(user: UserInDB = Depends(get_current_user), cache: UserCache | None = Depends(get_user_cache)):
+    if cache is None:
+        return {"size": None}
+    return cache.stats()
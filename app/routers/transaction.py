@@ -1,9 +1,34 @@
-from fastapi import APIRouter, Depends
-from app.api.dependencies import get_db
-from app.models.transaction import Transaction, TransactionDB
-from app.models.auth import UserInDB
-from app.routers.auth import get_current_user
+import asyncio
+from datetime import date, datetime, timezone
+
+from typing import Annotated
+
+from fastapi import APIRouter, Body, Depends, HTTPException, Query, Response
+from fastapi.responses import StreamingResponse
+from app.api.dependencies import (get_db, get_dynamodb, get_event_bus, get_outbox_relay, get_topic_subscription,
+                                  get_transaction_feed)
+from app.models.analytics import TransactionAnalytics
+from app.models.transaction import (
+    BulkDelete,
+    BulkItemResult,
+    MAX_BULK_SIZE,
+    MonthlySummary,
+    Transaction,
+    TransactionDB,
+    TransactionUpdate,
+)
+from app.routers.auth import get_current_user_id
+from app.service.dynamodb import DynamoDBPool
+from app.service.outbox import OutboxRelay
+from app.service.sns import EventBus
+from app.service.transaction_analytics import ANALYTICS_DAYS, compute_analytics, load_frame
 from app.service.transaction_db import DB
+from app.service.transaction_export import EXPORT_FORMATS, export_chunks
+from app.service.transaction_feed import TopicSubscription, TransactionFeed
+from app.utils.money_utils import DEFAULT_CURRENCY
+
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+MAX_PAGE_SIZE = 500
 
 router = APIRouter(
     prefix="/transactions",
@@ -12,31 +37,169 @@ router = APIRouter(
 
 
 @router.get("/me", response_model=list[TransactionDB])
-async def get_transaction_by_user_id(user: UserInDB = Depends(get_current_user), db: DB = Depends(get_db)):
-    transaction = await db.get_transaction_by_user_id(user_id=user.user_id)
-    return transaction
+async def get_transaction_by_user_id(
+    response: Response,
+    limit: int | None = Query(default=None, ge=1, le=MAX_PAGE_SIZE),
+    cursor: str | None = None,
+    status: bool | None = None,
+    date_from: date | None = None,
+    date_to: date | None = None,
+    user_id: str = Depends(get_current_user_id),
+    db: DB = Depends(get_db),
+):
+    if date_from and date_to and date_from > date_to:
+        raise HTTPException(
+            status_code=400, detail="date_from must not be after date_to")
+
+    # without a limit the whole history is returned, as before; with one,
+    # the cursor for the next page comes back in the X-Next-Cursor header
+    if limit is None:
+        return await db.get_transaction_by_user_id(
+            user_id=user_id, status=status, date_from=date_from, date_to=date_to)
+
+    page = await db.get_transaction_page(
+        user_id=user_id, limit=limit, cursor=cursor, status=status,
+        date_from=date_from, date_to=date_to)
+    if page.next_cursor:
+        response.headers[NEXT_CURSOR_HEADER] = page.next_cursor
+    return page.items
+
+
+@router.get("/summary", response_model=MonthlySummary)
+async def get_monthly_summary(
+    month: str | None = Query(default=None, pattern=r"^\d{4}-(0[1-9]|1[0-2])$"),
+    currency: str = Query(default=DEFAULT_CURRENCY, pattern=r"^[A-Z]{3}$"),
+    user_id: str = Depends(get_current_user_id),
+    db: DB = Depends(get_db),
+):
+    # one rollup item per month; defaults to the current (UTC) month
+    month = month or datetime.now(timezone.utc).strftime("%Y-%m")
+    return await db.get_monthly_summary(user_id=user_id, month=month, currency=currency)
+
+
+@router.get("/analytics", response_model=TransactionAnalytics)
+async def get_transaction_analytics(
+    currency: str = Query(default=DEFAULT_CURRENCY, pattern=r"^[A-Z]{3}$"),
+    days: int = Query(default=ANALYTICS_DAYS, ge=1, le=366),
+    user_id: str = Depends(get_current_user_id),
+    dynamodb: DynamoDBPool = Depends(get_dynamodb),
+):
+    frame = await load_frame(dynamodb, user_id=user_id, currency=currency)
+    # vectorized, but still CPU-bound for long histories; keep it off the loop
+    return await asyncio.to_thread(
+        compute_analytics, frame, today=datetime.now(timezone.utc).date(), days=days)
+
+
+@router.get("/export", response_class=StreamingResponse)
+async def export_transactions(
+    format: str = Query(default="csv", pattern=f"^({'|'.join(EXPORT_FORMATS)})$"),
+    status: bool | None = None,
+    date_from: date | None = None,
+    date_to: date | None = None,
+    user_id: str = Depends(get_current_user_id),
+    db: DB = Depends(get_db),
+):
+    if date_from and date_to and date_from > date_to:
+        raise HTTPException(
+            status_code=400, detail="date_from must not be after date_to")
+
+    pages = db.iter_transaction_pages(
+        user_id=user_id, status=status, date_from=date_from, date_to=date_to)
+    # read the first page before the response starts, so a failing query is
+    # still reported as an error status rather than a truncated body
+    first_page = await anext(pages, [])
+
+    async def all_pages():
+        yield first_page
+        async for page in pages:
+            yield page
+
+    return StreamingResponse(
+        export_chunks(all_pages(), format),
+        media_type=EXPORT_FORMATS[format],
+        headers={"Content-Disposition": f'attachment; filename="transactions.{format}"'},
+    )
+
+
+@router.get("/stream", response_class=StreamingResponse)
+async def stream_transactions(
+    user_id: str = Depends(get_current_user_id),
+    feed: TransactionFeed = Depends(get_transaction_feed),
+):
+    # created, updated and deleted transactions as server-sent events, so
+    # open clients apply deltas instead of polling /me
+    return StreamingResponse(
+        feed.stream(user_id),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@router.get("/event-stats")
+async def get_event_stats(
+    user_id: str = Depends(get_current_user_id),
+    relay: OutboxRelay | None = Depends(get_outbox_relay),
+    event_bus: EventBus | None = Depends(get_event_bus),
+    feed: TransactionFeed = Depends(get_transaction_feed),
+    topic_subscription: TopicSubscription | None = Depends(get_topic_subscription),
+):
+    # how far the outbox relay is behind, and what reached SNS and the stream
+    return {
+        "outbox": {"backlog": await relay.backlog(), **relay.stats()} if relay is not None else None,
+        "event_bus": event_bus.stats() if event_bus is not None else None,
+        "feed": feed.stats(),
+        "topic_subscription": topic_subscription.stats() if topic_subscription is not None else None,
+    }
 
 
 @router.post("/create", response_model=TransactionDB, status_code=201)
-async def create_transaction(transaction: Transaction, user: UserInDB = Depends(get_current_user), db: DB = Depends(get_db)):
-    created_transaction = await db.create_transaction(user_id=user.user_id, transaction=transaction)
+async def create_transaction(transaction: Transaction, user_id: str = Depends(get_current_user_id), db: DB = Depends(get_db)):
+    created_transaction = await db.create_transaction(user_id=user_id, transaction=transaction)
     return created_transaction
 
 
+# one request per import or bulk edit; results come back per item, in order
+@router.post("/bulk", response_model=list[BulkItemResult])
+async def bulk_create_transactions(
+    transactions: Annotated[list[Transaction], Body(min_length=1, max_length=MAX_BULK_SIZE)],
+    user_id: str = Depends(get_current_user_id),
+    db: DB = Depends(get_db),
+):
+    return await db.bulk_create_transactions(user_id=user_id, transactions=transactions)
+
+
+@router.put("/bulk", response_model=list[BulkItemResult])
+async def bulk_update_transactions(
+    updates: Annotated[list[TransactionUpdate], Body(min_length=1, max_length=MAX_BULK_SIZE)],
+    user_id: str = Depends(get_current_user_id),
+    db: DB = Depends(get_db),
+):
+    return await db.bulk_update_transactions(user_id=user_id, updates=updates)
+
+
+@router.post("/bulk/delete", response_model=list[BulkItemResult])
+async def bulk_delete_transactions(
+    request: BulkDelete,
+    user_id: str = Depends(get_current_user_id),
+    db: DB = Depends(get_db),
+):
+    return await db.bulk_delete_transactions(user_id=user_id, transaction_ids=request.transaction_ids)
+
+
 @router.get("/{transaction_id}", response_model=TransactionDB)
-async def get_transaction(transaction_id: str, user: UserInDB = Depends(get_current_user),  db: DB = Depends(get_db)):
-    transaction = await db.get_transaction(transaction_id=transaction_id)
+async def get_transaction(transaction_id: str, user_id: str = Depends(get_current_user_id),  db: DB = Depends(get_db)):
+    transaction = await db.get_transaction(transaction_id=transaction_id, user_id=user_id)
     return transaction
 
 
 @router.delete("/{transaction_id}", status_code=204)
-async def delete_transaction(transaction_id: str, user: UserInDB = Depends(get_current_user), db: DB = Depends(get_db)):
-    await db.delete_transaction(user_id=user.user_id, transaction_id=transaction_id)
+async def delete_transaction(transaction_id: str, user_id: str = Depends(get_current_user_id), db: DB = Depends(get_db)):
+    await db.delete_transaction(user_id=user_id, transaction_id=transaction_id)
     return transaction_id
 
 
 @router.put("/{transaction_id}", response_model=TransactionDB)
-async def update_transaction(transaction_id: str, transaction: Transaction, user: UserInDB = Depends(get_current_user), db: DB = Depends(get_db)):
+async def update_transaction(transaction_id: str, transaction: Transaction, user_id: str = Depends(get_current_user_id), db: DB = Depends(get_db)):
     updated_transaction = await db.update_transaction(
-        user_id=user.user_id, transaction_id=transaction_id, transaction=transaction)
+        user_id=user_id, transaction_id=transaction_id, transaction=transaction)
     return updated_transaction
@@ -0,0 +1,95 @@
+import asyncio
+import os
+from contextlib import AsyncExitStack
+
+import aioboto3
+from aiobotocore.config import AioConfig
+from dotenv import load_dotenv
+
+load_dotenv()
+
+DYNAMODB_REGION = 'us-west-1'
+DYNAMODB_ENDPOINT_URL = os.getenv("DYNAMODB_ENDPOINT_URL")
+DYNAMODB_MAX_POOL_CONNECTIONS = int(
+    os.getenv("DYNAMODB_MAX_POOL_CONNECTIONS", "50"))
+DYNAMODB_KEEPALIVE_TIMEOUT = float(
+    os.getenv("DYNAMODB_KEEPALIVE_TIMEOUT", "12"))
+# actions per TransactWriteItems call
+TRANSACT_WRITE_SIZE = 100
+
+
+class DynamoDBPool:
+    """App-wide DynamoDB resource shared by every request.
+
+    The underlying botocore client (credentials, endpoint resolution and the
+    aiohttp connection pool) is created once in `start()` and reused until
+    `close()`, instead of per DB call.
+    """
+
+    def __init__(self,
+                 region_name: str = DYNAMODB_REGION,
+                 endpoint_url: str | None = DYNAMODB_ENDPOINT_URL,
+                 max_pool_connections: int = DYNAMODB_MAX_POOL_CONNECTIONS,
+                 keepalive_timeout: float = DYNAMODB_KEEPALIVE_TIMEOUT):
+        self.session = aioboto3.Session()
+        self.region_name = region_name
+        self.endpoint_url = endpoint_url
+        self.config = AioConfig(
+            max_pool_connections=max_pool_connections,
+            tcp_keepalive=True,
+            connector_args={"keepalive_timeout": keepalive_timeout},
+        )
+        self.resource = None
+        self._tables = {}
+        self._stack = AsyncExitStack()
+        self._lock = asyncio.Lock()
+
+    async def start(self):
+        async with self._lock:
+            if self.resource is None:
+                self.resource = await self._stack.enter_async_context(
+                    self.session.resource(
+                        "dynamodb",
+                        region_name=self.region_name,
+                        endpoint_url=self.endpoint_url,
+                        config=self.config,
+                    )
+                )
+        return self
+
+    async def close(self):
+        await self._stack.aclose()
+        self.resource = None
+        self._tables.clear()
+
+    async def table(self, table_name: str):
+        if self.resource is None:
+            await self.start()
+        table = self._tables.get(table_name)
+        if table is None:
+            table = await self.resource.Table(table_name)
+            self._tables[table_name] = table
+        return table
+
+    async def batch_write_item(self, **kwargs) -> dict:
+        if self.resource is None:
+            await self.start()
+        return await self.resource.batch_write_item(**kwargs)
+
+    async def batch_get_item(self, **kwargs) -> dict:
+        if self.resource is None:
+            await self.start()
+        return await self.resource.batch_get_item(**kwargs)
+
+    async def transact_write_items(self, TransactItems: list[dict]) -> dict:
+        """The resource has no transactional call of its own; its client
+        takes plain Python values like the Table API does."""
+        if self.resource is None:
+            await self.start()
+        return await self.resource.meta.client.transact_write_items(TransactItems=TransactItems)
+
+    async def __aenter__(self):
+        return await self.start()
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.close()
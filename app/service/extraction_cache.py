@@ -0,0 +1,111 @@
+import asyncio
+import os
+import time
+from abc import ABC, abstractmethod
+
+from cachetools import TTLCache
+from dotenv import load_dotenv
+
+from app.service.dynamodb import DynamoDBPool
+
+load_dotenv()
+
+GEMINI_CACHE_BACKEND = os.getenv("GEMINI_CACHE_BACKEND", "memory")
+GEMINI_CACHE_MAX_SIZE = int(os.getenv("GEMINI_CACHE_MAX_SIZE", "10000"))
+GEMINI_CACHE_TTL_SECONDS = int(os.getenv("GEMINI_CACHE_TTL_SECONDS", str(30 * 24 * 3600)))
+GEMINI_CACHE_TABLE = "GeminiExtractionCache"
+BATCH_GET_SIZE = 100
+
+
+class ExtractionCache(ABC):
+    """Maps a content hash of an email to the transaction fields Gemini
+    extracted from it. Subclasses implement `_get_many` and `_set_many`."""
+
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+
+    async def get_many(self, keys: list[str]) -> dict[str, dict]:
+        found = await self._get_many(keys) if keys else {}
+        self.hits += len(found)
+        self.misses += len(keys) - len(found)
+        return found
+
+    async def set_many(self, values: dict[str, dict]):
+        if values:
+            await self._set_many(values)
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "backend": type(self).__name__,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / lookups if lookups else 0.0,
+        }
+
+    @abstractmethod
+    async def _get_many(self, keys: list[str]) -> dict[str, dict]:
+        ...
+
+    @abstractmethod
+    async def _set_many(self, values: dict[str, dict]):
+        ...
+
+
+class MemoryExtractionCache(ExtractionCache):
+    def __init__(self, maxsize: int = GEMINI_CACHE_MAX_SIZE, ttl: int = GEMINI_CACHE_TTL_SECONDS):
+        super().__init__()
+        self._cache = TTLCache(maxsize=maxsize, ttl=ttl)
+
+    async def _get_many(self, keys: list[str]) -> dict[str, dict]:
+        return {key: self._cache[key] for key in keys if key in self._cache}
+
+    async def _set_many(self, values: dict[str, dict]):
+        self._cache.update(values)
+
+
+class DynamoDBExtractionCache(ExtractionCache):
+    """Persistent cache in a DynamoDB table keyed by `cache_key`, with
+    DynamoDB TTL enabled on the `expires_at` attribute."""
+
+    def __init__(self, dynamodb: DynamoDBPool, table_name: str = GEMINI_CACHE_TABLE, ttl: int = GEMINI_CACHE_TTL_SECONDS):
+        super().__init__()
+        self.dynamodb = dynamodb
+        self.table_name = table_name
+        self.ttl = ttl
+
+    async def _get_many(self, keys: list[str]) -> dict[str, dict]:
+        found = {}
+        now = int(time.time())
+        unique_keys = list(dict.fromkeys(keys))
+        for i in range(0, len(unique_keys), BATCH_GET_SIZE):
+            request_keys = [{"cache_key": key}
+                            for key in unique_keys[i:i + BATCH_GET_SIZE]]
+            while request_keys:
+                response = await self.dynamodb.batch_get_item(
+                    RequestItems={self.table_name: {"Keys": request_keys}})
+                for item in response.get("Responses", {}).get(self.table_name, []):
+                    # DynamoDB deletes expired items lazily
+                    if item.get("expires_at", now) >= now:
+                        found[item["cache_key"]] = item["value"]
+                request_keys = response.get("UnprocessedKeys", {}).get(
+                    self.table_name, {}).get("Keys", [])
+                if request_keys:
+                    await asyncio.sleep(0.05)
+        return {key: found[key] for key in keys if key in found}
+
+    async def _set_many(self, values: dict[str, dict]):
+        expires_at = int(time.time()) + self.ttl
+        table = await self.dynamodb.table(self.table_name)
+        async with table.batch_writer(overwrite_by_pkeys=["cache_key"]) as batch:
+            for key, value in values.items():
+                await batch.put_item(Item={"cache_key": key, "value": value, "expires_at": expires_at})
+
+
+def create_extraction_cache(dynamodb: DynamoDBPool, backend: str = GEMINI_CACHE_BACKEND) -> ExtractionCache | None:
+    if backend == "memory":
+        return MemoryExtractionCache()
+    if backend == "dynamodb":
+        return DynamoDBExtractionCache(dynamodb)
+    return None
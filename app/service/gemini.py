@@ -1,35 +1,159 @@
+import asyncio
+import hashlib
 import json
+import os
+from typing import Optional
+
+from pydantic import BaseModel
+
 from app.models.email import Email
-from app.models.transaction import TransactionDB
+from app.models.transaction import Transaction, TransactionDB
 from app.models.auth import UserInDB
+from app.service.extraction_cache import ExtractionCache
+from app.service.rate_limit import RateLimit, is_quota_error
 from app.utils.prompt_utils import read_prompt
 
+GEMINI_CHUNK_TOKEN_BUDGET = int(os.getenv("GEMINI_CHUNK_TOKEN_BUDGET", "8000"))
+GEMINI_CHUNK_MAX_EMAILS = int(os.getenv("GEMINI_CHUNK_MAX_EMAILS", "20"))
+GEMINI_CONCURRENCY = int(os.getenv("GEMINI_CONCURRENCY", "4"))
+GEMINI_MAX_ATTEMPTS = 3
+GEMINI_RETRY_BACKOFF_SECONDS = 1.0
+# rough characters-per-token ratio for English text
+CHARS_PER_TOKEN = 4
+
+
+class ExtractedTransaction(BaseModel):
+    """Response schema for Gemini: the flat string fields the prompt asks
+    for. TransactionDB.from_item reads these into typed amounts and dates."""
+    user_id: str
+    transaction_id: str
+    title: Optional[str] = None
+    date: Optional[str] = None
+    amount: Optional[str] = None
+    description: Optional[str] = None
+    status: Optional[bool] = None
+
+
+def estimate_tokens(text: str) -> int:
+    return len(text) // CHARS_PER_TOKEN + 1
+
+
+def chunk_emails(emails: list[Email], token_budget: int, max_emails: int) -> list[list[Email]]:
+    chunks = []
+    chunk = []
+    chunk_tokens = 0
+    for email in emails:
+        tokens = estimate_tokens(str(email))
+        if chunk and (chunk_tokens + tokens > token_budget or len(chunk) >= max_emails):
+            chunks.append(chunk)
+            chunk = []
+            chunk_tokens = 0
+        chunk.append(email)
+        chunk_tokens += tokens
+    if chunk:
+        chunks.append(chunk)
+    return chunks
+
 
 class Gemini:
-    def __init__(self, client, model_name: str | None = "gemini-1.5-flash"):
+    def __init__(self, client, model_name: str | None = "gemini-1.5-flash",
+                 concurrency: int = GEMINI_CONCURRENCY,
+                 chunk_token_budget: int = GEMINI_CHUNK_TOKEN_BUDGET,
+                 chunk_max_emails: int = GEMINI_CHUNK_MAX_EMAILS,
+                 cache: ExtractionCache | None = None,
+                 rate_limit: RateLimit | None = None):
         self.client = client
         self.model_name = model_name
         self.prompt = read_prompt("app/resources/gemini_prompt.txt")
+        self.prompt_version = hashlib.sha256(self.prompt.encode()).hexdigest()[:16]
+        self.cache = cache
+        self.concurrency = concurrency
+        self.chunk_token_budget = chunk_token_budget
+        self.chunk_max_emails = chunk_max_emails
+        self.rate_limit = rate_limit
+
+    def cache_key(self, email: Email) -> str:
+        content = "\0".join([self.model_name, self.prompt_version, email.body])
+        return hashlib.sha256(content.encode()).hexdigest()
 
-    def get_transaction_from_gemini(self, user: UserInDB, emails: list[Email]) -> list[TransactionDB]:
+    def _build_prompt(self, user: UserInDB, emails: list[Email]) -> str:
         enumerated_transactions = [
             f"{i + 1}. {transaction}" for i, transaction in enumerate(emails)
         ]
 
         # prepare the prompt with the enumerated transactions
-        prompt = self.prompt.replace("{enumerated_transactions}", str(
+        return self.prompt.replace("{enumerated_transactions}", str(
             enumerated_transactions)).replace("{user_id}", user.user_id)
 
-        response = self.client.models.generate_content(
+    async def _extract_chunk(self, user: UserInDB, emails: list[Email]) -> list[TransactionDB]:
+        response = await self.client.aio.models.generate_content(
             model=self.model_name,
-            contents=prompt,
+            contents=self._build_prompt(user, emails),
             config={
                 "response_mime_type": "application/json",
-                "response_schema": list[TransactionDB],
+                "response_schema": list[ExtractedTransaction],
             },
         )
 
         transaction_data = json.loads(response.text)
-        transaction_list = [TransactionDB(**item) for item in transaction_data]
+        return TransactionDB.from_items(transaction_data)
+
+    async def _extract_chunk_with_retry(self, user: UserInDB, emails: list[Email], semaphore: asyncio.Semaphore) -> list[TransactionDB]:
+        async with semaphore:
+            for attempt in range(GEMINI_MAX_ATTEMPTS):
+                if self.rate_limit is not None:
+                    await self.rate_limit(1)
+                try:
+                    return await self._extract_chunk(user, emails)
+                except Exception as e:
+                    # a quota error lasts longer than the retries; let the caller back off
+                    if attempt == GEMINI_MAX_ATTEMPTS - 1 or is_quota_error(e):
+                        raise
+                    print(f"Gemini chunk of {len(emails)} emails failed, retrying: {e}")
+                    await asyncio.sleep(GEMINI_RETRY_BACKOFF_SECONDS * 2 ** attempt)
+
+    async def _extract(self, user: UserInDB, emails: list[Email]) -> list[TransactionDB]:
+        chunks = chunk_emails(emails, self.chunk_token_budget, self.chunk_max_emails)
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        results = await asyncio.gather(*(
+            self._extract_chunk_with_retry(user, chunk, semaphore) for chunk in chunks
+        ))
+
+        return [transaction for chunk_result in results for transaction in chunk_result]
+
+    async def get_transaction_from_gemini(self, user: UserInDB, emails: list[Email]) -> list[TransactionDB]:
+        """Extract transactions from emails with one Gemini call per chunk.
+
+        Emails whose body was extracted before with the same model and prompt
+        are served from the cache. The rest are chunked and run concurrently
+        up to `concurrency`, each chunk retried on its own; results are merged
+        in email order. If a chunk still fails after its retries the error is
+        raised, so the sync can be repeated.
+        """
+        if self.cache is None:
+            return await self._extract(user, emails)
+
+        keys = {email.id: self.cache_key(email) for email in emails}
+        cached = await self.cache.get_many(list(keys.values()))
+        misses = [email for email in emails if keys[email.id] not in cached]
+
+        extracted = await self._extract(user, misses) if misses else []
+        extracted_by_id = {transaction.transaction_id: transaction for transaction in extracted}
+
+        await self.cache.set_many({
+            keys[transaction_id]: transaction.model_dump(include=set(Transaction.model_fields))
+            for transaction_id, transaction in extracted_by_id.items() if transaction_id in keys
+        })
+
+        transaction_list = []
+        for email in emails:
+            if keys[email.id] in cached:
+                transaction_list.append(TransactionDB(
+                    user_id=user.user_id, transaction_id=email.id, **cached[keys[email.id]]))
+            elif email.id in extracted_by_id:
+                transaction_list.append(extracted_by_id.pop(email.id))
+        # keep anything Gemini returned under an id we did not send
+        transaction_list.extend(extracted_by_id.values())
 
         return transaction_list
@@ -0,0 +1,97 @@
+import base64
+import binascii
+import json
+import os
+import secrets
+import time
+
+from dotenv import load_dotenv
+from pydantic import BaseModel
+
+from app.models.auth import UserInDB
+from app.service.gmail_service import GmailClientCache, GmailService, load_gmail_service
+from app.service.user_db import UserDB
+
+load_dotenv()
+
+# Pub/Sub topic Gmail publishes to, "projects/<project>/topics/<topic>";
+# without it no watches are registered and syncs stay on demand
+GMAIL_PUSH_TOPIC = os.getenv("GMAIL_PUSH_TOPIC")
+# shared secret the Pub/Sub push subscription sends as ?token=
+GMAIL_PUSH_TOKEN = os.getenv("GMAIL_PUSH_TOKEN")
+# Google suggests renewing well before the seven day expiry
+GMAIL_WATCH_RENEW_BEFORE_SECONDS = 24 * 3600
+
+
+class GmailNotification(BaseModel):
+    email_address: str
+    history_id: str
+
+
+def push_token_valid(token: str | None) -> bool:
+    # no configured token means the webhook accepts nothing
+    return bool(GMAIL_PUSH_TOKEN and token) and secrets.compare_digest(token, GMAIL_PUSH_TOKEN)
+
+
+def parse_push_message(envelope: dict) -> GmailNotification:
+    """Reads the Gmail notification out of a Pub/Sub push request body,
+    whose message data is base64 JSON with emailAddress and historyId."""
+    try:
+        data = json.loads(base64.b64decode(envelope["message"]["data"]))
+        return GmailNotification(email_address=data["emailAddress"], history_id=str(data["historyId"]))
+    except (KeyError, TypeError, binascii.Error, ValueError) as e:
+        raise ValueError(f"Not a Gmail push message: {e}") from e
+
+
+def is_new_history(user: UserInDB, notification: GmailNotification) -> bool:
+    # history ids only grow; a notification at or below the stored id is
+    # mail an earlier sync already read
+    if not user.gmail_history_id:
+        return True
+    try:
+        return int(notification.history_id) > int(user.gmail_history_id)
+    except ValueError:
+        return True
+
+
+def watch_due(user: UserInDB, topic: str | None = GMAIL_PUSH_TOPIC) -> bool:
+    if not topic or not user.google_credentials:
+        return False
+    expiration = user.gmail_watch_expiration
+    return expiration is None or expiration / 1000 - time.time() < GMAIL_WATCH_RENEW_BEFORE_SECONDS
+
+
+async def register_watch(user: UserInDB, user_db: UserDB, gmail_service: GmailService,
+                         topic: str | None = GMAIL_PUSH_TOPIC) -> bool:
+    """Registers or renews the user's Gmail watch and records the address
+    notifications will name. Failures are logged: the user can still sync
+    on demand."""
+    if not topic:
+        return False
+    try:
+        watch = await gmail_service.watch(topic)
+        await user_db.update_gmail_watch(
+            user_id=user.user_id, gmail_address=watch.email_address, expiration=watch.expiration)
+        return True
+    except Exception as e:
+        print(f"Failed to register Gmail watch for {user.user_id}: {e}")
+        return False
+
+
+async def renew_watches(users: list[UserInDB], user_db: UserDB, clients: GmailClientCache | None = None,
+                        topic: str | None = GMAIL_PUSH_TOPIC) -> int:
+    """Renews every watch among `users` that is missing or expires within
+    GMAIL_WATCH_RENEW_BEFORE_SECONDS, whether or not the user has synced
+    lately; a mailbox that gets no mail would otherwise let its watch lapse.
+    Returns how many were renewed."""
+    renewed = 0
+    for user in users:
+        if not watch_due(user, topic):
+            continue
+        try:
+            gmail_service = await load_gmail_service(user, user_db, clients)
+        except Exception as e:
+            print(f"Failed to renew Gmail watch for {user.user_id}: {e}")
+            continue
+        renewed += await register_watch(user, user_db, gmail_service, topic)
+    return renewed
@@ -1,39 +1,285 @@
+import asyncio
+import json
 import os
+from dataclasses import dataclass, field
+from datetime import timezone
+from functools import lru_cache
+from typing import Awaitable, Callable
+from cachetools import TTLCache
+from dateutil.parser import parse as parse_date
 from dotenv import load_dotenv
-from google.auth.transport.requests import Request
+from fastapi import HTTPException
 from google.oauth2.credentials import Credentials
 from google_auth_oauthlib.flow import InstalledAppFlow
-from googleapiclient.discovery import build
+from googleapiclient.discovery import build_from_document
+from googleapiclient.discovery_cache import get_static_doc
+from googleapiclient.errors import HttpError
 
-from app.models.email import Email
-from app.utils.email_utils import decode_emails
+from app.models.auth import UserInDB
+from app.models.email import Email, EmailSync, GmailWatch
+from app.service import google_oauth
+from app.service.rate_limit import RateLimit, is_quota_error
+from app.service.user_db import UserDB
+from app.utils.email_utils import fetch_emails
+from app.utils.encrytion_utils import decrypt_credentials, encrypt_credentials
 
 load_dotenv()
 CLIENT_SECRET_FILE = os.getenv('CLIENT_SECRET_FILE')
 TOKEN_FILE = os.getenv('TOKEN_FILE')
 SCOPES = ['https://www.googleapis.com/auth/gmail.readonly']
+EXPENSE_LABEL_ID = "Label_2311038950946628504"
+LIST_PAGE_SIZE = 500
+GMAIL_CLIENT_CACHE_MAX_SIZE = int(os.getenv("GMAIL_CLIENT_CACHE_MAX_SIZE", "10000"))
+GMAIL_CLIENT_CACHE_TTL_SECONDS = int(os.getenv("GMAIL_CLIENT_CACHE_TTL_SECONDS", "3600"))
+
+
+@lru_cache(maxsize=None)
+def _gmail_discovery_document() -> dict:
+    # the copy shipped with google-api-python-client, parsed once instead of
+    # on every build(); building adds the root parameters to each method it
+    # touches, always the same ones, so one dict can be shared
+    return json.loads(get_static_doc("gmail", "v1"))
+
+
+def build_gmail_client(creds: Credentials):
+    return build_from_document(_gmail_discovery_document(), credentials=creds)
 
 
 class GmailService:
+    """Gmail calls for one user, made in worker threads.
+
+    The API client (and the httplib2 connection under it, which is not
+    thread-safe) belongs to this instance alone. It is built on first use,
+    inside the worker thread, and the calls that use it run one at a time.
+    """
 
-    def __init__(self, creds: Credentials):
+    def __init__(self, creds: Credentials, rate_limit: RateLimit | None = None, client=None):
         self.creds = creds
+        # awaited before Gmail calls with the number of calls about to be made
+        self.rate_limit = rate_limit
+        self.client = client
 
-    def get_expense_emails(self) -> list[Email] | None:
-        try:
-            service = build("gmail", "v1", credentials=self.creds)
+    def _client(self):
+        # only called from worker threads, so building stays off the loop
+        if self.client is None:
+            self.client = build_gmail_client(self.creds)
+        return self.client
+
+    def _list_label_messages(self, service) -> list[dict]:
+        messages = []
+        page_token = None
+        while True:
+            results = service.users().messages().list(
+                userId="me", labelIds=[EXPENSE_LABEL_ID],
+                maxResults=LIST_PAGE_SIZE, pageToken=page_token).execute()
+            messages.extend(results.get("messages", []))
+            page_token = results.get("nextPageToken")
+            if not page_token:
+                return messages
+
+    def _list_history_messages(self, service, start_history_id: str) -> tuple[list[dict], str]:
+        messages = {}
+        history_id = start_history_id
+        page_token = None
+        while True:
+            results = service.users().history().list(
+                userId="me", startHistoryId=start_history_id,
+                labelId=EXPENSE_LABEL_ID, historyTypes=["messageAdded"],
+                pageToken=page_token).execute()
+            for record in results.get("history", []):
+                for added in record.get("messagesAdded", []):
+                    message = added["message"]
+                    if EXPENSE_LABEL_ID in message.get("labelIds", [EXPENSE_LABEL_ID]):
+                        messages[message["id"]] = message
+            history_id = results.get("historyId", history_id)
+            page_token = results.get("nextPageToken")
+            if not page_token:
+                return list(messages.values()), history_id
+
+    def _list_new_messages(self, history_id: str | None):
+        service = self._client()
 
-            results = service.users().messages().list(userId="me", labelIds=[
-                "Label_2311038950946628504"], maxResults=10).execute()
-            messages = results.get("messages", [])
+        if history_id:
+            try:
+                messages, history_id = self._list_history_messages(
+                    service, history_id)
+                return service, messages, history_id, False
+            except HttpError as e:
+                # Gmail only keeps about a week of history; 404 means start over
+                if e.resp.status != 404:
+                    raise
+                print(f"History {history_id} expired, running a full sync")
 
-            decoded_body_list = decode_emails(service, messages)
+        # read the history id first so nothing added during the backfill is missed
+        history_id = service.users().getProfile(userId="me").execute()["historyId"]
+        return service, self._list_label_messages(service), str(history_id), True
 
-            return decoded_body_list
+    async def sync_expense_emails(self, history_id: str | None = None, get_existing_ids: Callable[[], Awaitable[set[str]]] | None = None) -> EmailSync | None:
+        """Fetch expense emails added since `history_id`, or the whole label
+        when there is no usable history id. On a full sync, messages whose ids
+        `get_existing_ids` returns are skipped before their bodies are fetched.
+        """
+        try:
+            if self.rate_limit is not None:
+                await self.rate_limit(1)
+            service, messages, history_id, full_sync = await asyncio.to_thread(
+                self._list_new_messages, history_id)
+            if full_sync and get_existing_ids is not None:
+                existing_ids = await get_existing_ids()
+                messages = [
+                    message for message in messages if message["id"] not in existing_ids]
+
+            failed_ids = []
+            decoded_body_list = [email async for email in fetch_emails(
+                service, messages, rate_limit=self.rate_limit, failed_ids=failed_ids)]
+
+            return EmailSync(emails=decoded_body_list, history_id=history_id, failed_ids=failed_ids)
         except Exception as e:
+            # callers back off on quota errors rather than treat them as a failed read
+            if is_quota_error(e):
+                raise
+            print(f"Failed to sync expense emails: {e}")
             return None
 
+    def _watch(self, topic_name: str) -> GmailWatch:
+        service = self._client()
+        email_address = service.users().getProfile(userId="me").execute()["emailAddress"]
+        response = service.users().watch(userId="me", body={
+            "topicName": topic_name,
+            "labelIds": [EXPENSE_LABEL_ID],
+            "labelFilterBehavior": "include",
+        }).execute()
+        return GmailWatch(email_address=email_address, history_id=str(response["historyId"]),
+                          expiration=int(response["expiration"]))
+
+    async def watch(self, topic_name: str) -> GmailWatch:
+        """Asks Gmail to publish a Pub/Sub notification to `topic_name` when
+        mail reaches the expense label. Watches lapse after seven days unless
+        renewed by calling this again."""
+        return await asyncio.to_thread(self._watch, topic_name)
+
     def logout(self):
         if os.path.exists("token.json"):
             os.remove("token.json")
         print("Logged out successfully. Token file removed.")
+
+
+def credentials_from_blob(blob: str) -> Credentials:
+    """Credentials from the encrypted JSON stored on the user."""
+    creds_data = json.loads(decrypt_credentials(blob))
+    expiry_str = creds_data.get("expiry")
+    expiry_dt = parse_date(expiry_str) if expiry_str else None
+    if expiry_dt and expiry_dt.tzinfo is not None:
+        # google-auth compares expiry against naive UTC
+        expiry_dt = expiry_dt.astimezone(timezone.utc).replace(tzinfo=None)
+
+    return Credentials(
+        token=creds_data.get("token"),
+        refresh_token=creds_data.get("refresh_token"),
+        token_uri=creds_data.get("token_uri"),
+        client_id=creds_data.get("client_id"),
+        client_secret=creds_data.get("client_secret"),
+        scopes=creds_data.get("scopes"),
+        expiry=expiry_dt,
+    )
+
+
+async def refresh_credentials(creds: Credentials, user_id: str, user_db: UserDB) -> str:
+    """Refreshes `creds` in place, stores them and returns the new blob."""
+    if not creds.refresh_token:
+        raise ValueError("Google credentials expired and cannot be refreshed")
+    await google_oauth.refresh(creds)
+    blob = encrypt_credentials(creds.to_json())
+    await user_db.update_user_credentials(user_id=user_id, google_credentials=blob)
+    return blob
+
+
+@dataclass
+class _CachedCredentials:
+    creds: Credentials
+    # the stored blob they were read from, and any written by their refreshes
+    blobs: set[str] = field(default_factory=set)
+
+
+class GmailClientCache:
+    """Decrypted credentials per user, so requests and syncs do not decrypt
+    and parse them on every call.
+
+    Each GmailService handed out builds its own client, from the discovery
+    document parsed once: an httplib2 client shared between threads would
+    interleave their requests on one connection.
+
+    An entry is rebuilt when the user's stored credentials are not ones it
+    knows (the account was re-linked) and dropped after `ttl` seconds or
+    when its credentials fail to refresh. Expired credentials are refreshed
+    once however many callers ask for the user at the same time.
+    """
+
+    def __init__(self, maxsize: int = GMAIL_CLIENT_CACHE_MAX_SIZE, ttl: int = GMAIL_CLIENT_CACHE_TTL_SECONDS):
+        self._entries = TTLCache(maxsize=maxsize, ttl=ttl)
+        self._refreshes: dict[str, asyncio.Task] = {}
+        self.hits = 0
+        self.misses = 0
+        self.refreshes = 0
+
+    async def get(self, user: UserInDB, user_db: UserDB) -> GmailService:
+        entry = self._entries.get(user.user_id)
+        if entry is None or user.google_credentials not in entry.blobs:
+            self.misses += 1
+            entry = _CachedCredentials(credentials_from_blob(user.google_credentials), {user.google_credentials})
+            self._entries[user.user_id] = entry
+        else:
+            self.hits += 1
+
+        if entry.creds.expired:
+            await self._refresh(user, user_db, entry)
+        return GmailService(entry.creds)
+
+    async def _refresh(self, user: UserInDB, user_db: UserDB, entry: _CachedCredentials):
+        task = self._refreshes.get(user.user_id)
+        if task is None:
+            self.refreshes += 1
+            task = asyncio.create_task(refresh_credentials(entry.creds, user.user_id, user_db))
+            self._refreshes[user.user_id] = task
+            task.add_done_callback(lambda _: self._refreshes.pop(user.user_id, None))
+        try:
+            # shielded: one caller giving up must not cancel the others' refresh
+            entry.blobs.add(await asyncio.shield(task))
+        except Exception:
+            if self._entries.get(user.user_id) is entry:
+                del self._entries[user.user_id]
+            raise
+
+    def invalidate(self, user_id: str):
+        self._entries.pop(user_id, None)
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / lookups if lookups else 0.0,
+            "refreshes": self.refreshes,
+        }
+
+
+async def load_gmail_service(user: UserInDB, user_db: UserDB, clients: GmailClientCache | None = None) -> GmailService:
+    """Builds a GmailService from the user's stored Google credentials,
+    refreshing and saving them first when they have expired."""
+    try:
+        if clients is not None:
+            return await clients.get(user, user_db)
+        creds = credentials_from_blob(user.google_credentials)
+        if creds.expired:
+            await refresh_credentials(creds, user.user_id, user_db)
+        return GmailService(creds)
+
+    except asyncio.TimeoutError:
+        print(f"Timed out refreshing Google credentials for {user.user_id}")
+        raise HTTPException(
+            status_code=503, detail="Google did not respond in time. Please try again.")
+    except Exception as e:
+        print(f"Failed to load credentials: {e}")
+        raise HTTPException(
+            status_code=401, detail="Invalid or missing Google credentials.")
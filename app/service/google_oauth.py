@@ -0,0 +1,66 @@
+import asyncio
+import base64
+import json
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache, partial
+
+from dotenv import load_dotenv
+from google.auth.transport.requests import Request
+from google.oauth2.credentials import Credentials
+from google_auth_oauthlib.flow import Flow
+
+load_dotenv()
+
+GOOGLE_OAUTH_TIMEOUT_SECONDS = float(os.getenv("GOOGLE_OAUTH_TIMEOUT_SECONDS", "10"))
+GOOGLE_OAUTH_WORKERS = int(os.getenv("GOOGLE_OAUTH_WORKERS", "8"))
+
+# token exchanges and refreshes are blocking HTTP calls to Google; their own
+# pool keeps a slow token endpoint from tying up the default executor that
+# the rest of the app offloads to, and its size bounds how many are in flight
+_executor = ThreadPoolExecutor(max_workers=GOOGLE_OAUTH_WORKERS, thread_name_prefix="google-oauth")
+# a Request (and the connection pool of its session) per worker thread
+_local = threading.local()
+
+
+@lru_cache(maxsize=None)
+def client_config() -> dict:
+    """The OAuth client from GOOGLE_CREDENTIALS_B64, decoded once."""
+    return json.loads(base64.b64decode(os.getenv("GOOGLE_CREDENTIALS_B64")))
+
+
+def oauth_flow(scopes: list[str], redirect_uri: str) -> Flow:
+    return Flow.from_client_config(client_config(), scopes=scopes, redirect_uri=redirect_uri)
+
+
+def _request(timeout: float):
+    if not hasattr(_local, "request"):
+        _local.request = Request()
+    return partial(_local.request, timeout=timeout)
+
+
+async def _run(fn, timeout: float):
+    # the HTTP timeout applies per connect or read; this bounds the whole
+    # call, retries included. A call given up on finishes in its thread.
+    loop = asyncio.get_running_loop()
+    return await asyncio.wait_for(loop.run_in_executor(_executor, fn), timeout)
+
+
+async def exchange_code(code: str, scopes: list[str], redirect_uri: str,
+                        timeout: float = GOOGLE_OAUTH_TIMEOUT_SECONDS) -> Credentials:
+    """Exchanges an authorization code for credentials.
+
+    Raises asyncio.TimeoutError when Google does not answer within `timeout`.
+    """
+    flow = oauth_flow(scopes, redirect_uri)
+    await _run(partial(flow.fetch_token, code=code, timeout=timeout), timeout)
+    return flow.credentials
+
+
+async def refresh(creds: Credentials, timeout: float = GOOGLE_OAUTH_TIMEOUT_SECONDS):
+    """Refreshes `creds` in place.
+
+    Raises asyncio.TimeoutError when Google does not answer within `timeout`.
+    """
+    await _run(lambda: creds.refresh(_request(timeout)), timeout)
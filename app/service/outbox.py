@@ -0,0 +1,179 @@
+import asyncio
+import os
+import zlib
+
+from boto3.dynamodb.conditions import Key
+from dotenv import load_dotenv
+
+from app.models.sns import ExpenseEventType
+from app.service.dynamodb import DynamoDBPool
+from app.service.sns import Event, EventBus
+from app.service.transaction_feed import TransactionFeed, feed_event
+from app.utils.transaction_key_utils import new_ulid
+
+load_dotenv()
+
+OUTBOX_TABLE = 'TransactionOutbox'
+# outbox items are keyed (shard, event_id) so pending events can be read
+# oldest first without a scan; a user's events all land in one shard
+OUTBOX_SHARDS = int(os.getenv("OUTBOX_SHARDS", "4"))
+OUTBOX_POLL_INTERVAL_SECONDS = float(os.getenv("OUTBOX_POLL_INTERVAL_SECONDS", "5"))
+OUTBOX_RELAY_BATCH_SIZE = 100
+OUTBOX_DELETE_BATCH_SIZE = 25
+
+
+def outbox_shard(user_id: str) -> str:
+    return f"shard#{zlib.crc32(user_id.encode()) % OUTBOX_SHARDS}"
+
+
+def outbox_put(user_id: str, event_type: ExpenseEventType, message: str, transaction_id: str | None = None) -> dict:
+    """TransactWriteItems action recording an event next to the change it
+    describes, so the event exists exactly when the change committed."""
+    item = {
+        'shard': outbox_shard(user_id),
+        # ULIDs sort by creation time, and double as the idempotency key
+        'event_id': f"evt_{new_ulid()}",
+        'user_id': user_id,
+        'event_type': event_type,
+        'message': message,
+    }
+    if transaction_id is not None:
+        item['transaction_id'] = transaction_id
+    return {'Put': {'TableName': OUTBOX_TABLE, 'Item': item}}
+
+
+class OutboxRelay:
+    """Moves outbox records to SNS through the EventBus.
+
+    Each pass reads every shard oldest first, publishes the events with
+    `EventBus.deliver` and deletes the records SNS accepted. Records are
+    only deleted after they were published, so a crash or a second relay
+    can publish one again: delivery is at least once, and consumers
+    deduplicate on the IdempotencyKey attribute (the event_id).
+
+    Writers call `wake()` after committing so events go out right away;
+    the poll interval only picks up records left by other processes or
+    earlier failures. When given a `feed` (the app does so when it has no
+    TopicSubscription), every record read is also handed to it, before and
+    whatever the outcome of publishing it: the record exists only because
+    its change committed. A record SNS has not taken yet is read again on
+    the next pass, but reaches the feed once.
+    """
+
+    def __init__(self, dynamodb: DynamoDBPool, event_bus: EventBus,
+                 poll_interval: float = OUTBOX_POLL_INTERVAL_SECONDS,
+                 batch_size: int = OUTBOX_RELAY_BATCH_SIZE,
+                 feed: TransactionFeed | None = None):
+        self.dynamodb = dynamodb
+        self.event_bus = event_bus
+        self.feed = feed
+        self.poll_interval = poll_interval
+        self.batch_size = batch_size
+        self.relayed = 0
+        self.passes = 0
+        self.failed_passes = 0
+        # ids of records already fed but still waiting for SNS
+        self._fed: set[str] = set()
+        self._wakeup = asyncio.Event()
+        self._closing = False
+        self._task: asyncio.Task | None = None
+
+    async def start(self):
+        if self._task is None:
+            self._closing = False
+            self._task = asyncio.create_task(self._run())
+        return self
+
+    async def close(self):
+        # one last pass for whatever was written before shutdown
+        if self._task is not None:
+            self._closing = True
+            self.wake()
+            await self._task
+            self._task = None
+
+    def wake(self):
+        self._wakeup.set()
+
+    async def relay_once(self) -> int:
+        table = await self.dynamodb.table(OUTBOX_TABLE)
+        relayed = 0
+        for shard in range(OUTBOX_SHARDS):
+            response = await table.query(
+                KeyConditionExpression=Key('shard').eq(f"shard#{shard}"), Limit=self.batch_size)
+            items = response.get('Items', [])
+            if not items:
+                continue
+            if self.feed is not None:
+                self._publish_to_feed(items)
+            delivered = await self.event_bus.deliver([
+                Event(item['message'], ExpenseEventType(item['event_type']),
+                      event_id=item['event_id'], group_id=item['user_id'],
+                      user_id=item['user_id'], transaction_id=item.get('transaction_id'))
+                for item in items
+            ])
+            # a delete that does not go through only means a repeat later
+            deletes = [{'DeleteRequest': {'Key': {'shard': f"shard#{shard}", 'event_id': event.event_id}}}
+                       for event in delivered]
+            for i in range(0, len(deletes), OUTBOX_DELETE_BATCH_SIZE):
+                await self.dynamodb.batch_write_item(
+                    RequestItems={OUTBOX_TABLE: deletes[i:i + OUTBOX_DELETE_BATCH_SIZE]})
+            self._fed.difference_update(event.event_id for event in delivered)
+            relayed += len(delivered)
+        self.relayed += relayed
+        return relayed
+
+    async def backlog(self) -> int:
+        """Records waiting in the outbox, counted over every shard."""
+        table = await self.dynamodb.table(OUTBOX_TABLE)
+        pending = 0
+        for shard in range(OUTBOX_SHARDS):
+            kwargs = {'KeyConditionExpression': Key('shard').eq(f"shard#{shard}"), 'Select': 'COUNT'}
+            while True:
+                response = await table.query(**kwargs)
+                pending += response['Count']
+                if 'LastEvaluatedKey' not in response:
+                    break
+                kwargs['ExclusiveStartKey'] = response['LastEvaluatedKey']
+        return pending
+
+    def stats(self) -> dict:
+        return {"relayed": self.relayed, "passes": self.passes, "failed_passes": self.failed_passes}
+
+    def _publish_to_feed(self, items: list[dict]):
+        for item in items:
+            if item['event_id'] in self._fed:
+                continue
+            self._fed.add(item['event_id'])
+            try:
+                self.feed.publish(item['user_id'], feed_event(
+                    ExpenseEventType(item['event_type']), item['message'],
+                    item.get('transaction_id'), item['event_id']))
+            except ValueError as e:
+                print(f"Skipping outbox event {item['event_id']} for the feed: {e}")
+
+    async def _run(self):
+        while True:
+            self._wakeup.clear()
+            self.passes += 1
+            try:
+                relayed = await self.relay_once()
+            except Exception as e:
+                print(f"Outbox relay pass failed: {e}")
+                self.failed_passes += 1
+                relayed = 0
+            if self._closing:
+                return
+            # a full pass may have left more behind; go again straight away
+            if relayed:
+                continue
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.poll_interval)
+            except asyncio.TimeoutError:
+                pass
+
+    async def __aenter__(self):
+        return await self.start()
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.close()
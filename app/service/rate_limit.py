@@ -0,0 +1,100 @@
+import asyncio
+import time
+from typing import Awaitable, Callable
+
+from googleapiclient.errors import HttpError
+
+# awaited with the number of calls about to be made
+RateLimit = Callable[[int], Awaitable[None]]
+
+GMAIL_QUOTA_REASONS = ("rateLimitExceeded", "userRateLimitExceeded", "quotaExceeded")
+
+
+class TokenBucket:
+    """Allows `rate` calls a second on average and bursts of up to
+    `capacity`. Waiters are served in arrival order."""
+
+    def __init__(self, rate: float, capacity: float | None = None):
+        self.rate = rate
+        self.capacity = capacity or rate
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._lock = asyncio.Lock()
+
+    async def acquire(self, tokens: float = 1):
+        # a request larger than the bucket waits for a full bucket
+        tokens = min(tokens, self.capacity)
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                if now < self._paused_until:
+                    await asyncio.sleep(self._paused_until - now)
+                    continue
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= tokens:
+                    self._tokens -= tokens
+                    return
+                await asyncio.sleep((tokens - self._tokens) / self.rate)
+
+    def pause(self, seconds: float):
+        """Hands out nothing for `seconds`, after the API reported its quota
+        exhausted, and restarts from an empty bucket."""
+        self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+        self._tokens = 0
+        self._updated = self._paused_until
+
+
+def combined(*buckets: TokenBucket) -> RateLimit:
+    async def acquire(tokens: int):
+        for bucket in buckets:
+            await bucket.acquire(tokens)
+    return acquire
+
+
+class SyncRateLimits:
+    """Token buckets for the APIs a sync calls: Gmail across all users,
+    Gmail per user (Gmail's quota is also enforced per mailbox) and Gemini."""
+
+    def __init__(self, gmail_rate: float, gmail_user_rate: float, gemini_rate: float):
+        self.gmail_user_rate = gmail_user_rate
+        self.gmail_bucket = TokenBucket(gmail_rate)
+        self.gemini_bucket = TokenBucket(gemini_rate)
+        self._user_buckets: dict[str, TokenBucket] = {}
+
+    def gmail(self, user_id: str) -> RateLimit:
+        bucket = self._user_buckets.get(user_id)
+        if bucket is None:
+            bucket = self._user_buckets[user_id] = TokenBucket(self.gmail_user_rate)
+        return combined(bucket, self.gmail_bucket)
+
+    def gemini(self) -> RateLimit:
+        return combined(self.gemini_bucket)
+
+    def pause(self, api: str, seconds: float):
+        bucket = self.gmail_bucket if api == "gmail" else self.gemini_bucket
+        bucket.pause(seconds)
+
+    def forget(self, user_id: str):
+        self._user_buckets.pop(user_id, None)
+
+
+def quota_error_api(error: BaseException | None) -> str | None:
+    """The API, "gmail" or "gemini", that reported a rate limit or exhausted
+    quota in `error` or an exception it was raised from; otherwise None."""
+    while error is not None:
+        if isinstance(error, HttpError):
+            if error.resp.status == 429:
+                return "gmail"
+            if error.resp.status == 403 and any(reason in str(error.content) for reason in GMAIL_QUOTA_REASONS):
+                return "gmail"
+        # google-genai APIError carries the HTTP status as `code`
+        elif getattr(error, "code", None) == 429 or "RESOURCE_EXHAUSTED" in str(error):
+            return "gemini"
+        error = error.__cause__ or error.__context__
+    return None
+
+
+def is_quota_error(error: BaseException | None) -> bool:
+    return quota_error_api(error) is not None
@@ -1,34 +1,128 @@
-from http.client import HTTPException
+import asyncio
 import os
+from contextlib import AsyncExitStack
+from dataclasses import dataclass
+
 import aioboto3
-from aiohttp import ClientError
+from dotenv import load_dotenv
 
 from app.models.sns import ExpenseEventType
 
+load_dotenv()
 
 SNS_REGION = 'us-west-1'
 SNS_TOPIC_ARN = os.getenv("SNS_TOPIC_ARN")
 SQS_QUEUE_URL = os.getenv("SQS_QUEUE_URL")
+# SNS PublishBatch limit
+PUBLISH_BATCH_SIZE = 10
+EVENT_PUBLISH_MAX_ATTEMPTS = 3
+EVENT_PUBLISH_BACKOFF_SECONDS = 0.1
+
+
+@dataclass
+class Event:
+    message: str
+    event_type: ExpenseEventType
+    # idempotency key sent with the message; consumers drop repeats, and
+    # FIFO topics deduplicate on it themselves
+    event_id: str | None = None
+    # FIFO message group, so one user's events stay in order
+    group_id: str | None = None
+    # sent as attributes, for subscribers that route by user
+    user_id: str | None = None
+    transaction_id: str | None = None
 
 
 class EventBus:
-    def __init__(self):
+    """App-wide SNS publisher with one long-lived client.
+
+    Events reach it only through the outbox relay, which calls `deliver()`
+    and keeps the records SNS did not accept for a later pass; writes never
+    publish directly.
+    """
+
+    def __init__(self,
+                 region_name: str = SNS_REGION,
+                 topic_arn: str | None = SNS_TOPIC_ARN):
         self.session = aioboto3.Session()
+        self.region_name = region_name
+        self.topic_arn = topic_arn
+        self.client = None
+        self._stack = AsyncExitStack()
+        self._lock = asyncio.Lock()
+        self.published = 0
+        self.failed = 0
+        self.batches = 0
+
+    async def start(self):
+        async with self._lock:
+            if self.client is None:
+                self.client = await self._stack.enter_async_context(
+                    self.session.client("sns", region_name=self.region_name))
+        return self
 
-    async def publish_event(self, message: str, event_type: ExpenseEventType):
-        """Publish a message to SNS topic"""
-        async with self.session.client("sns", region_name=SNS_REGION) as sns:
+    async def close(self):
+        await self._stack.aclose()
+        self.client = None
+
+    async def deliver(self, events: list[Event]) -> list[Event]:
+        """Publish now, ten per PublishBatch call, and return the events SNS
+        accepted; the rest were retried and can be offered again later."""
+        if self.client is None:
+            await self.start()
+        delivered = []
+        for i in range(0, len(events), PUBLISH_BATCH_SIZE):
+            delivered.extend(await self._send(events[i:i + PUBLISH_BATCH_SIZE]))
+        return delivered
+
+    def _entry(self, entry_id: str, event: Event) -> dict:
+        entry = {
+            'Id': entry_id,
+            'Message': event.message,
+            'MessageAttributes': {
+                'EventType': {
+                    'DataType': 'String',
+                    'StringValue': event.event_type
+                }
+            }
+        }
+        for name, value in (('IdempotencyKey', event.event_id), ('UserId', event.user_id),
+                            ('TransactionId', event.transaction_id)):
+            if value:
+                entry['MessageAttributes'][name] = {'DataType': 'String', 'StringValue': value}
+        if self.topic_arn and self.topic_arn.endswith(".fifo"):
+            entry['MessageGroupId'] = event.group_id or "default"
+            if event.event_id:
+                entry['MessageDeduplicationId'] = event.event_id
+        return entry
+
+    async def _send(self, batch: list[Event]) -> list[Event]:
+        pending = {str(i): event for i, event in enumerate(batch)}
+        for attempt in range(EVENT_PUBLISH_MAX_ATTEMPTS):
             try:
-                response = await sns.publish(
-                    TopicArn=SNS_TOPIC_ARN,
-                    Message=message,
-                    MessageAttributes={
-                        'EventType': {
-                            'DataType': 'String',
-                            'StringValue': event_type
-                        }
-                    }
-                )
-                return response.get("MessageId")
-            except ClientError as e:
-                raise HTTPException(status_code=500, detail=str(e))
+                response = await self.client.publish_batch(
+                    TopicArn=self.topic_arn,
+                    PublishBatchRequestEntries=[self._entry(entry_id, event) for entry_id, event in pending.items()])
+                self.batches += 1
+                failed_ids = {failure['Id'] for failure in response.get('Failed', [])}
+                self.published += len(pending) - len(failed_ids)
+                pending = {entry_id: event for entry_id, event in pending.items() if entry_id in failed_ids}
+            except Exception as e:
+                # the relay must outlive SNS errors; retry the whole batch
+                print(f"Failed to publish {len(pending)} events: {e}")
+            if not pending:
+                break
+            await asyncio.sleep(EVENT_PUBLISH_BACKOFF_SECONDS * 2 ** attempt)
+        else:
+            self.failed += len(pending)
+            print(f"Failed to publish {len(pending)} events after {EVENT_PUBLISH_MAX_ATTEMPTS} attempts")
+        return [event for i, event in enumerate(batch) if str(i) not in pending]
+
+    def stats(self) -> dict:
+        return {"published": self.published, "failed": self.failed, "batches": self.batches}
+
+    async def __aenter__(self):
+        return await self.start()
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.close()
@@ -0,0 +1,381 @@
+import asyncio
+import json
+import os
+from abc import ABC, abstractmethod
+from contextlib import AsyncExitStack
+from datetime import datetime, timezone
+from typing import Awaitable, Callable
+
+import aioboto3
+from cachetools import TTLCache
+from dotenv import load_dotenv
+from fastapi import HTTPException
+from google import genai
+
+from app.models.auth import UserInDB
+from app.models.email import EmailSync
+from app.models.sync_job import SyncJob, SyncJobStatus, SyncStage
+from app.service.dynamodb import DynamoDBPool
+from app.service.extraction_cache import ExtractionCache
+from app.service.gemini import Gemini
+from app.service.gmail_push import register_watch, watch_due
+from app.service.gmail_service import GmailClientCache, GmailService, load_gmail_service
+from app.service.outbox import OutboxRelay
+from app.service.rate_limit import SyncRateLimits
+from app.service.sns import SQS_QUEUE_URL
+from app.service.transaction_db import DB
+from app.service.transaction_parsers import ParserRegistry, default_registry
+from app.service.user_cache import UserCache
+from app.service.user_db import UserDB
+from app.utils.transaction_key_utils import new_ulid
+
+load_dotenv()
+
+# "memory" runs jobs on this process only; "sqs" shares them between
+# processes through SQS, with job state in DynamoDB
+SYNC_JOB_BACKEND = os.getenv("SYNC_JOB_BACKEND", "memory")
+# a queue of its own: the "sqs" backend refuses to start without one, or on
+# the notification queue (SQS_QUEUE_URL)
+SYNC_JOB_QUEUE_URL = os.getenv("SYNC_JOB_QUEUE_URL")
+SYNC_JOB_REGION = 'us-west-1'
+SYNC_JOB_WORKERS = int(os.getenv("SYNC_JOB_WORKERS", "4"))
+SYNC_JOB_TTL_SECONDS = int(os.getenv("SYNC_JOB_TTL_SECONDS", str(24 * 3600)))
+SYNC_JOB_MAX_JOBS = 10000
+SYNC_JOB_TABLE = "SyncJob"
+# a sync still running when this runs out is handed to another worker
+SYNC_JOB_VISIBILITY_TIMEOUT_SECONDS = 15 * 60
+SQS_WAIT_TIME_SECONDS = 20
+
+Progress = Callable[..., Awaitable[None]]
+SyncHandler = Callable[[SyncJob, Progress], Awaitable[str]]
+
+
+class SyncError(Exception):
+    pass
+
+
+async def sync_expenses(user: UserInDB, db: DB, user_db: UserDB, gmail_service: GmailService,
+                        gemini_client: Gemini, parser_registry: ParserRegistry, progress: Progress) -> str:
+    """Imports the user's new expense emails as transactions, reporting each
+    stage through `progress`, and returns a summary message."""
+    await progress(stage=SyncStage.LISTING)
+    # incremental when the user has a history id; the stored-id dedup
+    # only runs when Gmail falls back to listing the whole label
+    sync = await gmail_service.sync_expense_emails(
+        history_id=user.gmail_history_id,
+        get_existing_ids=lambda: db.get_transaction_ids(user_id=user.user_id))
+
+    if sync is None:
+        raise SyncError("Failed to read expense emails from Gmail.")
+
+    if not sync.emails:
+        await _save_history_id(user, user_db, sync)
+        return _with_failures("No new transactions to add.", sync)
+
+    # known bank templates are parsed directly; only the rest go to gemini
+    transaction_list, unmatched_emails = parser_registry.split(
+        user_id=user.user_id, emails=sync.emails)
+    await progress(stage=SyncStage.EXTRACTING, emails_found=len(sync.emails),
+                   parsed=len(transaction_list), sent_to_gemini=len(unmatched_emails))
+    if unmatched_emails:
+        transaction_list += await gemini_client.get_transaction_from_gemini(
+            user=user, emails=unmatched_emails)
+
+    await progress(stage=SyncStage.SAVING)
+    created_transaction_list = await db.create_transaction_from_gmail(transaction_list)
+    await _save_history_id(user, user_db, sync)
+    await progress(created=len(created_transaction_list),
+                   transaction_ids=[transaction.transaction_id for transaction in created_transaction_list])
+    return _with_failures(f"Added {len(created_transaction_list)} transactions.", sync)
+
+
+def _with_failures(message: str, sync: EmailSync) -> str:
+    if sync.failed_ids:
+        message += f" {len(sync.failed_ids)} emails could not be read and will be retried on the next sync."
+    return message
+
+
+async def _save_history_id(user: UserInDB, user_db: UserDB, sync: EmailSync):
+    # the next incremental sync starts after the saved id, so it stays put
+    # until every message up to it has been fetched
+    if sync.failed_ids:
+        print(f"Not advancing history for {user.user_id}: {len(sync.failed_ids)} messages failed")
+        return
+    if sync.history_id and sync.history_id != user.gmail_history_id:
+        await user_db.update_gmail_history_id(user_id=user.user_id, history_id=sync.history_id)
+
+
+class ExpenseSync:
+    """SyncHandler running `sync_expenses` for the job's user with the
+    app-wide DynamoDB pool, outbox relay and caches."""
+
+    def __init__(self, dynamodb: DynamoDBPool, relay: OutboxRelay | None = None,
+                 user_cache: UserCache | None = None, extraction_cache: ExtractionCache | None = None,
+                 parser_registry: ParserRegistry = default_registry,
+                 rate_limits: SyncRateLimits | None = None,
+                 gmail_clients: GmailClientCache | None = None):
+        self.dynamodb = dynamodb
+        self.relay = relay
+        self.user_cache = user_cache
+        self.extraction_cache = extraction_cache
+        self.parser_registry = parser_registry
+        self.rate_limits = rate_limits
+        self.gmail_clients = gmail_clients
+        self._gemini_client: Gemini | None = None
+
+    @property
+    def gemini_client(self) -> Gemini:
+        # built on first use, so a missing API key fails the job rather than startup
+        if self._gemini_client is None:
+            self._gemini_client = Gemini(
+                client=genai.Client(api_key=os.getenv('GEMINI_API_KEY')), cache=self.extraction_cache,
+                rate_limit=self.rate_limits.gemini() if self.rate_limits else None)
+        return self._gemini_client
+
+    async def __call__(self, job: SyncJob, progress: Progress) -> str:
+        user_db = UserDB(self.dynamodb, cache=self.user_cache)
+        # read the user now: the history id may have moved since the job was queued
+        user = await user_db.get_user_by_userid(job.user_id)
+        if user is None:
+            raise SyncError("User not found.")
+        gmail_service = await load_gmail_service(user, user_db, self.gmail_clients)
+        if self.rate_limits is not None:
+            gmail_service.rate_limit = self.rate_limits.gmail(user.user_id)
+        if watch_due(user):
+            await register_watch(user, user_db, gmail_service)
+        return await sync_expenses(user, DB(self.dynamodb, relay=self.relay), user_db, gmail_service,
+                                   self.gemini_client, self.parser_registry, progress)
+
+
+class SyncJobStore(ABC):
+    """Job state by job id. Subclasses implement `get` and `save`."""
+
+    @abstractmethod
+    async def get(self, job_id: str) -> SyncJob | None:
+        ...
+
+    @abstractmethod
+    async def save(self, job: SyncJob):
+        ...
+
+
+class MemorySyncJobStore(SyncJobStore):
+    def __init__(self, maxsize: int = SYNC_JOB_MAX_JOBS, ttl: int = SYNC_JOB_TTL_SECONDS):
+        self._jobs = TTLCache(maxsize=maxsize, ttl=ttl)
+
+    async def get(self, job_id: str) -> SyncJob | None:
+        job = self._jobs.get(job_id)
+        return job.model_copy(deep=True) if job is not None else None
+
+    async def save(self, job: SyncJob):
+        self._jobs[job.job_id] = job.model_copy(deep=True)
+
+
+class DynamoDBSyncJobStore(SyncJobStore):
+    """Jobs in a DynamoDB table keyed by `job_id`, with DynamoDB TTL enabled
+    on the `expires_at` attribute."""
+
+    def __init__(self, dynamodb: DynamoDBPool, table_name: str = SYNC_JOB_TABLE, ttl: int = SYNC_JOB_TTL_SECONDS):
+        self.dynamodb = dynamodb
+        self.table_name = table_name
+        self.ttl = ttl
+
+    async def get(self, job_id: str) -> SyncJob | None:
+        table = await self.dynamodb.table(self.table_name)
+        response = await table.get_item(Key={"job_id": job_id})
+        item = response.get("Item")
+        return SyncJob.model_validate(item) if item else None
+
+    async def save(self, job: SyncJob):
+        table = await self.dynamodb.table(self.table_name)
+        await table.put_item(Item={**job.model_dump(mode="json"),
+                                   "expires_at": int(job.created_at.timestamp()) + self.ttl})
+
+
+class SyncJobQueue(ABC):
+    """Job ids waiting for a worker. `get` returns the job id with a receipt
+    that is passed to `done` once the job has finished."""
+
+    async def start(self):
+        return self
+
+    async def close(self):
+        pass
+
+    @abstractmethod
+    async def put(self, job_id: str):
+        ...
+
+    @abstractmethod
+    async def get(self) -> tuple[str, str | None]:
+        ...
+
+    async def done(self, receipt: str | None):
+        pass
+
+
+class MemorySyncJobQueue(SyncJobQueue):
+    def __init__(self):
+        self._queue: asyncio.Queue[str] = asyncio.Queue()
+
+    async def put(self, job_id: str):
+        await self._queue.put(job_id)
+
+    async def get(self) -> tuple[str, str | None]:
+        return await self._queue.get(), None
+
+
+class SQSSyncJobQueue(SyncJobQueue):
+    """Job ids as SQS messages. A message is deleted once its job finished;
+    if the worker dies first, SQS hands it to another worker after the
+    visibility timeout.
+
+    Messages that are not sync jobs are left on the queue rather than
+    deleted; the queue's redrive policy moves them aside."""
+
+    def __init__(self, queue_url: str | None = SYNC_JOB_QUEUE_URL, region_name: str = SYNC_JOB_REGION,
+                 visibility_timeout: int = SYNC_JOB_VISIBILITY_TIMEOUT_SECONDS):
+        if not queue_url:
+            raise RuntimeError("SYNC_JOB_QUEUE_URL must be set for the sqs sync job backend")
+        if queue_url == SQS_QUEUE_URL:
+            raise RuntimeError("SYNC_JOB_QUEUE_URL must not be the notification queue (SQS_QUEUE_URL)")
+        self.session = aioboto3.Session()
+        self.queue_url = queue_url
+        self.region_name = region_name
+        self.visibility_timeout = visibility_timeout
+        self.client = None
+        self._stack = AsyncExitStack()
+
+    async def start(self):
+        if self.client is None:
+            self.client = await self._stack.enter_async_context(
+                self.session.client("sqs", region_name=self.region_name))
+        return self
+
+    async def close(self):
+        await self._stack.aclose()
+        self.client = None
+
+    async def put(self, job_id: str):
+        await self.client.send_message(QueueUrl=self.queue_url, MessageBody=json.dumps({"job_id": job_id}))
+
+    async def get(self) -> tuple[str, str | None]:
+        while True:
+            response = await self.client.receive_message(
+                QueueUrl=self.queue_url, MaxNumberOfMessages=1,
+                WaitTimeSeconds=SQS_WAIT_TIME_SECONDS, VisibilityTimeout=self.visibility_timeout)
+            for message in response.get("Messages", []):
+                try:
+                    return json.loads(message["Body"])["job_id"], message["ReceiptHandle"]
+                except (ValueError, KeyError, TypeError):
+                    print(f"Skipping message that is not a sync job: {message.get('MessageId')}")
+
+    async def done(self, receipt: str | None):
+        await self.client.delete_message(QueueUrl=self.queue_url, ReceiptHandle=receipt)
+
+
+class SyncJobs:
+    """Runs expense syncs in the background.
+
+    `submit` records a queued job and returns it straight away; `workers`
+    tasks take job ids off the queue and run `handler`, saving progress
+    and the outcome to the store for `get` to report. A user with a job
+    still queued or running gets that job back instead of a second one;
+    if it is already running, another sync follows once it finishes, so
+    mail that arrived meanwhile is not left behind.
+    """
+
+    def __init__(self, handler: SyncHandler, queue: SyncJobQueue | None = None,
+                 store: SyncJobStore | None = None, workers: int = SYNC_JOB_WORKERS):
+        self.handler = handler
+        self.queue = queue or MemorySyncJobQueue()
+        self.store = store or MemorySyncJobStore()
+        self.workers = workers
+        self._tasks: list[asyncio.Task] = []
+        self._active: dict[str, str] = {}
+        self._follow_up: set[str] = set()
+
+    async def start(self):
+        if not self._tasks:
+            await self.queue.start()
+            self._tasks = [asyncio.create_task(self._work()) for _ in range(self.workers)]
+        return self
+
+    async def close(self):
+        # with SQS, a job cut short here is picked up again by another worker
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        await self.queue.close()
+
+    async def submit(self, user_id: str) -> SyncJob:
+        active_id = self._active.get(user_id)
+        if active_id is not None:
+            active = await self.store.get(active_id)
+            if active is not None and active.status in (SyncJobStatus.QUEUED, SyncJobStatus.RUNNING):
+                if active.status == SyncJobStatus.RUNNING:
+                    self._follow_up.add(user_id)
+                return active
+
+        now = datetime.now(timezone.utc)
+        job = SyncJob(job_id=f"job_{new_ulid()}", user_id=user_id, created_at=now, updated_at=now)
+        await self.store.save(job)
+        await self.queue.put(job.job_id)
+        self._active[user_id] = job.job_id
+        return job
+
+    async def get(self, job_id: str) -> SyncJob | None:
+        return await self.store.get(job_id)
+
+    async def _work(self):
+        while True:
+            job_id, receipt = await self.queue.get()
+            try:
+                await self._run(job_id)
+            except Exception as e:
+                # the worker must outlive store errors; the job is retried
+                # when the queue redelivers it
+                print(f"Sync job {job_id} could not be run: {e}")
+                continue
+            await self.queue.done(receipt)
+
+    async def _run(self, job_id: str):
+        job = await self.store.get(job_id)
+        # gone (expired) or finished by a worker whose delete did not go through
+        if job is None or job.status in (SyncJobStatus.SUCCEEDED, SyncJobStatus.FAILED):
+            return
+
+        async def progress(**fields):
+            for name, value in fields.items():
+                setattr(job, name, value)
+            job.updated_at = datetime.now(timezone.utc)
+            await self.store.save(job)
+
+        await progress(status=SyncJobStatus.RUNNING)
+        try:
+            message = await self.handler(job, progress)
+        except Exception as e:
+            print(f"Sync job {job_id} failed: {e}")
+            await progress(status=SyncJobStatus.FAILED,
+                           error=e.detail if isinstance(e, HTTPException) else str(e))
+        else:
+            await progress(status=SyncJobStatus.SUCCEEDED, message=message)
+        finally:
+            if self._active.get(job.user_id) == job_id:
+                del self._active[job.user_id]
+        if job.user_id in self._follow_up:
+            self._follow_up.discard(job.user_id)
+            await self.submit(job.user_id)
+
+    async def __aenter__(self):
+        return await self.start()
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.close()
+
+
+def create_sync_jobs(dynamodb: DynamoDBPool, handler: SyncHandler, backend: str = SYNC_JOB_BACKEND) -> SyncJobs:
+    if backend == "sqs":
+        return SyncJobs(handler, queue=SQSSyncJobQueue(), store=DynamoDBSyncJobStore(dynamodb))
+    return SyncJobs(handler)
@@ -0,0 +1,216 @@
+import datetime
+from dataclasses import dataclass
+
+import numpy as np
+from aiohttp import ClientError
+from boto3.dynamodb.conditions import Key
+from fastapi import HTTPException
+
+from app.models.analytics import (
+    DailySpending,
+    MerchantSpending,
+    MonthlySpending,
+    SpendingAnomaly,
+    TransactionAnalytics,
+)
+from app.service.dynamodb import DynamoDBPool
+from app.service.transaction_db import TRANSACTION_DATE_INDEX, TRANSACTION_TABLE
+from app.service.transaction_rollups import rollup_category
+from app.utils.money_utils import DEFAULT_CURRENCY, currency_exponent, minor_to_decimal, parse_money
+from app.utils.transaction_key_utils import UNDATED
+
+ANALYTICS_DAYS = 90
+ANALYTICS_TOP_MERCHANTS = 20
+ANALYTICS_MAX_ANOMALIES = 50
+ROLLING_WINDOWS = (7, 30)
+# a merchant needs this many other transactions before its own spread is
+# used to judge a new one
+MERCHANT_MIN_HISTORY = 5
+MERCHANT_Z_THRESHOLD = 3.0
+# Iglewicz and Hoaglin's cut-off for the modified z-score
+MODIFIED_Z_THRESHOLD = 3.5
+
+PROJECTED_ATTRIBUTES = ('transaction_id', 'date_key', 'amount_minor', 'amount', 'currency', 'title')
+
+
+@dataclass
+class TransactionFrame:
+    """One user's transactions in one currency, as parallel columns."""
+    currency: str
+    transaction_ids: np.ndarray  # str
+    dates: np.ndarray  # datetime64[D]
+    amounts: np.ndarray  # int64 minor units
+    merchant_codes: np.ndarray  # int64 index into `merchants`
+    merchants: np.ndarray  # str
+    excluded: int = 0
+
+    def __len__(self) -> int:
+        return len(self.amounts)
+
+
+async def load_frame(dynamodb: DynamoDBPool, user_id: str, currency: str = DEFAULT_CURRENCY) -> TransactionFrame:
+    """Reads the user's partition straight into columns: only the attributes
+    the metrics use are projected, and no model objects are built."""
+    table = await dynamodb.table(TRANSACTION_TABLE)
+    query_kwargs = {
+        'IndexName': TRANSACTION_DATE_INDEX,
+        'KeyConditionExpression': Key('user_id').eq(user_id),
+        'ProjectionExpression': ", ".join(f"#a{i}" for i in range(len(PROJECTED_ATTRIBUTES))),
+        'ExpressionAttributeNames': {f"#a{i}": name for i, name in enumerate(PROJECTED_ATTRIBUTES)},
+    }
+    transaction_ids, dates, amounts, titles = [], [], [], []
+    excluded = 0
+    while True:
+        try:
+            response = await table.query(**query_kwargs)
+        except ClientError as e:
+            raise HTTPException(status_code=500, detail=str(e))
+        for item in response.get('Items', []):
+            minor = item.get('amount_minor')
+            item_currency = item.get('currency')
+            if minor is None:
+                # not migrated to typed amounts yet
+                parsed = parse_money(item.get('amount'))
+                if parsed is None:
+                    excluded += 1
+                    continue
+                minor, item_currency = parsed
+            date = item['date_key'][:10]
+            if (item_currency or DEFAULT_CURRENCY) != currency or date == UNDATED:
+                excluded += 1
+                continue
+            transaction_ids.append(item['transaction_id'])
+            dates.append(date)
+            amounts.append(int(minor))
+            titles.append(item.get('title') or "")
+        last_evaluated_key = response.get('LastEvaluatedKey')
+        if not last_evaluated_key:
+            break
+        query_kwargs['ExclusiveStartKey'] = last_evaluated_key
+
+    # normalize each distinct title once rather than once per transaction
+    raw_titles, raw_codes = np.unique(np.array(titles, dtype=str), return_inverse=True)
+    merchants, merchant_codes = np.unique(
+        np.array([rollup_category(title) for title in raw_titles], dtype=str), return_inverse=True)
+    return TransactionFrame(
+        currency=currency,
+        transaction_ids=np.array(transaction_ids, dtype=str),
+        dates=np.array(dates, dtype='datetime64[D]'),
+        amounts=np.array(amounts, dtype=np.int64),
+        merchant_codes=merchant_codes[raw_codes].astype(np.int64),
+        merchants=merchants,
+        excluded=excluded,
+    )
+
+
+def _monthly(frame: TransactionFrame) -> list[MonthlySpending]:
+    months, codes = np.unique(frame.dates.astype('datetime64[M]'), return_inverse=True)
+    totals = np.bincount(codes, weights=frame.amounts).round().astype(np.int64)
+    counts = np.bincount(codes)
+    return [
+        MonthlySpending(month=str(month), amount=minor_to_decimal(int(total), frame.currency), count=int(count))
+        for month, total, count in zip(months, totals, counts)
+    ]
+
+
+def _daily(frame: TransactionFrame, today: datetime.date, days: int) -> list[DailySpending]:
+    # the longest window needs that much history before the first day shown
+    history = max(ROLLING_WINDOWS) - 1
+    first_day = np.datetime64(today, 'D') - (days - 1) - history
+    offsets = (frame.dates - first_day).astype(np.int64)
+    in_range = (offsets >= 0) & (offsets < days + history)
+    totals = np.bincount(offsets[in_range], weights=frame.amounts[in_range], minlength=days + history)
+
+    cumulative = np.concatenate(([0.0], np.cumsum(totals)))
+    scale = 10.0 ** currency_exponent(frame.currency)
+    rolling = {
+        window: (cumulative[history + 1:] - cumulative[history + 1 - window:-window or None]) / window / scale
+        for window in ROLLING_WINDOWS
+    }
+    day_totals = totals[history:].round().astype(np.int64)
+    day_dates = first_day + history + np.arange(days)
+    return [
+        DailySpending(
+            date=day.item(),
+            amount=minor_to_decimal(int(total), frame.currency),
+            rolling_7d=round(float(rolling[7][i]), 2),
+            rolling_30d=round(float(rolling[30][i]), 2),
+        )
+        for i, (day, total) in enumerate(zip(day_dates, day_totals))
+    ]
+
+
+def _merchant_totals(frame: TransactionFrame) -> tuple[np.ndarray, np.ndarray]:
+    size = len(frame.merchants)
+    totals = np.bincount(frame.merchant_codes, weights=frame.amounts, minlength=size)
+    counts = np.bincount(frame.merchant_codes, minlength=size)
+    return totals, counts
+
+
+def _merchants(frame: TransactionFrame, top: int) -> list[MerchantSpending]:
+    totals, counts = _merchant_totals(frame)
+    order = np.argsort(-totals, kind='stable')[:top]
+    return [
+        MerchantSpending(merchant=str(frame.merchants[i]),
+                         amount=minor_to_decimal(int(round(totals[i])), frame.currency),
+                         count=int(counts[i]))
+        for i in order
+    ]
+
+
+def _anomalies(frame: TransactionFrame, limit: int) -> list[SpendingAnomaly]:
+    amounts = frame.amounts.astype(np.float64)
+    codes = frame.merchant_codes
+    totals, counts = _merchant_totals(frame)
+    squares = np.bincount(codes, weights=amounts ** 2, minlength=len(frame.merchants))
+
+    # compare each transaction with the merchant's other transactions, so a
+    # spike does not inflate the statistics it is judged against
+    others = counts[codes] - 1
+    with np.errstate(divide='ignore', invalid='ignore'):
+        mean = (totals[codes] - amounts) / others
+        variance = (squares[codes] - amounts ** 2) / others - mean ** 2
+        merchant_z = (amounts - mean) / np.sqrt(np.maximum(variance, 0))
+    merchant_z = np.where((others >= MERCHANT_MIN_HISTORY) & np.isfinite(merchant_z), merchant_z, 0.0)
+
+    # transactions without enough merchant history are compared with all of
+    # the user's spending using the median-based modified z-score
+    median = np.median(amounts)
+    mad = np.median(np.abs(amounts - median))
+    modified_z = 0.6745 * (amounts - median) / mad if mad else np.zeros_like(amounts)
+
+    by_merchant = merchant_z > MERCHANT_Z_THRESHOLD
+    overall = ~by_merchant & (others < MERCHANT_MIN_HISTORY) & (modified_z > MODIFIED_Z_THRESHOLD)
+    flagged = np.flatnonzero(by_merchant | overall)
+    # newest first
+    flagged = flagged[np.argsort(frame.dates[flagged], kind='stable')[::-1]][:limit]
+    return [
+        SpendingAnomaly(
+            transaction_id=str(frame.transaction_ids[i]),
+            date=frame.dates[i].item(),
+            merchant=str(frame.merchants[codes[i]]),
+            amount=minor_to_decimal(int(frame.amounts[i]), frame.currency),
+            score=round(float(merchant_z[i] if by_merchant[i] else modified_z[i]), 2),
+            reason="unusual for this merchant" if by_merchant[i] else "unusually large",
+        )
+        for i in flagged
+    ]
+
+
+def compute_analytics(frame: TransactionFrame, today: datetime.date,
+                      days: int = ANALYTICS_DAYS,
+                      top_merchants: int = ANALYTICS_TOP_MERCHANTS,
+                      max_anomalies: int = ANALYTICS_MAX_ANOMALIES) -> TransactionAnalytics:
+    if not len(frame):
+        return TransactionAnalytics(
+            currency=frame.currency, transaction_count=0, excluded_count=frame.excluded,
+            monthly=[], daily=[], merchants=[], anomalies=[])
+    return TransactionAnalytics(
+        currency=frame.currency,
+        transaction_count=len(frame),
+        excluded_count=frame.excluded,
+        monthly=_monthly(frame),
+        daily=_daily(frame, today, days),
+        merchants=_merchants(frame, top_merchants),
+        anomalies=_anomalies(frame, max_anomalies),
+    )
@@ -1,174 +1,574 @@
-from datetime import datetime
+import asyncio
+from datetime import date
 import json
-import random
-import string
+import os
 from aiohttp import ClientError
-from boto3.dynamodb.conditions import Key
-import aioboto3
+from botocore.exceptions import ClientError as DynamoDBClientError
+from boto3.dynamodb.conditions import Attr, Key
 from fastapi import HTTPException
 
 from app.models.DBResponse import DBResponse
 from app.models.sns import ExpenseEventType
-from app.models.transaction import Transaction, TransactionDB
-from app.service.sns import EventBus
+from app.models.transaction import (
+    BulkItemResult,
+    MonthlySummary,
+    Transaction,
+    TransactionBase,
+    TransactionDB,
+    TransactionPage,
+    TransactionUpdate,
+)
+from app.service.dynamodb import TRANSACT_WRITE_SIZE, DynamoDBPool
+from app.service.outbox import OutboxRelay, outbox_put
+from app.service.transaction_rollups import ROLLUP_ATTRIBUTES, RollupDeltas, RollupStore
+from app.utils.money_utils import DEFAULT_CURRENCY
+from app.utils.pagination_utils import decode_cursor, encode_cursor
+from app.utils.transaction_key_utils import date_key_upper_bound, new_ulid, transaction_date_key
 
-DYNAMODB_REGION = 'us-west-1'
 TRANSACTION_TABLE = 'Transaction'
-
-
-def generate_transaction_id(user_id: str) -> str:
-    timestamp = datetime.now()  # milliseconds since epoch
-    random_part = ''.join(random.choices(
-        string.ascii_lowercase + string.digits, k=6))
-    return f"txn_{user_id}_{timestamp}_{random_part}"
+# GSI keyed (user_id, date_key); see TransactionDB.date_key
+TRANSACTION_DATE_INDEX = 'user_id-date_key-index'
+BATCH_WRITE_CONCURRENCY = int(os.getenv("DYNAMODB_BATCH_WRITE_CONCURRENCY", "4"))
+BATCH_WRITE_MAX_ATTEMPTS = 5
+BATCH_WRITE_BACKOFF_SECONDS = 0.05
+BATCH_GET_SIZE = 100
+BULK_UPDATE_CONCURRENCY = int(os.getenv("DYNAMODB_BULK_UPDATE_CONCURRENCY", "16"))
+# every change travels with its outbox record
+TRANSACT_CHANGES_PER_CALL = TRANSACT_WRITE_SIZE // 2
+OPTIMISTIC_WRITE_ATTEMPTS = 3
+# cancellation reasons that say nothing about the items themselves; the
+# same transaction may succeed when sent again
+RETRYABLE_CANCELLATION_REASONS = {'ThrottlingError', 'TransactionConflict', 'ProvisionedThroughputExceeded'}
+RETRYABLE_ERROR_CODES = {'ThrottlingException', 'ProvisionedThroughputExceededException',
+                         'RequestLimitExceeded', 'TransactionInProgressException'}
+
+
+def generate_transaction_id() -> str:
+    # ULIDs sort by creation time, so ids created later sort later
+    return f"txn_{new_ulid()}"
+
+
+def created_message(transaction: TransactionBase) -> str:
+    # the transaction's own fields, as EXPENSE_CREATED has always carried
+    return json.dumps(transaction.model_dump(exclude={'user_id', 'transaction_id', 'date_key'}))
+
+
+def _unchanged_condition(item: dict) -> dict:
+    """Condition that the item still exists with the attributes the rollups
+    were computed from, as read."""
+    clauses = ["attribute_exists(transaction_id)"]
+    names = {}
+    values = {}
+    for name in ROLLUP_ATTRIBUTES:
+        names[f"#c_{name}"] = name
+        if name not in item:
+            clauses.append(f"attribute_not_exists(#c_{name})")
+        elif item[name] is None:
+            clauses.append(f"attribute_type(#c_{name}, :c_null)")
+            values[':c_null'] = 'NULL'
+        else:
+            clauses.append(f"#c_{name} = :c_{name}")
+            values[f":c_{name}"] = item[name]
+    condition = {'ConditionExpression': " AND ".join(clauses), 'ExpressionAttributeNames': names}
+    if values:
+        condition['ExpressionAttributeValues'] = values
+    return condition
+
+
+def _retryable(error: DynamoDBClientError) -> bool:
+    code = error.response.get('Error', {}).get('Code')
+    if code == 'TransactionCanceledException':
+        reasons = {reason.get('Code') for reason in error.response.get('CancellationReasons', [])} - {None, 'None'}
+        return bool(reasons) and reasons <= RETRYABLE_CANCELLATION_REASONS
+    return code in RETRYABLE_ERROR_CODES
+
+
+def _condition_failed(error: DynamoDBClientError) -> bool:
+    code = error.response.get('Error', {}).get('Code')
+    if code == 'TransactionCanceledException':
+        return any(reason.get('Code') == 'ConditionalCheckFailed'
+                   for reason in error.response.get('CancellationReasons', []))
+    return code == 'ConditionalCheckFailedException'
 
 
 class DB:
-    def __init__(self):
-        self.session = aioboto3.Session()
-        self.event_bus = EventBus()
+    """Transaction reads and writes.
+
+    Every write commits the change together with an outbox record of its
+    event in one TransactWriteItems call; `relay` (the app's OutboxRelay)
+    is woken afterwards to publish it.
+    """
+
+    def __init__(self, dynamodb: DynamoDBPool, rollups: RollupStore | None = None,
+                 relay: OutboxRelay | None = None):
+        self.dynamodb = dynamodb
+        self.relay = relay
+        self.rollups = rollups or RollupStore(dynamodb)
+
+    async def _update_rollups(self, deltas: RollupDeltas):
+        # the transaction write has already succeeded, so failing the request
+        # would only invite a duplicate retry; the rebuild job repairs drift
+        if not deltas:
+            return
+        try:
+            await self.rollups.apply(deltas)
+        except Exception as e:
+            print(f"Failed to update rollups: {e}")
+
+    async def _query_pages(self, table, **query_kwargs):
+        while True:
+            response = await table.query(**query_kwargs)
+            yield response.get('Items', [])
+            last_evaluated_key = response.get('LastEvaluatedKey')
+            if not last_evaluated_key:
+                return
+            query_kwargs['ExclusiveStartKey'] = last_evaluated_key
 
     async def get_all_transactions(self, user_id: str) -> list[TransactionDB]:
-        async with self.session.resource("dynamodb", region_name=DYNAMODB_REGION) as dynamodb:
-            table = await dynamodb.Table(TRANSACTION_TABLE)
+        table = await self.dynamodb.table(TRANSACTION_TABLE)
+        try:
+            transactions = []
+            async for items in self._query_pages(table, KeyConditionExpression=Key('user_id').eq(user_id)):
+                transactions.extend(TransactionDB.from_items(items))
+            return transactions
+        except ClientError as e:
+            raise HTTPException(status_code=500, detail=str(e))
+
+    async def get_transaction_ids(self, user_id: str) -> set[str]:
+        table = await self.dynamodb.table(TRANSACTION_TABLE)
+        try:
+            transaction_ids = set()
+            async for items in self._query_pages(
+                table,
+                KeyConditionExpression=Key('user_id').eq(user_id),
+                ProjectionExpression='transaction_id',
+            ):
+                transaction_ids.update(item['transaction_id'] for item in items)
+            return transaction_ids
+        except ClientError as e:
+            raise HTTPException(status_code=500, detail=str(e))
+
+    async def _transact(self, actions: list[dict]) -> dict:
+        # a cancelled transaction wrote nothing, so throttled or conflicting
+        # ones are sent again with backoff, as batch writes retry their
+        # unprocessed items
+        for attempt in range(BATCH_WRITE_MAX_ATTEMPTS):
+            try:
+                response = await self.dynamodb.transact_write_items(TransactItems=actions)
+                break
+            except DynamoDBClientError as e:
+                if not _retryable(e) or attempt == BATCH_WRITE_MAX_ATTEMPTS - 1:
+                    raise
+                await asyncio.sleep(BATCH_WRITE_BACKOFF_SECONDS * 2 ** attempt)
+        if self.relay is not None:
+            self.relay.wake()
+        return response
+
+    async def _transact_changes(self, changes: list[list[dict]], concurrency: int) -> list[Exception | None]:
+        """Commits each change (its actions plus its outbox record) atomically,
+        packing as many changes per TransactWriteItems call as fit. Returns,
+        per change, the error that cancelled its call, or None."""
+        semaphore = asyncio.Semaphore(concurrency)
+        errors: list[Exception | None] = [None] * len(changes)
+
+        async def commit(start: int):
+            chunk = changes[start:start + TRANSACT_CHANGES_PER_CALL]
+            async with semaphore:
+                try:
+                    await self._transact([action for change in chunk for action in change])
+                except DynamoDBClientError as e:
+                    errors[start:start + len(chunk)] = [e] * len(chunk)
+
+        await asyncio.gather(*(commit(start) for start in range(0, len(changes), TRANSACT_CHANGES_PER_CALL)))
+        return errors
+
+    async def _change_existing(self, user_id: str, transaction_id: str, actions_for) -> dict:
+        """Optimistic read-modify-write. Reads the item, commits
+        `actions_for(item)` on condition that the attributes the rollups use
+        are unchanged, and starts over if another write got in between.
+        Returns the item as it was before the change."""
+        table = await self.dynamodb.table(TRANSACTION_TABLE)
+        for _ in range(OPTIMISTIC_WRITE_ATTEMPTS):
+            response = await table.get_item(
+                Key={'user_id': user_id, 'transaction_id': transaction_id}, ConsistentRead=True)
+            old_item = response.get('Item')
+            if not old_item:
+                raise HTTPException(status_code=404, detail="Transaction not found")
             try:
-                response = await table.scan()
-                items = response.get('Items', [])
-                return [TransactionDB.model_validate(item) for item in items]
-            except ClientError as e:
-                raise HTTPException(status_code=500, detail=str(e))
+                await self._transact(actions_for(old_item))
+                return old_item
+            except DynamoDBClientError as e:
+                if not _condition_failed(e):
+                    raise
+        raise HTTPException(
+            status_code=409, detail="Transaction was changed concurrently, try again")
 
     async def create_transaction(self, user_id: str, transaction: Transaction):
-        async with self.session.resource("dynamodb", region_name=DYNAMODB_REGION) as dynamodb:
-            table = await dynamodb.Table(TRANSACTION_TABLE)
-            try:
-                tx_db = TransactionDB(
-                    user_id=user_id,
-                    transaction_id=generate_transaction_id(user_id),
-                    **transaction.model_dump()
+        try:
+            tx_db = TransactionDB(
+                user_id=user_id,
+                transaction_id=generate_transaction_id(),
+                **transaction.model_dump()
+            )
+            # the event is committed with the item and published by the relay
+            response = await self._transact([
+                {'Put': {'TableName': TRANSACTION_TABLE, 'Item': tx_db.model_dump()}},
+                outbox_put(user_id, ExpenseEventType.EXPENSE_CREATED, created_message(tx_db), tx_db.transaction_id),
+            ])
+            response_model = DBResponse.model_validate(response)
+
+            if response_model.ResponseMetadata.HTTPStatusCode != 200:
+                raise HTTPException(
+                    status_code=response_model.ResponseMetadata.HTTPStatusCode,
+                    detail="Failed to create transaction"
                 )
-                response = await table.put_item(Item=tx_db.model_dump())
-                response_model = DBResponse.model_validate(response)
-
-                if response_model.ResponseMetadata.HTTPStatusCode != 200:
-                    raise HTTPException(
-                        status_code=response_model.ResponseMetadata.HTTPStatusCode,
-                        detail="Failed to create transaction"
-                    )
-
-                # Publish event to SNS
-                await self.event_bus.publish_event(json.dumps(transaction.model_dump()), ExpenseEventType.EXPENSE_CREATED)
-
-                return TransactionDB.model_validate(tx_db.model_dump())
-
-            except ClientError as e:
-                raise HTTPException(status_code=500, detail=str(e))
-
-    async def create_transaction_from_gmail(self, transaction_list: list[TransactionDB]):
-        created_transaction_list = []
-
-        async with self.session.resource("dynamodb", region_name=DYNAMODB_REGION) as dynamodb:
-            table = await dynamodb.Table(TRANSACTION_TABLE)
-            for transaction in transaction_list:
-                try:
-                    response = await table.put_item(Item=transaction.model_dump())
-                    response_model = DBResponse.model_validate(response)
-
-                    if response_model.ResponseMetadata.HTTPStatusCode != 200:
-                        raise HTTPException(
-                            status_code=response_model.ResponseMetadata.HTTPStatusCode,
-                            detail="Failed to create transaction"
-                        )
-
-                    created_transaction_list.append(
-                        TransactionDB.model_validate(transaction.model_dump()))
-
-                except ClientError as e:
-                    raise HTTPException(status_code=500, detail=str(e))
 
+            deltas = RollupDeltas()
+            deltas.add(tx_db.model_dump())
+            await self._update_rollups(deltas)
+
+            return TransactionDB.model_validate(tx_db.model_dump())
+
+        except ClientError as e:
+            raise HTTPException(status_code=500, detail=str(e))
+
+    async def _batch_get(self, keys: list[dict]) -> list[dict]:
+        items = []
+        for i in range(0, len(keys), BATCH_GET_SIZE):
+            request_items = {TRANSACTION_TABLE: {'Keys': keys[i:i + BATCH_GET_SIZE]}}
+            for attempt in range(BATCH_WRITE_MAX_ATTEMPTS):
+                response = await self.dynamodb.batch_get_item(RequestItems=request_items)
+                items.extend(response.get('Responses', {}).get(TRANSACTION_TABLE, []))
+                request_items = response.get('UnprocessedKeys') or {}
+                if not request_items:
+                    break
+                await asyncio.sleep(BATCH_WRITE_BACKOFF_SECONDS * 2 ** attempt)
+            else:
+                raise HTTPException(
+                    status_code=500, detail="Failed to read existing transactions")
+        return items
+
+    async def create_transaction_from_gmail(self, transaction_list: list[TransactionDB], concurrency: int = BATCH_WRITE_CONCURRENCY) -> list[TransactionDB]:
+        # TransactWriteItems rejects two actions on one key; keep the last
+        # write per key like sequential put_item would, in input order.
+        unique_transactions = {}
+        for transaction in transaction_list:
+            unique_transactions[(transaction.user_id,
+                                 transaction.transaction_id)] = transaction
+        created_transaction_list = list(unique_transactions.values())
+
+        items = [transaction.model_dump() for transaction in created_transaction_list]
+        try:
+            # re-imported emails overwrite their earlier item; take the old
+            # contribution out of the rollups so they are not counted twice
+            existing = {
+                item['transaction_id']: item
+                for item in await self._batch_get([
+                    {'user_id': item['user_id'], 'transaction_id': item['transaction_id']}
+                    for item in items
+                ])
+            }
+            errors = await self._transact_changes([
+                [{'Put': {'TableName': TRANSACTION_TABLE, 'Item': item}},
+                 outbox_put(transaction.user_id, ExpenseEventType.EXPENSE_CREATED, created_message(transaction),
+                            transaction.transaction_id)]
+                for transaction, item in zip(created_transaction_list, items)
+            ], concurrency=concurrency)
+        except ClientError as e:
+            raise HTTPException(status_code=500, detail=str(e))
+
+        deltas = RollupDeltas()
+        for item, error in zip(items, errors):
+            if error is None:
+                if item['transaction_id'] in existing:
+                    deltas.remove(existing[item['transaction_id']])
+                deltas.add(item)
+        await self._update_rollups(deltas)
+
+        failed = sum(error is not None for error in errors)
+        if failed:
+            raise HTTPException(
+                status_code=500,
+                detail=f"Failed to create {failed} transactions"
+            )
         return created_transaction_list
 
     async def get_transaction(self, transaction_id: str, user_id: str) -> TransactionDB:
-        async with self.session.resource("dynamodb", region_name=DYNAMODB_REGION) as dynamodb:
-            table = await dynamodb.Table(TRANSACTION_TABLE)
-            try:
-                response = await table.get_item(
-                    Key={'user_id': user_id, 'transaction_id': transaction_id}
-                )
-                item = response.get('Item')
-                if not item:
-                    raise HTTPException(
-                        status_code=404, detail="Transaction not found")
-
-                return TransactionDB.model_validate(item)
-
-            except ClientError as e:
-                raise HTTPException(status_code=500, detail=str(e))
-
-    async def get_transaction_by_user_id(self, user_id: str) -> list[TransactionDB]:
-        async with self.session.resource("dynamodb", region_name=DYNAMODB_REGION) as dynamodb:
-            table = await dynamodb.Table(TRANSACTION_TABLE)
-            try:
-                filtering_exp = Key('user_id').eq(user_id)
-                response = await table.query(KeyConditionExpression=filtering_exp)
-                items = response.get('Items', [])
-                return [TransactionDB.model_validate(item) for item in items]
-
-            except ClientError as e:
-                raise HTTPException(status_code=500, detail=str(e))
+        table = await self.dynamodb.table(TRANSACTION_TABLE)
+        try:
+            response = await table.get_item(
+                Key={'user_id': user_id, 'transaction_id': transaction_id}
+            )
+            item = response.get('Item')
+            if not item:
+                raise HTTPException(
+                    status_code=404, detail="Transaction not found")
+
+            return TransactionDB.from_item(item)
+
+        except ClientError as e:
+            raise HTTPException(status_code=500, detail=str(e))
+
+    def _list_query(self, user_id: str, status: bool | None = None,
+                    date_from: date | None = None, date_to: date | None = None) -> dict:
+        # newest first by transaction date; the date range is a key range on
+        # the date index rather than a filter over the whole partition
+        key_condition = Key('user_id').eq(user_id)
+        if date_from and date_to:
+            key_condition &= Key('date_key').between(
+                date_from.isoformat(), date_key_upper_bound(date_to.isoformat()))
+        elif date_from:
+            key_condition &= Key('date_key').gte(date_from.isoformat())
+        elif date_to:
+            key_condition &= Key('date_key').lt(date_key_upper_bound(date_to.isoformat()))
+
+        query_kwargs = {
+            'IndexName': TRANSACTION_DATE_INDEX,
+            'KeyConditionExpression': key_condition,
+            'ScanIndexForward': False,
+        }
+        if status is not None:
+            query_kwargs['FilterExpression'] = Attr('status').eq(status)
+        return query_kwargs
+
+    async def get_monthly_summary(self, user_id: str, month: str, currency: str = DEFAULT_CURRENCY) -> MonthlySummary:
+        try:
+            return await self.rollups.get_summary(user_id=user_id, month=month, currency=currency)
+        except ClientError as e:
+            raise HTTPException(status_code=500, detail=str(e))
+
+    async def get_transaction_by_user_id(self, user_id: str, status: bool | None = None,
+                                         date_from: date | None = None, date_to: date | None = None) -> list[TransactionDB]:
+        transactions = []
+        async for page in self.iter_transaction_pages(user_id, status, date_from, date_to):
+            transactions.extend(page)
+        return transactions
+
+    async def iter_transaction_pages(self, user_id: str, status: bool | None = None,
+                                     date_from: date | None = None, date_to: date | None = None):
+        """Yields the same transactions as get_transaction_by_user_id one
+        DynamoDB page at a time, so callers can hand each page on before
+        the next one is read."""
+        table = await self.dynamodb.table(TRANSACTION_TABLE)
+        try:
+            async for items in self._query_pages(table, **self._list_query(user_id, status, date_from, date_to)):
+                yield TransactionDB.from_items(items)
+
+        except ClientError as e:
+            raise HTTPException(status_code=500, detail=str(e))
+
+    async def get_transaction_page(self, user_id: str, limit: int, cursor: str | None = None, status: bool | None = None,
+                                   date_from: date | None = None, date_to: date | None = None) -> TransactionPage:
+        table = await self.dynamodb.table(TRANSACTION_TABLE)
+        query_kwargs = self._list_query(user_id, status, date_from, date_to)
+        start_key = decode_cursor(cursor, user_id)
+        try:
+            items = []
+            # Limit counts items read before the filter, so keep reading until
+            # the page is full or the partition is exhausted
+            while True:
+                if start_key:
+                    query_kwargs['ExclusiveStartKey'] = start_key
+                response = await table.query(Limit=limit - len(items), **query_kwargs)
+                items.extend(response.get('Items', []))
+                start_key = response.get('LastEvaluatedKey')
+                if not start_key or len(items) >= limit:
+                    break
+
+            return TransactionPage(
+                items=TransactionDB.from_items(items),
+                next_cursor=encode_cursor(start_key)
+            )
+
+        except ClientError as e:
+            raise HTTPException(status_code=500, detail=str(e))
+
+    async def _delete_item(self, transaction_id: str, user_id: str) -> dict:
+        key = {'user_id': user_id, 'transaction_id': transaction_id}
+        return await self._change_existing(user_id, transaction_id, lambda old_item: [
+            {'Delete': {'TableName': TRANSACTION_TABLE, 'Key': key, **_unchanged_condition(old_item)}},
+            outbox_put(user_id, ExpenseEventType.EXPENSE_DELETED, transaction_id, transaction_id),
+        ])
 
     async def delete_transaction(self, transaction_id: str, user_id: str):
-        async with self.session.resource("dynamodb", region_name=DYNAMODB_REGION) as dynamodb:
-            table = await dynamodb.Table(TRANSACTION_TABLE)
-            try:
-                response = await table.delete_item(
-                    Key={'user_id': user_id, 'transaction_id': transaction_id}
-                )
-                if response.get('ResponseMetadata', {}).get('HTTPStatusCode') != 200:
-                    raise HTTPException(
-                        status_code=404, detail="Transaction not found or could not be deleted"
-                    )
-                # Publish event to SNS
-                await self.event_bus.publish_event(transaction_id, ExpenseEventType.EXPENSE_DELETED)
-
-            except ClientError as e:
-                raise HTTPException(status_code=500, detail=str(e))
+        try:
+            old_item = await self._delete_item(transaction_id, user_id)
+            deltas = RollupDeltas()
+            deltas.remove(old_item)
+            await self._update_rollups(deltas)
+
+        except ClientError as e:
+            raise HTTPException(status_code=500, detail=str(e))
+
+    async def _update_item(self, transaction_id: str, user_id: str, transaction: Transaction) -> tuple[dict, dict]:
+        """Applies the non-None fields of `transaction` and returns the item
+        before and after; 404 when the transaction does not exist."""
+
+        def changes_for(old_item: dict) -> dict:
+            # an amount sent without a currency is in the stored one
+            return transaction.in_currency_of(old_item).model_dump(exclude_none=True, exclude={'transaction_id'})
+
+        def actions_for(old_item: dict) -> list[dict]:
+            changes = changes_for(old_item)
+            update_expression = "SET "
+            expression_attribute_values = {}
+            expression_attribute_names = {}
+
+            for key, value in changes.items():
+                placeholder = f"#{key}"  # attribute name placeholder
+                value_placeholder = f":{key}"
+
+                update_expression += f"{placeholder} = {value_placeholder}, "
+                expression_attribute_values[value_placeholder] = value
+                # map placeholder to actual name
+                expression_attribute_names[placeholder] = key
+
+            if transaction.date is not None:
+                update_expression += "#date_key = :date_key, "
+                expression_attribute_values[':date_key'] = transaction_date_key(
+                    transaction.date, transaction_id)
+                expression_attribute_names['#date_key'] = 'date_key'
+
+            update_expression = update_expression.rstrip(", ")
+            condition = _unchanged_condition(old_item)
+            updated = TransactionDB.from_item({**old_item, **changes})
+            return [
+                {'Update': {
+                    'TableName': TRANSACTION_TABLE,
+                    'Key': {'user_id': user_id, 'transaction_id': transaction_id},
+                    'UpdateExpression': update_expression,
+                    'ConditionExpression': condition['ConditionExpression'],
+                    'ExpressionAttributeNames': {**expression_attribute_names, **condition['ExpressionAttributeNames']},
+                    'ExpressionAttributeValues': {**expression_attribute_values,
+                                                  **condition.get('ExpressionAttributeValues', {})},
+                }},
+                outbox_put(user_id, ExpenseEventType.EXPENSE_UPDATED, updated.model_dump_json(), transaction_id),
+            ]
+
+        old_item = await self._change_existing(user_id, transaction_id, actions_for)
+        return old_item, {**old_item, **changes_for(old_item)}
 
     async def update_transaction(self, transaction_id: str, user_id: str, transaction: Transaction) -> TransactionDB:
-        async with self.session.resource("dynamodb", region_name=DYNAMODB_REGION) as dynamodb:
-            table = await dynamodb.Table(TRANSACTION_TABLE)
-            try:
-                update_expression = "SET "
-                expression_attribute_values = {}
-                expression_attribute_names = {}
-
-                for key, value in transaction.model_dump().items():
-                    if value is not None:
-                        placeholder = f"#{key}"  # attribute name placeholder
-                        value_placeholder = f":{key}"
-
-                        update_expression += f"{placeholder} = {value_placeholder}, "
-                        expression_attribute_values[value_placeholder] = value
-                        # map placeholder to actual name
-                        expression_attribute_names[placeholder] = key
-
-                update_expression = update_expression.rstrip(", ")
-
-                response = await table.update_item(
-                    Key={'user_id': user_id, 'transaction_id': transaction_id},
-                    UpdateExpression=update_expression,
-                    ExpressionAttributeValues=expression_attribute_values,
-                    ExpressionAttributeNames=expression_attribute_names,
-                    ReturnValues="ALL_NEW"
-                )
-
-                updated_item = response.get('Attributes')
-                if not updated_item:
-                    raise HTTPException(
-                        status_code=404, detail="Transaction not found or could not be updated"
-                    )
-
-                return TransactionDB.model_validate(updated_item)
-
-            except ClientError as e:
-                raise HTTPException(status_code=500, detail=str(e))
+        try:
+            old_item, updated_item = await self._update_item(transaction_id, user_id, transaction)
+
+            deltas = RollupDeltas()
+            deltas.remove(old_item)
+            deltas.add(updated_item)
+            await self._update_rollups(deltas)
+
+            return TransactionDB.from_item(updated_item)
+
+        except ClientError as e:
+            raise HTTPException(status_code=500, detail=str(e))
+
+    async def bulk_create_transactions(self, user_id: str, transactions: list[Transaction],
+                                       concurrency: int = BATCH_WRITE_CONCURRENCY) -> list[BulkItemResult]:
+        tx_dbs = [
+            TransactionDB(user_id=user_id, transaction_id=generate_transaction_id(), **transaction.model_dump())
+            for transaction in transactions
+        ]
+        errors = await self._transact_changes([
+            [{'Put': {'TableName': TRANSACTION_TABLE, 'Item': tx_db.model_dump()}},
+             outbox_put(user_id, ExpenseEventType.EXPENSE_CREATED, created_message(tx_db), tx_db.transaction_id)]
+            for tx_db in tx_dbs
+        ], concurrency=concurrency)
+
+        results = []
+        deltas = RollupDeltas()
+        for tx_db, error in zip(tx_dbs, errors):
+            if error is not None:
+                results.append(BulkItemResult(
+                    status_code=500, detail="Failed to create transaction"))
+                continue
+            deltas.add(tx_db.model_dump())
+            results.append(BulkItemResult(
+                transaction_id=tx_db.transaction_id, status_code=201, transaction=tx_db))
+        await self._update_rollups(deltas)
+        return results
+
+    async def bulk_update_transactions(self, user_id: str, updates: list[TransactionUpdate],
+                                       concurrency: int = BULK_UPDATE_CONCURRENCY) -> list[BulkItemResult]:
+        # each update is a read and a conditional write of its own, so the
+        # items are updated side by side rather than in batches
+        semaphore = asyncio.Semaphore(concurrency)
+        deltas = RollupDeltas()
+
+        async def apply(update: TransactionUpdate) -> BulkItemResult:
+            async with semaphore:
+                try:
+                    old_item, updated_item = await self._update_item(
+                        update.transaction_id, user_id, update)
+                except HTTPException as e:
+                    return BulkItemResult(
+                        transaction_id=update.transaction_id, status_code=e.status_code, detail=e.detail)
+                except (ClientError, DynamoDBClientError) as e:
+                    return BulkItemResult(
+                        transaction_id=update.transaction_id, status_code=500, detail=str(e))
+            deltas.remove(old_item)
+            deltas.add(updated_item)
+            return BulkItemResult(
+                transaction_id=update.transaction_id, status_code=200,
+                transaction=TransactionDB.from_item(updated_item))
+
+        results = await asyncio.gather(*(apply(update) for update in updates))
+        await self._update_rollups(deltas)
+        return list(results)
+
+    async def bulk_delete_transactions(self, user_id: str, transaction_ids: list[str],
+                                       concurrency: int = BATCH_WRITE_CONCURRENCY) -> list[BulkItemResult]:
+        unique_ids = list(dict.fromkeys(transaction_ids))
+        try:
+            # read the targets in batches, for the rollups and to tell
+            # missing ids apart, then delete them conditionally
+            existing = {
+                item['transaction_id']: item
+                for item in await self._batch_get([
+                    {'user_id': user_id, 'transaction_id': transaction_id}
+                    for transaction_id in unique_ids
+                ])
+            }
+        except ClientError as e:
+            raise HTTPException(status_code=500, detail=str(e))
+        errors = await self._transact_changes([
+            [{'Delete': {'TableName': TRANSACTION_TABLE,
+                         'Key': {'user_id': user_id, 'transaction_id': transaction_id},
+                         **_unchanged_condition(item)}},
+             outbox_put(user_id, ExpenseEventType.EXPENSE_DELETED, transaction_id, transaction_id)]
+            for transaction_id, item in existing.items()
+        ], concurrency=concurrency)
+
+        outcomes = {}
+        deltas = RollupDeltas()
+        for (transaction_id, item), error in zip(existing.items(), errors):
+            if error is None:
+                deltas.remove(item)
+                outcomes[transaction_id] = BulkItemResult(transaction_id=transaction_id, status_code=204)
+            elif _condition_failed(error):
+                # one changed item cancels its whole call; retry the items
+                # of that call one by one
+                try:
+                    deltas.remove(await self._delete_item(transaction_id, user_id))
+                    outcomes[transaction_id] = BulkItemResult(transaction_id=transaction_id, status_code=204)
+                except HTTPException as e:
+                    outcomes[transaction_id] = BulkItemResult(
+                        transaction_id=transaction_id, status_code=e.status_code, detail=e.detail)
+                except (ClientError, DynamoDBClientError) as e:
+                    outcomes[transaction_id] = BulkItemResult(
+                        transaction_id=transaction_id, status_code=500, detail=str(e))
+            else:
+                outcomes[transaction_id] = BulkItemResult(
+                    transaction_id=transaction_id, status_code=500, detail="Failed to delete transaction")
+        await self._update_rollups(deltas)
+
+        results = []
+        seen = set()
+        for transaction_id in transaction_ids:
+            if transaction_id in outcomes and transaction_id not in seen:
+                results.append(outcomes[transaction_id])
+            else:
+                # a repeated id was already deleted by its first occurrence
+                results.append(BulkItemResult(
+                    transaction_id=transaction_id, status_code=404, detail="Transaction not found"))
+            seen.add(transaction_id)
+        return results
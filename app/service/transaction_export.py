@@ -0,0 +1,49 @@
+import csv
+import io
+from typing import AsyncIterator
+
+from app.models.transaction import TransactionDB
+
+EXPORT_FORMATS = {
+    'csv': "text/csv",
+    'ndjson': "application/x-ndjson",
+}
+CSV_COLUMNS = ('transaction_id', 'date', 'title', 'amount', 'currency', 'description', 'status')
+# free text taken from email bodies; amounts and dates are formatted by us
+CSV_TEXT_COLUMNS = ('title', 'description')
+# spreadsheets evaluate a cell starting with one of these as a formula
+FORMULA_PREFIXES = ("=", "+", "-", "@", "\t", "\r")
+
+
+def _csv_row(transaction: TransactionDB) -> dict:
+    row = transaction.model_dump(mode="json")
+    for column in CSV_TEXT_COLUMNS:
+        value = row.get(column)
+        if value and value.startswith(FORMULA_PREFIXES):
+            row[column] = f"'{value}"
+    return row
+
+
+async def csv_chunks(pages: AsyncIterator[list[TransactionDB]]) -> AsyncIterator[str]:
+    """One CSV chunk per DynamoDB page, the header row first."""
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=CSV_COLUMNS, extrasaction='ignore')
+    writer.writeheader()
+    async for page in pages:
+        writer.writerows(_csv_row(transaction) for transaction in page)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue()
+
+
+async def ndjson_chunks(pages: AsyncIterator[list[TransactionDB]]) -> AsyncIterator[str]:
+    """One JSON object per line, in the same shape /transactions/me returns."""
+    async for page in pages:
+        if page:
+            yield "".join(transaction.model_dump_json() + "\n" for transaction in page)
+
+
+def export_chunks(pages: AsyncIterator[list[TransactionDB]], export_format: str) -> AsyncIterator[str]:
+    return csv_chunks(pages) if export_format == 'csv' else ndjson_chunks(pages)
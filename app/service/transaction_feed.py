@@ -0,0 +1,281 @@
+import asyncio
+import json
+import os
+import uuid
+from contextlib import AsyncExitStack
+from dataclasses import dataclass
+from typing import AsyncIterator
+
+import aioboto3
+from dotenv import load_dotenv
+
+from app.models.sns import ExpenseEventType
+from app.service.sns import SNS_REGION, SNS_TOPIC_ARN
+
+load_dotenv()
+
+TRANSACTION_FEED_BUFFER_SIZE = int(os.getenv("TRANSACTION_FEED_BUFFER_SIZE", "100"))
+# name prefix of the SQS queue each process subscribes to the SNS topic;
+# unset, clients only see events relayed by the process they are connected to
+TRANSACTION_FEED_QUEUE_PREFIX = os.getenv("TRANSACTION_FEED_QUEUE_PREFIX")
+# events older than this are of no use to a live stream
+TRANSACTION_FEED_RETENTION_SECONDS = 60
+TRANSACTION_FEED_RETRY_SECONDS = 5
+SQS_WAIT_TIME_SECONDS = 20
+SSE_KEEPALIVE_SECONDS = 15
+# sent in place of the events a slow client missed: its list is stale and
+# has to be fetched again
+RESYNC_EVENT = "resync"
+
+
+@dataclass
+class FeedEvent:
+    event_type: str
+    transaction_id: str | None = None
+    # the transaction as stored, for created and updated events
+    transaction: dict | None = None
+    event_id: str | None = None
+
+    def sse(self) -> str:
+        lines = [f"event: {self.event_type}"]
+        if self.event_id:
+            lines.append(f"id: {self.event_id}")
+        data = {"transaction_id": self.transaction_id, "transaction": self.transaction}
+        lines.append(f"data: {json.dumps(data)}")
+        return "\n".join(lines) + "\n\n"
+
+
+def feed_event(event_type: ExpenseEventType, message: str, transaction_id: str | None,
+               event_id: str | None = None) -> FeedEvent:
+    """FeedEvent for an outbox record: deletes carry the id as the message,
+    creates and updates the transaction's JSON."""
+    if event_type == ExpenseEventType.EXPENSE_DELETED:
+        return FeedEvent(event_type, transaction_id or message, event_id=event_id)
+    transaction = json.loads(message)
+    transaction_id = transaction_id or transaction.get('transaction_id')
+    transaction['transaction_id'] = transaction_id
+    return FeedEvent(event_type, transaction_id, transaction, event_id)
+
+
+class Subscription:
+    def __init__(self, buffer_size: int):
+        self.queue: asyncio.Queue[FeedEvent] = asyncio.Queue(buffer_size)
+
+    def put(self, event: FeedEvent) -> bool:
+        """Queues the event, or replaces everything queued with a resync when
+        the buffer is full. Returns False when events were dropped."""
+        try:
+            self.queue.put_nowait(event)
+            return True
+        except asyncio.QueueFull:
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            self.queue.put_nowait(FeedEvent(RESYNC_EVENT))
+            return False
+
+    async def get(self) -> FeedEvent:
+        return await self.queue.get()
+
+
+class TransactionFeed:
+    """In-process fan-out of transaction events to each user's connected
+    clients.
+
+    Every client gets its own buffer of `buffer_size` events, so one slow
+    client never holds up publishing or the others. A client that falls
+    that far behind loses its buffer and is sent a resync event instead.
+
+    Events reach it from a TopicSubscription, so clients see every
+    process's events, or else from this process's outbox relay alone.
+    """
+
+    def __init__(self, buffer_size: int = TRANSACTION_FEED_BUFFER_SIZE):
+        self.buffer_size = buffer_size
+        self._subscriptions: dict[str, set[Subscription]] = {}
+        self.published = 0
+        self.resyncs = 0
+
+    def subscribe(self, user_id: str) -> Subscription:
+        subscription = Subscription(self.buffer_size)
+        self._subscriptions.setdefault(user_id, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, user_id: str, subscription: Subscription):
+        subscriptions = self._subscriptions.get(user_id)
+        if subscriptions is not None:
+            subscriptions.discard(subscription)
+            if not subscriptions:
+                del self._subscriptions[user_id]
+
+    def publish(self, user_id: str, event: FeedEvent):
+        for subscription in self._subscriptions.get(user_id, ()):
+            if not subscription.put(event):
+                self.resyncs += 1
+        self.published += 1
+
+    async def stream(self, user_id: str, keepalive: float = SSE_KEEPALIVE_SECONDS) -> AsyncIterator[str]:
+        """Server-sent events for the user until the client disconnects, with
+        a comment line every `keepalive` seconds to hold proxies open."""
+        subscription = self.subscribe(user_id)
+        try:
+            yield ": connected\n\n"
+            while True:
+                try:
+                    event = await asyncio.wait_for(subscription.get(), timeout=keepalive)
+                except asyncio.TimeoutError:
+                    yield ": keepalive\n\n"
+                    continue
+                yield event.sse()
+        finally:
+            self.unsubscribe(user_id, subscription)
+
+    def stats(self) -> dict:
+        return {
+            "users": len(self._subscriptions),
+            "clients": sum(len(subscriptions) for subscriptions in self._subscriptions.values()),
+            "published": self.published,
+            "resyncs": self.resyncs,
+        }
+
+
+def _attribute(attributes: dict, name: str) -> str | None:
+    return attributes.get(name, {}).get('StringValue')
+
+
+def sns_feed_event(message: dict) -> tuple[str, FeedEvent]:
+    """The user and FeedEvent of an SQS message delivered raw from the SNS
+    topic. Raises ValueError for a message without the attributes the
+    relay sends."""
+    attributes = message.get('MessageAttributes', {})
+    user_id = _attribute(attributes, 'UserId')
+    event_type = _attribute(attributes, 'EventType')
+    if not user_id or not event_type:
+        raise ValueError("missing UserId or EventType")
+    return user_id, feed_event(ExpenseEventType(event_type), message['Body'],
+                               _attribute(attributes, 'TransactionId'), _attribute(attributes, 'IdempotencyKey'))
+
+
+class TopicSubscription:
+    """Feeds this process's TransactionFeed from the SNS topic, so a client
+    sees every event whichever process or instance relayed it.
+
+    `start()` creates an SQS queue of this process's own and subscribes it
+    to the topic with raw delivery; `close()` unsubscribes and deletes it.
+    A queue left by a process that died holds at most a minute of events
+    and is deleted by SQS after 30 days without use. When no prefix is
+    configured or the setup fails, `active` stays False and the app feeds
+    clients from its own relay instead.
+    """
+
+    def __init__(self, feed: TransactionFeed, queue_prefix: str | None = TRANSACTION_FEED_QUEUE_PREFIX,
+                 topic_arn: str | None = SNS_TOPIC_ARN, region_name: str = SNS_REGION):
+        self.feed = feed
+        self.queue_prefix = queue_prefix
+        self.topic_arn = topic_arn
+        self.region_name = region_name
+        self.session = aioboto3.Session()
+        self.sqs = None
+        self.sns = None
+        self.queue_url: str | None = None
+        self.subscription_arn: str | None = None
+        self.active = False
+        self.received = 0
+        self.malformed = 0
+        self._task: asyncio.Task | None = None
+        self._stack = AsyncExitStack()
+
+    async def start(self):
+        if self.active or not self.queue_prefix or not self.topic_arn:
+            return self
+        try:
+            await self._subscribe()
+        except Exception as e:
+            print(f"Transaction feed falls back to this process's events: {e}")
+            await self._unsubscribe()
+            return self
+        self.active = True
+        self._task = asyncio.create_task(self._run())
+        return self
+
+    async def _subscribe(self):
+        self.sqs = await self._stack.enter_async_context(self.session.client("sqs", region_name=self.region_name))
+        self.sns = await self._stack.enter_async_context(self.session.client("sns", region_name=self.region_name))
+        response = await self.sqs.create_queue(
+            QueueName=f"{self.queue_prefix}-{uuid.uuid4().hex[:12]}",
+            Attributes={'MessageRetentionPeriod': str(TRANSACTION_FEED_RETENTION_SECONDS)})
+        self.queue_url = response['QueueUrl']
+        attributes = await self.sqs.get_queue_attributes(QueueUrl=self.queue_url, AttributeNames=['QueueArn'])
+        queue_arn = attributes['Attributes']['QueueArn']
+        await self.sqs.set_queue_attributes(QueueUrl=self.queue_url, Attributes={'Policy': json.dumps({
+            'Version': '2012-10-17',
+            'Statement': [{
+                'Effect': 'Allow',
+                'Principal': {'Service': 'sns.amazonaws.com'},
+                'Action': 'sqs:SendMessage',
+                'Resource': queue_arn,
+                'Condition': {'ArnEquals': {'aws:SourceArn': self.topic_arn}},
+            }],
+        })})
+        response = await self.sns.subscribe(
+            TopicArn=self.topic_arn, Protocol='sqs', Endpoint=queue_arn,
+            Attributes={'RawMessageDelivery': 'true'}, ReturnSubscriptionArn=True)
+        self.subscription_arn = response['SubscriptionArn']
+
+    async def _unsubscribe(self):
+        try:
+            if self.subscription_arn is not None:
+                await self.sns.unsubscribe(SubscriptionArn=self.subscription_arn)
+            if self.queue_url is not None:
+                await self.sqs.delete_queue(QueueUrl=self.queue_url)
+        except Exception as e:
+            print(f"Failed to remove transaction feed queue {self.queue_url}: {e}")
+        finally:
+            self.subscription_arn = self.queue_url = None
+            await self._stack.aclose()
+            self.sqs = self.sns = None
+
+    async def close(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        if self.active:
+            await self._unsubscribe()
+            self.active = False
+
+    async def receive_once(self) -> int:
+        response = await self.sqs.receive_message(
+            QueueUrl=self.queue_url, MaxNumberOfMessages=10,
+            WaitTimeSeconds=SQS_WAIT_TIME_SECONDS, MessageAttributeNames=['All'])
+        messages = response.get('Messages', [])
+        for message in messages:
+            try:
+                user_id, event = sns_feed_event(message)
+            except (KeyError, ValueError) as e:
+                self.malformed += 1
+                print(f"Skipping topic message {message.get('MessageId')} for the feed: {e}")
+                continue
+            self.feed.publish(user_id, event)
+            self.received += 1
+        if messages:
+            # the queue is this process's alone; every message was handled
+            await self.sqs.delete_message_batch(QueueUrl=self.queue_url, Entries=[
+                {'Id': str(i), 'ReceiptHandle': message['ReceiptHandle']} for i, message in enumerate(messages)])
+        return len(messages)
+
+    async def _run(self):
+        while True:
+            try:
+                await self.receive_once()
+            except Exception as e:
+                print(f"Transaction feed queue receive failed: {e}")
+                await asyncio.sleep(TRANSACTION_FEED_RETRY_SECONDS)
+
+    def stats(self) -> dict:
+        return {"active": self.active, "received": self.received, "malformed": self.malformed}
+
+    async def __aenter__(self):
+        return await self.start()
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.close()
@@ -0,0 +1,127 @@
+import re
+from datetime import date, datetime
+
+from app.models.email import Email
+from app.models.transaction import TransactionDB
+from app.utils.money_utils import parse_money
+
+
+class RegexParser:
+    """Extracts a transaction from one fixed notification template.
+
+    `body_pattern` must define the named groups `amount` and `merchant`, and
+    may define `date` (parsed with `date_formats`). Only emails whose sender
+    matches `sender_pattern` are tried.
+    """
+
+    def __init__(self, name: str, sender_pattern: str, body_pattern: str,
+                 date_formats: tuple[str, ...] = ()):
+        self.name = name
+        self.sender_pattern = re.compile(sender_pattern, re.IGNORECASE)
+        self.body_pattern = re.compile(body_pattern, re.IGNORECASE | re.DOTALL)
+        self.date_formats = date_formats
+
+    def matches_sender(self, sender: str | None) -> bool:
+        return sender is not None and self.sender_pattern.search(sender) is not None
+
+    def parse(self, user_id: str, email: Email) -> TransactionDB | None:
+        match = self.body_pattern.search(email.body)
+        if match is None:
+            return None
+
+        fields = match.groupdict()
+        merchant = " ".join(fields["merchant"].split())
+        date = self._parse_date(fields.get("date"))
+        if fields.get("date") and date is None:
+            return None
+        amount = parse_money(fields["amount"])
+        if amount is None:
+            return None
+        amount_minor, currency = amount
+
+        return TransactionDB(
+            user_id=user_id,
+            transaction_id=email.id,
+            title=merchant,
+            date=date,
+            amount_minor=amount_minor,
+            currency=currency,
+            description=f"{self.name}: {merchant}"[:50],
+            status=False,
+        )
+
+    def _parse_date(self, value: str | None) -> date | None:
+        if not value:
+            return None
+        value = " ".join(value.replace(",", " ").split())
+        for date_format in self.date_formats:
+            try:
+                return datetime.strptime(value, date_format).date()
+            except ValueError:
+                continue
+        return None
+
+
+class ParserRegistry:
+    def __init__(self, parsers: list[RegexParser] | None = None):
+        self.parsers = list(parsers or [])
+
+    def register(self, parser: RegexParser):
+        self.parsers.append(parser)
+
+    def parse(self, user_id: str, email: Email) -> TransactionDB | None:
+        for parser in self.parsers:
+            if parser.matches_sender(email.sender):
+                transaction = parser.parse(user_id, email)
+                if transaction is not None:
+                    return transaction
+        return None
+
+    def split(self, user_id: str, emails: list[Email]) -> tuple[list[TransactionDB], list[Email]]:
+        """Parse what the rules recognise; return the rest for the LLM."""
+        parsed = []
+        unmatched = []
+        for email in emails:
+            transaction = self.parse(user_id, email)
+            if transaction is None:
+                unmatched.append(email)
+            else:
+                parsed.append(transaction)
+        return parsed, unmatched
+
+
+AMOUNT = r"\$(?P<amount>\d{1,3}(?:,\d{3})*\.\d{2})"
+MONTH_DAY_YEAR = ("%b %d %Y", "%B %d %Y", "%m/%d/%Y", "%m/%d/%y")
+
+DEFAULT_PARSERS = [
+    RegexParser(
+        name="Chase",
+        sender_pattern=r"@(?:[\w-]+\.)*chase\.com>?$",
+        body_pattern=(r"You made an? " + AMOUNT + r" transaction with (?P<merchant>.+?)"
+                      r"\s+on (?P<date>[A-Z][a-z]{2,8} \d{1,2}, \d{4})"),
+        date_formats=MONTH_DAY_YEAR,
+    ),
+    RegexParser(
+        name="Bank of America",
+        sender_pattern=r"@(?:[\w-]+\.)*bankofamerica\.com>?$",
+        body_pattern=(r"Amount:\s*" + AMOUNT + r".*?Date:\s*(?P<date>[A-Z][a-z]{2,8} \d{1,2}, \d{4})"
+                      r".*?Where:\s*(?P<merchant>[^\n]+)"),
+        date_formats=MONTH_DAY_YEAR,
+    ),
+    RegexParser(
+        name="Capital One",
+        sender_pattern=r"@(?:[\w-]+\.)*capitalone\.com>?$",
+        body_pattern=(r"on (?P<date>[A-Z][a-z]{2,8} \d{1,2}, \d{4}), at (?P<merchant>.+?),"
+                      r" a pending authorization or purchase in the amount of " + AMOUNT),
+        date_formats=MONTH_DAY_YEAR,
+    ),
+    RegexParser(
+        name="American Express",
+        sender_pattern=r"@(?:[\w-]+\.)*(?:aexp|americanexpress)\.com>?$",
+        body_pattern=(r"(?P<merchant>[^\n]+?)\s*\n\s*" + AMOUNT +
+                      r"\*?\s*\n\s*(?P<date>[A-Z][a-z]{2}, [A-Z][a-z]{2} \d{1,2}, \d{4})"),
+        date_formats=("%a %b %d %Y",),
+    ),
+]
+
+default_registry = ParserRegistry(DEFAULT_PARSERS)
@@ -0,0 +1,174 @@
+import asyncio
+from collections import defaultdict
+from decimal import Decimal
+
+from app.models.transaction import MonthlySummary, SpendingBreakdown
+from app.service.dynamodb import DynamoDBPool
+from app.utils.money_utils import DEFAULT_CURRENCY, minor_to_decimal, parse_money
+from app.utils.transaction_key_utils import UNDATED, normalize_date
+
+ROLLUP_TABLE = 'TransactionRollup'
+UNCATEGORIZED = "uncategorized"
+# transactions without a usable date are rolled up under this month
+UNDATED_MONTH = UNDATED[:7]
+STATUS_PREFIX = "status#"
+CATEGORY_PREFIX = "category#"
+# counters of currencies other than the default are kept apart under this
+# prefix and the code; amounts in different currencies are never summed
+CURRENCY_PREFIX = "currency#"
+# what a transaction's rollup contribution is computed from
+ROLLUP_ATTRIBUTES = ('amount_minor', 'amount', 'currency', 'date', 'status', 'title')
+# counters per update_item; DynamoDB rejects expressions over 4KB, and each
+# "#c<n> :c<n>" clause takes up to 14 characters
+ROLLUP_COUNTERS_PER_UPDATE = 150
+
+
+def item_money(item: dict) -> tuple[Decimal | None, str]:
+    """The item's amount, or None when it has none, and its currency."""
+    # typed items carry minor units; items not yet migrated only the string
+    currency = item.get('currency') or DEFAULT_CURRENCY
+    if item.get('amount_minor') is not None:
+        return minor_to_decimal(int(item['amount_minor']), currency), currency
+    parsed = parse_money(item.get('amount'), item.get('currency'))
+    return (minor_to_decimal(*parsed), parsed[1]) if parsed else (None, currency)
+
+
+def item_amount(item: dict) -> Decimal | None:
+    return item_money(item)[0]
+
+
+def currency_prefix(currency: str) -> str:
+    return "" if currency == DEFAULT_CURRENCY else f"{CURRENCY_PREFIX}{currency}#"
+
+
+def rollup_month(date: str | None) -> str:
+    return (normalize_date(date) or UNDATED)[:7]
+
+
+def rollup_category(title: str | None) -> str:
+    # transactions have no category field; the title (the merchant for
+    # parsed bank alerts) is the closest thing to one
+    return " ".join((title or "").split())[:50] or UNCATEGORIZED
+
+
+class RollupDeltas:
+    """Per (user_id, month) changes to the rollup counters.
+
+    Each transaction contributes its amount and a count of one to the month
+    total, to its status bucket and to its category bucket; removing a
+    transaction adds the same contribution with the opposite sign.
+    """
+
+    def __init__(self):
+        self._deltas: dict[tuple[str, str], dict[str, Decimal]] = defaultdict(
+            lambda: defaultdict(Decimal))
+
+    def add(self, item: dict, sign: int = 1):
+        amount, currency = item_money(item)
+        status = "split" if item.get('status') else "unsplit"
+        counters = self._deltas[(item['user_id'], rollup_month(item.get('date')))]
+        base = currency_prefix(currency)
+        for prefix in ("", f"{STATUS_PREFIX}{status}#", f"{CATEGORY_PREFIX}{rollup_category(item.get('title'))}#"):
+            counters[f"{base}{prefix}amount"] += sign * (amount or Decimal(0))
+            counters[f"{base}{prefix}count"] += sign
+
+    def remove(self, item: dict):
+        self.add(item, sign=-1)
+
+    def items(self) -> list[tuple[tuple[str, str], dict[str, Decimal]]]:
+        # an update that leaves a bucket unchanged cancels out; skip it
+        changed = []
+        for key, counters in self._deltas.items():
+            counters = {name: value for name, value in counters.items() if value}
+            if counters:
+                changed.append((key, counters))
+        return changed
+
+    def __bool__(self) -> bool:
+        return bool(self.items())
+
+
+class RollupStore:
+    """Monthly spending counters per user, one item per (user_id, month).
+
+    Counters are top-level number attributes ("amount", "count",
+    "status#<bucket>#amount", "category#<title>#count", ...) maintained with
+    atomic ADD updates, so concurrent writers never lose each other's changes.
+    Counters for currencies other than the default carry a
+    "currency#<code>#" prefix. A month with many distinct titles is
+    updated in several calls of at most ROLLUP_COUNTERS_PER_UPDATE counters.
+    """
+
+    def __init__(self, dynamodb: DynamoDBPool):
+        self.dynamodb = dynamodb
+
+    async def apply(self, deltas: RollupDeltas):
+        table = await self.dynamodb.table(ROLLUP_TABLE)
+
+        async def add(key: tuple[str, str], counters: list[tuple[str, Decimal]]):
+            names, values, clauses = {}, {}, []
+            for i, (name, value) in enumerate(counters):
+                names[f"#c{i}"] = name
+                values[f":c{i}"] = value
+                clauses.append(f"#c{i} :c{i}")
+            await table.update_item(
+                Key={'user_id': key[0], 'month': key[1]},
+                UpdateExpression="ADD " + ", ".join(clauses),
+                ExpressionAttributeNames=names,
+                ExpressionAttributeValues=values,
+            )
+
+        updates = []
+        for key, counters in deltas.items():
+            counters = list(counters.items())
+            for i in range(0, len(counters), ROLLUP_COUNTERS_PER_UPDATE):
+                updates.append(add(key, counters[i:i + ROLLUP_COUNTERS_PER_UPDATE]))
+        await asyncio.gather(*updates)
+
+    async def get_summary(self, user_id: str, month: str, currency: str = DEFAULT_CURRENCY) -> MonthlySummary:
+        table = await self.dynamodb.table(ROLLUP_TABLE)
+        response = await table.get_item(Key={'user_id': user_id, 'month': month})
+        return summary_from_item(month, response.get('Item', {}), currency)
+
+
+def summary_from_item(month: str, item: dict, currency: str = DEFAULT_CURRENCY) -> MonthlySummary:
+    """The month's counters in `currency`, and which currencies the month
+    has transactions in."""
+    base = currency_prefix(currency)
+    counters = {}
+    currencies = set()
+    for name, value in item.items():
+        if name.startswith(CURRENCY_PREFIX):
+            code, _, counter = name[len(CURRENCY_PREFIX):].partition("#")
+            if counter == "count" and value:
+                currencies.add(code)
+        elif name == "count" and value:
+            currencies.add(DEFAULT_CURRENCY)
+        if base and name.startswith(base):
+            counters[name[len(base):]] = value
+        elif not base and not name.startswith(CURRENCY_PREFIX):
+            counters[name] = value
+
+    buckets = {STATUS_PREFIX: defaultdict(dict), CATEGORY_PREFIX: defaultdict(dict)}
+    for name, value in counters.items():
+        for prefix, bucket in buckets.items():
+            if name.startswith(prefix):
+                label, field = name[len(prefix):].rsplit("#", 1)
+                bucket[label][field] = value
+
+    def breakdown(bucket: dict) -> dict[str, SpendingBreakdown]:
+        # buckets emptied by deletes keep zeroed counters; hide them
+        return {
+            label: SpendingBreakdown(amount=fields.get('amount', 0), count=fields.get('count', 0))
+            for label, fields in bucket.items() if fields.get('count')
+        }
+
+    return MonthlySummary(
+        month=month,
+        currency=currency,
+        currencies=sorted(currencies),
+        amount=counters.get('amount', 0),
+        count=counters.get('count', 0),
+        by_status=breakdown(buckets[STATUS_PREFIX]),
+        by_category=breakdown(buckets[CATEGORY_PREFIX]),
+    )
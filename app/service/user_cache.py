@@ -0,0 +1,47 @@
+import os
+
+from cachetools import TTLCache
+from dotenv import load_dotenv
+
+from app.models.auth import UserInDB
+
+load_dotenv()
+
+USER_CACHE_MAX_SIZE = int(os.getenv("USER_CACHE_MAX_SIZE", "10000"))
+USER_CACHE_TTL_SECONDS = int(os.getenv("USER_CACHE_TTL_SECONDS", "60"))
+
+
+class UserCache:
+    """Bounded per-process cache of users keyed by user id.
+
+    UserDB invalidates entries on its own writes; the TTL bounds staleness
+    from writes made by other processes.
+    """
+
+    def __init__(self, maxsize: int = USER_CACHE_MAX_SIZE, ttl: int = USER_CACHE_TTL_SECONDS):
+        self._cache = TTLCache(maxsize=maxsize, ttl=ttl)
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, user_id: str) -> UserInDB | None:
+        user = self._cache.get(user_id)
+        if user is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return user
+
+    def set(self, user: UserInDB):
+        self._cache[user.user_id] = user
+
+    def invalidate(self, user_id: str):
+        self._cache.pop(user_id, None)
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._cache),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / lookups if lookups else 0.0,
+        }
@@ -1,43 +1,131 @@
-import aioboto3
 from aiohttp import ClientError
+from boto3.dynamodb.conditions import Attr, Key
 from app.models.auth import UserInDB
+from app.service.dynamodb import DynamoDBPool
+from app.service.user_cache import UserCache
 
-DYNAMODB_REGION = "us-west-1"
 USER_TABLE_NAME = "User"
+# GSI on gmail_address, for mapping Gmail push notifications to users
+GMAIL_ADDRESS_INDEX = "gmail_address-index"
 
 
 class UserDB:
-    def __init__(self):
-        self.session = aioboto3.Session()
+    def __init__(self, dynamodb: DynamoDBPool, cache: UserCache | None = None):
+        self.dynamodb = dynamodb
+        self.cache = cache
 
     async def get_user_by_userid(self, user_id: str) -> UserInDB | None:
-        async with self.session.resource("dynamodb", region_name=DYNAMODB_REGION) as dynamodb:
-            table = await dynamodb.Table(USER_TABLE_NAME)
-            response = await table.get_item(Key={"user_id": user_id})
-            user = response.get("Item")
-            return UserInDB.model_validate(user) if user else None
+        if self.cache is not None:
+            cached_user = self.cache.get(user_id)
+            if cached_user is not None:
+                return cached_user
+
+        table = await self.dynamodb.table(USER_TABLE_NAME)
+        response = await table.get_item(Key={"user_id": user_id})
+        user = response.get("Item")
+        if not user:
+            return None
+
+        user = UserInDB.model_validate(user)
+        if self.cache is not None:
+            self.cache.set(user)
+        return user
+
+    def _invalidate(self, user_id: str):
+        if self.cache is not None:
+            self.cache.invalidate(user_id)
 
     async def create_user(self, user: UserInDB):
-        async with self.session.resource("dynamodb", region_name=DYNAMODB_REGION) as dynamodb:
-            table = await dynamodb.Table(USER_TABLE_NAME)
-            try:
-                await table.put_item(
-                    Item=user.model_dump(),
-                    ConditionExpression="attribute_not_exists(user_id)"
-                )
-            except ClientError as e:
-                print("Error creating user:", e)
-                raise e
+        table = await self.dynamodb.table(USER_TABLE_NAME)
+        try:
+            await table.put_item(
+                Item=user.model_dump(),
+                ConditionExpression="attribute_not_exists(user_id)"
+            )
+        except ClientError as e:
+            print("Error creating user:", e)
+            raise e
+        finally:
+            self._invalidate(user.user_id)
+
+    async def update_user_password(self, user_id: str, hashed_password: str):
+        table = await self.dynamodb.table(USER_TABLE_NAME)
+        try:
+            await table.update_item(
+                Key={"user_id": user_id},
+                UpdateExpression="SET hashed_password = :val",
+                ExpressionAttributeValues={":val": hashed_password}
+            )
+        except ClientError as e:
+            print("Error updating user password:", e)
+            raise e
+        finally:
+            self._invalidate(user_id)
 
     async def update_user_credentials(self, user_id: str, google_credentials: str):
-        async with self.session.resource("dynamodb", region_name=DYNAMODB_REGION) as dynamodb:
-            table = await dynamodb.Table(USER_TABLE_NAME)
-            try:
-                await table.update_item(
-                    Key={"user_id": user_id},
-                    UpdateExpression="SET google_credentials = :val",
-                    ExpressionAttributeValues={":val": google_credentials}
-                )
-            except ClientError as e:
-                print("Error updating user credentials:", e)
-                raise e
+        table = await self.dynamodb.table(USER_TABLE_NAME)
+        try:
+            await table.update_item(
+                Key={"user_id": user_id},
+                UpdateExpression="SET google_credentials = :val",
+                ExpressionAttributeValues={":val": google_credentials}
+            )
+        except ClientError as e:
+            print("Error updating user credentials:", e)
+            raise e
+        finally:
+            self._invalidate(user_id)
+
+    async def update_gmail_history_id(self, user_id: str, history_id: str):
+        table = await self.dynamodb.table(USER_TABLE_NAME)
+        try:
+            await table.update_item(
+                Key={"user_id": user_id},
+                UpdateExpression="SET gmail_history_id = :val",
+                ExpressionAttributeValues={":val": history_id}
+            )
+        except ClientError as e:
+            print("Error updating gmail history id:", e)
+            raise e
+        finally:
+            self._invalidate(user_id)
+
+    async def get_user_by_gmail_address(self, gmail_address: str) -> UserInDB | None:
+        table = await self.dynamodb.table(USER_TABLE_NAME)
+        response = await table.query(
+            IndexName=GMAIL_ADDRESS_INDEX,
+            KeyConditionExpression=Key("gmail_address").eq(gmail_address),
+            Limit=1,
+        )
+        items = response.get("Items", [])
+        if not items:
+            return None
+        # the index may only project keys; the cached read has the rest
+        return await self.get_user_by_userid(items[0]["user_id"])
+
+    async def update_gmail_watch(self, user_id: str, gmail_address: str, expiration: int):
+        table = await self.dynamodb.table(USER_TABLE_NAME)
+        try:
+            await table.update_item(
+                Key={"user_id": user_id},
+                UpdateExpression="SET gmail_address = :address, gmail_watch_expiration = :expiration",
+                ExpressionAttributeValues={":address": gmail_address, ":expiration": expiration}
+            )
+        except ClientError as e:
+            print("Error updating gmail watch:", e)
+            raise e
+        finally:
+            self._invalidate(user_id)
+
+    async def get_linked_users(self) -> list[UserInDB]:
+        """Every user with Google credentials, read with a full table scan."""
+        table = await self.dynamodb.table(USER_TABLE_NAME)
+        scan_kwargs = {"FilterExpression": Attr("google_credentials").exists()}
+        users = []
+        while True:
+            response = await table.scan(**scan_kwargs)
+            users.extend(UserInDB.model_validate(item) for item in response.get("Items", []))
+            last_evaluated_key = response.get("LastEvaluatedKey")
+            if not last_evaluated_key:
+                return users
+            scan_kwargs["ExclusiveStartKey"] = last_evaluated_key
@@ -1,34 +1,143 @@
+import asyncio
 import base64
+import time
+from typing import AsyncIterator, Awaitable, Callable
+
+from googleapiclient.errors import HttpError
 
 from app.models.email import Email
+from app.service.rate_limit import is_quota_error
+
+# Gmail caps a batch at 100 calls and recommends staying at or below 50.
+GMAIL_BATCH_SIZE = 50
+# per-message failures worth another try: rate limits and server errors
+RETRYABLE_STATUSES = (429, 500, 502, 503, 504)
+MESSAGE_FETCH_RETRIES = 3
+MESSAGE_FETCH_BACKOFF_SECONDS = 1.0
 
 
 def decode_emails(service, messages) -> list[Email]:
     decoded_body_list = []
-    for message in messages:
-        msg_id = message['id']
-        msg = service.users().messages().get(
-            userId="me", id=msg_id, format='full').execute()
-        parts = msg['payload']['parts']
-
-        for part in parts:
-            text_part = None
-            nested_parts = part.get('parts', {})
-            if not nested_parts:
-                if part['mimeType'] == 'text/plain':
-                    text_part = part
-
-            for part in nested_parts:
-                if part['mimeType'] == 'text/plain':
-                    text_part = part
-
-            if text_part:
-                text = _decode_body(part)
-                decoded_body_list.append(Email(id=msg_id, body=text))
+    for message_ids in _chunk_ids(messages, GMAIL_BATCH_SIZE):
+        msgs, _ = _fetch_message_batch(service, message_ids)
+        for msg in msgs:
+            decoded_body_list.extend(decode_message(msg))
+
+    return decoded_body_list
+
+
+async def fetch_emails(service, messages, batch_size: int = GMAIL_BATCH_SIZE,
+                       rate_limit: Callable[[int], Awaitable[None]] | None = None,
+                       failed_ids: list[str] | None = None) -> AsyncIterator[Email]:
+    """Fetch and decode messages in Gmail batch requests off the event loop.
+
+    The next batch is requested while the current one is being consumed, and
+    emails are yielded as each batch arrives. `rate_limit` is awaited with
+    the number of messages before each batch is sent.
+
+    Messages that fail with a rate limit or server error are retried with
+    backoff. Ids still failing afterwards are appended to `failed_ids`;
+    a rate limit or quota error that persists is raised.
+    """
+    batches = _chunk_ids(messages, batch_size)
+    if not batches:
+        return
+
+    if rate_limit is not None:
+        await rate_limit(len(batches[0]))
+    pending = asyncio.create_task(
+        asyncio.to_thread(_fetch_message_batch, service, batches[0]))
+    try:
+        for next_ids in batches[1:] + [None]:
+            msgs, failed = await pending
+            if failed_ids is not None:
+                failed_ids.extend(failed)
+            if next_ids is not None:
+                if rate_limit is not None:
+                    await rate_limit(len(next_ids))
+                pending = asyncio.create_task(
+                    asyncio.to_thread(_fetch_message_batch, service, next_ids))
+            for msg in msgs:
+                for email in decode_message(msg):
+                    yield email
+    finally:
+        if not pending.done():
+            pending.cancel()
+
+
+def decode_message(msg) -> list[Email]:
+    decoded_body_list = []
+    msg_id = msg['id']
+    parts = msg['payload']['parts']
+    sender = next((header['value'] for header in msg['payload'].get('headers', [])
+                   if header['name'].lower() == 'from'), None)
+
+    for part in parts:
+        text_part = None
+        nested_parts = part.get('parts', {})
+        if not nested_parts:
+            if part['mimeType'] == 'text/plain':
+                text_part = part
+
+        for part in nested_parts:
+            if part['mimeType'] == 'text/plain':
+                text_part = part
+
+        if text_part:
+            text = _decode_body(part)
+            decoded_body_list.append(Email(id=msg_id, body=text, sender=sender))
 
     return decoded_body_list
 
 
+def _chunk_ids(messages, size: int) -> list[list[str]]:
+    message_ids = [message['id'] for message in messages]
+    return [message_ids[i:i + size] for i in range(0, len(message_ids), size)]
+
+
+def _retryable(error: Exception) -> bool:
+    return isinstance(error, HttpError) and (
+        error.resp.status in RETRYABLE_STATUSES or is_quota_error(error))
+
+
+def _fetch_message_batch(service, message_ids: list[str]) -> tuple[list[dict], list[str]]:
+    """Returns the fetched messages in order and the ids that failed."""
+    responses = {}
+    errors = {}
+
+    def callback(request_id, response, exception):
+        if isinstance(exception, HttpError) and exception.resp.status == 404:
+            # deleted since it was listed; there is nothing left to import
+            errors.pop(request_id, None)
+            return
+        if exception is not None:
+            errors[request_id] = exception
+            return
+        errors.pop(request_id, None)
+        responses[request_id] = response
+
+    pending = message_ids
+    for attempt in range(MESSAGE_FETCH_RETRIES + 1):
+        batch = service.new_batch_http_request(callback=callback)
+        for msg_id in pending:
+            batch.add(service.users().messages().get(
+                userId="me", id=msg_id, format='full'), request_id=msg_id)
+        batch.execute()
+
+        pending = [msg_id for msg_id, error in errors.items() if _retryable(error)]
+        if not pending or attempt == MESSAGE_FETCH_RETRIES:
+            break
+        time.sleep(MESSAGE_FETCH_BACKOFF_SECONDS * 2 ** attempt)
+
+    for msg_id, error in errors.items():
+        # raised so the caller backs off rather than skip the rest of the mailbox
+        if is_quota_error(error):
+            raise error
+        print(f"Failed to fetch message {msg_id}: {error}")
+
+    return [responses[msg_id] for msg_id in message_ids if msg_id in responses], list(errors)
+
+
 def _decode_body(part) -> str:
     data = part['body']['data']
     byte_code = base64.urlsafe_b64decode(data)
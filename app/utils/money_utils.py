@@ -0,0 +1,129 @@
+import os
+import re
+from decimal import Decimal, InvalidOperation
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+DEFAULT_CURRENCY = os.getenv("DEFAULT_CURRENCY", "USD")
+
+# active ISO 4217 codes
+ISO_4217_CURRENCIES = frozenset("""
+    AED AFN ALL AMD ANG AOA ARS AUD AWG AZN BAM BBD BDT BGN BHD BIF BMD BND BOB
+    BRL BSD BTN BWP BYN BZD CAD CDF CHF CLP CNY COP CRC CUP CVE CZK DJF DKK DOP
+    DZD EGP ERN ETB EUR FJD FKP GBP GEL GHS GIP GMD GNF GTQ GYD HKD HNL HTG HUF
+    IDR ILS INR IQD IRR ISK JMD JOD JPY KES KGS KHR KMF KPW KRW KWD KYD KZT LAK
+    LBP LKR LRD LSL LYD MAD MDL MGA MKD MMK MNT MOP MRU MUR MVR MWK MXN MYR MZN
+    NAD NGN NIO NOK NPR NZD OMR PAB PEN PGK PHP PKR PLN PYG QAR RON RSD RUB RWF
+    SAR SBD SCR SDG SEK SGD SHP SLE SOS SRD SSP STN SVC SYP SZL THB TJS TMT TND
+    TOP TRY TTD TWD TZS UAH UGX USD UYU UZS VES VND VUV WST XAF XCD XOF XPF YER
+    ZAR ZMW ZWL
+""".split())
+# ISO 4217 minor-unit exponents that differ from the usual 2
+CURRENCY_EXPONENTS = {
+    "BIF": 0, "CLP": 0, "DJF": 0, "GNF": 0, "ISK": 0, "JPY": 0, "KMF": 0, "KRW": 0,
+    "PYG": 0, "RWF": 0, "UGX": 0, "VND": 0, "VUV": 0, "XAF": 0, "XOF": 0, "XPF": 0,
+    "BHD": 3, "IQD": 3, "JOD": 3, "KWD": 3, "LYD": 3, "OMR": 3, "TND": 3,
+}
+CURRENCY_SYMBOLS = {"$": "USD", "€": "EUR", "£": "GBP", "¥": "JPY", "₩": "KRW", "₹": "INR"}
+
+_CURRENCY_CODE = re.compile(r"\b([A-Za-z]{3})\b")
+# digits with any thousands or decimal separators between them
+_NUMBER = re.compile(r"\d(?:[\d.,' ]*\d)?")
+
+
+def currency_exponent(currency: str) -> int:
+    return CURRENCY_EXPONENTS.get(currency, 2)
+
+
+def normalize_currency(code: str) -> str | None:
+    """The ISO 4217 code for `code` in any case, or None when it is not one."""
+    code = code.strip().upper()
+    return code if code in ISO_4217_CURRENCIES else None
+
+
+def detect_currency(text: str) -> str | None:
+    """Finds an ISO code ("12.00 EUR") or a currency symbol ("€12") in text."""
+    for word in _CURRENCY_CODE.findall(text):
+        if word.isupper() and word in ISO_4217_CURRENCIES:
+            return word
+    return next((code for symbol, code in CURRENCY_SYMBOLS.items() if symbol in text), None)
+
+
+def _parse_number(token: str) -> Decimal | None:
+    last_comma, last_dot = token.rfind(","), token.rfind(".")
+    if last_comma >= 0 and last_dot >= 0:
+        # "1.234,50" and "1,234.50": the last separator is the decimal one
+        decimal_separator = "," if last_comma > last_dot else "."
+    elif last_comma >= 0:
+        # "12,50" is a decimal comma; "5,000" and "1,234,567" group thousands
+        decimal_separator = "," if token.count(",") == 1 and len(token) - last_comma - 1 != 3 else None
+    elif last_dot >= 0:
+        decimal_separator = "." if token.count(".") == 1 else None
+    else:
+        decimal_separator = None
+
+    integer, fraction = token.rsplit(decimal_separator, 1) if decimal_separator else (token, "")
+    if fraction and not fraction.isdigit():
+        return None
+    groups = re.split(r"[.,' ]", integer)
+    if len(groups) > 1 and (len(groups[0]) > 3 or any(len(group) != 3 for group in groups[1:])):
+        return None
+    return Decimal("".join(groups) + (f".{fraction}" if fraction else ""))
+
+
+def parse_amount(value) -> Decimal | None:
+    """Parses a legacy amount ("100.50", "$1,234.00", "12,50 €", 4.5) into a
+    decimal in major units. Returns None unless it holds exactly one number."""
+    if isinstance(value, (int, float, Decimal)) and not isinstance(value, bool):
+        try:
+            amount = Decimal(str(value))
+        except InvalidOperation:
+            return None
+        return amount if amount.is_finite() else None
+    if not isinstance(value, str):
+        return None
+
+    text = value.strip()
+    numbers = list(_NUMBER.finditer(text))
+    if len(numbers) != 1:
+        return None
+    amount = _parse_number(numbers[0].group())
+    if amount is None:
+        return None
+    # "(12.00)" is how statements write a negative amount
+    negative = "-" in text[:numbers[0].start()] or (text.startswith("(") and text.endswith(")"))
+    return -amount if negative else amount
+
+
+def to_minor(amount: Decimal, currency: str) -> int:
+    """Major units to minor units of `currency`; extra decimals are rounded half-even."""
+    return int(amount.scaleb(currency_exponent(currency)).to_integral_value())
+
+
+def parse_money(value, currency: str | None = None) -> tuple[int, str] | None:
+    """Parses a legacy amount into (minor units, currency code), scaled by
+    `currency` or else the currency named in the text, or the default.
+    Returns None when the amount or the currency cannot be read."""
+    if currency is None and isinstance(value, str):
+        currency = detect_currency(value)
+    currency = normalize_currency(currency) if currency else DEFAULT_CURRENCY
+    amount = parse_amount(value)
+    if amount is None or currency is None:
+        return None
+    return to_minor(amount, currency), currency
+
+
+def format_minor(minor: int, currency: str) -> str:
+    """Formats minor units as a plain decimal string, e.g. 10050 -> "100.50"."""
+    exponent = currency_exponent(currency)
+    if exponent == 0:
+        return str(minor)
+    sign = "-" if minor < 0 else ""
+    units, cents = divmod(abs(minor), 10 ** exponent)
+    return f"{sign}{units}.{cents:0{exponent}d}"
+
+
+def minor_to_decimal(minor: int, currency: str) -> Decimal:
+    return Decimal(minor).scaleb(-currency_exponent(currency))
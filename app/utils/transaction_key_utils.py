@@ -0,0 +1,89 @@
+import secrets
+import threading
+import time
+from datetime import date, datetime
+
+from dateutil.parser import ParserError, parse as parse_date
+
+# Crockford base32, the ULID alphabet; it is ordered so encoded ids sort the
+# same way as the numbers they encode
+ULID_ALPHABET = "0123456789ABCDEFGHJKMNPQRSTVWXYZ"
+ULID_RANDOM_BITS = 80
+
+ISO_DATE_FORMAT = "%Y-%m-%d"
+# stored dates are MM/DD/YYYY (what the Gemini prompt and the bank parsers
+# produce); ISO dates come from clients that already send them normalized
+KNOWN_DATE_FORMATS = ("%m/%d/%Y", ISO_DATE_FORMAT)
+# sorts before every real date, so undated transactions come last in
+# newest-first listings and never match a date range
+UNDATED = "0000-00-00"
+DATE_KEY_SEPARATOR = "#"
+
+_ulid_lock = threading.Lock()
+_last_ulid = (0, 0)
+
+
+def new_ulid() -> str:
+    """Returns a 26 character ULID: 48 bits of millisecond timestamp followed
+    by 80 random bits. Ids generated within the same millisecond increment the
+    random part, so ids from one process are strictly increasing."""
+    global _last_ulid
+    with _ulid_lock:
+        timestamp_ms = time.time_ns() // 1_000_000
+        last_ms, last_random = _last_ulid
+        if timestamp_ms <= last_ms:
+            timestamp_ms, random_part = last_ms, last_random + 1
+            if random_part >> ULID_RANDOM_BITS:
+                # random part overflowed; borrow the next millisecond
+                timestamp_ms, random_part = last_ms + 1, secrets.randbits(ULID_RANDOM_BITS)
+        else:
+            random_part = secrets.randbits(ULID_RANDOM_BITS)
+        _last_ulid = (timestamp_ms, random_part)
+
+    value = (timestamp_ms << ULID_RANDOM_BITS) | random_part
+    chars = []
+    for _ in range(26):
+        chars.append(ULID_ALPHABET[value & 0x1F])
+        value >>= 5
+    return "".join(reversed(chars))
+
+
+def normalize_date(value: str | date | None) -> str | None:
+    """Returns `value` as an ISO-8601 date (YYYY-MM-DD), or None when it is
+    missing or cannot be parsed."""
+    if not value:
+        return None
+    if isinstance(value, date):
+        return value.isoformat()
+    value = value.strip()
+    for date_format in KNOWN_DATE_FORMATS:
+        try:
+            return datetime.strptime(value, date_format).strftime(ISO_DATE_FORMAT)
+        except ValueError:
+            continue
+    try:
+        return parse_date(value).strftime(ISO_DATE_FORMAT)
+    except (ParserError, OverflowError, ValueError):
+        return None
+
+
+def parse_legacy_date(value: str) -> date | None:
+    # MM/DD/YYYY is by far the most common legacy form; skip strptime for it
+    if len(value) == 10 and value[2] == "/" and value[5] == "/":
+        try:
+            return date(int(value[6:]), int(value[:2]), int(value[3:5]))
+        except ValueError:
+            return None
+    normalized = normalize_date(value)
+    return date.fromisoformat(normalized) if normalized else None
+
+
+def transaction_date_key(date: str | date | None, transaction_id: str) -> str:
+    """Sort key of the date index: the normalized date followed by the
+    transaction id, so keys sort by date and stay unique per user."""
+    return f"{normalize_date(date) or UNDATED}{DATE_KEY_SEPARATOR}{transaction_id}"
+
+
+def date_key_upper_bound(date: str) -> str:
+    """Smallest string greater than every date key on `date`."""
+    return f"{date}{chr(ord(DATE_KEY_SEPARATOR) + 1)}"
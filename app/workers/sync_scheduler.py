@@ -0,0 +1,305 @@
+"""Sync every linked user's Gmail on a schedule.
+
+    python -m app.workers.sync_scheduler [--interval SECONDS] [--concurrency N]
+                                         [--renewal-interval SECONDS] [--once]
+
+Runs as its own process next to the API. Linked users (those with Google
+credentials) are read from the User table every interval. Each user is
+synced about once per interval, at a jittered time so users linked
+together do not stay in lockstep, and always the most overdue user first.
+At most --concurrency syncs run at once.
+
+Gmail calls go through a global and a per-user token bucket and Gemini
+calls through a global one. A quota error pauses that API's bucket and
+backs the user off exponentially; other failures back the user off from
+the interval. Throughput is printed every minute.
+
+Every --renewal-interval it also renews the Gmail watches that expire
+within a day, so push notifications keep coming for mailboxes that have
+not synced lately.
+
+Events for the transactions it creates are left in the outbox for the
+API's relay, which polls it.
+"""
+import argparse
+import asyncio
+import heapq
+import os
+import random
+import time
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from typing import Awaitable, Callable
+
+from dotenv import load_dotenv
+
+from app.models.sync_job import SyncJob
+from app.service.dynamodb import DynamoDBPool
+from app.service.extraction_cache import create_extraction_cache
+from app.service.gmail_push import renew_watches
+from app.service.gmail_service import GmailClientCache
+from app.service.rate_limit import SyncRateLimits, quota_error_api
+from app.service.sync_jobs import ExpenseSync, SyncHandler
+from app.service.user_db import UserDB
+from app.utils.transaction_key_utils import new_ulid
+
+load_dotenv()
+
+SYNC_INTERVAL_SECONDS = float(os.getenv("SYNC_INTERVAL_SECONDS", str(15 * 60)))
+SYNC_SCHEDULER_CONCURRENCY = int(os.getenv("SYNC_SCHEDULER_CONCURRENCY", "8"))
+# each user's next sync lands within this fraction of the interval
+SYNC_INTERVAL_JITTER = 0.2
+SYNC_MAX_BACKOFF_SECONDS = 6 * 3600
+QUOTA_PAUSE_SECONDS = 60
+# calls per second; Gmail allows 250 quota units per user per second and a
+# message read costs 5
+SYNC_GMAIL_RATE = float(os.getenv("SYNC_GMAIL_RATE", "100"))
+SYNC_GMAIL_USER_RATE = float(os.getenv("SYNC_GMAIL_USER_RATE", "40"))
+SYNC_GEMINI_RATE = float(os.getenv("SYNC_GEMINI_RATE", "2"))
+METRICS_INTERVAL_SECONDS = 60
+WATCH_RENEWAL_INTERVAL_SECONDS = float(os.getenv("WATCH_RENEWAL_INTERVAL_SECONDS", "3600"))
+
+
+@dataclass
+class SchedulerStats:
+    users_synced: int = 0
+    emails: int = 0
+    transactions: int = 0
+    failures: int = 0
+    quota_errors: int = 0
+    watches_renewed: int = 0
+    started: float = field(default_factory=time.monotonic)
+
+    def rates(self, since: "SchedulerStats | None" = None) -> dict:
+        """Per-minute throughput since start, or since the `since` snapshot."""
+        base = since or SchedulerStats(started=self.started)
+        minutes = max(time.monotonic() - base.started, 1e-9) / 60
+        return {
+            "users_per_min": (self.users_synced - base.users_synced) / minutes,
+            "emails_per_min": (self.emails - base.emails) / minutes,
+            "transactions_per_min": (self.transactions - base.transactions) / minutes,
+            "failures": self.failures - base.failures,
+            "quota_errors": self.quota_errors - base.quota_errors,
+            "watches_renewed": self.watches_renewed - base.watches_renewed,
+        }
+
+    def snapshot(self) -> "SchedulerStats":
+        return SchedulerStats(self.users_synced, self.emails, self.transactions,
+                              self.failures, self.quota_errors, self.watches_renewed, time.monotonic())
+
+
+class SyncScheduler:
+    """Runs `handler` for every user `list_user_ids` returns, repeatedly.
+
+    Due times are kept in a heap, so whichever user has waited longest is
+    synced next and a user is never queued twice; a user is rescheduled
+    only once their sync finished.
+
+    `renew_watches`, when given, runs every `renewal_interval` in the
+    background, one pass at a time, and returns how many watches it renewed.
+    """
+
+    def __init__(self, handler: SyncHandler, list_user_ids: Callable[[], Awaitable[list[str]]],
+                 rate_limits: SyncRateLimits | None = None,
+                 renew_watches: Callable[[], Awaitable[int]] | None = None,
+                 renewal_interval: float = WATCH_RENEWAL_INTERVAL_SECONDS,
+                 interval: float = SYNC_INTERVAL_SECONDS,
+                 concurrency: int = SYNC_SCHEDULER_CONCURRENCY,
+                 jitter: float = SYNC_INTERVAL_JITTER,
+                 max_backoff: float = SYNC_MAX_BACKOFF_SECONDS,
+                 quota_pause: float = QUOTA_PAUSE_SECONDS,
+                 rng: random.Random | None = None):
+        self.handler = handler
+        self.list_user_ids = list_user_ids
+        self.rate_limits = rate_limits
+        self.renew_watches = renew_watches
+        self.renewal_interval = renewal_interval
+        self.interval = interval
+        self.concurrency = concurrency
+        self.jitter = jitter
+        self.max_backoff = max_backoff
+        self.quota_pause = quota_pause
+        self.rng = rng or random.Random()
+        self.stats = SchedulerStats()
+        self._due: list[tuple[float, str]] = []
+        self._users: set[str] = set()
+        # users with an entry in the heap or a sync running
+        self._tracked: set[str] = set()
+        self._failures: dict[str, int] = {}
+        self._running: set[asyncio.Task] = set()
+        self._renewal: asyncio.Task | None = None
+
+    async def refresh_users(self):
+        """Starts scheduling new users, spread over the first interval, and
+        stops scheduling users no longer returned."""
+        user_ids = set(await self.list_user_ids())
+        now = time.monotonic()
+        for user_id in user_ids - self._tracked:
+            heapq.heappush(self._due, (now + self.rng.uniform(0, self.interval), user_id))
+            self._tracked.add(user_id)
+        for user_id in self._users - user_ids:
+            self._failures.pop(user_id, None)
+            if self.rate_limits is not None:
+                self.rate_limits.forget(user_id)
+        self._users = user_ids
+
+    def _jittered(self, seconds: float) -> float:
+        return seconds * self.rng.uniform(1 - self.jitter, 1 + self.jitter)
+
+    def _backoff(self, user_id: str, quota: bool) -> float:
+        failures = self._failures[user_id]
+        base = self.quota_pause if quota else self.interval
+        return min(base * 2 ** (failures - 1 if quota else failures), self.max_backoff)
+
+    async def sync_user(self, user_id: str) -> bool:
+        counters = {}
+
+        async def progress(**fields):
+            counters.update(fields)
+
+        now = datetime.now(timezone.utc)
+        job = SyncJob(job_id=f"scheduled_{new_ulid()}", user_id=user_id, created_at=now, updated_at=now)
+        try:
+            await self.handler(job, progress)
+        except Exception as e:
+            self._failures[user_id] = self._failures.get(user_id, 0) + 1
+            api = quota_error_api(e)
+            if api is not None:
+                self.stats.quota_errors += 1
+                if self.rate_limits is not None:
+                    self.rate_limits.pause(api, self.quota_pause)
+            else:
+                self.stats.failures += 1
+            delay = self._backoff(user_id, quota=api is not None)
+            print(f"Scheduled sync for {user_id} failed, next try in {delay:.0f}s: {e}")
+            self._reschedule(user_id, delay)
+            return False
+
+        self._failures.pop(user_id, None)
+        self.stats.users_synced += 1
+        self.stats.emails += counters.get("emails_found", 0)
+        self.stats.transactions += counters.get("created", 0)
+        self._reschedule(user_id, self.interval)
+        return True
+
+    async def renew(self) -> int:
+        try:
+            renewed = await self.renew_watches()
+        except Exception as e:
+            print(f"Gmail watch renewal failed: {e}")
+            return 0
+        self.stats.watches_renewed += renewed
+        return renewed
+
+    def _start_renewal(self):
+        # a slow pass is left to finish rather than overlapped
+        if self.renew_watches is not None and (self._renewal is None or self._renewal.done()):
+            self._renewal = asyncio.create_task(self.renew())
+
+    def _reschedule(self, user_id: str, delay: float):
+        if user_id in self._users:
+            heapq.heappush(self._due, (time.monotonic() + self._jittered(delay), user_id))
+        else:
+            self._tracked.discard(user_id)
+
+    async def run(self):
+        """Schedules syncs until cancelled."""
+        await self.refresh_users()
+        semaphore = asyncio.Semaphore(self.concurrency)
+        next_refresh = time.monotonic() + self.interval
+        next_report = time.monotonic() + METRICS_INTERVAL_SECONDS
+        next_renewal = time.monotonic()
+        last_report = self.stats.snapshot()
+
+        try:
+            while True:
+                now = time.monotonic()
+                if now >= next_refresh:
+                    try:
+                        await self.refresh_users()
+                    except Exception as e:
+                        print(f"Failed to read linked users: {e}")
+                    next_refresh = now + self.interval
+                if now >= next_renewal:
+                    self._start_renewal()
+                    next_renewal = now + self.renewal_interval
+                if now >= next_report:
+                    self._report(last_report)
+                    last_report = self.stats.snapshot()
+                    next_report = now + METRICS_INTERVAL_SECONDS
+
+                if not self._due or self._due[0][0] > now:
+                    wake_at = min(next_refresh, next_report, next_renewal,
+                                  self._due[0][0] if self._due else next_refresh)
+                    await asyncio.sleep(max(wake_at - now, 0))
+                    continue
+
+                _, user_id = heapq.heappop(self._due)
+                if user_id not in self._users:
+                    self._tracked.discard(user_id)
+                    continue
+                # wait for a free slot before taking the next user off the heap
+                await semaphore.acquire()
+                task = asyncio.create_task(self.sync_user(user_id))
+                self._running.add(task)
+                task.add_done_callback(self._running.discard)
+                task.add_done_callback(lambda _: semaphore.release())
+        finally:
+            tasks = self._running | ({self._renewal} if self._renewal is not None else set())
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+    async def run_once(self):
+        """Syncs every linked user a single time, straight away."""
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def sync(user_id: str):
+            async with semaphore:
+                await self.sync_user(user_id)
+
+        last_report = self.stats.snapshot()
+        await asyncio.gather(*(sync(user_id) for user_id in await self.list_user_ids()))
+        if self.renew_watches is not None:
+            await self.renew()
+        self._report(last_report)
+
+    def _report(self, since: SchedulerStats):
+        rates = self.stats.rates(since)
+        print(f"synced {rates['users_per_min']:.1f} users/min, {rates['emails_per_min']:.1f} emails/min, "
+              f"{rates['transactions_per_min']:.1f} transactions/min; {rates['failures']} failures, "
+              f"{rates['quota_errors']} quota errors, {rates['watches_renewed']} watches renewed; "
+              f"{len(self._users)} linked users, "
+              f"{len(self._running)} syncing")
+
+
+async def main(args: argparse.Namespace):
+    rate_limits = SyncRateLimits(SYNC_GMAIL_RATE, SYNC_GMAIL_USER_RATE, SYNC_GEMINI_RATE)
+    async with DynamoDBPool() as dynamodb:
+        user_db = UserDB(dynamodb)
+
+        gmail_clients = GmailClientCache()
+
+        async def list_user_ids() -> list[str]:
+            return [user.user_id for user in await user_db.get_linked_users()]
+
+        async def renew() -> int:
+            return await renew_watches(await user_db.get_linked_users(), user_db, gmail_clients)
+
+        handler = ExpenseSync(dynamodb, extraction_cache=create_extraction_cache(dynamodb),
+                              rate_limits=rate_limits, gmail_clients=gmail_clients)
+        scheduler = SyncScheduler(handler, list_user_ids, rate_limits=rate_limits, renew_watches=renew,
+                                  renewal_interval=args.renewal_interval,
+                                  interval=args.interval, concurrency=args.concurrency)
+        await (scheduler.run_once() if args.once else scheduler.run())
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--interval", type=float, default=SYNC_INTERVAL_SECONDS,
+                        help="seconds between a user's syncs")
+    parser.add_argument("--concurrency", type=int, default=SYNC_SCHEDULER_CONCURRENCY)
+    parser.add_argument("--renewal-interval", type=float, default=WATCH_RENEWAL_INTERVAL_SECONDS,
+                        help="seconds between Gmail watch renewal passes")
+    parser.add_argument("--once", action="store_true", help="sync every linked user once and exit")
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,140 @@
+"""/transactions/analytics: per-item models vs. a columnar frame.
+
+    python -m benchmarks.bench_analytics [page_size]
+
+* models: what the endpoint would cost built on the list read, i.e.
+  DB.get_transaction_by_user_id (a TransactionDB per item) followed by plain
+  Python loops over the models
+* columnar: load_frame (projected query straight into NumPy columns) followed
+  by compute_analytics
+
+Runs against the in-memory stand-in in `benchmarks.dynamodb_stub`, which
+returns `page_size` items per page (roughly DynamoDB's 1 MB page for these
+items). Load and compute are timed separately.
+"""
+import asyncio
+import datetime
+import math
+import os
+import random
+import sys
+import time
+from collections import defaultdict
+
+from app.service.dynamodb import DynamoDBPool
+from app.service.transaction_analytics import (
+    ANALYTICS_DAYS,
+    MERCHANT_MIN_HISTORY,
+    MERCHANT_Z_THRESHOLD,
+    compute_analytics,
+    load_frame,
+)
+from app.service.transaction_db import DB, TRANSACTION_TABLE
+from app.service.transaction_rollups import rollup_category
+from benchmarks.dynamodb_stub import DynamoDBStub
+
+TRANSACTION_COUNTS = (10_000, 100_000)
+MERCHANTS = [f"MERCHANT {i:03d}" for i in range(200)]
+TODAY = datetime.date(2025, 6, 30)
+
+
+def seed(stub: DynamoDBStub, user_id: str, count: int):
+    rng = random.Random(count)
+    table = stub.tables.setdefault(TRANSACTION_TABLE, {})
+    for i in range(count):
+        transaction_id = f"txn_{i:08d}"
+        day = (TODAY - datetime.timedelta(days=rng.randrange(3 * 365))).isoformat()
+        cents = rng.randrange(100, 20_000)
+        title = rng.choice(MERCHANTS)
+        table[(user_id, transaction_id)] = {
+            'user_id': {'S': user_id},
+            'transaction_id': {'S': transaction_id},
+            'title': {'S': title},
+            'date': {'S': day},
+            'date_key': {'S': f"{day}#{transaction_id}"},
+            'amount': {'S': f"{cents // 100}.{cents % 100:02d}"},
+            'amount_minor': {'N': str(cents)},
+            'currency': {'S': "USD"},
+            'description': {'S': f"Chase: {title}"},
+            'status': {'BOOL': False},
+        }
+
+
+def analytics_from_models(transactions, today: datetime.date, days: int) -> dict:
+    monthly = defaultdict(int)
+    daily = defaultdict(int)
+    merchants = defaultdict(list)
+    for transaction in transactions:
+        if transaction.date is None or transaction.amount_minor is None:
+            continue
+        monthly[transaction.date.isoformat()[:7]] += transaction.amount_minor
+        daily[transaction.date] += transaction.amount_minor
+        merchants[rollup_category(transaction.title)].append(transaction)
+
+    rolling = []
+    for offset in range(days - 1, -1, -1):
+        day = today - datetime.timedelta(days=offset)
+        window = [daily.get(day - datetime.timedelta(days=back), 0) for back in range(30)]
+        rolling.append((day, daily.get(day, 0), sum(window[:7]) / 7, sum(window) / 30))
+
+    anomalies = []
+    for group in merchants.values():
+        if len(group) <= MERCHANT_MIN_HISTORY:
+            continue
+        total = sum(t.amount_minor for t in group)
+        squares = sum(t.amount_minor ** 2 for t in group)
+        others = len(group) - 1
+        for transaction in group:
+            amount = transaction.amount_minor
+            mean = (total - amount) / others
+            variance = (squares - amount ** 2) / others - mean ** 2
+            if variance > 0 and (amount - mean) / math.sqrt(variance) > MERCHANT_Z_THRESHOLD:
+                anomalies.append(transaction)
+    return {
+        'monthly': dict(monthly),
+        'daily': rolling,
+        'merchants': sorted(((m, sum(t.amount_minor for t in g)) for m, g in merchants.items()),
+                            key=lambda pair: -pair[1])[:20],
+        'anomalies': anomalies,
+    }
+
+
+async def timed(coro) -> tuple[float, object]:
+    start = time.perf_counter()
+    result = await coro
+    return time.perf_counter() - start, result
+
+
+async def main(page_size: int):
+    os.environ.setdefault("AWS_ACCESS_KEY_ID", "bench")
+    os.environ.setdefault("AWS_SECRET_ACCESS_KEY", "bench")
+    stub = DynamoDBStub(page_size=page_size)
+    endpoint_url = await stub.start()
+    try:
+        async with DynamoDBPool(endpoint_url=endpoint_url) as dynamodb:
+            db = DB(dynamodb)
+            print(f"{page_size} items per page, last {ANALYTICS_DAYS} days")
+            for count in TRANSACTION_COUNTS:
+                user_id = f"bench{count}"
+                seed(stub, user_id, count)
+
+                load, transactions = await timed(db.get_transaction_by_user_id(user_id))
+                start = time.perf_counter()
+                analytics_from_models(transactions, TODAY, ANALYTICS_DAYS)
+                compute = time.perf_counter() - start
+                models = load + compute
+                print(f"{count:>7} models    load {load * 1000:8.0f}ms  compute {compute * 1000:8.0f}ms")
+
+                load, frame = await timed(load_frame(dynamodb, user_id))
+                start = time.perf_counter()
+                compute_analytics(frame, today=TODAY)
+                compute = time.perf_counter() - start
+                columnar = load + compute
+                print(f"{count:>7} columnar  load {load * 1000:8.0f}ms  compute {compute * 1000:8.0f}ms"
+                      f"  ({models / columnar:.1f}x overall)")
+    finally:
+        await stub.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main(int(sys.argv[1]) if len(sys.argv) > 1 else 4_000))
@@ -0,0 +1,104 @@
+"""/transactions/me latency under load with different auth strategies.
+
+    python -m benchmarks.bench_auth_cache [requests] [concurrency] [latency_ms]
+
+* user lookup per request: get_current_user reads the User table every time
+  (the behaviour before UserCache)
+* cached user lookup: get_current_user backed by UserCache
+* claims only: get_current_user_id, what /transactions/me uses now
+
+Runs in-process against the DynamoDB stand-in; needs the same environment
+variables as the app (TOKEN_KEY, ENCRYPTION_KEY, GOOGLE_CREDENTIALS_B64).
+"""
+import asyncio
+import os
+import sys
+import time
+
+import httpx
+from fastapi import Depends, FastAPI
+
+from app.models.auth import UserInDB
+from app.routers import transaction
+from app.routers.auth import create_access_token, get_current_user, get_current_user_id
+from app.service.dynamodb import DynamoDBPool
+from app.service.transaction_db import TRANSACTION_TABLE
+from app.service.user_cache import UserCache
+from app.service.user_db import USER_TABLE_NAME
+from benchmarks.dynamodb_stub import DynamoDBStub
+
+
+async def user_id_from_user(user: UserInDB = Depends(get_current_user)) -> str:
+    return user.user_id
+
+
+def build_app(dynamodb: DynamoDBPool, user_cache: UserCache | None, claims_only: bool) -> FastAPI:
+    app = FastAPI()
+    app.include_router(transaction.router)
+    app.state.dynamodb = dynamodb
+    app.state.user_cache = user_cache
+    if not claims_only:
+        app.dependency_overrides[get_current_user_id] = user_id_from_user
+    return app
+
+
+async def run_load(app: FastAPI, token: str, requests: int, concurrency: int) -> list[float]:
+    samples = []
+    queue = iter(range(requests))
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        async def worker():
+            for _ in queue:
+                start = time.perf_counter()
+                response = await client.get(
+                    "/transactions/me", headers={"Authorization": f"Bearer {token}"})
+                response.raise_for_status()
+                samples.append(time.perf_counter() - start)
+
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return sorted(samples)
+
+
+def report(label: str, samples: list[float], elapsed: float, cache: UserCache | None):
+    p50 = samples[len(samples) // 2] * 1000
+    p99 = samples[int(len(samples) * 0.99) - 1] * 1000
+    hit_ratio = f"{cache.stats()['hit_ratio']:.3f}" if cache else "-"
+    print(f"{label:<26} {len(samples) / elapsed:7.0f} req/s  p50={p50:6.2f}ms  "
+          f"p99={p99:6.2f}ms  cache hit ratio={hit_ratio}")
+
+
+async def main(requests: int, concurrency: int, latency: float):
+    os.environ.setdefault("AWS_ACCESS_KEY_ID", "bench")
+    os.environ.setdefault("AWS_SECRET_ACCESS_KEY", "bench")
+    stub = DynamoDBStub(latency=latency)
+    endpoint_url = await stub.start()
+    try:
+        async with DynamoDBPool(endpoint_url=endpoint_url) as dynamodb:
+            await (await dynamodb.table(USER_TABLE_NAME)).put_item(
+                Item={"user_id": "bench", "hashed_password": "x"})
+            transactions = await dynamodb.table(TRANSACTION_TABLE)
+            for i in range(20):
+                await transactions.put_item(Item={
+                    "user_id": "bench", "transaction_id": f"txn_{i:03d}",
+                    "title": "Coffee", "amount": "4.50", "status": False})
+
+            token = create_access_token({"sub": "bench"})
+            print(f"{requests} requests, concurrency {concurrency}, "
+                  f"simulated DynamoDB latency {latency * 1000:.0f}ms")
+            for label, cache, claims_only in [
+                ("user lookup per request", None, False),
+                ("cached user lookup", UserCache(), False),
+                ("claims only", None, True),
+            ]:
+                app = build_app(dynamodb, cache, claims_only)
+                start = time.perf_counter()
+                samples = await run_load(app, token, requests, concurrency)
+                report(label, samples, time.perf_counter() - start, cache)
+    finally:
+        await stub.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main(int(sys.argv[1]) if len(sys.argv) > 1 else 1000,
+                     int(sys.argv[2]) if len(sys.argv) > 2 else 20,
+                     float(sys.argv[3]) / 1000 if len(sys.argv) > 3 else 0.003))
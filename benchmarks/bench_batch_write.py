@@ -0,0 +1,67 @@
+"""Gmail import throughput: sequential put_item vs. the batched import.
+
+The import commits each transaction together with its outbox record, 50
+per TransactWriteItems call.
+
+    python -m benchmarks.bench_batch_write [latency_ms]
+
+Runs against the in-memory stand-in in `benchmarks.dynamodb_stub` with a
+simulated per-request latency so the round-trip savings are visible offline.
+"""
+import asyncio
+import os
+import sys
+import time
+
+from app.models.transaction import TransactionDB
+from app.service.dynamodb import DynamoDBPool
+from app.service.transaction_db import TRANSACTION_TABLE, DB
+from benchmarks.dynamodb_stub import DynamoDBStub
+
+ITEM_COUNTS = (25, 100, 500)
+
+
+def make_transactions(count: int) -> list[TransactionDB]:
+    return [
+        TransactionDB(user_id="bench", transaction_id=f"msg_{i:05d}",
+                      title="Coffee", date="2025-02-05", amount_minor=450, currency="USD",
+                      description="Bench transaction", status=False)
+        for i in range(count)
+    ]
+
+
+async def sequential_put(dynamodb: DynamoDBPool, transactions: list[TransactionDB]):
+    table = await dynamodb.table(TRANSACTION_TABLE)
+    for transaction in transactions:
+        await table.put_item(Item=transaction.model_dump())
+
+
+async def main(latency: float):
+    os.environ.setdefault("AWS_ACCESS_KEY_ID", "bench")
+    os.environ.setdefault("AWS_SECRET_ACCESS_KEY", "bench")
+    stub = DynamoDBStub(latency=latency)
+    endpoint_url = await stub.start()
+    try:
+        async with DynamoDBPool(endpoint_url=endpoint_url) as dynamodb:
+            db = DB(dynamodb)
+            print(f"simulated latency {latency * 1000:.0f}ms per request")
+            for count in ITEM_COUNTS:
+                transactions = make_transactions(count)
+
+                start = time.perf_counter()
+                await sequential_put(dynamodb, transactions)
+                sequential = time.perf_counter() - start
+
+                start = time.perf_counter()
+                await db.create_transaction_from_gmail(transactions)
+                batched = time.perf_counter() - start
+
+                print(f"{count:>5} items  put_item {count / sequential:8.0f} items/s"
+                      f"  import {count / batched:8.0f} items/s"
+                      f"  ({sequential / batched:.1f}x)")
+    finally:
+        await stub.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main(float(sys.argv[1]) / 1000 if len(sys.argv) > 1 else 0.005))
@@ -0,0 +1,66 @@
+"""Per-request latency of a DynamoDB call: new resource per call vs. DynamoDBPool.
+
+    python -m benchmarks.bench_dynamodb_pool [requests]
+
+Runs against the in-memory stand-in in `benchmarks.dynamodb_stub`, so it needs
+no AWS access; dummy credentials are set if none are configured.
+"""
+import asyncio
+import os
+import statistics
+import sys
+import time
+
+import aioboto3
+
+from app.service.dynamodb import DYNAMODB_REGION, DynamoDBPool
+from app.service.user_db import USER_TABLE_NAME, UserDB
+from benchmarks.dynamodb_stub import DynamoDBStub
+
+
+def report(label: str, samples: list[float]):
+    samples = sorted(samples)
+    p50 = samples[len(samples) // 2] * 1000
+    p99 = samples[int(len(samples) * 0.99) - 1] * 1000
+    print(f"{label:<28} mean={statistics.mean(samples) * 1000:7.2f}ms "
+          f"p50={p50:7.2f}ms p99={p99:7.2f}ms")
+
+
+async def per_call_resource(endpoint_url: str, requests: int) -> list[float]:
+    samples = []
+    for _ in range(requests):
+        start = time.perf_counter()
+        session = aioboto3.Session()
+        async with session.resource("dynamodb", region_name=DYNAMODB_REGION,
+                                    endpoint_url=endpoint_url) as dynamodb:
+            table = await dynamodb.Table(USER_TABLE_NAME)
+            await table.get_item(Key={"user_id": "bench"})
+        samples.append(time.perf_counter() - start)
+    return samples
+
+
+async def pooled_resource(endpoint_url: str, requests: int) -> list[float]:
+    samples = []
+    async with DynamoDBPool(endpoint_url=endpoint_url) as dynamodb:
+        await (await dynamodb.table(USER_TABLE_NAME)).get_item(Key={"user_id": "bench"})
+        for _ in range(requests):
+            start = time.perf_counter()
+            await UserDB(dynamodb).get_user_by_userid("bench")
+            samples.append(time.perf_counter() - start)
+    return samples
+
+
+async def main(requests: int):
+    os.environ.setdefault("AWS_ACCESS_KEY_ID", "bench")
+    os.environ.setdefault("AWS_SECRET_ACCESS_KEY", "bench")
+    stub = DynamoDBStub()
+    endpoint_url = await stub.start()
+    try:
+        report("session.resource per call", await per_call_resource(endpoint_url, requests))
+        report("DynamoDBPool", await pooled_resource(endpoint_url, requests))
+    finally:
+        await stub.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main(int(sys.argv[1]) if len(sys.argv) > 1 else 200))
@@ -0,0 +1,114 @@
+"""Cost of getting a GmailService for a request or sync.
+
+    python -m benchmarks.bench_gmail_client [iterations] [concurrency]
+
+* build per call: decrypt and parse the stored credentials, then
+  googleapiclient's build() (the behaviour before GmailClientCache)
+* static document: the same, but built from the discovery document parsed
+  once (build_gmail_client)
+* cache hit: GmailClientCache.get for a user whose credentials are cached,
+  then building that service's own client from the parsed document
+
+Then `concurrency` callers ask for a user with expired credentials at the
+same time, with a refresh that takes 100ms; the cache refreshes once.
+
+No network is used. Needs the same environment variables as the app
+(TOKEN_KEY, ENCRYPTION_KEY, GOOGLE_CREDENTIALS_B64).
+"""
+import asyncio
+import json
+import sys
+import time
+from datetime import datetime, timedelta, timezone
+from unittest.mock import AsyncMock, patch
+
+from google.oauth2.credentials import Credentials
+from googleapiclient.discovery import build
+
+from app.models.auth import UserInDB
+from app.service.gmail_service import GmailClientCache, build_gmail_client, credentials_from_blob
+from app.service.user_db import UserDB
+from app.utils.encrytion_utils import decrypt_credentials, encrypt_credentials
+
+
+def linked_user(expires_in: timedelta) -> UserInDB:
+    blob = encrypt_credentials(json.dumps({
+        "token": "token", "refresh_token": "refresh", "token_uri": "https://oauth2.googleapis.com/token",
+        "client_id": "client", "client_secret": "secret",
+        "scopes": ["https://www.googleapis.com/auth/gmail.readonly"],
+        "expiry": (datetime.now(timezone.utc) + expires_in).isoformat(),
+    }))
+    return UserInDB(user_id="bench", hashed_password="x", google_credentials=blob)
+
+
+def build_per_call(user: UserInDB):
+    creds_data = json.loads(decrypt_credentials(user.google_credentials))
+    creds = Credentials(
+        token=creds_data.get("token"),
+        refresh_token=creds_data.get("refresh_token"),
+        token_uri=creds_data.get("token_uri"),
+        client_id=creds_data.get("client_id"),
+        client_secret=creds_data.get("client_secret"),
+        scopes=creds_data.get("scopes"),
+    )
+    return build("gmail", "v1", credentials=creds, static_discovery=True)
+
+
+def static_document(user: UserInDB):
+    return build_gmail_client(credentials_from_blob(user.google_credentials))
+
+
+def report(label: str, elapsed: float, iterations: int):
+    print(f"{label:<18} {elapsed / iterations * 1e6:9.1f} us/call")
+
+
+async def concurrent_refresh(concurrency: int):
+    refreshes = 0
+
+    def refresh(creds, request):
+        nonlocal refreshes
+        refreshes += 1
+        time.sleep(0.1)
+        creds.token = "fresh"
+        creds.expiry = datetime.now(timezone.utc).replace(tzinfo=None) + timedelta(hours=1)
+
+    clients = GmailClientCache()
+    user = linked_user(-timedelta(minutes=5))
+    with patch.object(Credentials, "refresh", autospec=True, side_effect=refresh):
+        start = time.perf_counter()
+        await asyncio.gather(*(clients.get(user, AsyncMock(spec=UserDB)) for _ in range(concurrency)))
+        elapsed = time.perf_counter() - start
+    print(f"{concurrency} concurrent callers, expired credentials: "
+          f"{refreshes} refresh, {elapsed * 1000:.0f}ms")
+
+
+async def main(iterations: int, concurrency: int):
+    user = linked_user(timedelta(hours=1))
+    # warm up imports and the discovery document cache
+    build_per_call(user)
+    static_document(user)
+
+    start = time.perf_counter()
+    for _ in range(iterations):
+        build_per_call(user)
+    report("build per call", time.perf_counter() - start, iterations)
+
+    start = time.perf_counter()
+    for _ in range(iterations):
+        static_document(user)
+    report("static document", time.perf_counter() - start, iterations)
+
+    clients = GmailClientCache()
+    user_db = AsyncMock(spec=UserDB)
+    await clients.get(user, user_db)
+    start = time.perf_counter()
+    for _ in range(iterations):
+        (await clients.get(user, user_db))._client()
+    report("cache hit", time.perf_counter() - start, iterations)
+
+    await concurrent_refresh(concurrency)
+
+
+if __name__ == "__main__":
+    asyncio.run(main(int(sys.argv[1]) if len(sys.argv) > 1 else 500,
+                     int(sys.argv[2]) if len(sys.argv) > 2 else 20))
@@ -0,0 +1,70 @@
+"""Gmail message fetch: one request per message vs. batched, off-loop fetch.
+
+    python -m benchmarks.bench_gmail_fetch [messages] [latency_ms]
+
+Uses `benchmarks.fake_gmail`, so no Google account is needed. Also reports the
+worst event-loop stall seen by a heartbeat task while the fetch runs.
+"""
+import asyncio
+import sys
+import time
+
+from app.utils.email_utils import decode_message, fetch_emails
+from benchmarks.fake_gmail import FakeGmailService, make_message
+
+
+def sequential_decode(service, messages):
+    # the pre-batching implementation: one blocking get() per message
+    decoded_body_list = []
+    for message in messages:
+        msg = service.users().messages().get(
+            userId="me", id=message["id"], format="full").execute()
+        decoded_body_list.extend(decode_message(msg))
+    return decoded_body_list
+
+
+async def heartbeat(stop: asyncio.Event, interval: float = 0.005) -> float:
+    worst = 0.0
+    while not stop.is_set():
+        start = time.perf_counter()
+        await asyncio.sleep(interval)
+        worst = max(worst, time.perf_counter() - start - interval)
+    return worst
+
+
+async def measure(label: str, service: FakeGmailService, fetch):
+    service.round_trips = 0
+    stop = asyncio.Event()
+    monitor = asyncio.create_task(heartbeat(stop))
+    await asyncio.sleep(0)
+    start = time.perf_counter()
+    emails = await fetch()
+    elapsed = time.perf_counter() - start
+    stop.set()
+    stall = await monitor
+    print(f"{label:<22} {len(emails):>4} emails  {elapsed * 1000:8.1f}ms  "
+          f"{service.round_trips:>4} round trips  max loop stall {stall * 1000:7.1f}ms")
+
+
+async def main(count: int, latency: float):
+    service = FakeGmailService(
+        {f"msg_{i}": make_message(f"msg_{i}", f"Receipt {i}: $4.50 at Coffee Shop")
+         for i in range(count)},
+        latency=latency,
+    )
+    messages = [{"id": msg_id} for msg_id in service.store]
+    print(f"{count} messages, simulated latency {latency * 1000:.0f}ms per round trip")
+
+    async def blocking():
+        return sequential_decode(service, messages)
+
+    async def batched():
+        return [email async for email in fetch_emails(service, messages)]
+
+    await measure("sequential get()", service, blocking)
+    await measure("fetch_emails (batch)", service, batched)
+
+
+if __name__ == "__main__":
+    asyncio.run(main(int(sys.argv[1]) if len(sys.argv) > 1 else 200,
+                     float(sys.argv[2]) / 1000 if len(sys.argv) > 2 else 0.05))
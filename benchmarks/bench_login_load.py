@@ -0,0 +1,94 @@
+"""Concurrent login throughput and latency of an unrelated endpoint.
+
+    python -m benchmarks.bench_login_load [logins] [concurrency]
+
+Compares bcrypt verification inline on the event loop (the old behaviour)
+with the thread pool in app.utils.password_utils, while a probe keeps hitting
+GET / and records its latency. Needs the same environment variables as the
+app (TOKEN_KEY, ENCRYPTION_KEY, GOOGLE_CREDENTIALS_B64); BCRYPT_ROUNDS and
+PASSWORD_HASH_WORKERS apply.
+"""
+import asyncio
+import sys
+import time
+from unittest.mock import patch
+
+import httpx
+from fastapi import FastAPI
+
+from app.api.dependencies import get_user_db
+from app.models.auth import UserInDB
+from app.routers import auth, home
+from app.utils.password_utils import hash_password, pwd_context
+
+
+class InMemoryUserDB:
+    def __init__(self, users: dict[str, UserInDB]):
+        self.users = users
+
+    async def get_user_by_userid(self, user_id: str) -> UserInDB | None:
+        return self.users.get(user_id)
+
+    async def update_user_password(self, user_id: str, hashed_password: str):
+        self.users[user_id] = self.users[user_id].model_copy(
+            update={"hashed_password": hashed_password})
+
+
+async def inline_verify(plain: str, hashed: str):
+    return pwd_context.verify_and_update(plain, hashed)
+
+
+def percentile(samples: list[float], fraction: float) -> float:
+    samples = sorted(samples)
+    return samples[min(len(samples) - 1, int(len(samples) * fraction))] * 1000
+
+
+async def run(label: str, logins: int, concurrency: int, user_db: InMemoryUserDB):
+    app = FastAPI()
+    app.include_router(auth.router)
+    app.include_router(home.router)
+    app.dependency_overrides[get_user_db] = lambda: user_db
+
+    probe_samples = []
+    done = asyncio.Event()
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        async def probe():
+            # time from "probe due" to response, so event-loop stalls count
+            while not done.is_set():
+                start = time.perf_counter()
+                await asyncio.sleep(0.01)
+                await client.get("/")
+                probe_samples.append(time.perf_counter() - start - 0.01)
+
+        queue = iter(range(logins))
+
+        async def login_worker():
+            for _ in queue:
+                response = await client.post(
+                    "/auth/login", data={"username": "bench", "password": "password123"})
+                response.raise_for_status()
+
+        probe_task = asyncio.create_task(probe())
+        start = time.perf_counter()
+        await asyncio.gather(*(login_worker() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - start
+        done.set()
+        await probe_task
+
+    print(f"{label:<18} {logins / elapsed:6.1f} logins/s   GET / p50={percentile(probe_samples, 0.5):7.1f}ms "
+          f"p99={percentile(probe_samples, 0.99):7.1f}ms  ({len(probe_samples)} probes)")
+
+
+async def main(logins: int, concurrency: int):
+    user_db = InMemoryUserDB({"bench": UserInDB(
+        user_id="bench", hashed_password=hash_password("password123"))})
+    print(f"{logins} logins, concurrency {concurrency}")
+    with patch("app.routers.auth.verify_password_async", inline_verify):
+        await run("inline bcrypt", logins, concurrency, user_db)
+    await run("thread pool", logins, concurrency, user_db)
+
+
+if __name__ == "__main__":
+    asyncio.run(main(int(sys.argv[1]) if len(sys.argv) > 1 else 16,
+                     int(sys.argv[2]) if len(sys.argv) > 2 else 8))
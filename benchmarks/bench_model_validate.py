@@ -0,0 +1,107 @@
+"""TransactionDB.model_validate throughput on DynamoDB-shaped items.
+
+    python -m benchmarks.bench_model_validate [items] [repeats] [page size]
+
+* string model: the model before typed amounts (amount and date as plain
+  strings), validating the legacy items it used to read
+* typed, migrated items: TransactionDB.model_validate on what reads see once
+  app.migrations.transaction_amounts has run (Decimal amount_minor as boto3
+  returns it, ISO dates)
+* from_items, migrated items: the read path the service uses for query
+  pages, which checks each item for legacy values and validates the page in
+  one call
+* from_items, legacy items: unmigrated items read through legacy_fields
+
+Prints the best of `repeats` runs for each.
+"""
+import random
+import sys
+import time
+from decimal import Decimal
+from functools import partial
+from typing import Optional
+
+from pydantic import BaseModel, Field
+
+from app.models.transaction import TransactionDB
+
+
+class StringTransactionDB(BaseModel):
+    title: Optional[str] = None
+    date: Optional[str] = None
+    amount: Optional[str] = None
+    description: Optional[str] = Field(max_length=50, default=None)
+    status: Optional[bool] = None
+    user_id: str
+    transaction_id: str
+
+
+def legacy_item(i: int, rng: random.Random) -> dict:
+    cents = rng.randrange(100, 500_000)
+    return {
+        'user_id': f"user{i % 100}",
+        'transaction_id': f"msg{i:08d}",
+        'title': "STARBUCKS STORE 0421",
+        'date': f"{rng.randrange(1, 13):02d}/{rng.randrange(1, 29):02d}/2025",
+        'amount': f"{cents // 100}.{cents % 100:02d}",
+        'description': "Chase: STARBUCKS STORE 0421",
+        'status': False,
+    }
+
+
+def migrated_item(item: dict) -> dict:
+    typed = TransactionDB.from_item(item).model_dump()
+    typed['amount_minor'] = Decimal(typed['amount_minor'])
+    return typed
+
+
+def run_once(validate, items: list[dict]) -> float:
+    start = time.perf_counter()
+    for item in items:
+        validate(item)
+    return time.perf_counter() - start
+
+
+def pages(validate_page, page_size: int):
+    def validate(items: list[dict]):
+        for i in range(0, len(items), page_size):
+            validate_page(items[i:i + page_size])
+    return validate
+
+
+def run_pages(validate, items: list[dict]) -> float:
+    # from_items converts amounts in place; give every run boto3's Decimals
+    items = [dict(item) for item in items]
+    start = time.perf_counter()
+    validate(items)
+    return time.perf_counter() - start
+
+
+def main(count: int, repeats: int, page_size: int):
+    rng = random.Random(0)
+    legacy = [legacy_item(i, rng) for i in range(count)]
+    migrated = [migrated_item(item) for item in legacy]
+    cases = [
+        ("string model", partial(run_once, StringTransactionDB.model_validate), legacy),
+        ("typed, migrated items", partial(run_once, TransactionDB.model_validate), migrated),
+        ("from_items, migrated items", partial(run_pages, pages(TransactionDB.from_items, page_size)), migrated),
+        ("from_items, legacy items", partial(run_pages, pages(TransactionDB.from_items, page_size)), legacy),
+    ]
+
+    # interleave the cases so drift in machine load hits all of them alike
+    best = {label: float("inf") for label, _, _ in cases}
+    for _ in range(repeats):
+        for label, run, items in cases:
+            best[label] = min(best[label], run(items))
+
+    print(f"{count} items, best of {repeats}, pages of {page_size}")
+    baseline = count / best["string model"]
+    for label, _, _ in cases:
+        rate = count / best[label]
+        print(f"{label:<26} {rate:10.0f} items/s  ({rate / baseline:.2f}x)")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 100_000,
+         int(sys.argv[2]) if len(sys.argv) > 2 else 3,
+         int(sys.argv[3]) if len(sys.argv) > 3 else 100)
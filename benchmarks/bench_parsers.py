@@ -0,0 +1,69 @@
+"""Rule-based parser accuracy and speed over the labelled email corpus.
+
+    python -m benchmarks.bench_parsers [corpus.json] [repeat]
+
+The corpus is a JSON list of {"id", "sender", "body", "expected"} where
+`expected` holds the fields a correct parse must produce, or null when the
+email should fall through to Gemini.
+"""
+import json
+import sys
+import time
+from pathlib import Path
+
+from app.models.email import Email
+from app.service.transaction_parsers import ParserRegistry, default_registry
+
+DEFAULT_CORPUS = Path(__file__).parent.parent / "tests" / "data" / "bank_email_corpus.json"
+
+
+def evaluate(registry: ParserRegistry, corpus: list[dict]) -> dict:
+    correct = wrong = missed = false_positive = fallthrough = 0
+    for case in corpus:
+        email = Email(id=case["id"], body=case["body"], sender=case["sender"])
+        transaction = registry.parse("bench", email)
+        expected = case["expected"]
+        if transaction is None:
+            if expected is None:
+                fallthrough += 1
+            else:
+                missed += 1
+                print(f"  missed {case['id']}")
+        elif expected is None:
+            false_positive += 1
+            print(f"  false positive {case['id']}")
+        else:
+            # the corpus stores dates and amounts as JSON
+            fields = transaction.model_dump(mode="json")
+            if all(fields.get(key) == value for key, value in expected.items()):
+                correct += 1
+            else:
+                wrong += 1
+                print(f"  wrong fields {case['id']}: {fields}")
+    parsed = correct + wrong + false_positive
+    labelled = correct + wrong + missed
+    return {
+        "precision": correct / parsed if parsed else 1.0,
+        "recall": correct / labelled if labelled else 1.0,
+        "fallthrough_to_gemini": fallthrough + missed,
+    }
+
+
+def main(corpus_path: Path, repeat: int):
+    corpus = json.loads(corpus_path.read_text())
+    print(f"{len(corpus)} labelled emails from {corpus_path}")
+    print(evaluate(default_registry, corpus))
+
+    emails = [Email(id=f"{case['id']}_{i}", body=case["body"], sender=case["sender"])
+              for i in range(repeat) for case in corpus]
+    start = time.perf_counter()
+    parsed, unmatched = default_registry.split("bench", emails)
+    elapsed = time.perf_counter() - start
+    print(f"{len(emails)} emails in {elapsed * 1000:.1f}ms "
+          f"({elapsed / len(emails) * 1e6:.1f}us/email), "
+          f"{len(parsed)} parsed, {len(unmatched)} left for Gemini")
+
+
+if __name__ == "__main__":
+    main(Path(sys.argv[1]) if len(sys.argv) > 1 else DEFAULT_CORPUS,
+         int(sys.argv[2]) if len(sys.argv) > 2 else 1000)
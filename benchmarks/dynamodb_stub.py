@@ -0,0 +1,158 @@
+"""Minimal in-memory DynamoDB stand-in for offline benchmarks.
+
+Speaks enough of the DynamoDB JSON protocol (GetItem, PutItem, DeleteItem,
+Query, Scan, BatchGetItem, BatchWriteItem and the Put/Delete actions of
+TransactWriteItems, without conditions) for the service layer to run
+against it through aioboto3 by pointing `endpoint_url` at the server.
+"""
+import asyncio
+import bisect
+import json
+
+from aiohttp import web
+
+KEY_SCHEMA = {
+    "Transaction": ("user_id", "transaction_id"),
+    "User": ("user_id", None),
+    "TransactionOutbox": ("shard", "event_id"),
+}
+
+
+def _scalar(value: dict):
+    return next(iter(value.values()))
+
+
+class DynamoDBStub:
+    def __init__(self, latency: float = 0.0, page_size: int | None = None):
+        self.latency = latency
+        # items per Query/Scan page when the request sets no Limit; DynamoDB
+        # itself stops at 1 MB
+        self.page_size = page_size
+        self.tables: dict[str, dict[tuple, dict]] = {}
+        # key-sorted (keys, items) per Scan/Query result set, dropped on any
+        # write, so paging through a large partition is not quadratic
+        self._sorted: dict[tuple, tuple[list, list]] = {}
+        self.calls: dict[str, int] = {}
+        self._runner = None
+        self.endpoint_url = None
+
+    def _key(self, table: str, item: dict) -> tuple:
+        hash_key, range_key = KEY_SCHEMA.get(table, ("id", None))
+        return (_scalar(item[hash_key]), _scalar(item[range_key]) if range_key else None)
+
+    async def start(self, host: str = "127.0.0.1", port: int = 0) -> str:
+        app = web.Application()
+        app.router.add_post("/", self._handle)
+        self._runner = web.AppRunner(app)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, host, port)
+        await site.start()
+        port = site._server.sockets[0].getsockname()[1]
+        self.endpoint_url = f"http://{host}:{port}"
+        return self.endpoint_url
+
+    async def close(self):
+        if self._runner:
+            await self._runner.cleanup()
+
+    async def _handle(self, request: web.Request) -> web.Response:
+        operation = request.headers["X-Amz-Target"].split(".")[-1]
+        self.calls[operation] = self.calls.get(operation, 0) + 1
+        body = json.loads(await request.read() or b"{}")
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        handler = getattr(self, f"_op_{operation}", None)
+        if handler is None:
+            return web.json_response(
+                {"__type": "UnknownOperationException", "message": operation}, status=400)
+        return web.json_response(handler(body),
+                                 content_type="application/x-amz-json-1.0")
+
+    def _op_GetItem(self, body: dict) -> dict:
+        table = self.tables.get(body["TableName"], {})
+        item = table.get(self._key(body["TableName"], body["Key"]))
+        return {"Item": item} if item else {}
+
+    def _op_PutItem(self, body: dict) -> dict:
+        self._sorted.clear()
+        table = self.tables.setdefault(body["TableName"], {})
+        table[self._key(body["TableName"], body["Item"])] = body["Item"]
+        return {}
+
+    def _op_DeleteItem(self, body: dict) -> dict:
+        self._sorted.clear()
+        table = self.tables.get(body["TableName"], {})
+        table.pop(self._key(body["TableName"], body["Key"]), None)
+        return {}
+
+    def _op_BatchWriteItem(self, body: dict) -> dict:
+        for table_name, requests in body["RequestItems"].items():
+            for request in requests:
+                if "PutRequest" in request:
+                    self._op_PutItem({"TableName": table_name,
+                                      "Item": request["PutRequest"]["Item"]})
+                else:
+                    self._op_DeleteItem({"TableName": table_name,
+                                         "Key": request["DeleteRequest"]["Key"]})
+        return {"UnprocessedItems": {}}
+
+    def _op_TransactWriteItems(self, body: dict) -> dict:
+        for action in body["TransactItems"]:
+            if "Put" in action:
+                self._op_PutItem(action["Put"])
+            else:
+                self._op_DeleteItem(action["Delete"])
+        return {}
+
+    def _op_BatchGetItem(self, body: dict) -> dict:
+        responses = {}
+        for table_name, request in body["RequestItems"].items():
+            table = self.tables.get(table_name, {})
+            found = (table.get(self._key(table_name, key)) for key in request["Keys"])
+            responses[table_name] = [item for item in found if item]
+        return {"Responses": responses, "UnprocessedKeys": {}}
+
+    def _page(self, result_set: tuple, select, body: dict) -> dict:
+        table_name = body["TableName"]
+        if result_set not in self._sorted:
+            keyed = sorted(((self._key(table_name, item), item) for item in select()),
+                           key=lambda pair: pair[0])
+            self._sorted[result_set] = ([key for key, _ in keyed], [item for _, item in keyed])
+        keys, items = self._sorted[result_set]
+        start = body.get("ExclusiveStartKey")
+        if start:
+            items = items[bisect.bisect_right(keys, self._key(table_name, start)):]
+        limit = body.get("Limit") or self.page_size
+        page = items[:limit] if limit else items
+        response = {"Items": page, "Count": len(page), "ScannedCount": len(page)}
+        if limit and len(items) > limit:
+            hash_key, range_key = KEY_SCHEMA.get(table_name, ("id", None))
+            last = page[-1]
+            response["LastEvaluatedKey"] = {
+                k: last[k] for k in (hash_key, range_key) if k}
+        if "ProjectionExpression" in body:
+            names = body.get("ExpressionAttributeNames", {})
+            projected = [names.get(name.strip(), name.strip())
+                         for name in body["ProjectionExpression"].split(",")]
+            response["Items"] = [{k: item[k] for k in projected if k in item}
+                                 for item in page]
+        return response
+
+    def _op_Scan(self, body: dict) -> dict:
+        table_name = body["TableName"]
+        return self._page((table_name,), lambda: self.tables.get(table_name, {}).values(), body)
+
+    def _op_Query(self, body: dict) -> dict:
+        # Only hash-key equality is supported: "#n0 = :v0"
+        names = body.get("ExpressionAttributeNames", {})
+        values = body.get("ExpressionAttributeValues", {})
+        left, right = [part.strip() for part in
+                       body["KeyConditionExpression"].split("=", 1)]
+        attribute = names.get(left, left)
+        expected = _scalar(values[right])
+        table_name = body["TableName"]
+        return self._page(
+            (table_name, attribute, expected),
+            lambda: (item for item in self.tables.get(table_name, {}).values()
+                     if _scalar(item[attribute]) == expected),
+            body)
@@ -0,0 +1,80 @@
+"""Offline stand-in for a googleapiclient Gmail service.
+
+Every `execute()` (single request or batch) sleeps for `latency` seconds to
+simulate one HTTP round trip, so fetch strategies can be compared without
+network access.
+"""
+import base64
+import time
+
+
+def make_message(msg_id: str, body: str) -> dict:
+    data = base64.urlsafe_b64encode(body.encode()).decode()
+    return {
+        "id": msg_id,
+        "payload": {"parts": [
+            {"mimeType": "multipart/alternative", "parts": [
+                {"mimeType": "text/plain", "body": {"data": data}},
+            ]},
+        ]},
+    }
+
+
+class _Request:
+    def __init__(self, service, result):
+        self.service = service
+        self.result = result
+
+    def execute(self):
+        self.service.round_trips += 1
+        time.sleep(self.service.latency)
+        if isinstance(self.result, Exception):
+            raise self.result
+        return self.result
+
+
+class _Batch:
+    def __init__(self, service, callback):
+        self.service = service
+        self.callback = callback
+        self.requests = []
+
+    def add(self, request, callback=None, request_id=None):
+        self.requests.append((request_id, request))
+
+    def execute(self):
+        self.service.round_trips += 1
+        time.sleep(self.service.latency)
+        for request_id, request in self.requests:
+            if isinstance(request.result, Exception):
+                self.callback(request_id, None, request.result)
+            else:
+                self.callback(request_id, request.result, None)
+
+
+class FakeGmailService:
+    def __init__(self, messages: dict[str, dict], latency: float = 0.0):
+        self.store = messages
+        self.latency = latency
+        self.round_trips = 0
+
+    def users(self):
+        return self
+
+    def get(self, userId: str, id: str, format: str = "full"):
+        return _Request(self, self.store.get(id, KeyError(id)))
+
+    def list(self, userId: str, labelIds=None, maxResults: int = 100, pageToken=None):
+        ids = list(self.store)
+        start = int(pageToken or 0)
+        page = ids[start:start + maxResults]
+        result = {"messages": [{"id": msg_id} for msg_id in page]}
+        if start + maxResults < len(ids):
+            result["nextPageToken"] = str(start + maxResults)
+        return _Request(self, result)
+
+    def messages(self):
+        return self
+
+    def new_batch_http_request(self, callback=None):
+        return _Batch(self, callback)
@@ -214,6 +214,29 @@ async def test_google_login_invalid_token(client, mock_user_db):
     assert response.json()["detail"] == "Invalid token"
 
 
+@pytest.mark.asyncio
+async def test_google_login_redirects_to_google_consent(client, mock_user_db, sample_user, valid_token):
+    mock_user_db.get_user_by_userid.return_value = sample_user
+
+    response = client.get(f"/auth/google-login?token={valid_token}", follow_redirects=False)
+
+    assert response.status_code == 307
+    assert response.headers["location"].startswith("https://accounts.google.com/")
+    assert f"state={valid_token}" in response.headers["location"]
+
+
+@pytest.mark.asyncio
+async def test_google_callback_times_out_when_google_is_slow(client, mock_user_db, sample_user, valid_token):
+    import asyncio
+    mock_user_db.get_user_by_userid.return_value = sample_user
+
+    with patch("app.routers.auth.exchange_code", AsyncMock(side_effect=asyncio.TimeoutError)):
+        response = client.get(f"/auth/google-callback?code=abc&state={valid_token}", follow_redirects=False)
+
+    assert response.status_code == 504
+    mock_user_db.update_user_credentials.assert_not_awaited()
+
+
 def test_hash_and_verify_password():
     from app.routers.auth import hash_password, verify_password
 
@@ -284,3 +307,47 @@ async def test_login_with_json_content_type(client, mock_user_db, sample_user):
     )
 
     assert response.status_code == 422
+
+
+def test_get_current_user_id_reads_claims_only(valid_token, expired_token):
+    from fastapi import HTTPException
+    from app.routers.auth import get_current_user_id
+
+    assert get_current_user_id(valid_token) == "testuser"
+    with pytest.raises(HTTPException) as exc_info:
+        get_current_user_id(expired_token)
+    assert exc_info.value.status_code == 401
+
+
+@pytest.mark.asyncio
+async def test_login_rehashes_outdated_hash(client, mock_user_db):
+    from passlib.context import CryptContext
+
+    old_hash = CryptContext(schemes=["bcrypt"], bcrypt__rounds=4).hash("password123")
+    mock_user_db.get_user_by_userid.return_value = UserInDB(
+        user_id="testuser", hashed_password=old_hash)
+
+    response = client.post(
+        "/auth/login",
+        data={"username": "testuser", "password": "password123"}
+    )
+
+    assert response.status_code == 200
+    mock_user_db.update_user_password.assert_called_once()
+    new_hash = mock_user_db.update_user_password.call_args.kwargs["hashed_password"]
+    assert new_hash != old_hash
+    from app.routers.auth import verify_password
+    assert verify_password("password123", new_hash)
+
+
+@pytest.mark.asyncio
+async def test_login_keeps_current_hash(client, mock_user_db, sample_user):
+    mock_user_db.get_user_by_userid.return_value = sample_user
+
+    response = client.post(
+        "/auth/login",
+        data={"username": "testuser", "password": "password123"}
+    )
+
+    assert response.status_code == 200
+    mock_user_db.update_user_password.assert_not_called()
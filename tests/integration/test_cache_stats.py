@@ -0,0 +1,34 @@
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app.api.dependencies import get_user_cache
+from app.models.auth import UserInDB
+from app.routers.auth import get_current_user
+from app.routers.genai import router
+from app.service.user_cache import UserCache
+
+
+def app_with(user_cache: UserCache | None) -> FastAPI:
+    app = FastAPI()
+    app.include_router(router)
+    app.dependency_overrides[get_current_user] = lambda: UserInDB(user_id="user123", hashed_password="x")
+    app.dependency_overrides[get_user_cache] = lambda: user_cache
+    return app
+
+
+def test_user_cache_stats_report_hits_and_misses():
+    cache = UserCache()
+    cache.set(UserInDB(user_id="user123", hashed_password="x"))
+    cache.get("user123")
+    cache.get("someone")
+
+    with TestClient(app_with(cache)) as client:
+        response = client.get("/genai/user-cache-stats")
+
+    assert response.status_code == 200
+    assert response.json() == {"size": 1, "hits": 1, "misses": 1, "hit_ratio": 0.5}
+
+
+def test_user_cache_stats_without_a_cache():
+    with TestClient(app_with(None)) as client:
+        assert client.get("/genai/user-cache-stats").json() == {"size": None}
@@ -0,0 +1,50 @@
+from unittest.mock import AsyncMock
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app.api.dependencies import get_event_bus, get_outbox_relay, get_topic_subscription, get_transaction_feed
+from app.routers.auth import get_current_user_id
+from app.routers.transaction import router
+from app.service.outbox import OutboxRelay
+from app.service.sns import EventBus
+from app.service.transaction_feed import TransactionFeed
+
+
+def app_with(relay, event_bus, feed, topic_subscription=None) -> FastAPI:
+    app = FastAPI()
+    app.include_router(router)
+    app.dependency_overrides[get_current_user_id] = lambda: "user123"
+    app.dependency_overrides[get_outbox_relay] = lambda: relay
+    app.dependency_overrides[get_event_bus] = lambda: event_bus
+    app.dependency_overrides[get_transaction_feed] = lambda: feed
+    app.dependency_overrides[get_topic_subscription] = lambda: topic_subscription
+    return app
+
+
+def test_event_stats_report_the_outbox_backlog_and_counters():
+    relay = OutboxRelay(AsyncMock(), AsyncMock(spec=EventBus))
+    relay.backlog = AsyncMock(return_value=7)
+    relay.relayed, relay.passes = 12, 3
+    event_bus = EventBus(topic_arn="arn:topic")
+    event_bus.published, event_bus.batches = 12, 2
+    feed = TransactionFeed()
+    feed.subscribe("user123")
+
+    with TestClient(app_with(relay, event_bus, feed)) as client:
+        response = client.get("/transactions/event-stats")
+
+    assert response.status_code == 200
+    assert response.json() == {
+        "outbox": {"backlog": 7, "relayed": 12, "passes": 3, "failed_passes": 0},
+        "event_bus": {"published": 12, "failed": 0, "batches": 2},
+        "feed": {"users": 1, "clients": 1, "published": 0, "resyncs": 0},
+        "topic_subscription": None,
+    }
+
+
+def test_event_stats_without_a_relay():
+    with TestClient(app_with(None, None, TransactionFeed())) as client:
+        body = client.get("/transactions/event-stats").json()
+
+    assert body["outbox"] is None and body["event_bus"] is None
@@ -0,0 +1,108 @@
+import base64
+import itertools
+import json
+from datetime import datetime, timezone
+from unittest.mock import AsyncMock, patch
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app.api.dependencies import get_sync_jobs, get_user_db
+from app.models.auth import UserInDB
+from app.routers.genai import router
+from app.service.sync_jobs import SyncJobs
+from app.service.user_db import UserDB
+
+PUSH_TOKEN = "push-secret"
+
+
+class FakePubSubPublisher:
+    """Stands in for a Pub/Sub push subscription: wraps Gmail notifications
+    in the push envelope Pub/Sub sends and posts them to the webhook."""
+
+    def __init__(self, client: TestClient, endpoint: str, token: str | None = PUSH_TOKEN):
+        self.client = client
+        self.endpoint = endpoint
+        self.token = token
+        self._message_ids = itertools.count(1)
+
+    def publish(self, email_address: str, history_id: int):
+        data = json.dumps({"emailAddress": email_address, "historyId": history_id}).encode()
+        return self.post({
+            "message": {
+                "data": base64.b64encode(data).decode(),
+                "messageId": str(next(self._message_ids)),
+                "publishTime": datetime.now(timezone.utc).isoformat(),
+            },
+            "subscription": "projects/expense-notify/subscriptions/gmail-push",
+        })
+
+    def post(self, envelope: dict):
+        params = {"token": self.token} if self.token else {}
+        return self.client.post(self.endpoint, params=params, json=envelope)
+
+
+@pytest.fixture
+def mock_user_db():
+    user_db = AsyncMock(spec=UserDB)
+    users = {"me@gmail.com": UserInDB(
+        user_id="testuser", hashed_password="x", google_credentials="creds",
+        gmail_history_id="100", gmail_address="me@gmail.com")}
+    user_db.get_user_by_gmail_address.side_effect = lambda address: users.get(address)
+    return user_db
+
+
+@pytest.fixture
+def mock_sync_jobs():
+    return AsyncMock(spec=SyncJobs)
+
+
+@pytest.fixture
+def client(mock_user_db, mock_sync_jobs):
+    app = FastAPI()
+    app.include_router(router)
+    app.dependency_overrides[get_user_db] = lambda: mock_user_db
+    app.dependency_overrides[get_sync_jobs] = lambda: mock_sync_jobs
+    with patch("app.service.gmail_push.GMAIL_PUSH_TOKEN", PUSH_TOKEN), TestClient(app) as test_client:
+        yield test_client
+
+
+@pytest.fixture
+def publisher(client):
+    return FakePubSubPublisher(client, "/genai/gmail/push")
+
+
+def test_new_mail_queues_a_sync_for_that_user(publisher, mock_sync_jobs):
+    response = publisher.publish("me@gmail.com", 150)
+
+    assert response.status_code == 204
+    mock_sync_jobs.submit.assert_awaited_once_with("testuser")
+
+
+def test_history_already_synced_is_acknowledged_without_a_sync(publisher, mock_sync_jobs):
+    assert publisher.publish("me@gmail.com", 100).status_code == 204
+    mock_sync_jobs.submit.assert_not_awaited()
+
+
+def test_unknown_address_and_malformed_messages_are_acknowledged(publisher, mock_sync_jobs):
+    assert publisher.publish("someone@gmail.com", 150).status_code == 204
+    assert publisher.post({"message": {"data": "???"}}).status_code == 204
+    mock_sync_jobs.submit.assert_not_awaited()
+
+
+def test_push_without_the_shared_token_is_rejected(client, mock_sync_jobs):
+    publisher = FakePubSubPublisher(client, "/genai/gmail/push", token="wrong")
+
+    assert publisher.publish("me@gmail.com", 150).status_code == 403
+    publisher.token = None
+    assert publisher.publish("me@gmail.com", 150).status_code == 403
+    mock_sync_jobs.submit.assert_not_awaited()
+
+
+def test_lookup_failures_are_left_for_pub_sub_to_retry(publisher, mock_user_db, mock_sync_jobs):
+    mock_user_db.get_user_by_gmail_address.side_effect = RuntimeError("DynamoDB unavailable")
+
+    with pytest.raises(RuntimeError):
+        publisher.publish("me@gmail.com", 150)
+    mock_sync_jobs.submit.assert_not_awaited()
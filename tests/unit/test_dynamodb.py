@@ -0,0 +1,68 @@
+import pytest
+from unittest.mock import AsyncMock, patch
+
+from app.service.dynamodb import DynamoDBPool
+
+
+@pytest.fixture
+def mock_table():
+    return AsyncMock()
+
+
+@pytest.fixture
+def mock_dynamodb_resource(mock_table):
+    mock_dynamodb = AsyncMock()
+    mock_dynamodb.Table.return_value = mock_table
+    return mock_dynamodb
+
+
+@pytest.fixture
+def mock_async_context_manager(mock_dynamodb_resource):
+    mock_resource = AsyncMock()
+    mock_resource.__aenter__.return_value = mock_dynamodb_resource
+    mock_resource.__aexit__.return_value = None
+    return mock_resource
+
+
+@pytest.mark.asyncio
+async def test_resource_created_once_and_tables_cached(mock_async_context_manager, mock_dynamodb_resource, mock_table):
+    pool = DynamoDBPool(max_pool_connections=7, keepalive_timeout=30)
+
+    with patch.object(pool.session, "resource", return_value=mock_async_context_manager) as resource:
+        async with pool:
+            first = await pool.table("Transaction")
+            second = await pool.table("Transaction")
+
+    assert first is mock_table
+    assert second is mock_table
+    resource.assert_called_once()
+    assert resource.call_args.kwargs["config"].max_pool_connections == 7
+    assert resource.call_args.kwargs["config"].connector_args["keepalive_timeout"] == 30
+    mock_dynamodb_resource.Table.assert_awaited_once_with("Transaction")
+    mock_async_context_manager.__aexit__.assert_awaited_once()
+
+
+@pytest.mark.asyncio
+async def test_table_starts_pool_lazily(mock_async_context_manager, mock_table):
+    pool = DynamoDBPool()
+
+    with patch.object(pool.session, "resource", return_value=mock_async_context_manager) as resource:
+        table = await pool.table("User")
+        await pool.close()
+
+    assert table is mock_table
+    resource.assert_called_once()
+    assert pool.resource is None
+
+
+@pytest.mark.asyncio
+async def test_transact_write_items_uses_the_resource_client(mock_async_context_manager, mock_dynamodb_resource):
+    pool = DynamoDBPool()
+    actions = [{'Put': {'TableName': "Transaction", 'Item': {'user_id': "u", 'transaction_id': "t"}}}]
+    mock_dynamodb_resource.meta.client.transact_write_items = AsyncMock(return_value={})
+
+    with patch.object(pool.session, "resource", return_value=mock_async_context_manager):
+        async with pool:
+            await pool.transact_write_items(TransactItems=actions)
+
+    mock_dynamodb_resource.meta.client.transact_write_items.assert_awaited_once_with(TransactItems=actions)
@@ -0,0 +1,141 @@
+import base64
+import pytest
+from unittest.mock import MagicMock, patch
+from googleapiclient.errors import HttpError
+
+from app.models.email import Email
+from app.utils.email_utils import decode_emails, decode_message, fetch_emails
+
+
+def make_message(msg_id, body):
+    data = base64.urlsafe_b64encode(body.encode()).decode()
+    return {
+        'id': msg_id,
+        'payload': {'parts': [
+            {'mimeType': 'text/plain', 'body': {'data': data}},
+        ]},
+    }
+
+
+class FakeBatch:
+    def __init__(self, service, callback):
+        self.service = service
+        self.callback = callback
+        self.request_ids = []
+
+    def add(self, request, callback=None, request_id=None):
+        self.request_ids.append(request_id)
+
+    def execute(self):
+        self.service.batch_sizes.append(len(self.request_ids))
+        for request_id in self.request_ids:
+            if request_id in self.service.failing:
+                self.callback(request_id, None, self.service.failing[request_id])
+            elif self.service.transient.get(request_id):
+                self.service.transient[request_id] -= 1
+                self.callback(request_id, None, HttpError(MagicMock(status=503), b'backend error'))
+            else:
+                self.callback(
+                    request_id, self.service.store[request_id], None)
+
+
+@pytest.fixture
+def gmail_service():
+    service = MagicMock()
+    service.store = {f'msg_{i}': make_message(
+        f'msg_{i}', f'body {i}') for i in range(120)}
+    service.failing = {}
+    service.transient = {}
+    service.batch_sizes = []
+    service.new_batch_http_request.side_effect = lambda callback: FakeBatch(
+        service, callback)
+    return service
+
+
+@pytest.mark.asyncio
+async def test_fetch_emails_batches_requests_and_keeps_order(gmail_service):
+    messages = [{'id': msg_id} for msg_id in gmail_service.store]
+
+    emails = [email async for email in fetch_emails(gmail_service, messages)]
+
+    assert [email.id for email in emails] == [msg['id'] for msg in messages]
+    assert emails[0] == Email(id='msg_0', body='body 0')
+    assert gmail_service.batch_sizes == [50, 50, 20]
+
+
+@pytest.fixture(autouse=True)
+def no_backoff():
+    with patch('app.utils.email_utils.MESSAGE_FETCH_BACKOFF_SECONDS', 0):
+        yield
+
+
+@pytest.mark.asyncio
+async def test_fetch_emails_reports_failed_messages(gmail_service):
+    gmail_service.failing = {'msg_1': HttpError(MagicMock(status=400), b'bad request')}
+    messages = [{'id': 'msg_0'}, {'id': 'msg_1'}, {'id': 'msg_2'}]
+    failed_ids = []
+
+    emails = [email async for email in fetch_emails(gmail_service, messages, failed_ids=failed_ids)]
+
+    assert [email.id for email in emails] == ['msg_0', 'msg_2']
+    assert failed_ids == ['msg_1']
+
+
+@pytest.mark.asyncio
+async def test_fetch_emails_retries_server_errors(gmail_service):
+    gmail_service.transient = {'msg_1': 2}
+    messages = [{'id': 'msg_0'}, {'id': 'msg_1'}]
+    failed_ids = []
+
+    emails = [email async for email in fetch_emails(gmail_service, messages, failed_ids=failed_ids)]
+
+    assert [email.id for email in emails] == ['msg_0', 'msg_1']
+    assert failed_ids == []
+    assert gmail_service.batch_sizes == [2, 1, 1]
+
+
+@pytest.mark.asyncio
+async def test_fetch_emails_raises_persistent_rate_limits(gmail_service):
+    gmail_service.failing = {'msg_1': HttpError(MagicMock(status=429), b'rate limited')}
+
+    with pytest.raises(HttpError):
+        [email async for email in fetch_emails(gmail_service, [{'id': 'msg_0'}, {'id': 'msg_1'}])]
+    # retried before giving up
+    assert gmail_service.batch_sizes == [2, 1, 1, 1]
+
+
+@pytest.mark.asyncio
+async def test_fetch_emails_drops_deleted_messages(gmail_service):
+    gmail_service.failing = {'msg_1': HttpError(MagicMock(status=404), b'not found')}
+    failed_ids = []
+
+    emails = [email async for email in fetch_emails(
+        gmail_service, [{'id': 'msg_0'}, {'id': 'msg_1'}], failed_ids=failed_ids)]
+
+    assert [email.id for email in emails] == ['msg_0']
+    assert failed_ids == []
+
+
+@pytest.mark.asyncio
+async def test_fetch_emails_no_messages(gmail_service):
+    emails = [email async for email in fetch_emails(gmail_service, [])]
+
+    assert emails == []
+    gmail_service.new_batch_http_request.assert_not_called()
+
+
+def test_decode_emails(gmail_service):
+    emails = decode_emails(gmail_service, [{'id': 'msg_3'}])
+
+    assert emails == [Email(id='msg_3', body='body 3')]
+
+
+def test_decode_message_reads_sender():
+    msg = make_message('msg_1', 'body 1')
+    msg['payload']['headers'] = [
+        {'name': 'Subject', 'value': 'Alert'},
+        {'name': 'From', 'value': 'Chase <no.reply.alerts@chase.com>'},
+    ]
+
+    assert decode_message(msg) == [
+        Email(id='msg_1', body='body 1', sender='Chase <no.reply.alerts@chase.com>')]
@@ -0,0 +1,90 @@
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import pytest
+
+from app.models.sns import ExpenseEventType
+from app.service.sns import Event, EventBus
+
+
+def sns_client(publish_batch=None) -> AsyncMock:
+    client = AsyncMock()
+    client.publish_batch.side_effect = publish_batch or (
+        lambda TopicArn, PublishBatchRequestEntries: {
+            'Successful': [{'Id': entry['Id'], 'MessageId': f"m{entry['Id']}"}
+                           for entry in PublishBatchRequestEntries],
+            'Failed': [],
+        })
+    return client
+
+
+def event_bus(client: AsyncMock) -> EventBus:
+    bus = EventBus(topic_arn="arn:topic")
+    context = MagicMock()
+    context.__aenter__ = AsyncMock(return_value=client)
+    context.__aexit__ = AsyncMock(return_value=False)
+    bus.session = MagicMock()
+    bus.session.client.return_value = context
+    return bus
+
+
+@pytest.mark.asyncio
+async def test_deliver_publishes_and_close_releases_the_client():
+    client = sns_client()
+    bus = event_bus(client)
+
+    event = Event("txn_1", ExpenseEventType.EXPENSE_DELETED)
+    assert await bus.deliver([event]) == [event]
+    await bus.close()
+
+    entries = client.publish_batch.await_args.kwargs['PublishBatchRequestEntries']
+    assert entries == [{'Id': '0', 'Message': "txn_1", 'MessageAttributes': {
+        'EventType': {'DataType': 'String', 'StringValue': ExpenseEventType.EXPENSE_DELETED}}}]
+    assert bus.stats() == {"published": 1, "failed": 0, "batches": 1}
+    assert bus.client is None
+
+
+@pytest.mark.asyncio
+async def test_routing_attributes_are_sent_when_set():
+    client = sns_client()
+    async with event_bus(client) as bus:
+        await bus.deliver([Event("txn_1", ExpenseEventType.EXPENSE_DELETED, event_id="evt_1",
+                                 user_id="user123", transaction_id="txn_1")])
+
+    entry = client.publish_batch.await_args.kwargs['PublishBatchRequestEntries'][0]
+    assert {name: value['StringValue'] for name, value in entry['MessageAttributes'].items()} == {
+        'EventType': ExpenseEventType.EXPENSE_DELETED, 'IdempotencyKey': "evt_1",
+        'UserId': "user123", 'TransactionId': "txn_1"}
+
+
+@pytest.mark.asyncio
+async def test_events_are_sent_ten_per_call():
+    client = sns_client()
+    async with event_bus(client) as bus:
+        await bus.deliver([Event(f"m{i}", ExpenseEventType.EXPENSE_CREATED) for i in range(25)])
+
+    sizes = [len(call.kwargs['PublishBatchRequestEntries']) for call in client.publish_batch.await_args_list]
+    assert sizes == [10, 10, 5]
+    assert bus.published == 25
+
+
+@pytest.mark.asyncio
+async def test_failed_entries_are_retried_then_left_out():
+    calls = []
+
+    def publish_batch(TopicArn, PublishBatchRequestEntries):
+        calls.append([entry['Message'] for entry in PublishBatchRequestEntries])
+        if len(calls) == 1:
+            raise RuntimeError("throttled")
+        # "bad" never goes through
+        return {'Failed': [{'Id': entry['Id'], 'SenderFault': False}
+                           for entry in PublishBatchRequestEntries if entry['Message'] == "bad"]}
+
+    good, bad = (Event(message, ExpenseEventType.EXPENSE_CREATED) for message in ("good", "bad"))
+    with patch('app.service.sns.EVENT_PUBLISH_BACKOFF_SECONDS', 0):
+        async with event_bus(sns_client(publish_batch)) as bus:
+            delivered = await bus.deliver([good, bad])
+
+    assert delivered == [good]
+    assert calls == [["good", "bad"], ["good", "bad"], ["bad"]]
+    assert bus.published == 1
+    assert bus.failed == 1
@@ -0,0 +1,74 @@
+import pytest
+from unittest.mock import AsyncMock, MagicMock
+
+from app.service.dynamodb import DynamoDBPool
+from app.service.extraction_cache import (
+    DynamoDBExtractionCache, MemoryExtractionCache, create_extraction_cache)
+
+
+@pytest.mark.asyncio
+async def test_memory_cache_counts_hits_and_misses():
+    cache = MemoryExtractionCache(maxsize=10, ttl=60)
+    await cache.set_many({"a": {"amount": "1.00"}})
+
+    found = await cache.get_many(["a", "b"])
+
+    assert found == {"a": {"amount": "1.00"}}
+    assert cache.stats() == {
+        "backend": "MemoryExtractionCache", "hits": 1, "misses": 1, "hit_ratio": 0.5}
+
+
+@pytest.mark.asyncio
+async def test_memory_cache_evicts_least_recently_used():
+    cache = MemoryExtractionCache(maxsize=2, ttl=60)
+    await cache.set_many({"a": {}, "b": {}})
+    await cache.get_many(["a"])
+    await cache.set_many({"c": {}})
+
+    assert set(await cache.get_many(["a", "b", "c"])) == {"a", "c"}
+
+
+@pytest.fixture
+def mock_dynamodb():
+    return AsyncMock(spec=DynamoDBPool)
+
+
+@pytest.mark.asyncio
+async def test_dynamodb_cache_batch_gets_and_skips_expired(mock_dynamodb):
+    mock_dynamodb.batch_get_item.return_value = {"Responses": {"GeminiExtractionCache": [
+        {"cache_key": "a", "value": {"amount": "1.00"}, "expires_at": 4102444800},
+        {"cache_key": "b", "value": {"amount": "2.00"}, "expires_at": 1},
+    ]}}
+    cache = DynamoDBExtractionCache(mock_dynamodb)
+
+    found = await cache.get_many(["a", "b", "c"])
+
+    assert found == {"a": {"amount": "1.00"}}
+    assert cache.hits == 1 and cache.misses == 2
+    mock_dynamodb.batch_get_item.assert_awaited_once_with(RequestItems={
+        "GeminiExtractionCache": {"Keys": [{"cache_key": "a"}, {"cache_key": "b"}, {"cache_key": "c"}]}})
+
+
+@pytest.mark.asyncio
+async def test_dynamodb_cache_writes_with_expiry(mock_dynamodb):
+    batch = AsyncMock()
+    writer = MagicMock()
+    writer.__aenter__ = AsyncMock(return_value=batch)
+    writer.__aexit__ = AsyncMock(return_value=None)
+    table = MagicMock()
+    table.batch_writer.return_value = writer
+    mock_dynamodb.table.return_value = table
+    cache = DynamoDBExtractionCache(mock_dynamodb, ttl=60)
+
+    await cache.set_many({"a": {"amount": "1.00"}})
+
+    item = batch.put_item.await_args.kwargs["Item"]
+    assert item["cache_key"] == "a"
+    assert item["value"] == {"amount": "1.00"}
+    assert "expires_at" in item
+
+
+def test_create_extraction_cache_backends(mock_dynamodb):
+    assert isinstance(create_extraction_cache(mock_dynamodb, "memory"), MemoryExtractionCache)
+    assert isinstance(create_extraction_cache(mock_dynamodb, "dynamodb"), DynamoDBExtractionCache)
+    assert create_extraction_cache(mock_dynamodb, "none") is None
@@ -0,0 +1,160 @@
+import asyncio
+import json
+import re
+import pytest
+from unittest.mock import AsyncMock, MagicMock, patch
+
+from app.models.auth import UserInDB
+from app.models.email import Email
+from app.service.extraction_cache import MemoryExtractionCache
+from app.service.gemini import Gemini, chunk_emails
+
+
+@pytest.fixture
+def user():
+    return UserInDB(user_id="user123", hashed_password="hashed")
+
+
+@pytest.fixture
+def emails():
+    return [Email(id=f"msg_{i}", body=f"Paid ${i}.00 at Store {i}") for i in range(5)]
+
+
+def gemini_response(emails_in_prompt):
+    return MagicMock(text=json.dumps([
+        {"user_id": "user123", "transaction_id": email_id, "amount": "1.00"}
+        for email_id in emails_in_prompt
+    ]))
+
+
+@pytest.fixture
+def mock_client():
+    client = MagicMock()
+
+    async def generate_content(model, contents, config):
+        return gemini_response(re.findall(r"id='([^']+)'", contents))
+
+    client.aio.models.generate_content = AsyncMock(side_effect=generate_content)
+    return client
+
+
+def test_chunk_emails_respects_max_emails(emails):
+    chunks = chunk_emails(emails, token_budget=10_000, max_emails=2)
+
+    assert [[email.id for email in chunk] for chunk in chunks] == [
+        ["msg_0", "msg_1"], ["msg_2", "msg_3"], ["msg_4"]]
+
+
+def test_chunk_emails_respects_token_budget():
+    emails = [Email(id="big", body="x" * 400), Email(id="small", body="y")]
+
+    chunks = chunk_emails(emails, token_budget=50, max_emails=20)
+
+    assert [[email.id for email in chunk] for chunk in chunks] == [["big"], ["small"]]
+
+
+@pytest.mark.asyncio
+async def test_get_transaction_from_gemini_merges_chunks_in_order(mock_client, user, emails):
+    gemini = Gemini(client=mock_client, chunk_max_emails=2)
+
+    result = await gemini.get_transaction_from_gemini(user=user, emails=emails)
+
+    assert [t.transaction_id for t in result] == [email.id for email in emails]
+    assert mock_client.aio.models.generate_content.await_count == 3
+
+
+@pytest.mark.asyncio
+async def test_get_transaction_from_gemini_limits_concurrency(user, emails):
+    running = 0
+    peak = 0
+
+    async def generate_content(model, contents, config):
+        nonlocal running, peak
+        running += 1
+        peak = max(peak, running)
+        await asyncio.sleep(0.01)
+        running -= 1
+        return MagicMock(text="[]")
+
+    client = MagicMock()
+    client.aio.models.generate_content = AsyncMock(side_effect=generate_content)
+    gemini = Gemini(client=client, concurrency=2, chunk_max_emails=1)
+
+    await gemini.get_transaction_from_gemini(user=user, emails=emails)
+
+    assert client.aio.models.generate_content.await_count == 5
+    assert peak == 2
+
+
+@pytest.mark.asyncio
+async def test_get_transaction_from_gemini_retries_failed_chunk(mock_client, user, emails):
+    generate_content = mock_client.aio.models.generate_content.side_effect
+    attempts = []
+
+    async def flaky(model, contents, config):
+        attempts.append(contents)
+        if len(attempts) == 1:
+            raise RuntimeError("quota exceeded")
+        return await generate_content(model, contents, config)
+
+    mock_client.aio.models.generate_content.side_effect = flaky
+    gemini = Gemini(client=mock_client, concurrency=1, chunk_max_emails=5)
+
+    with patch("app.service.gemini.GEMINI_RETRY_BACKOFF_SECONDS", 0):
+        result = await gemini.get_transaction_from_gemini(user=user, emails=emails)
+
+    assert len(result) == 5
+    assert len(attempts) == 2
+
+
+@pytest.mark.asyncio
+async def test_get_transaction_from_gemini_raises_after_retries(user, emails):
+    client = MagicMock()
+    client.aio.models.generate_content = AsyncMock(side_effect=RuntimeError("down"))
+    gemini = Gemini(client=client)
+
+    with patch("app.service.gemini.GEMINI_RETRY_BACKOFF_SECONDS", 0):
+        with pytest.raises(RuntimeError):
+            await gemini.get_transaction_from_gemini(user=user, emails=emails)
+
+    assert client.aio.models.generate_content.await_count == 3
+
+
+@pytest.mark.asyncio
+async def test_get_transaction_from_gemini_rate_limits_and_does_not_retry_quota_errors(user, emails):
+    client = MagicMock()
+    client.aio.models.generate_content = AsyncMock(side_effect=RuntimeError("429 RESOURCE_EXHAUSTED"))
+    rate_limit = AsyncMock()
+    gemini = Gemini(client=client, chunk_max_emails=5, rate_limit=rate_limit)
+
+    with pytest.raises(RuntimeError):
+        await gemini.get_transaction_from_gemini(user=user, emails=emails)
+
+    assert client.aio.models.generate_content.await_count == 1
+    rate_limit.assert_awaited_once_with(1)
+
+
+@pytest.mark.asyncio
+async def test_get_transaction_from_gemini_serves_repeats_from_cache(mock_client, user, emails):
+    cache = MemoryExtractionCache()
+    gemini = Gemini(client=mock_client, cache=cache)
+
+    first = await gemini.get_transaction_from_gemini(user=user, emails=emails)
+    reprocessed = [Email(id="resent", body=emails[0].body)] + emails[1:]
+    second = await gemini.get_transaction_from_gemini(user=user, emails=reprocessed)
+
+    assert mock_client.aio.models.generate_content.await_count == 1
+    assert [t.transaction_id for t in second] == [email.id for email in reprocessed]
+    assert second[1:] == first[1:]
+    assert second[0].user_id == "user123"
+    assert cache.hits == 5 and cache.misses == 5
+
+
+@pytest.mark.asyncio
+async def test_cache_key_depends_on_model_and_prompt(mock_client, emails):
+    gemini = Gemini(client=mock_client)
+    other_model = Gemini(client=mock_client, model_name="gemini-2.0-flash")
+
+    assert gemini.cache_key(emails[0]) == Gemini(client=mock_client).cache_key(emails[0])
+    assert gemini.cache_key(emails[0]) != other_model.cache_key(emails[0])
+    assert gemini.cache_key(emails[0]) != gemini.cache_key(emails[1])
@@ -0,0 +1,107 @@
+import base64
+import json
+import time
+from unittest.mock import AsyncMock, patch
+
+import pytest
+
+from app.models.auth import UserInDB
+from app.models.email import GmailWatch
+from app.service.gmail_push import is_new_history, parse_push_message, register_watch, renew_watches, watch_due
+from app.service.user_db import UserDB
+
+TOPIC = "projects/expense-notify/topics/gmail"
+
+
+def envelope(data) -> dict:
+    encoded = base64.b64encode(json.dumps(data).encode()).decode()
+    return {"message": {"data": encoded, "messageId": "1"}, "subscription": "projects/p/subscriptions/s"}
+
+
+def user(**fields) -> UserInDB:
+    return UserInDB(user_id="user123", hashed_password="x", google_credentials="creds", **fields)
+
+
+def test_parse_push_message():
+    notification = parse_push_message(envelope({"emailAddress": "me@gmail.com", "historyId": 9876}))
+
+    assert notification.email_address == "me@gmail.com"
+    assert notification.history_id == "9876"
+
+
+@pytest.mark.parametrize("body", [
+    {},
+    {"message": {"data": "not base64!"}},
+    envelope({"historyId": 1}),
+    envelope(["not", "an", "object"]),
+])
+def test_parse_push_message_rejects_other_payloads(body):
+    with pytest.raises(ValueError):
+        parse_push_message(body)
+
+
+def test_only_history_past_the_last_sync_is_new():
+    notification = parse_push_message(envelope({"emailAddress": "me@gmail.com", "historyId": 200}))
+
+    assert is_new_history(user(), notification)
+    assert is_new_history(user(gmail_history_id="199"), notification)
+    assert not is_new_history(user(gmail_history_id="200"), notification)
+
+
+def test_watch_due():
+    now_ms = int(time.time() * 1000)
+
+    assert watch_due(user(), topic=TOPIC)
+    assert watch_due(user(gmail_watch_expiration=now_ms + 3600 * 1000), topic=TOPIC)
+    assert not watch_due(user(gmail_watch_expiration=now_ms + 6 * 24 * 3600 * 1000), topic=TOPIC)
+    assert not watch_due(user(), topic=None)
+
+
+@pytest.mark.asyncio
+async def test_register_watch_records_the_address():
+    gmail_service = AsyncMock()
+    gmail_service.watch.return_value = GmailWatch(email_address="me@gmail.com", history_id="1", expiration=123)
+    user_db = AsyncMock(spec=UserDB)
+
+    assert await register_watch(user(), user_db, gmail_service, topic=TOPIC)
+
+    gmail_service.watch.assert_awaited_once_with(TOPIC)
+    user_db.update_gmail_watch.assert_awaited_once_with(
+        user_id="user123", gmail_address="me@gmail.com", expiration=123)
+
+
+@pytest.mark.asyncio
+async def test_register_watch_failure_is_not_raised():
+    gmail_service = AsyncMock()
+    gmail_service.watch.side_effect = RuntimeError("403 topic permission denied")
+    user_db = AsyncMock(spec=UserDB)
+
+    assert not await register_watch(user(), user_db, gmail_service, topic=TOPIC)
+    assert not await register_watch(user(), user_db, gmail_service, topic=None)
+    user_db.update_gmail_watch.assert_not_awaited()
+
+
+@pytest.mark.asyncio
+async def test_renew_watches_only_renews_those_expiring_soon():
+    now_ms = int(time.time() * 1000)
+    expiring = user(gmail_watch_expiration=now_ms + 3600 * 1000)
+    expiring.user_id = "expiring"
+    fresh = user(gmail_watch_expiration=now_ms + 6 * 24 * 3600 * 1000)
+    fresh.user_id = "fresh"
+    broken = user(gmail_watch_expiration=now_ms)
+    broken.user_id = "broken"
+    gmail_service = AsyncMock()
+    gmail_service.watch.return_value = GmailWatch(email_address="me@gmail.com", history_id="1", expiration=456)
+    user_db = AsyncMock(spec=UserDB)
+
+    async def load(user, user_db, clients):
+        if user.user_id == "broken":
+            raise RuntimeError("credentials revoked")
+        return gmail_service
+
+    with patch("app.service.gmail_push.load_gmail_service", side_effect=load) as load_gmail_service:
+        assert await renew_watches([expiring, fresh, broken], user_db, topic=TOPIC) == 1
+
+    assert [call.args[0].user_id for call in load_gmail_service.await_args_list] == ["expiring", "broken"]
+    user_db.update_gmail_watch.assert_awaited_once_with(
+        user_id="expiring", gmail_address="me@gmail.com", expiration=456)
@@ -0,0 +1,217 @@
+import asyncio
+import json
+import threading
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from unittest.mock import AsyncMock, MagicMock, patch
+from googleapiclient.errors import HttpError
+
+from app.models.auth import UserInDB
+from app.models.email import Email
+from app.service.gmail_service import EXPENSE_LABEL_ID, GmailClientCache, GmailService
+from app.service.user_db import UserDB
+from app.utils.encrytion_utils import encrypt_credentials
+
+
+@pytest.fixture
+def mock_service():
+    return MagicMock()
+
+
+@pytest.fixture
+def gmail_service(mock_service):
+    with patch('app.service.gmail_service.build_gmail_client', return_value=mock_service):
+        yield GmailService(creds=MagicMock())
+
+
+def fake_fetch_emails(service, messages, rate_limit=None, failed_ids=None):
+    async def emails():
+        for message in messages:
+            yield Email(id=message['id'], body=f"body {message['id']}")
+    return emails()
+
+
+@pytest.fixture(autouse=True)
+def patch_fetch_emails():
+    with patch('app.service.gmail_service.fetch_emails', side_effect=fake_fetch_emails) as fetch:
+        yield fetch
+
+
+@pytest.mark.asyncio
+async def test_full_sync_follows_next_page_token(gmail_service, mock_service):
+    mock_service.users().getProfile().execute.return_value = {'historyId': 900}
+    mock_service.users().messages().list().execute.side_effect = [
+        {'messages': [{'id': 'a'}, {'id': 'b'}], 'nextPageToken': 'page2'},
+        {'messages': [{'id': 'c'}]},
+    ]
+    get_existing_ids = AsyncMock(return_value={'b'})
+
+    sync = await gmail_service.sync_expense_emails(get_existing_ids=get_existing_ids)
+
+    assert [email.id for email in sync.emails] == ['a', 'c']
+    assert sync.history_id == '900'
+    get_existing_ids.assert_awaited_once()
+    page_tokens = [call.kwargs.get('pageToken')
+                   for call in mock_service.users().messages().list.call_args_list
+                   if call.kwargs]
+    assert page_tokens == [None, 'page2']
+
+
+@pytest.mark.asyncio
+async def test_incremental_sync_uses_history(gmail_service, mock_service):
+    mock_service.users().history().list().execute.side_effect = [
+        {'history': [{'messagesAdded': [{'message': {'id': 'x', 'labelIds': [EXPENSE_LABEL_ID]}}]}],
+         'historyId': '1001', 'nextPageToken': 'next'},
+        {'history': [{'messagesAdded': [
+            {'message': {'id': 'x', 'labelIds': [EXPENSE_LABEL_ID]}},
+            {'message': {'id': 'y', 'labelIds': ['INBOX']}},
+        ]}], 'historyId': '1002'},
+    ]
+    get_existing_ids = AsyncMock(return_value=set())
+
+    sync = await gmail_service.sync_expense_emails(history_id='1000', get_existing_ids=get_existing_ids)
+
+    assert [email.id for email in sync.emails] == ['x']
+    assert sync.history_id == '1002'
+    get_existing_ids.assert_not_awaited()
+    mock_service.users().messages().list().execute.assert_not_called()
+
+
+@pytest.mark.asyncio
+async def test_incremental_sync_no_changes(gmail_service, mock_service):
+    mock_service.users().history().list().execute.return_value = {
+        'historyId': '1000'}
+
+    sync = await gmail_service.sync_expense_emails(history_id='1000')
+
+    assert sync.emails == []
+    assert sync.history_id == '1000'
+
+
+@pytest.mark.asyncio
+async def test_expired_history_falls_back_to_full_sync(gmail_service, mock_service):
+    mock_service.users().history().list().execute.side_effect = HttpError(
+        MagicMock(status=404), b'not found')
+    mock_service.users().getProfile().execute.return_value = {'historyId': '2000'}
+    mock_service.users().messages().list().execute.return_value = {
+        'messages': [{'id': 'a'}]}
+    get_existing_ids = AsyncMock(return_value=set())
+
+    sync = await gmail_service.sync_expense_emails(history_id='1', get_existing_ids=get_existing_ids)
+
+    assert [email.id for email in sync.emails] == ['a']
+    assert sync.history_id == '2000'
+    get_existing_ids.assert_awaited_once()
+
+
+@pytest.mark.asyncio
+async def test_sync_error_returns_none(gmail_service, mock_service):
+    mock_service.users().history().list().execute.side_effect = HttpError(
+        MagicMock(status=500), b'boom')
+
+    assert await gmail_service.sync_expense_emails(history_id='1') is None
+
+
+def linked_user(token: str = "token", expires_in: timedelta = timedelta(hours=1)) -> UserInDB:
+    blob = encrypt_credentials(json.dumps({
+        "token": token, "refresh_token": "refresh", "token_uri": "https://oauth2.googleapis.com/token",
+        "client_id": "client", "client_secret": "secret", "scopes": ["gmail.readonly"],
+        "expiry": (datetime.now(timezone.utc) + expires_in).isoformat(),
+    }))
+    return UserInDB(user_id="user123", hashed_password="x", google_credentials=blob)
+
+
+@pytest.fixture
+def build_client():
+    with patch('app.service.gmail_service.build_gmail_client', side_effect=lambda creds: MagicMock()) as build:
+        yield build
+
+
+@pytest.mark.asyncio
+async def test_client_cache_reuses_the_credentials(build_client):
+    clients = GmailClientCache()
+    user = linked_user()
+    user_db = AsyncMock(spec=UserDB)
+
+    first = await clients.get(user, user_db)
+    second = await clients.get(user, user_db)
+
+    assert second.creds is first.creds
+    assert second.creds.token == "token"
+    assert second is not first
+    build_client.assert_not_called()
+    assert clients.stats() == {"size": 1, "hits": 1, "misses": 1, "hit_ratio": 0.5, "refreshes": 0}
+
+
+@pytest.mark.asyncio
+async def test_client_cache_rebuilds_when_the_account_is_relinked(build_client):
+    clients = GmailClientCache()
+    user_db = AsyncMock(spec=UserDB)
+    await clients.get(linked_user("old"), user_db)
+
+    service = await clients.get(linked_user("new"), user_db)
+
+    assert service.creds.token == "new"
+
+
+@pytest.mark.asyncio
+async def test_expired_credentials_are_refreshed_once_for_concurrent_callers(build_client):
+    clients = GmailClientCache()
+    user = linked_user(expires_in=-timedelta(minutes=5))
+    user_db = AsyncMock(spec=UserDB)
+    refreshes = []
+
+    def refresh(creds, request):
+        refreshes.append(creds)
+        creds.token = "fresh"
+        creds.expiry = datetime.now(timezone.utc).replace(tzinfo=None) + timedelta(hours=1)
+
+    with patch('app.service.gmail_service.Credentials.refresh', autospec=True, side_effect=refresh):
+        services = await asyncio.gather(*(clients.get(user, user_db) for _ in range(5)))
+        # the stored blob has not changed yet, but the cache knows the refreshed one
+        user.google_credentials = user_db.update_user_credentials.await_args.kwargs["google_credentials"]
+        again = await clients.get(user, user_db)
+
+    assert len(refreshes) == 1
+    assert {service.creds.token for service in services} == {"fresh"}
+    assert again.creds is services[0].creds
+    user_db.update_user_credentials.assert_awaited_once()
+    assert clients.stats()["refreshes"] == 1
+
+
+@pytest.mark.asyncio
+async def test_each_service_builds_its_own_client_in_a_worker_thread(build_client):
+    built_in = []
+
+    def build(creds):
+        built_in.append(threading.current_thread())
+        client = MagicMock()
+        client.users().getProfile().execute.return_value = {"emailAddress": "me@gmail.com"}
+        client.users().watch().execute.return_value = {"historyId": "2", "expiration": "123"}
+        return client
+
+    build_client.side_effect = build
+    clients = GmailClientCache()
+    user_db = AsyncMock(spec=UserDB)
+    first, second = await clients.get(linked_user(), user_db), await clients.get(linked_user(), user_db)
+
+    await asyncio.gather(first.watch("topic"), second.watch("topic"))
+
+    assert first.client is not second.client
+    assert len(built_in) == 2
+    assert threading.main_thread() not in built_in
+
+
+@pytest.mark.asyncio
+async def test_failed_refresh_evicts_the_cached_credentials(build_client):
+    clients = GmailClientCache()
+    user = linked_user(expires_in=-timedelta(minutes=5))
+    user_db = AsyncMock(spec=UserDB)
+
+    with patch('app.service.gmail_service.Credentials.refresh', side_effect=RuntimeError("invalid_grant")):
+        with pytest.raises(RuntimeError):
+            await clients.get(user, user_db)
+
+    assert clients.stats()["size"] == 0
+    user_db.update_user_credentials.assert_not_awaited()
@@ -0,0 +1,57 @@
+import asyncio
+import time
+from unittest.mock import MagicMock, patch
+
+import pytest
+from google.oauth2.credentials import Credentials
+
+from app.service import google_oauth
+
+
+def test_client_config_is_decoded_once():
+    google_oauth.client_config.cache_clear()
+    with patch("app.service.google_oauth.base64.b64decode", wraps=google_oauth.base64.b64decode) as decode:
+        first = google_oauth.client_config()
+        assert google_oauth.client_config() is first
+    decode.assert_called_once()
+    assert "web" in first or "installed" in first
+
+
+@pytest.mark.asyncio
+async def test_refresh_runs_off_the_event_loop_with_a_timeout():
+    creds = Credentials(token="old", refresh_token="refresh", token_uri="https://oauth2.googleapis.com/token",
+                        client_id="client", client_secret="secret")
+    ticks = 0
+
+    def refresh(request):
+        # blocks like the real HTTP call would
+        time.sleep(0.1)
+        assert request.keywords == {"timeout": 5}
+        creds.token = "fresh"
+
+    async def tick():
+        nonlocal ticks
+        while True:
+            ticks += 1
+            await asyncio.sleep(0.01)
+
+    ticker = asyncio.create_task(tick())
+    with patch.object(creds, "refresh", side_effect=refresh):
+        await google_oauth.refresh(creds, timeout=5)
+    ticker.cancel()
+
+    assert creds.token == "fresh"
+    # the loop kept running while the refresh blocked its thread
+    assert ticks >= 5
+
+
+@pytest.mark.asyncio
+async def test_slow_code_exchange_times_out():
+    flow = MagicMock()
+    flow.fetch_token.side_effect = lambda **kwargs: time.sleep(0.5)
+
+    with patch("app.service.google_oauth.oauth_flow", return_value=flow):
+        with pytest.raises(asyncio.TimeoutError):
+            await google_oauth.exchange_code("code", ["scope"], "https://example.com/callback", timeout=0.05)
+
+    flow.fetch_token.assert_called_once_with(code="code", timeout=0.05)
@@ -0,0 +1,54 @@
+from decimal import Decimal
+
+import pytest
+
+from app.utils.money_utils import format_minor, minor_to_decimal, parse_money
+
+
+@pytest.mark.parametrize("value, expected", [
+    ("100.50", (10050, "USD")),
+    ("$1,234.00", (123400, "USD")),
+    ("12.00 EUR", (1200, "EUR")),
+    ("₩5,000", (5000, "KRW")),
+    ("(12.00)", (-1200, "USD")),
+    ("4.555", (456, "USD")),
+    (4.5, (450, "USD")),
+    (Decimal("7"), (700, "USD")),
+    ("12,50 €", (1250, "EUR")),
+    ("1.234,50 EUR", (123450, "EUR")),
+    ("1 234,50 EUR", (123450, "EUR")),
+    ("1,234,567.89", (123456789, "USD")),
+    ("-$5", (-500, "USD")),
+])
+def test_parse_money(value, expected):
+    assert parse_money(value) == expected
+
+
+def test_parse_money_explicit_currency():
+    assert parse_money("1000", currency="JPY") == (1000, "JPY")
+
+
+def test_parse_money_scales_by_the_currency_exponent():
+    assert parse_money("5.00", currency="JPY") == (5, "JPY")
+    assert parse_money("1.2345", currency="KWD") == (1234, "KWD")
+    assert parse_money("5", currency="usd") == (500, "USD")
+
+
+@pytest.mark.parametrize("value", [None, "", "abc", "NaN", "1.2.3", "12 34", "1 and 2", True])
+def test_parse_money_invalid(value):
+    assert parse_money(value) is None
+
+
+def test_format_minor():
+    assert format_minor(10050, "USD") == "100.50"
+    assert format_minor(-5, "USD") == "-0.05"
+    assert format_minor(5000, "KRW") == "5000"
+    assert format_minor(1234, "KWD") == "1.234"
+
+
+def test_minor_to_decimal():
+    assert minor_to_decimal(10050, "USD") == Decimal("100.50")
+
+
+def test_parse_money_unknown_currency():
+    assert parse_money("5.00", currency="XYZ") is None
@@ -0,0 +1,160 @@
+import asyncio
+from unittest.mock import AsyncMock, patch
+
+import pytest
+
+from app.models.sns import ExpenseEventType
+from app.service.dynamodb import DynamoDBPool
+from app.service.outbox import OUTBOX_TABLE, OutboxRelay, outbox_put, outbox_shard
+from app.service.sns import EventBus
+from app.service.transaction_feed import TransactionFeed
+
+
+def record(event_id: str, user_id: str = "user123", message: str = "txn_1") -> dict:
+    return {'shard': outbox_shard(user_id), 'event_id': event_id, 'user_id': user_id,
+            'event_type': ExpenseEventType.EXPENSE_DELETED, 'message': message}
+
+
+@pytest.fixture
+def mock_table():
+    table = AsyncMock()
+    table.query.return_value = {'Items': []}
+    return table
+
+
+@pytest.fixture
+def mock_dynamodb(mock_table):
+    mock_pool = AsyncMock(spec=DynamoDBPool)
+    mock_pool.table.return_value = mock_table
+    return mock_pool
+
+
+@pytest.fixture
+def mock_event_bus():
+    event_bus = AsyncMock(spec=EventBus)
+    event_bus.deliver.side_effect = lambda events: events
+    return event_bus
+
+
+def test_outbox_put_keeps_a_users_events_in_one_shard():
+    first = outbox_put("user123", ExpenseEventType.EXPENSE_CREATED, "{}")['Put']
+    second = outbox_put("user123", ExpenseEventType.EXPENSE_DELETED, "txn_1")['Put']
+
+    assert first['TableName'] == OUTBOX_TABLE
+    assert first['Item']['shard'] == second['Item']['shard']
+    assert first['Item']['event_id'] < second['Item']['event_id']
+
+
+@pytest.mark.asyncio
+async def test_relay_once_publishes_then_deletes_delivered_records(mock_dynamodb, mock_table, mock_event_bus):
+    shard = outbox_shard("user123")
+    mock_table.query.side_effect = lambda KeyConditionExpression, Limit: (
+        {'Items': [record("evt_1"), record("evt_2", message="txn_2")]}
+        if KeyConditionExpression.get_expression()['values'][1] == shard else {'Items': []})
+    # SNS takes the first and keeps failing the second
+    mock_event_bus.deliver.side_effect = lambda events: events[:1]
+
+    relay = OutboxRelay(mock_dynamodb, mock_event_bus)
+    assert await relay.relay_once() == 1
+
+    events = mock_event_bus.deliver.await_args.args[0]
+    assert [(event.event_id, event.message, event.group_id) for event in events] == [
+        ("evt_1", "txn_1", "user123"), ("evt_2", "txn_2", "user123")]
+    mock_dynamodb.batch_write_item.assert_awaited_once_with(RequestItems={OUTBOX_TABLE: [
+        {'DeleteRequest': {'Key': {'shard': shard, 'event_id': "evt_1"}}}]})
+    assert relay.relayed == 1
+
+
+@pytest.mark.asyncio
+async def test_relay_hands_committed_events_to_the_feed(mock_dynamodb, mock_table, mock_event_bus):
+    shard = outbox_shard("user123")
+    created = outbox_put("user123", ExpenseEventType.EXPENSE_CREATED, '{"title": "Coffee"}', "txn_1")['Put']['Item']
+    mock_table.query.side_effect = lambda KeyConditionExpression, Limit: (
+        {'Items': [created, record("evt_2", message="txn_2")]}
+        if KeyConditionExpression.get_expression()['values'][1] == shard else {'Items': []})
+    feed = TransactionFeed()
+    subscription = feed.subscribe("user123")
+
+    await OutboxRelay(mock_dynamodb, mock_event_bus, feed=feed).relay_once()
+
+    first, second = subscription.queue.get_nowait(), subscription.queue.get_nowait()
+    assert (first.event_type, first.transaction_id, first.transaction) == (
+        ExpenseEventType.EXPENSE_CREATED, "txn_1", {'title': "Coffee", 'transaction_id': "txn_1"})
+    assert first.event_id == created['event_id']
+    assert (second.event_type, second.transaction_id, second.transaction) == (
+        ExpenseEventType.EXPENSE_DELETED, "txn_2", None)
+
+
+@pytest.mark.asyncio
+async def test_feed_does_not_wait_for_sns(mock_dynamodb, mock_table, mock_event_bus):
+    shard = outbox_shard("user123")
+    mock_table.query.side_effect = lambda KeyConditionExpression, Limit: (
+        {'Items': [record("evt_1", message="txn_1")]}
+        if KeyConditionExpression.get_expression()['values'][1] == shard else {'Items': []})
+    mock_event_bus.deliver.side_effect = lambda events: []
+    feed = TransactionFeed()
+    subscription = feed.subscribe("user123")
+    relay = OutboxRelay(mock_dynamodb, mock_event_bus, feed=feed)
+
+    await relay.relay_once()
+    # SNS took nothing, so the record is read again, but not fed again
+    await relay.relay_once()
+
+    assert subscription.queue.qsize() == 1
+    assert subscription.queue.get_nowait().event_id == "evt_1"
+    mock_dynamodb.batch_write_item.assert_not_awaited()
+
+    mock_event_bus.deliver.side_effect = lambda events: events
+    await relay.relay_once()
+    assert subscription.queue.empty()
+    assert relay._fed == set()
+
+
+@pytest.mark.asyncio
+async def test_relay_wakes_on_write_and_drains_on_close(mock_dynamodb, mock_table, mock_event_bus):
+    relay = OutboxRelay(mock_dynamodb, mock_event_bus, poll_interval=60)
+    with patch.object(relay, 'relay_once', wraps=relay.relay_once) as relay_once:
+        async with relay:
+            await asyncio.sleep(0)
+            passes = relay_once.await_count
+            relay.wake()
+            await asyncio.sleep(0.01)
+            # woken rather than waiting out the poll interval
+            assert relay_once.await_count == passes + 1
+        # and one more pass on the way out
+        assert relay_once.await_count == passes + 2
+
+
+@pytest.mark.asyncio
+async def test_relay_survives_failed_passes(mock_dynamodb, mock_table, mock_event_bus):
+    mock_table.query.side_effect = RuntimeError("unavailable")
+
+    async with OutboxRelay(mock_dynamodb, mock_event_bus, poll_interval=60) as relay:
+        await asyncio.sleep(0)
+
+    assert relay.relayed == 0
+    mock_event_bus.deliver.assert_not_awaited()
+
+
+@pytest.mark.asyncio
+async def test_backlog_counts_every_page_of_every_shard(mock_dynamodb, mock_table, mock_event_bus):
+    pages = {"shard#0": [{'Count': 100, 'LastEvaluatedKey': {'event_id': "evt_100"}}, {'Count': 3}],
+             "shard#1": [{'Count': 2}]}
+
+    def query(KeyConditionExpression, Select, ExclusiveStartKey=None):
+        shard_pages = pages.get(KeyConditionExpression.get_expression()['values'][1], [{'Count': 0}])
+        return shard_pages[1 if ExclusiveStartKey else 0]
+    mock_table.query.side_effect = query
+
+    relay = OutboxRelay(mock_dynamodb, mock_event_bus)
+    assert await relay.backlog() == 105
+
+
+@pytest.mark.asyncio
+async def test_stats_count_passes_and_failures(mock_dynamodb, mock_table, mock_event_bus):
+    mock_table.query.side_effect = RuntimeError("unavailable")
+    relay = OutboxRelay(mock_dynamodb, mock_event_bus, poll_interval=60)
+    async with relay:
+        await asyncio.sleep(0)
+
+    assert relay.stats() == {"relayed": 0, "passes": 2, "failed_passes": 2}
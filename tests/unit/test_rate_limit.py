@@ -0,0 +1,84 @@
+import asyncio
+import time
+from unittest.mock import MagicMock
+
+import pytest
+from googleapiclient.errors import HttpError
+
+from app.service.rate_limit import SyncRateLimits, TokenBucket, is_quota_error, quota_error_api
+
+
+def http_error(status: int, content: bytes = b"") -> HttpError:
+    return HttpError(MagicMock(status=status), content)
+
+
+class GenaiError(Exception):
+    def __init__(self, code: int):
+        super().__init__(f"{code} error")
+        self.code = code
+
+
+@pytest.mark.asyncio
+async def test_bucket_allows_a_burst_then_paces_to_the_rate():
+    bucket = TokenBucket(rate=50, capacity=5)
+
+    start = time.monotonic()
+    for _ in range(5):
+        await bucket.acquire()
+    burst = time.monotonic() - start
+    for _ in range(5):
+        await bucket.acquire()
+    paced = time.monotonic() - start - burst
+
+    assert burst < 0.05
+    # five more tokens at 50 a second
+    assert paced >= 0.09
+
+
+@pytest.mark.asyncio
+async def test_paused_bucket_hands_out_nothing():
+    bucket = TokenBucket(rate=1000)
+    bucket.pause(0.05)
+
+    start = time.monotonic()
+    await bucket.acquire()
+
+    assert time.monotonic() - start >= 0.05
+
+
+@pytest.mark.asyncio
+async def test_gmail_limit_applies_the_users_and_the_global_bucket():
+    limits = SyncRateLimits(gmail_rate=1000, gmail_user_rate=20, gemini_rate=1000)
+    limits.gmail_bucket = MagicMock(wraps=limits.gmail_bucket)
+
+    start = time.monotonic()
+    await limits.gmail("user123")(20)
+    # another user has a bucket of their own
+    await limits.gmail("user456")(20)
+    assert time.monotonic() - start < 0.05
+    await asyncio.wait_for(limits.gmail("user123")(2), timeout=1)
+    assert time.monotonic() - start >= 0.09
+    assert limits.gmail_bucket.acquire.call_count == 3
+
+
+@pytest.mark.parametrize("error, api", [
+    (http_error(429), "gmail"),
+    (http_error(403, b'{"error": {"errors": [{"reason": "userRateLimitExceeded"}]}}'), "gmail"),
+    (http_error(403, b'{"error": {"errors": [{"reason": "insufficientPermissions"}]}}'), None),
+    (http_error(500), None),
+    (GenaiError(429), "gemini"),
+    (RuntimeError("429 RESOURCE_EXHAUSTED. Quota exceeded"), "gemini"),
+    (RuntimeError("down"), None),
+])
+def test_quota_error_api(error, api):
+    assert quota_error_api(error) == api
+
+
+def test_quota_errors_are_found_through_the_cause():
+    try:
+        try:
+            raise http_error(429)
+        except HttpError as e:
+            raise RuntimeError("sync failed") from e
+    except RuntimeError as e:
+        assert is_quota_error(e)
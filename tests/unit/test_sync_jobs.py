@@ -0,0 +1,198 @@
+import asyncio
+from unittest.mock import AsyncMock, MagicMock
+
+import pytest
+
+from app.models.auth import UserInDB
+from app.models.email import Email, EmailSync
+from app.models.sync_job import SyncJobStatus, SyncStage
+from app.models.transaction import TransactionDB
+from app.service.sync_jobs import SQSSyncJobQueue, SyncError, SyncJobs, sync_expenses
+from app.service.transaction_parsers import ParserRegistry
+
+
+async def wait_for_status(sync_jobs: SyncJobs, job_id: str, *statuses: SyncJobStatus):
+    for _ in range(100):
+        job = await sync_jobs.get(job_id)
+        if job.status in statuses:
+            return job
+        await asyncio.sleep(0.01)
+    raise AssertionError(f"job {job_id} is still {job.status}")
+
+
+@pytest.mark.asyncio
+async def test_submit_returns_before_the_job_runs():
+    started = asyncio.Event()
+    release = asyncio.Event()
+
+    async def handler(job, progress):
+        started.set()
+        await progress(stage=SyncStage.SAVING, created=2, transaction_ids=["a", "b"])
+        await release.wait()
+        return "Added 2 transactions."
+
+    async with SyncJobs(handler, workers=1) as sync_jobs:
+        job = await sync_jobs.submit("user123")
+        assert job.status == SyncJobStatus.QUEUED
+
+        await asyncio.wait_for(started.wait(), timeout=1)
+        running = await sync_jobs.get(job.job_id)
+        assert running.status == SyncJobStatus.RUNNING
+        assert running.stage == SyncStage.SAVING
+
+        release.set()
+        done = await wait_for_status(sync_jobs, job.job_id, SyncJobStatus.SUCCEEDED)
+
+    assert done.message == "Added 2 transactions."
+    assert done.transaction_ids == ["a", "b"]
+    assert done.updated_at >= done.created_at
+
+
+@pytest.mark.asyncio
+async def test_a_users_active_job_is_reused():
+    release = asyncio.Event()
+
+    async def handler(job, progress):
+        await release.wait()
+        return "done"
+
+    async with SyncJobs(handler, workers=2) as sync_jobs:
+        first = await sync_jobs.submit("user123")
+        assert (await sync_jobs.submit("user123")).job_id == first.job_id
+        other = await sync_jobs.submit("user456")
+        assert other.job_id != first.job_id
+
+        release.set()
+        await wait_for_status(sync_jobs, first.job_id, SyncJobStatus.SUCCEEDED)
+        assert (await sync_jobs.submit("user123")).job_id != first.job_id
+
+
+@pytest.mark.asyncio
+async def test_submitting_during_a_run_queues_a_follow_up():
+    started = asyncio.Event()
+    release = asyncio.Event()
+    runs = []
+
+    async def handler(job, progress):
+        runs.append(job.job_id)
+        started.set()
+        await release.wait()
+        return "done"
+
+    async with SyncJobs(handler, workers=1) as sync_jobs:
+        first = await sync_jobs.submit("user123")
+        await asyncio.wait_for(started.wait(), timeout=1)
+        # new mail arrived after the running sync listed the mailbox
+        assert (await sync_jobs.submit("user123")).job_id == first.job_id
+        assert (await sync_jobs.submit("user123")).job_id == first.job_id
+
+        release.set()
+        await wait_for_status(sync_jobs, first.job_id, SyncJobStatus.SUCCEEDED)
+        for _ in range(100):
+            if len(runs) == 2:
+                break
+            await asyncio.sleep(0.01)
+
+    assert len(runs) == 2 and runs[0] == first.job_id
+
+
+@pytest.mark.asyncio
+async def test_failed_job_records_the_error_and_worker_keeps_running():
+    async def handler(job, progress):
+        if job.user_id == "broken":
+            raise SyncError("Failed to read expense emails from Gmail.")
+        return "ok"
+
+    async with SyncJobs(handler, workers=1) as sync_jobs:
+        failed = await sync_jobs.submit("broken")
+        succeeded = await sync_jobs.submit("user123")
+        failed = await wait_for_status(sync_jobs, failed.job_id, SyncJobStatus.FAILED)
+        succeeded = await wait_for_status(sync_jobs, succeeded.job_id, SyncJobStatus.SUCCEEDED)
+
+    assert failed.error == "Failed to read expense emails from Gmail."
+    assert succeeded.message == "ok"
+
+
+@pytest.mark.asyncio
+async def test_sqs_queue_skips_foreign_messages_and_returns_job_ids():
+    queue = SQSSyncJobQueue(queue_url="https://sqs/jobs")
+    queue.client = AsyncMock()
+    queue.client.receive_message.side_effect = [
+        {},
+        {'Messages': [{'Body': "not json", 'ReceiptHandle': "r1"}]},
+        {'Messages': [{'Body': '{"job_id": "job_1"}', 'ReceiptHandle': "r2"}]},
+    ]
+
+    assert await queue.get() == ("job_1", "r2")
+    queue.client.delete_message.assert_not_awaited()
+
+
+def test_sqs_queue_needs_a_queue_of_its_own(monkeypatch):
+    monkeypatch.setattr("app.service.sync_jobs.SQS_QUEUE_URL", "https://sqs/notifications")
+
+    with pytest.raises(RuntimeError):
+        SQSSyncJobQueue(queue_url=None)
+    with pytest.raises(RuntimeError):
+        SQSSyncJobQueue(queue_url="https://sqs/notifications")
+
+
+@pytest.mark.asyncio
+async def test_sync_expenses_reports_each_stage():
+    user = UserInDB(user_id="user123", hashed_password="x", gmail_history_id="100")
+    emails = [Email(id="m1", body="parsed"), Email(id="m2", body="unknown")]
+    gmail_service = AsyncMock()
+    gmail_service.sync_expense_emails.return_value = EmailSync(emails=emails, history_id="200")
+    parser_registry = MagicMock(spec=ParserRegistry)
+    parser_registry.split.return_value = (
+        [TransactionDB(user_id="user123", transaction_id="m1")], [emails[1]])
+    gemini_client = AsyncMock()
+    gemini_client.get_transaction_from_gemini.return_value = [TransactionDB(user_id="user123", transaction_id="m2")]
+    db = AsyncMock()
+    db.create_transaction_from_gmail.side_effect = lambda transactions: transactions
+    user_db = AsyncMock()
+    progress = AsyncMock()
+
+    message = await sync_expenses(user, db, user_db, gmail_service, gemini_client, parser_registry, progress)
+
+    assert message == "Added 2 transactions."
+    gemini_client.get_transaction_from_gemini.assert_awaited_once_with(user=user, emails=[emails[1]])
+    user_db.update_gmail_history_id.assert_awaited_once_with(user_id="user123", history_id="200")
+    assert [call.kwargs for call in progress.await_args_list] == [
+        {'stage': SyncStage.LISTING},
+        {'stage': SyncStage.EXTRACTING, 'emails_found': 2, 'parsed': 1, 'sent_to_gemini': 1},
+        {'stage': SyncStage.SAVING},
+        {'created': 2, 'transaction_ids': ["m1", "m2"]},
+    ]
+
+
+@pytest.mark.asyncio
+async def test_sync_expenses_fails_when_gmail_cannot_be_read():
+    user = UserInDB(user_id="user123", hashed_password="x")
+    gmail_service = AsyncMock()
+    gmail_service.sync_expense_emails.return_value = None
+    user_db = AsyncMock()
+
+    with pytest.raises(SyncError):
+        await sync_expenses(user, AsyncMock(), user_db, gmail_service, AsyncMock(), MagicMock(), AsyncMock())
+    user_db.update_gmail_history_id.assert_not_awaited()
+
+
+@pytest.mark.asyncio
+async def test_sync_expenses_keeps_the_history_id_when_a_fetch_failed():
+    user = UserInDB(user_id="user123", hashed_password="x", gmail_history_id="100")
+    emails = [Email(id="m1", body="parsed")]
+    gmail_service = AsyncMock()
+    gmail_service.sync_expense_emails.return_value = EmailSync(
+        emails=emails, history_id="200", failed_ids=["m2"])
+    parser_registry = MagicMock(spec=ParserRegistry)
+    parser_registry.split.return_value = ([TransactionDB(user_id="user123", transaction_id="m1")], [])
+    db = AsyncMock()
+    db.create_transaction_from_gmail.side_effect = lambda transactions: transactions
+    user_db = AsyncMock()
+
+    message = await sync_expenses(user, db, user_db, gmail_service, AsyncMock(), parser_registry, AsyncMock())
+
+    assert message == "Added 1 transactions. 1 emails could not be read and will be retried on the next sync."
+    db.create_transaction_from_gmail.assert_awaited_once()
+    # the next sync lists m2 again from the old history id
+    user_db.update_gmail_history_id.assert_not_awaited()
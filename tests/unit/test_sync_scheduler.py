@@ -0,0 +1,142 @@
+import asyncio
+import random
+import time
+from unittest.mock import MagicMock
+
+import pytest
+from googleapiclient.errors import HttpError
+
+from app.service.rate_limit import SyncRateLimits
+from app.workers.sync_scheduler import SyncScheduler
+
+
+def scheduler(handler, user_ids, **kwargs) -> SyncScheduler:
+    async def list_user_ids():
+        return list(user_ids)
+    return SyncScheduler(handler, list_user_ids, rng=random.Random(0), **kwargs)
+
+
+@pytest.mark.asyncio
+async def test_successful_sync_counts_throughput_and_reschedules():
+    async def handler(job, progress):
+        await progress(emails_found=4)
+        await progress(created=3)
+        return "done"
+
+    sync_scheduler = scheduler(handler, ["user123"], interval=100, jitter=0)
+    await sync_scheduler.refresh_users()
+    sync_scheduler._due.clear()
+
+    assert await sync_scheduler.sync_user("user123")
+
+    stats = sync_scheduler.stats
+    assert (stats.users_synced, stats.emails, stats.transactions) == (1, 4, 3)
+    assert stats.rates()["emails_per_min"] > 0
+    (due, user_id), = sync_scheduler._due
+    assert user_id == "user123"
+    assert round(due - time.monotonic()) == 100
+
+
+@pytest.mark.asyncio
+async def test_quota_error_pauses_the_api_and_backs_off_exponentially():
+    async def handler(job, progress):
+        raise HttpError(MagicMock(status=429), b"")
+
+    rate_limits = MagicMock(spec=SyncRateLimits)
+    sync_scheduler = scheduler(handler, ["user123"], rate_limits=rate_limits,
+                               interval=900, jitter=0, quota_pause=60)
+    await sync_scheduler.refresh_users()
+    sync_scheduler._due.clear()
+
+    for _ in range(3):
+        assert not await sync_scheduler.sync_user("user123")
+
+    rate_limits.pause.assert_called_with("gmail", 60)
+    assert sync_scheduler.stats.quota_errors == 3
+    # retried after 60s, 120s, then 240s rather than the 900s interval
+    now = time.monotonic()
+    assert sorted(round(due - now) for due, _ in sync_scheduler._due) == [60, 120, 240]
+
+
+@pytest.mark.asyncio
+async def test_other_failures_back_off_from_the_interval_up_to_the_cap():
+    async def handler(job, progress):
+        raise RuntimeError("Invalid or missing Google credentials.")
+
+    sync_scheduler = scheduler(handler, ["user123"], interval=900, max_backoff=3000, jitter=0)
+    await sync_scheduler.refresh_users()
+
+    await sync_scheduler.sync_user("user123")
+    assert sync_scheduler._backoff("user123", quota=False) == 1800
+    await sync_scheduler.sync_user("user123")
+    assert sync_scheduler._backoff("user123", quota=False) == 3000
+    assert sync_scheduler.stats.failures == 2
+
+
+@pytest.mark.asyncio
+async def test_run_once_syncs_every_user_within_the_concurrency_limit():
+    running = 0
+    peak = 0
+    synced = []
+
+    async def handler(job, progress):
+        nonlocal running, peak
+        running += 1
+        peak = max(peak, running)
+        await asyncio.sleep(0.01)
+        running -= 1
+        synced.append(job.user_id)
+        return "done"
+
+    await scheduler(handler, [f"user{i}" for i in range(10)], concurrency=3).run_once()
+
+    assert sorted(synced) == sorted(f"user{i}" for i in range(10))
+    assert peak == 3
+
+
+@pytest.mark.asyncio
+async def test_run_syncs_users_repeatedly_and_drops_unlinked_users():
+    user_ids = ["user1", "user2"]
+    synced = []
+
+    async def handler(job, progress):
+        synced.append(job.user_id)
+        if synced.count("user1") == 2:
+            user_ids.remove("user2")
+        return "done"
+
+    sync_scheduler = scheduler(handler, user_ids, interval=0.05, concurrency=2)
+    task = asyncio.create_task(sync_scheduler.run())
+    await asyncio.sleep(0.5)
+    task.cancel()
+    await asyncio.gather(task, return_exceptions=True)
+
+    assert synced.count("user1") >= 4
+    # no longer scheduled once a refresh stopped returning it
+    assert synced.count("user2") < synced.count("user1")
+    assert "user2" not in sync_scheduler._tracked
+
+
+@pytest.mark.asyncio
+async def test_run_renews_watches_even_without_syncs():
+    renewals = []
+
+    async def handler(job, progress):
+        return "done"
+
+    async def renew_watches():
+        renewals.append(time.monotonic())
+        if len(renewals) == 2:
+            raise RuntimeError("scan failed")
+        return 1
+
+    # no linked users to sync, so only the renewal pass keeps watches alive
+    sync_scheduler = scheduler(handler, [], renew_watches=renew_watches, renewal_interval=0.05, interval=60)
+    task = asyncio.create_task(sync_scheduler.run())
+    await asyncio.sleep(0.3)
+    task.cancel()
+    await asyncio.gather(task, return_exceptions=True)
+
+    # a failed pass is logged and the next one still runs
+    assert len(renewals) >= 3
+    assert sync_scheduler.stats.watches_renewed == len(renewals) - 1
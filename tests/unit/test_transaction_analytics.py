@@ -0,0 +1,130 @@
+import datetime
+from decimal import Decimal
+from unittest.mock import AsyncMock
+
+import numpy as np
+import pytest
+
+from app.service.dynamodb import DynamoDBPool
+from app.service.transaction_analytics import TransactionFrame, compute_analytics, load_frame
+
+TODAY = datetime.date(2024, 3, 31)
+
+
+def item(transaction_id: str, date: str, amount_minor=None, title: str = "Coffee", **extra) -> dict:
+    return {'transaction_id': transaction_id, 'date_key': f"{date}#{transaction_id}",
+            'amount_minor': amount_minor, 'currency': 'USD', 'title': title, **extra}
+
+
+def frame(rows: list[tuple[str, int, str]], currency: str = "USD") -> TransactionFrame:
+    """rows of (ISO date, minor units, merchant)"""
+    merchants, codes = np.unique(np.array([row[2] for row in rows], dtype=str), return_inverse=True)
+    return TransactionFrame(
+        currency=currency,
+        transaction_ids=np.array([f"t{i}" for i in range(len(rows))], dtype=str),
+        dates=np.array([row[0] for row in rows], dtype='datetime64[D]'),
+        amounts=np.array([row[1] for row in rows], dtype=np.int64),
+        merchant_codes=codes.astype(np.int64),
+        merchants=merchants,
+    )
+
+
+@pytest.fixture
+def mock_table():
+    return AsyncMock()
+
+
+@pytest.fixture
+def mock_dynamodb(mock_table):
+    mock_pool = AsyncMock(spec=DynamoDBPool)
+    mock_pool.table.return_value = mock_table
+    return mock_pool
+
+
+@pytest.mark.asyncio
+async def test_load_frame_reads_every_page_into_columns(mock_dynamodb, mock_table):
+    mock_table.query.side_effect = [
+        {'Items': [item("a", "2024-03-02", Decimal(450), title="Starbucks  Reserve ")],
+         'LastEvaluatedKey': {'user_id': 'user123', 'date_key': '2024-03-02#a'}},
+        {'Items': [
+            # not migrated yet
+            {'transaction_id': 'b', 'date_key': '2024-03-01#b', 'amount': "$12.00", 'title': "Starbucks Reserve"},
+            item("c", "2024-02-28", Decimal(1000), currency="EUR"),
+            item("d", "0000-00-00", Decimal(100)),
+            {'transaction_id': 'e', 'date_key': '2024-02-27#e', 'amount': "n/a"},
+        ]},
+    ]
+
+    result = await load_frame(mock_dynamodb, user_id="user123", currency="USD")
+
+    assert list(result.transaction_ids) == ["a", "b"]
+    assert list(result.dates.astype(str)) == ["2024-03-02", "2024-03-01"]
+    assert list(result.amounts) == [450, 1200]
+    # titles that differ only in whitespace are the same merchant
+    assert list(result.merchants) == ["Starbucks Reserve"]
+    assert list(result.merchant_codes) == [0, 0]
+    assert result.excluded == 3
+
+    first_call, second_call = mock_table.query.call_args_list
+    assert first_call.kwargs['IndexName'] == 'user_id-date_key-index'
+    assert set(first_call.kwargs['ExpressionAttributeNames'].values()) >= {'amount_minor', 'date_key', 'title'}
+    assert second_call.kwargs['ExclusiveStartKey'] == {'user_id': 'user123', 'date_key': '2024-03-02#a'}
+
+
+@pytest.mark.asyncio
+async def test_load_frame_empty_partition(mock_dynamodb, mock_table):
+    mock_table.query.return_value = {'Items': []}
+
+    result = compute_analytics(await load_frame(mock_dynamodb, user_id="user123"), today=TODAY)
+
+    assert result.transaction_count == 0
+    assert result.monthly == [] and result.daily == [] and result.anomalies == []
+
+
+def test_monthly_and_merchant_totals():
+    result = compute_analytics(frame([
+        ("2024-01-05", 1000, "Coffee"),
+        ("2024-01-20", 250, "Coffee"),
+        ("2024-02-01", 5000, "Rent"),
+    ]), today=TODAY)
+
+    assert [(m.month, m.amount, m.count) for m in result.monthly] == [
+        ("2024-01", Decimal("12.50"), 2), ("2024-02", Decimal("50.00"), 1)]
+    assert [(m.merchant, m.amount, m.count) for m in result.merchants] == [
+        ("Rent", Decimal("50.00"), 1), ("Coffee", Decimal("12.50"), 2)]
+
+
+def test_daily_rolling_averages_include_history_before_the_window():
+    result = compute_analytics(frame([
+        ("2024-03-24", 700, "Coffee"),  # before the first day shown
+        ("2024-03-30", 1400, "Coffee"),
+        ("2024-04-02", 9900, "Coffee"),  # after today
+    ]), today=TODAY, days=2)
+
+    assert [d.date for d in result.daily] == [datetime.date(2024, 3, 30), datetime.date(2024, 3, 31)]
+    assert [d.amount for d in result.daily] == [Decimal("14.00"), Decimal("0.00")]
+    # 03-24..03-30 and 03-25..03-31
+    assert [d.rolling_7d for d in result.daily] == [3.0, 2.0]
+    assert [d.rolling_30d for d in result.daily] == [0.7, 0.7]
+
+
+def test_anomalies_compare_against_the_merchants_other_transactions():
+    rows = [(f"2024-03-{day:02d}", 500 + day, "Coffee") for day in range(1, 11)]
+    rows.append(("2024-03-20", 4000, "Coffee"))
+    # a single large purchase elsewhere is still ordinary next to the rest
+    rows.append(("2024-03-21", 520, "Books"))
+
+    result = compute_analytics(frame(rows), today=TODAY)
+
+    assert [(a.transaction_id, a.reason) for a in result.anomalies] == [("t10", "unusual for this merchant")]
+    assert result.anomalies[0].amount == Decimal("40.00")
+
+
+def test_anomalies_fall_back_to_all_spending_without_merchant_history():
+    rows = [("2024-03-01", amount, f"Shop{i}") for i, amount in enumerate([900, 1000, 1100, 1000, 950])]
+    rows += [("2024-03-05", 25000, "Jeweller"), ("2024-03-06", 30000, "Airline")]
+
+    result = compute_analytics(frame(rows), today=TODAY, max_anomalies=1)
+
+    # newest first, then capped
+    assert [(a.transaction_id, a.reason) for a in result.anomalies] == [("t6", "unusually large")]
@@ -0,0 +1,68 @@
+from unittest.mock import AsyncMock
+
+import pytest
+from botocore.exceptions import ClientError
+
+from app.migrations.transaction_date_key import backfill_date_keys
+from app.service.dynamodb import DynamoDBPool
+
+
+@pytest.fixture
+def mock_table():
+    return AsyncMock()
+
+
+@pytest.fixture
+def mock_dynamodb(mock_table):
+    mock_pool = AsyncMock(spec=DynamoDBPool)
+    mock_pool.table.return_value = mock_table
+    return mock_pool
+
+
+def legacy_item(transaction_id: str, date: str | None = "01/15/2024", **extra) -> dict:
+    item = {'user_id': 'user123', 'transaction_id': transaction_id, **extra}
+    if date is not None:
+        item['date'] = date
+    return item
+
+
+@pytest.mark.asyncio
+async def test_backfill_updates_only_stale_items(mock_dynamodb, mock_table):
+    mock_table.scan.side_effect = [
+        {'Items': [legacy_item('a'), legacy_item('b', date_key='2024-01-15#b')],
+         'LastEvaluatedKey': {'user_id': 'user123', 'transaction_id': 'b'}},
+        {'Items': [legacy_item('c', date=None)]},
+    ]
+
+    stats = await backfill_date_keys(mock_dynamodb, segments=1)
+
+    assert (stats.scanned, stats.updated, stats.skipped) == (3, 2, 1)
+    written = {call.kwargs['Key']['transaction_id']: call.kwargs['ExpressionAttributeValues'][':date_key']
+               for call in mock_table.update_item.await_args_list}
+    assert written == {'a': '2024-01-15#a', 'c': '0000-00-00#c'}
+    assert mock_table.scan.call_args_list[1].kwargs['ExclusiveStartKey'] == {
+        'user_id': 'user123', 'transaction_id': 'b'}
+
+
+@pytest.mark.asyncio
+async def test_backfill_dry_run_does_not_write(mock_dynamodb, mock_table):
+    mock_table.scan.return_value = {'Items': [legacy_item('a')]}
+
+    stats = await backfill_date_keys(mock_dynamodb, segments=2, dry_run=True)
+
+    assert stats.updated == 2
+    mock_table.update_item.assert_not_awaited()
+    assert {call.kwargs['Segment'] for call in mock_table.scan.call_args_list} == {0, 1}
+
+
+@pytest.mark.asyncio
+async def test_backfill_skips_items_changed_since_scan(mock_dynamodb, mock_table):
+    mock_table.scan.return_value = {'Items': [legacy_item('a')]}
+    mock_table.update_item.side_effect = ClientError(
+        {'Error': {'Code': 'ConditionalCheckFailedException', 'Message': 'changed'}},
+        'UpdateItem'
+    )
+
+    stats = await backfill_date_keys(mock_dynamodb, segments=1)
+
+    assert (stats.updated, stats.skipped) == (0, 1)
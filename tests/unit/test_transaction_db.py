@@ -1,13 +1,23 @@
+import json
+from datetime import date
+from decimal import Decimal
+
 import pytest
 import pytest_asyncio
 from unittest.mock import AsyncMock, patch, MagicMock
 from aiohttp import ClientError
+from botocore.exceptions import ClientError as DynamoDBClientError
+from boto3.dynamodb.conditions import Attr, Key
 from fastapi import HTTPException
 
-from app.models.transaction import Transaction, TransactionDB
+from app.models.transaction import Transaction, TransactionDB, TransactionUpdate
 from app.models.DBResponse import DBResponse
 from app.models.sns import ExpenseEventType
-from app.service.transaction_db import DB
+from app.service.dynamodb import DynamoDBPool
+from app.service.outbox import OUTBOX_TABLE, OutboxRelay
+from app.service.transaction_db import DB, TRANSACTION_DATE_INDEX
+from app.service.transaction_rollups import RollupStore
+from app.utils.pagination_utils import decode_cursor, encode_cursor
 
 
 @pytest.fixture
@@ -16,29 +26,27 @@ def mock_table():
 
 
 @pytest.fixture
-def mock_dynamodb_resource(mock_table):
-    mock_dynamodb = AsyncMock()
-    mock_dynamodb.Table.return_value = mock_table
-    return mock_dynamodb
+def mock_dynamodb(mock_table):
+    mock_pool = AsyncMock(spec=DynamoDBPool)
+    mock_pool.table.return_value = mock_table
+    mock_pool.batch_get_item.return_value = {'Responses': {}}
+    mock_pool.transact_write_items.return_value = {'ResponseMetadata': {'HTTPStatusCode': 200}}
+    return mock_pool
 
 
 @pytest.fixture
-def mock_async_context_manager(mock_dynamodb_resource):
-    mock_resource = AsyncMock()
-    mock_resource.__aenter__.return_value = mock_dynamodb_resource
-    mock_resource.__aexit__.return_value = None
-    return mock_resource
+def mock_relay():
+    return MagicMock(spec=OutboxRelay)
 
 
 @pytest.fixture
-def mock_event_bus():
-    return AsyncMock()
+def mock_rollups():
+    return AsyncMock(spec=RollupStore)
 
 
 @pytest_asyncio.fixture
-async def db_instance(mock_event_bus):
-    with patch('app.service.transaction_db.EventBus', return_value=mock_event_bus):
-        return DB()
+async def db_instance(mock_relay, mock_dynamodb, mock_rollups):
+    return DB(mock_dynamodb, rollups=mock_rollups, relay=mock_relay)
 
 
 @pytest.fixture
@@ -56,7 +64,8 @@ def sample_transaction_db():
         title="Test Transaction",
         user_id="user123",
         transaction_id="txn_user123_2024-01-15_abc123",
-        amount="100.50",
+        amount_minor=10050,
+        currency="USD",
         description="Test transaction",
         date="2024-01-15",
         status=True
@@ -72,117 +81,232 @@ def mock_db_response():
 
 
 @pytest.mark.asyncio
-async def test_get_all_transactions_success(db_instance, mock_async_context_manager, mock_table, sample_transaction_db):
-    mock_table.scan.return_value = {
+async def test_get_all_transactions_success(db_instance, mock_dynamodb, mock_table, sample_transaction_db):
+    mock_table.query.return_value = {
         'Items': [sample_transaction_db.model_dump()]
     }
 
-    with patch.object(db_instance.session, "resource", return_value=mock_async_context_manager):
-        result = await db_instance.get_all_transactions("user123")
+    result = await db_instance.get_all_transactions("user123")
 
     assert result == [TransactionDB(
         title="Test Transaction",
         user_id="user123",
         transaction_id="txn_user123_2024-01-15_abc123",
-        amount="100.50",
+        amount_minor=10050,
+        currency="USD",
         description="Test transaction",
         date="2024-01-15",
         status=True
     )]
-    mock_table.scan.assert_awaited_once()
+    mock_table.query.assert_awaited_once()
+    mock_table.scan.assert_not_awaited()
+    assert mock_table.query.await_args.kwargs['KeyConditionExpression'] == Key(
+        'user_id').eq("user123")
 
 
 @pytest.mark.asyncio
-async def test_get_all_transactions_empty(db_instance, mock_async_context_manager, mock_table):
-    mock_table.scan.return_value = {'Items': []}
+async def test_get_all_transactions_empty(db_instance, mock_dynamodb, mock_table):
+    mock_table.query.return_value = {'Items': []}
 
-    with patch.object(db_instance.session, "resource", return_value=mock_async_context_manager):
-        result = await db_instance.get_all_transactions("user123")
+    result = await db_instance.get_all_transactions("user123")
 
     assert result == []
-    mock_table.scan.assert_awaited_once()
+    mock_table.query.assert_awaited_once()
+
+
+@pytest.mark.asyncio
+async def test_get_all_transactions_follows_last_evaluated_key(db_instance, mock_dynamodb, mock_table, sample_transaction_db):
+    last_key = {'user_id': 'user123',
+                'transaction_id': 'txn_user123_2024-01-15_abc123'}
+    second_item = sample_transaction_db.model_copy(
+        update={'transaction_id': 'txn_user123_2024-01-16_def456'})
+    mock_table.query.side_effect = [
+        {'Items': [sample_transaction_db.model_dump()], 'LastEvaluatedKey': last_key},
+        {'Items': [second_item.model_dump()]},
+    ]
+
+    result = await db_instance.get_all_transactions("user123")
+
+    assert [t.transaction_id for t in result] == [
+        'txn_user123_2024-01-15_abc123', 'txn_user123_2024-01-16_def456']
+    assert mock_table.query.await_count == 2
+    assert 'ExclusiveStartKey' not in mock_table.query.await_args_list[0].kwargs
+    assert mock_table.query.await_args_list[1].kwargs['ExclusiveStartKey'] == last_key
 
 
 @pytest.mark.asyncio
-async def test_get_all_transactions_client_error(db_instance, mock_async_context_manager, mock_table):
-    mock_table.scan.side_effect = ClientError(
+async def test_get_all_transactions_client_error(db_instance, mock_dynamodb, mock_table):
+    mock_table.query.side_effect = ClientError(
         {'Error': {'Code': 'ValidationException', 'Message': 'Validation error'}},
-        'ScanItem'
+        'Query'
     )
 
-    with patch.object(db_instance.session, "resource", return_value=mock_async_context_manager):
-        with pytest.raises(HTTPException) as exc_info:
-            await db_instance.get_all_transactions("user123")
+    with pytest.raises(HTTPException) as exc_info:
+        await db_instance.get_all_transactions("user123")
 
     assert exc_info.value.status_code == 500
 
 
 @pytest.mark.asyncio
-async def test_create_transaction_success(db_instance, mock_async_context_manager, mock_table, mock_event_bus, sample_transaction, mock_db_response):
-    mock_table.put_item.return_value = mock_db_response.model_dump()
+async def test_get_transaction_ids_projects_ids_only(db_instance, mock_dynamodb, mock_table):
+    mock_table.query.side_effect = [
+        {'Items': [{'transaction_id': 'a'}, {'transaction_id': 'b'}],
+         'LastEvaluatedKey': {'user_id': 'user123', 'transaction_id': 'b'}},
+        {'Items': [{'transaction_id': 'c'}]},
+    ]
+
+    result = await db_instance.get_transaction_ids("user123")
 
-    with patch.object(db_instance.session, "resource", return_value=mock_async_context_manager):
-        with patch('app.service.transaction_db.generate_transaction_id', return_value='txn_user123_2024-01-15_abc123'):
-            result = await db_instance.create_transaction("user123", sample_transaction)
+    assert result == {'a', 'b', 'c'}
+    assert mock_table.query.await_count == 2
+    for call in mock_table.query.await_args_list:
+        assert call.kwargs['ProjectionExpression'] == 'transaction_id'
+
+
+def transact_actions(mock_dynamodb, call: int = -1) -> list[dict]:
+    return mock_dynamodb.transact_write_items.await_args_list[call].kwargs['TransactItems']
+
+
+def cancelled(*codes: str) -> DynamoDBClientError:
+    return DynamoDBClientError(
+        {'Error': {'Code': 'TransactionCanceledException', 'Message': 'cancelled'},
+         'CancellationReasons': [{'Code': code} for code in codes]},
+        'TransactWriteItems'
+    )
+
+
+@pytest.mark.asyncio
+async def test_create_transaction_success(db_instance, mock_dynamodb, mock_table, mock_relay, mock_rollups, sample_transaction):
+    with patch('app.service.transaction_db.generate_transaction_id', return_value='txn_user123_2024-01-15_abc123'):
+        result = await db_instance.create_transaction("user123", sample_transaction)
 
     assert result.user_id == "user123"
     assert result.transaction_id == "txn_user123_2024-01-15_abc123"
-    mock_table.put_item.assert_awaited_once()
-    mock_event_bus.publish_event.assert_awaited_once()
+    put, event = transact_actions(mock_dynamodb)
+    assert put['Put']['TableName'] == 'Transaction'
+    assert put['Put']['Item'] == result.model_dump()
+    # the event is written in the same transaction, with the transaction's own fields
+    assert event['Put']['TableName'] == OUTBOX_TABLE
+    assert event['Put']['Item']['event_type'] == ExpenseEventType.EXPENSE_CREATED
+    assert json.loads(event['Put']['Item']['message']) == json.loads(json.dumps(sample_transaction.model_dump()))
+    assert event['Put']['Item']['event_id'].startswith("evt_")
+    mock_table.put_item.assert_not_awaited()
+    mock_relay.wake.assert_called_once()
+    mock_rollups.apply.assert_awaited_once()
 
 
 @pytest.mark.asyncio
-async def test_create_transaction_failed_response(db_instance, mock_async_context_manager, mock_table, sample_transaction):
+async def test_create_transaction_failed_response(db_instance, mock_dynamodb, sample_transaction):
     failed_response = DBResponse(ResponseMetadata={'HTTPStatusCode': 400})
-    mock_table.put_item.return_value = failed_response.model_dump()
+    mock_dynamodb.transact_write_items.return_value = failed_response.model_dump()
 
-    with patch.object(db_instance.session, "resource", return_value=mock_async_context_manager):
-        with patch('app.service.transaction_db.generate_transaction_id', return_value='txn_user123_2024-01-15_abc123'):
-            with pytest.raises(HTTPException) as exc_info:
-                await db_instance.create_transaction("user123", sample_transaction)
+    with patch('app.service.transaction_db.generate_transaction_id', return_value='txn_user123_2024-01-15_abc123'):
+        with pytest.raises(HTTPException) as exc_info:
+            await db_instance.create_transaction("user123", sample_transaction)
 
     assert exc_info.value.status_code == 400
 
 
+def make_gmail_transactions(sample_transaction_db, count):
+    return [
+        sample_transaction_db.model_copy(update={'transaction_id': f'msg_{i}'})
+        for i in range(count)
+    ]
+
+
 @pytest.mark.asyncio
-async def test_create_transaction_from_gmail_success(db_instance, mock_async_context_manager, mock_table, sample_transaction_db, mock_db_response):
+async def test_create_transaction_from_gmail_success(db_instance, mock_dynamodb, mock_table, sample_transaction_db):
     transaction_list = [sample_transaction_db]
-    mock_table.put_item.return_value = mock_db_response.model_dump()
 
-    with patch.object(db_instance.session, "resource", return_value=mock_async_context_manager):
-        result = await db_instance.create_transaction_from_gmail(transaction_list)
+    result = await db_instance.create_transaction_from_gmail(transaction_list)
 
     assert len(result) == 1
     assert result[0].user_id == "user123"
-    mock_table.put_item.assert_awaited_once()
+    put, event = transact_actions(mock_dynamodb)
+    assert put == {'Put': {'TableName': 'Transaction', 'Item': sample_transaction_db.model_dump()}}
+    assert event['Put']['Item']['event_type'] == ExpenseEventType.EXPENSE_CREATED
+    mock_table.put_item.assert_not_awaited()
 
 
 @pytest.mark.asyncio
-async def test_create_transaction_from_gmail_partial_failure(db_instance, mock_async_context_manager, mock_table, sample_transaction_db):
-    transaction_list = [sample_transaction_db, sample_transaction_db]
-    success_response = DBResponse(ResponseMetadata={'HTTPStatusCode': 200})
-    failed_response = DBResponse(ResponseMetadata={'HTTPStatusCode': 400})
+async def test_create_transaction_from_gmail_replaces_reimported_rollups(db_instance, mock_dynamodb, mock_rollups, sample_transaction_db):
+    previous = sample_transaction_db.model_copy(update={'amount_minor': 8000})
+    mock_dynamodb.batch_get_item.return_value = {
+        'Responses': {'Transaction': [previous.model_dump()]}
+    }
 
-    mock_table.put_item.side_effect = [
-        success_response.model_dump(),
-        failed_response.model_dump()
-    ]
+    await db_instance.create_transaction_from_gmail([sample_transaction_db])
 
-    with patch.object(db_instance.session, "resource", return_value=mock_async_context_manager):
-        with pytest.raises(HTTPException) as exc_info:
-            await db_instance.create_transaction_from_gmail(transaction_list)
+    keys = mock_dynamodb.batch_get_item.await_args.kwargs['RequestItems']['Transaction']['Keys']
+    assert keys == [{'user_id': 'user123', 'transaction_id': sample_transaction_db.transaction_id}]
+    deltas = dict(mock_rollups.apply.await_args.args[0].items())
+    assert deltas[("user123", "2024-01")] == {
+        'amount': Decimal("20.50"),
+        'status#split#amount': Decimal("20.50"),
+        'category#Test Transaction#amount': Decimal("20.50"),
+    }
 
-    assert exc_info.value.status_code == 400
+
+@pytest.mark.asyncio
+async def test_create_transaction_from_gmail_chunks_in_input_order(db_instance, mock_dynamodb, sample_transaction_db):
+    transaction_list = make_gmail_transactions(sample_transaction_db, 120)
+
+    result = await db_instance.create_transaction_from_gmail(transaction_list, concurrency=2)
+
+    assert [t.transaction_id for t in result] == [
+        f'msg_{i}' for i in range(120)]
+    # 100 actions per call: 50 transactions and their outbox records
+    chunk_sizes = sorted(len(call.kwargs['TransactItems'])
+                         for call in mock_dynamodb.transact_write_items.await_args_list)
+    assert chunk_sizes == [40, 100, 100]
+
+
+@pytest.mark.asyncio
+async def test_create_transaction_from_gmail_drops_duplicate_keys(db_instance, mock_dynamodb, sample_transaction_db):
+    updated = sample_transaction_db.model_copy(update={'amount': '1.00'})
+
+    result = await db_instance.create_transaction_from_gmail([sample_transaction_db, updated])
+
+    assert result == [updated]
+    assert len(transact_actions(mock_dynamodb)) == 2
+
+
+@pytest.mark.asyncio
+async def test_create_transaction_from_gmail_partial_failure(db_instance, mock_dynamodb, mock_rollups, sample_transaction_db):
+    transaction_list = make_gmail_transactions(sample_transaction_db, 60)
+    mock_dynamodb.transact_write_items.side_effect = [
+        {}, DynamoDBClientError({'Error': {'Code': 'ValidationException', 'Message': 'bad item'}}, 'TransactWriteItems')]
+
+    with pytest.raises(HTTPException) as exc_info:
+        await db_instance.create_transaction_from_gmail(transaction_list, concurrency=1)
+
+    assert exc_info.value.status_code == 500
+    assert exc_info.value.detail == "Failed to create 10 transactions"
+    # the committed chunk still counts
+    deltas = dict(mock_rollups.apply.await_args.args[0].items())
+    assert deltas[("user123", "2024-01")]["count"] == 50
+
+
+@pytest.mark.asyncio
+async def test_create_transaction_from_gmail_client_error(db_instance, mock_dynamodb, sample_transaction_db):
+    mock_dynamodb.batch_get_item.side_effect = ClientError(
+        {'Error': {'Code': 'ValidationException', 'Message': 'Validation error'}},
+        'BatchGetItem'
+    )
+
+    with pytest.raises(HTTPException) as exc_info:
+        await db_instance.create_transaction_from_gmail([sample_transaction_db])
+
+    assert exc_info.value.status_code == 500
 
 
 @pytest.mark.asyncio
-async def test_get_transaction_success(db_instance, mock_async_context_manager, mock_table, sample_transaction_db):
+async def test_get_transaction_success(db_instance, mock_dynamodb, mock_table, sample_transaction_db):
     mock_table.get_item.return_value = {
         'Item': sample_transaction_db.model_dump()
     }
 
-    with patch.object(db_instance.session, "resource", return_value=mock_async_context_manager):
-        result = await db_instance.get_transaction("txn_123", "user123")
+    result = await db_instance.get_transaction("txn_123", "user123")
 
     assert result.user_id == "user123"
     mock_table.get_item.assert_awaited_once_with(
@@ -191,25 +315,23 @@ async def test_get_transaction_success(db_instance, mock_async_context_manager,
 
 
 @pytest.mark.asyncio
-async def test_get_transaction_not_found(db_instance, mock_async_context_manager, mock_table):
+async def test_get_transaction_not_found(db_instance, mock_dynamodb, mock_table):
     mock_table.get_item.return_value = {}
 
-    with patch.object(db_instance.session, "resource", return_value=mock_async_context_manager):
-        with pytest.raises(HTTPException) as exc_info:
-            await db_instance.get_transaction("txn_123", "user123")
+    with pytest.raises(HTTPException) as exc_info:
+        await db_instance.get_transaction("txn_123", "user123")
 
     assert exc_info.value.status_code == 404
     assert "Transaction not found" in str(exc_info.value.detail)
 
 
 @pytest.mark.asyncio
-async def test_get_transaction_by_user_id_success(db_instance, mock_async_context_manager, mock_table, sample_transaction_db):
+async def test_get_transaction_by_user_id_success(db_instance, mock_dynamodb, mock_table, sample_transaction_db):
     mock_table.query.return_value = {
         'Items': [sample_transaction_db.model_dump()]
     }
 
-    with patch.object(db_instance.session, "resource", return_value=mock_async_context_manager):
-        result = await db_instance.get_transaction_by_user_id("user123")
+    result = await db_instance.get_transaction_by_user_id("user123")
 
     assert len(result) == 1
     assert result[0].user_id == "user123"
@@ -217,99 +339,353 @@ async def test_get_transaction_by_user_id_success(db_instance, mock_async_contex
 
 
 @pytest.mark.asyncio
-async def test_get_transaction_by_user_id_empty(db_instance, mock_async_context_manager, mock_table):
+async def test_get_transaction_by_user_id_empty(db_instance, mock_dynamodb, mock_table):
     mock_table.query.return_value = {'Items': []}
 
-    with patch.object(db_instance.session, "resource", return_value=mock_async_context_manager):
-        result = await db_instance.get_transaction_by_user_id("user123")
+    result = await db_instance.get_transaction_by_user_id("user123")
 
     assert result == []
 
 
 @pytest.mark.asyncio
-async def test_delete_transaction_success(db_instance, mock_async_context_manager, mock_table, mock_event_bus):
-    mock_table.delete_item.return_value = {
-        'ResponseMetadata': {'HTTPStatusCode': 200}
-    }
+async def test_get_transaction_by_user_id_filters_status(db_instance, mock_dynamodb, mock_table):
+    mock_table.query.return_value = {'Items': []}
 
-    with patch.object(db_instance.session, "resource", return_value=mock_async_context_manager):
-        await db_instance.delete_transaction("txn_123", "user123")
+    await db_instance.get_transaction_by_user_id("user123", status=True)
 
-    mock_table.delete_item.assert_awaited_once_with(
-        Key={'user_id': 'user123', 'transaction_id': 'txn_123'}
-    )
-    mock_event_bus.publish_event.assert_awaited_once_with(
-        "txn_123", ExpenseEventType.EXPENSE_DELETED
-    )
+    kwargs = mock_table.query.call_args.kwargs
+    assert kwargs['FilterExpression'] == Attr('status').eq(True)
+    assert kwargs['ScanIndexForward'] is False
 
 
 @pytest.mark.asyncio
-async def test_delete_transaction_not_found(db_instance, mock_async_context_manager, mock_table):
-    mock_table.delete_item.return_value = {
-        'ResponseMetadata': {'HTTPStatusCode': 404}
+async def test_get_transaction_by_user_id_date_range_uses_index(db_instance, mock_dynamodb, mock_table):
+    mock_table.query.return_value = {'Items': []}
+
+    await db_instance.get_transaction_by_user_id(
+        "user123", date_from=date(2024, 1, 1), date_to=date(2024, 1, 31))
+
+    kwargs = mock_table.query.call_args.kwargs
+    assert kwargs['IndexName'] == TRANSACTION_DATE_INDEX
+    assert kwargs['KeyConditionExpression'] == (
+        Key('user_id').eq("user123") & Key('date_key').between("2024-01-01", "2024-01-31$"))
+
+
+@pytest.mark.asyncio
+async def test_iter_transaction_pages_yields_each_page(db_instance, mock_dynamodb, mock_table, sample_transaction_db):
+    last_key = {'user_id': 'user123', 'transaction_id': 'txn_2'}
+    mock_table.query.side_effect = [
+        {'Items': [sample_transaction_db.model_dump()], 'LastEvaluatedKey': last_key},
+        {'Items': [sample_transaction_db.model_dump(), sample_transaction_db.model_dump()]},
+    ]
+
+    pages = [page async for page in db_instance.iter_transaction_pages("user123")]
+
+    assert [len(page) for page in pages] == [1, 2]
+    assert isinstance(pages[0][0], TransactionDB)
+    assert mock_table.query.call_args_list[1].kwargs['ExclusiveStartKey'] == last_key
+
+
+@pytest.mark.asyncio
+async def test_iter_transaction_pages_client_error(db_instance, mock_dynamodb, mock_table):
+    mock_table.query.side_effect = ClientError("boom")
+
+    with pytest.raises(HTTPException) as exc_info:
+        await anext(db_instance.iter_transaction_pages("user123"))
+
+    assert exc_info.value.status_code == 500
+
+
+@pytest.mark.asyncio
+async def test_get_transaction_page_returns_cursor(db_instance, mock_dynamodb, mock_table, sample_transaction_db):
+    last_key = {'user_id': 'user123', 'transaction_id': 'txn_2'}
+    mock_table.query.return_value = {
+        'Items': [sample_transaction_db.model_dump()],
+        'LastEvaluatedKey': last_key
     }
 
-    with patch.object(db_instance.session, "resource", return_value=mock_async_context_manager):
-        with pytest.raises(HTTPException) as exc_info:
-            await db_instance.delete_transaction("txn_123", "user123")
+    page = await db_instance.get_transaction_page("user123", limit=1)
+
+    assert len(page.items) == 1
+    assert decode_cursor(page.next_cursor, "user123") == last_key
+    assert mock_table.query.call_args.kwargs['Limit'] == 1
+
+
+@pytest.mark.asyncio
+async def test_get_transaction_page_reads_until_filtered_page_is_full(db_instance, mock_dynamodb, mock_table, sample_transaction_db):
+    item = sample_transaction_db.model_dump()
+    mock_table.query.side_effect = [
+        {'Items': [item], 'LastEvaluatedKey': {'user_id': 'user123', 'transaction_id': 'a'}},
+        {'Items': [item]},
+    ]
+
+    page = await db_instance.get_transaction_page("user123", limit=3, status=True)
+
+    assert len(page.items) == 2
+    assert page.next_cursor is None
+    second = mock_table.query.call_args_list[1].kwargs
+    assert second['Limit'] == 2
+    assert second['ExclusiveStartKey'] == {'user_id': 'user123', 'transaction_id': 'a'}
+
+
+@pytest.mark.asyncio
+async def test_get_transaction_page_rejects_foreign_cursor(db_instance, mock_dynamodb, mock_table):
+    cursor = encode_cursor({'user_id': 'other', 'transaction_id': 'a'})
+
+    with pytest.raises(HTTPException) as exc_info:
+        await db_instance.get_transaction_page("user123", limit=10, cursor=cursor)
+
+    assert exc_info.value.status_code == 400
+    mock_table.query.assert_not_awaited()
+
+
+@pytest.mark.asyncio
+async def test_delete_transaction_success(db_instance, mock_dynamodb, mock_table, mock_relay, mock_rollups, sample_transaction_db):
+    mock_table.get_item.return_value = {'Item': sample_transaction_db.model_dump()}
+
+    await db_instance.delete_transaction("txn_123", "user123")
+
+    mock_table.get_item.assert_awaited_once_with(
+        Key={'user_id': 'user123', 'transaction_id': 'txn_123'}, ConsistentRead=True)
+    delete, event = transact_actions(mock_dynamodb)
+    assert delete['Delete']['Key'] == {'user_id': 'user123', 'transaction_id': 'txn_123'}
+    # only deletes the item as it was read
+    assert delete['Delete']['ExpressionAttributeValues'][':c_amount_minor'] == 10050
+    assert event['Put']['Item']['event_type'] == ExpenseEventType.EXPENSE_DELETED
+    assert event['Put']['Item']['message'] == "txn_123"
+    mock_relay.wake.assert_called_once()
+    deltas = dict(mock_rollups.apply.await_args.args[0].items())
+    assert deltas[("user123", "2024-01")]["amount"] == Decimal("-100.50")
+    assert deltas[("user123", "2024-01")]["count"] == -1
+
+
+@pytest.mark.asyncio
+async def test_delete_transaction_not_found(db_instance, mock_dynamodb, mock_table):
+    mock_table.get_item.return_value = {}
+
+    with pytest.raises(HTTPException) as exc_info:
+        await db_instance.delete_transaction("txn_123", "user123")
 
     assert exc_info.value.status_code == 404
     assert "Transaction not found" in str(exc_info.value.detail)
+    mock_dynamodb.transact_write_items.assert_not_awaited()
 
 
 @pytest.mark.asyncio
-async def test_update_transaction_success(db_instance, mock_async_context_manager, mock_table, sample_transaction, sample_transaction_db):
-    # Setup
-    mock_table.update_item.return_value = {
-        'Attributes': sample_transaction_db.model_dump()
-    }
+async def test_delete_transaction_rereads_after_concurrent_change(db_instance, mock_dynamodb, mock_table, mock_rollups, sample_transaction_db):
+    changed = sample_transaction_db.model_copy(update={'amount_minor': 500})
+    mock_table.get_item.side_effect = [
+        {'Item': sample_transaction_db.model_dump()}, {'Item': changed.model_dump()}]
+    mock_dynamodb.transact_write_items.side_effect = [cancelled('ConditionalCheckFailed', 'None'), {}]
+
+    await db_instance.delete_transaction("txn_123", "user123")
+
+    assert transact_actions(mock_dynamodb)[0]['Delete']['ExpressionAttributeValues'][':c_amount_minor'] == 500
+    deltas = dict(mock_rollups.apply.await_args.args[0].items())
+    assert deltas[("user123", "2024-01")]["amount"] == Decimal("-5.00")
+
+
+@pytest.mark.asyncio
+async def test_delete_transaction_gives_up_on_contention(db_instance, mock_dynamodb, mock_table, sample_transaction_db):
+    mock_table.get_item.return_value = {'Item': sample_transaction_db.model_dump()}
+    mock_dynamodb.transact_write_items.side_effect = cancelled('ConditionalCheckFailed', 'None')
+
+    with pytest.raises(HTTPException) as exc_info:
+        await db_instance.delete_transaction("txn_123", "user123")
+
+    assert exc_info.value.status_code == 409
+    assert mock_dynamodb.transact_write_items.await_count == 3
 
-    with patch.object(db_instance.session, "resource", return_value=mock_async_context_manager):
-        result = await db_instance.update_transaction("txn_123", "user123", sample_transaction)
+
+@pytest.mark.asyncio
+async def test_update_transaction_success(db_instance, mock_dynamodb, mock_table, sample_transaction, sample_transaction_db):
+    mock_table.get_item.return_value = {'Item': sample_transaction_db.model_dump()}
+
+    result = await db_instance.update_transaction("txn_123", "user123", sample_transaction)
 
     assert result.user_id == "user123"
-    mock_table.update_item.assert_awaited_once()
+    update, event = transact_actions(mock_dynamodb)
+    update = update['Update']
+    assert update['Key'] == {'user_id': 'user123', 'transaction_id': 'txn_123'}
+    assert update['UpdateExpression'].startswith("SET ")
+    assert update['ConditionExpression'].startswith("attribute_exists(transaction_id) AND ")
+    # sample_transaction.date is already ISO
+    assert update['ExpressionAttributeValues'][':date_key'] == "2024-01-15#txn_123"
+    assert update['ExpressionAttributeNames']['#c_title'] == 'title'
+    assert event['Put']['Item']['event_type'] == ExpenseEventType.EXPENSE_UPDATED
+    assert json.loads(event['Put']['Item']['message'])['amount'] == "100.50"
+
+
+@pytest.mark.asyncio
+async def test_update_transaction_moves_rollup_contribution(db_instance, mock_dynamodb, mock_table, mock_rollups, sample_transaction_db):
+    mock_table.get_item.return_value = {'Item': sample_transaction_db.model_dump()}
+
+    result = await db_instance.update_transaction(
+        "txn_user123_2024-01-15_abc123", "user123", Transaction(date="02/01/2024", amount="20"))
 
-    call_args = mock_table.update_item.await_args
-    assert call_args.kwargs['Key'] == {
-        'user_id': 'user123', 'transaction_id': 'txn_123'}
-    assert 'UpdateExpression' in call_args.kwargs
-    assert 'ExpressionAttributeValues' in call_args.kwargs
-    assert 'ExpressionAttributeNames' in call_args.kwargs
-    assert call_args.kwargs['ReturnValues'] == "ALL_NEW"
+    assert result.amount == "20.00"
+    assert result.title == "Test Transaction"
+    deltas = dict(mock_rollups.apply.await_args.args[0].items())
+    assert deltas[("user123", "2024-01")]["amount"] == Decimal("-100.50")
+    assert deltas[("user123", "2024-02")]["amount"] == Decimal("20")
+    assert deltas[("user123", "2024-02")]["count"] == 1
 
 
 @pytest.mark.asyncio
-async def test_update_transaction_not_found(db_instance, mock_async_context_manager, mock_table, sample_transaction):
-    mock_table.update_item.return_value = {}
+async def test_update_amount_without_currency_keeps_the_stored_currency(db_instance, mock_dynamodb, mock_table, sample_transaction_db):
+    stored = sample_transaction_db.model_copy(update={'amount_minor': 1000, 'currency': "JPY"})
+    mock_table.get_item.return_value = {'Item': stored.model_dump()}
+
+    result = await db_instance.update_transaction(
+        "txn_user123_2024-01-15_abc123", "user123", Transaction.model_validate({'amount': "5.00"}))
+
+    assert (result.amount_minor, result.currency, result.amount) == (5, "JPY", "5")
+    values = transact_actions(mock_dynamodb)[0]['Update']['ExpressionAttributeValues']
+    assert values[':amount_minor'] == 5
+    assert values[':currency'] == "JPY"
 
-    with patch.object(db_instance.session, "resource", return_value=mock_async_context_manager):
-        with pytest.raises(HTTPException) as exc_info:
-            await db_instance.update_transaction("txn_123", "user123", sample_transaction)
+
+@pytest.mark.asyncio
+async def test_update_transaction_deleted_meanwhile(db_instance, mock_dynamodb, mock_table, sample_transaction, sample_transaction_db):
+    mock_table.get_item.side_effect = [{'Item': sample_transaction_db.model_dump()}, {}]
+    mock_dynamodb.transact_write_items.side_effect = cancelled('ConditionalCheckFailed', 'None')
+
+    with pytest.raises(HTTPException) as exc_info:
+        await db_instance.update_transaction("txn_123", "user123", sample_transaction)
+
+    assert exc_info.value.status_code == 404
+
+
+@pytest.mark.asyncio
+async def test_update_transaction_not_found(db_instance, mock_dynamodb, mock_table, sample_transaction):
+    mock_table.get_item.return_value = {}
+
+    with pytest.raises(HTTPException) as exc_info:
+        await db_instance.update_transaction("txn_123", "user123", sample_transaction)
 
     assert exc_info.value.status_code == 404
     assert "Transaction not found" in str(exc_info.value.detail)
 
 
 @pytest.mark.asyncio
-async def test_update_transaction_client_error(db_instance, mock_async_context_manager, mock_table, sample_transaction):
-    mock_table.update_item.side_effect = ClientError(
+async def test_update_transaction_client_error(db_instance, mock_dynamodb, mock_table, sample_transaction):
+    mock_table.get_item.side_effect = ClientError(
         {'Error': {'Code': 'ValidationException', 'Message': 'Validation error'}},
-        'UpdateItem'
+        'GetItem'
     )
 
-    with patch.object(db_instance.session, "resource", return_value=mock_async_context_manager):
-        with pytest.raises(HTTPException) as exc_info:
-            await db_instance.update_transaction("txn_123", "user123", sample_transaction)
+    with pytest.raises(HTTPException) as exc_info:
+        await db_instance.update_transaction("txn_123", "user123", sample_transaction)
 
     assert exc_info.value.status_code == 500
 
 
+@pytest.mark.asyncio
+async def test_bulk_create_transactions_reports_failed_chunks(db_instance, mock_dynamodb, mock_rollups):
+    transactions = [Transaction(title=f"t{i}", amount="1.00", date="2024-01-15") for i in range(60)]
+    mock_dynamodb.transact_write_items.side_effect = [
+        {}, DynamoDBClientError({'Error': {'Code': 'ValidationException', 'Message': 'bad item'}}, 'TransactWriteItems')]
+
+    results = await db_instance.bulk_create_transactions("user123", transactions, concurrency=1)
+
+    assert [result.status_code for result in results] == [201] * 50 + [500] * 10
+    assert results[0].transaction.title == "t0"
+    assert results[0].transaction_id.startswith("txn_")
+    assert results[59].transaction_id is None
+    first_call = transact_actions(mock_dynamodb, 0)
+    assert len(first_call) == 100
+    assert first_call[1]['Put']['TableName'] == OUTBOX_TABLE
+    deltas = dict(mock_rollups.apply.await_args.args[0].items())
+    assert deltas[("user123", "2024-01")]["count"] == 50
+
+
+@pytest.mark.asyncio
+async def test_bulk_update_transactions_per_item_results(db_instance, mock_dynamodb, mock_table, mock_rollups, sample_transaction_db):
+    async def get_item(Key, **kwargs):
+        return {} if Key['transaction_id'] == "missing" else {'Item': sample_transaction_db.model_dump()}
+
+    mock_table.get_item.side_effect = get_item
+    updates = [
+        TransactionUpdate(transaction_id="txn_1", amount="20"),
+        TransactionUpdate(transaction_id="missing", amount="5"),
+    ]
+
+    results = await db_instance.bulk_update_transactions("user123", updates)
+
+    assert [(result.transaction_id, result.status_code) for result in results] == [("txn_1", 200), ("missing", 404)]
+    assert results[0].transaction.amount == "20.00"
+    assert results[0].transaction.title == "Test Transaction"
+    # the key is never part of the update
+    update = transact_actions(mock_dynamodb)[0]['Update']
+    assert '#transaction_id' not in update['ExpressionAttributeNames']
+    mock_rollups.apply.assert_awaited_once()
+    deltas = dict(mock_rollups.apply.await_args.args[0].items())
+    assert deltas[("user123", "2024-01")]["amount"] == Decimal("-80.50")
+
+
+@pytest.mark.asyncio
+async def test_bulk_delete_transactions(db_instance, mock_dynamodb, mock_rollups, sample_transaction_db):
+    existing = sample_transaction_db.model_dump()
+    mock_dynamodb.batch_get_item.return_value = {'Responses': {'Transaction': [existing]}}
+    transaction_id = sample_transaction_db.transaction_id
+
+    results = await db_instance.bulk_delete_transactions("user123", [transaction_id, "missing", transaction_id])
+
+    assert [result.status_code for result in results] == [204, 404, 404]
+    keys = mock_dynamodb.batch_get_item.await_args.kwargs['RequestItems']['Transaction']['Keys']
+    assert [key['transaction_id'] for key in keys] == [transaction_id, "missing"]
+    delete, event = transact_actions(mock_dynamodb)
+    assert delete['Delete']['Key'] == {'user_id': 'user123', 'transaction_id': transaction_id}
+    assert event['Put']['Item']['message'] == transaction_id
+    deltas = dict(mock_rollups.apply.await_args.args[0].items())
+    assert deltas[("user123", "2024-01")]["count"] == -1
+
+
+@pytest.mark.asyncio
+async def test_bulk_delete_transactions_retries_cancelled_chunk_per_item(db_instance, mock_dynamodb, mock_table, sample_transaction_db):
+    items = [sample_transaction_db.model_copy(update={'transaction_id': f"txn_{i}"}).model_dump() for i in range(2)]
+    mock_dynamodb.batch_get_item.return_value = {'Responses': {'Transaction': items}}
+    # txn_1 was deleted after it was read, which cancels the whole call
+    mock_dynamodb.transact_write_items.side_effect = [cancelled('None', 'None', 'ConditionalCheckFailed', 'None'), {}]
+    mock_table.get_item.side_effect = [{'Item': items[0]}, {}]
+
+    results = await db_instance.bulk_delete_transactions("user123", ["txn_0", "txn_1"])
+
+    assert [result.status_code for result in results] == [204, 404]
+    assert mock_dynamodb.transact_write_items.await_count == 2
+
+
 def test_generate_transaction_id():
     from app.service.transaction_db import generate_transaction_id
 
-    user_id = "testuser"
-    transaction_id = generate_transaction_id(user_id)
+    first = generate_transaction_id()
+    second = generate_transaction_id()
+
+    assert first.startswith("txn_")
+    assert len(first) == len("txn_") + 26
+    assert first < second
+
+
+@pytest.mark.asyncio
+async def test_throttled_or_conflicting_transactions_are_retried(db_instance, mock_dynamodb):
+    mock_dynamodb.transact_write_items.side_effect = [
+        cancelled('None', 'ThrottlingError'), cancelled('TransactionConflict', 'None'), {}]
+    transactions = [Transaction(title=f"t{i}", amount="1.00", date="2024-01-15") for i in range(2)]
+
+    with patch('app.service.transaction_db.BATCH_WRITE_BACKOFF_SECONDS', 0):
+        results = await db_instance.bulk_create_transactions("user123", transactions)
+
+    assert [result.status_code for result in results] == [201, 201]
+    assert mock_dynamodb.transact_write_items.await_count == 3
+
+
+@pytest.mark.asyncio
+async def test_transactions_still_throttled_after_the_retries_fail(db_instance, mock_dynamodb):
+    mock_dynamodb.transact_write_items.side_effect = cancelled('ThrottlingError')
+
+    with patch('app.service.transaction_db.BATCH_WRITE_BACKOFF_SECONDS', 0):
+        results = await db_instance.bulk_create_transactions(
+            "user123", [Transaction(title="t", amount="1.00", date="2024-01-15")])
 
-    assert transaction_id.startswith(f"txn_{user_id}_")
-    assert len(transaction_id.split("_")) == 4
+    assert results[0].status_code == 500
+    assert mock_dynamodb.transact_write_items.await_count == 5
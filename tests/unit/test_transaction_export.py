@@ -0,0 +1,76 @@
+import csv
+import io
+import json
+
+import pytest
+
+from app.models.transaction import TransactionDB
+from app.service.transaction_export import CSV_COLUMNS, csv_chunks, export_chunks, ndjson_chunks
+
+
+def transaction(transaction_id: str, title: str = "Coffee") -> TransactionDB:
+    return TransactionDB(user_id="user123", transaction_id=transaction_id, title=title,
+                         date="2024-01-15", amount_minor=450, currency="USD", description="Chase: Coffee", status=False)
+
+
+async def pages_of(*pages):
+    for page in pages:
+        yield page
+
+
+async def collect(chunks) -> list[str]:
+    return [chunk async for chunk in chunks]
+
+
+@pytest.mark.asyncio
+async def test_csv_chunks_one_per_page_with_header_first():
+    chunks = await collect(csv_chunks(pages_of([transaction("a")], [transaction("b", title='Bar, "Grill"')])))
+
+    assert len(chunks) == 2
+    rows = list(csv.DictReader(io.StringIO("".join(chunks))))
+    assert [row['transaction_id'] for row in rows] == ["a", "b"]
+    assert rows[1]['title'] == 'Bar, "Grill"'
+    assert rows[0]['date'] == "2024-01-15"
+    assert rows[0]['amount'] == "4.50"
+    assert rows[0]['currency'] == "USD"
+    assert chunks[0].splitlines()[0] == ",".join(CSV_COLUMNS)
+
+
+@pytest.mark.asyncio
+async def test_csv_chunks_neutralize_formulas_in_text_cells():
+    risky = transaction("a", title='=HYPERLINK("http://evil","x")')
+    risky.description = "@SUM(A1)"
+    risky.amount_minor = -450
+
+    chunks = await collect(csv_chunks(pages_of([risky, transaction("b", title="-5% off")])))
+
+    rows = list(csv.DictReader(io.StringIO("".join(chunks))))
+    assert rows[0]['title'] == '\'=HYPERLINK("http://evil","x")'
+    assert rows[0]['description'] == "'@SUM(A1)"
+    # amounts are numbers we formatted, so a minus sign stays
+    assert rows[0]['amount'] == "-4.50"
+    assert rows[1]['title'] == "'-5% off"
+
+
+@pytest.mark.asyncio
+async def test_csv_chunks_empty_history_is_just_the_header():
+    chunks = await collect(csv_chunks(pages_of()))
+
+    assert chunks == [",".join(CSV_COLUMNS) + "\r\n"]
+
+
+@pytest.mark.asyncio
+async def test_ndjson_chunks_one_object_per_line():
+    chunks = await collect(ndjson_chunks(pages_of([transaction("a"), transaction("b")], [])))
+
+    assert len(chunks) == 1
+    lines = [json.loads(line) for line in chunks[0].splitlines()]
+    assert [line['transaction_id'] for line in lines] == ["a", "b"]
+    assert lines[0] == transaction("a").model_dump(mode="json")
+
+
+@pytest.mark.asyncio
+async def test_export_chunks_picks_the_format():
+    chunks = await collect(export_chunks(pages_of([transaction("a")]), "ndjson"))
+
+    assert json.loads(chunks[0])['transaction_id'] == "a"
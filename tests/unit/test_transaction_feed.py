@@ -0,0 +1,131 @@
+import asyncio
+import json
+from unittest.mock import AsyncMock, MagicMock
+
+import pytest
+
+from app.models.sns import ExpenseEventType
+from app.service.transaction_feed import RESYNC_EVENT, FeedEvent, TopicSubscription, TransactionFeed
+
+
+def deleted(transaction_id: str) -> FeedEvent:
+    return FeedEvent(ExpenseEventType.EXPENSE_DELETED, transaction_id, event_id=f"evt_{transaction_id}")
+
+
+def test_events_only_reach_the_users_own_clients():
+    feed = TransactionFeed()
+    first, second = feed.subscribe("user123"), feed.subscribe("user123")
+    other = feed.subscribe("user456")
+
+    feed.publish("user123", deleted("txn_1"))
+
+    assert first.queue.get_nowait().transaction_id == "txn_1"
+    assert second.queue.get_nowait().transaction_id == "txn_1"
+    assert other.queue.empty()
+    assert feed.stats() == {"users": 2, "clients": 3, "published": 1, "resyncs": 0}
+
+
+def test_a_full_buffer_is_replaced_by_a_resync():
+    feed = TransactionFeed(buffer_size=2)
+    slow = feed.subscribe("user123")
+
+    for i in range(3):
+        feed.publish("user123", deleted(f"txn_{i}"))
+    feed.publish("user123", deleted("txn_3"))
+
+    assert [slow.queue.get_nowait().event_type for _ in range(2)] == [RESYNC_EVENT, ExpenseEventType.EXPENSE_DELETED]
+    assert feed.resyncs == 1
+
+
+def test_sse_format():
+    event = FeedEvent(ExpenseEventType.EXPENSE_UPDATED, "txn_1", {"transaction_id": "txn_1", "title": "Coffee"}, "evt_1")
+
+    lines = event.sse().split("\n")
+
+    assert lines[:2] == ["event: expense_updated", "id: evt_1"]
+    assert json.loads(lines[2].removeprefix("data: ")) == {
+        "transaction_id": "txn_1", "transaction": {"transaction_id": "txn_1", "title": "Coffee"}}
+    assert event.sse().endswith("\n\n")
+
+
+@pytest.mark.asyncio
+async def test_stream_sends_keepalives_and_unsubscribes_when_closed():
+    feed = TransactionFeed()
+    stream = feed.stream("user123", keepalive=0.01)
+
+    assert await anext(stream) == ": connected\n\n"
+    assert await anext(stream) == ": keepalive\n\n"
+    feed.publish("user123", deleted("txn_1"))
+    assert (await anext(stream)).startswith("event: expense_deleted\nid: evt_txn_1\n")
+
+    await stream.aclose()
+    assert feed.stats()["clients"] == 0
+
+
+def topic_message(message_id: str, body: str, **attributes) -> dict:
+    return {'MessageId': message_id, 'ReceiptHandle': f"rh_{message_id}", 'Body': body,
+            'MessageAttributes': {name: {'DataType': 'String', 'StringValue': value}
+                                  for name, value in attributes.items()}}
+
+
+def topic_subscription(feed: TransactionFeed, sqs: AsyncMock, sns: AsyncMock) -> TopicSubscription:
+    subscription = TopicSubscription(feed, queue_prefix="feed", topic_arn="arn:topic")
+    contexts = {}
+    for name, client in (("sqs", sqs), ("sns", sns)):
+        contexts[name] = MagicMock()
+        contexts[name].__aenter__ = AsyncMock(return_value=client)
+        contexts[name].__aexit__ = AsyncMock(return_value=False)
+    subscription.session = MagicMock()
+    subscription.session.client.side_effect = lambda name, region_name: contexts[name]
+    return subscription
+
+
+def sqs_client(*batches) -> AsyncMock:
+    sqs = AsyncMock()
+    sqs.create_queue.return_value = {'QueueUrl': "https://sqs/feed-1"}
+    sqs.get_queue_attributes.return_value = {'Attributes': {'QueueArn': "arn:queue"}}
+    sqs.receive_message.side_effect = [{'Messages': list(batch)} for batch in batches]
+    return sqs
+
+
+@pytest.mark.asyncio
+async def test_topic_messages_reach_the_feed_and_are_deleted():
+    feed = TransactionFeed()
+    subscriber = feed.subscribe("user123")
+    sqs = sqs_client([
+        topic_message("m1", "txn_1", EventType=ExpenseEventType.EXPENSE_DELETED, UserId="user123",
+                      TransactionId="txn_1", IdempotencyKey="evt_1"),
+        topic_message("m2", "txn_2", EventType=ExpenseEventType.EXPENSE_DELETED),
+    ])
+    sns = AsyncMock()
+    sns.subscribe.return_value = {'SubscriptionArn': "arn:subscription"}
+    subscription = topic_subscription(feed, sqs, sns)
+
+    await subscription._subscribe()
+    assert await subscription.receive_once() == 2
+
+    assert sns.subscribe.await_args.kwargs['Endpoint'] == "arn:queue"
+    assert sns.subscribe.await_args.kwargs['Attributes'] == {'RawMessageDelivery': 'true'}
+    assert subscriber.queue.get_nowait() == FeedEvent(ExpenseEventType.EXPENSE_DELETED, "txn_1", event_id="evt_1")
+    entries = sqs.delete_message_batch.await_args.kwargs['Entries']
+    assert [entry['ReceiptHandle'] for entry in entries] == ["rh_m1", "rh_m2"]
+    assert subscription.stats() == {"active": False, "received": 1, "malformed": 1}
+
+    await subscription._unsubscribe()
+    sns.unsubscribe.assert_awaited_once_with(SubscriptionArn="arn:subscription")
+    sqs.delete_queue.assert_awaited_once_with(QueueUrl="https://sqs/feed-1")
+
+
+@pytest.mark.asyncio
+async def test_subscription_stays_inactive_when_setup_fails():
+    sqs = sqs_client()
+    sqs.create_queue.side_effect = RuntimeError("access denied")
+    subscription = topic_subscription(TransactionFeed(), sqs, AsyncMock())
+
+    async with subscription:
+        assert not subscription.active
+    sqs.delete_queue.assert_not_awaited()
+
+    unconfigured = TopicSubscription(TransactionFeed(), queue_prefix=None, topic_arn="arn:topic")
+    async with unconfigured:
+        assert not unconfigured.active
@@ -0,0 +1,45 @@
+from app.utils.transaction_key_utils import (
+    UNDATED,
+    date_key_upper_bound,
+    new_ulid,
+    normalize_date,
+    transaction_date_key,
+)
+
+
+def test_new_ulid_is_monotonic_within_a_millisecond():
+    ids = [new_ulid() for _ in range(1000)]
+
+    assert ids == sorted(ids)
+    assert len(set(ids)) == len(ids)
+    assert all(len(ulid) == 26 for ulid in ids)
+
+
+def test_normalize_date_formats():
+    assert normalize_date("01/15/2024") == "2024-01-15"
+    assert normalize_date("2024-01-15") == "2024-01-15"
+    assert normalize_date("Jan 15, 2024") == "2024-01-15"
+
+
+def test_normalize_date_invalid():
+    assert normalize_date(None) is None
+    assert normalize_date("") is None
+    assert normalize_date("not a date") is None
+
+
+def test_transaction_date_key_sorts_by_date():
+    keys = [
+        transaction_date_key("02/01/2024", "txn_a"),
+        transaction_date_key("12/31/2023", "txn_b"),
+        transaction_date_key(None, "txn_c"),
+    ]
+
+    assert keys[2] == f"{UNDATED}#txn_c"
+    assert sorted(keys) == [keys[2], keys[1], keys[0]]
+
+
+def test_date_key_upper_bound_covers_whole_day():
+    key = transaction_date_key("01/15/2024", "txn_zzz")
+
+    assert "2024-01-15" < key < date_key_upper_bound("2024-01-15")
+    assert date_key_upper_bound("2024-01-15") < "2024-01-16"
@@ -0,0 +1,94 @@
+from datetime import date
+from decimal import Decimal
+
+import pytest
+from pydantic import ValidationError
+
+from app.models.transaction import Transaction, TransactionDB
+
+
+def test_legacy_strings_are_converted():
+    transaction = Transaction(amount="$1,234.50", date="02/05/2025")
+
+    assert transaction.amount_minor == 123450
+    assert transaction.currency == "USD"
+    assert transaction.date == date(2025, 2, 5)
+    assert transaction.amount == "1234.50"
+
+
+def test_free_form_legacy_date_is_normalized():
+    assert Transaction(date="Feb 5, 2025").date == date(2025, 2, 5)
+    assert Transaction(date="").date is None
+
+
+@pytest.mark.parametrize("data", [
+    {'amount': "n/a"},
+    {'date': "not a date"},
+    {'currency': "XYZ"},
+    {'amount': "5.00", 'currency': "dollars"},
+    {'amount': "12.00 EUR", 'currency': "USD"},
+])
+def test_unreadable_input_is_rejected(data):
+    with pytest.raises(ValidationError):
+        Transaction.model_validate(data)
+
+
+def test_unreadable_stored_values_are_dropped():
+    transaction = TransactionDB.from_item(
+        {'user_id': "u", 'transaction_id': "t", 'amount': "n/a", 'date': "not a date", 'currency': "dollars"})
+
+    assert transaction.amount_minor is None
+    assert transaction.amount is None
+    assert transaction.date is None
+    assert transaction.currency == "dollars"
+
+
+def test_stored_models_only_read_typed_values():
+    item = {'user_id': "u", 'transaction_id': "t", 'amount': "4.50", 'date': "02/05/2025"}
+
+    with pytest.raises(ValidationError):
+        TransactionDB.model_validate(item)
+    assert TransactionDB.from_item(item).amount_minor == 450
+
+
+@pytest.mark.parametrize("data, amount_minor, currency", [
+    ({'amount': "5.00", 'currency': "JPY"}, 5, "JPY"),
+    ({'amount': "1.234", 'currency': "KWD"}, 1234, "KWD"),
+    ({'amount': "5.00", 'currency': "eur"}, 500, "EUR"),
+    ({'amount': "12,50 €"}, 1250, "EUR"),
+    ({'amount': "1.234,50 EUR"}, 123450, "EUR"),
+])
+def test_legacy_amount_is_scaled_by_its_currency(data, amount_minor, currency):
+    transaction = Transaction.model_validate(data)
+
+    assert (transaction.amount_minor, transaction.currency) == (amount_minor, currency)
+
+
+def test_typed_values_take_precedence_over_legacy_amount():
+    transaction = Transaction.model_validate(
+        {'amount': "999.00", 'amount_minor': Decimal(1050), 'currency': "EUR", 'date': "2025-02-05"})
+
+    assert transaction.amount_minor == 1050
+    assert transaction.amount == "10.50"
+
+
+def test_dump_is_ready_for_dynamodb():
+    item = TransactionDB.from_item(
+        {'user_id': "u", 'transaction_id': "t", 'amount': "4.50", 'date': "02/05/2025"}).model_dump()
+
+    assert item['date'] == "2025-02-05"
+    assert item['amount'] == "4.50"
+    assert item['amount_minor'] == 450
+    assert item['date_key'] == "2025-02-05#t"
+    assert TransactionDB.model_validate(item).model_dump() == item
+
+
+def test_from_items_reads_typed_and_legacy_items_alike():
+    typed = {'user_id': "u", 'transaction_id': "t1", 'amount_minor': Decimal(450), 'currency': "USD",
+             'amount': "4.50", 'date': "2025-02-05", 'date_key': "2025-02-05#t1"}
+    legacy = {'user_id': "u", 'transaction_id': "t2", 'amount': "$4.50", 'date': "02/05/2025"}
+
+    first, second = TransactionDB.from_items([typed, legacy])
+
+    assert (first.amount_minor, first.date) == (450, date(2025, 2, 5))
+    assert (second.amount_minor, second.currency, second.date) == (450, "USD", date(2025, 2, 5))
@@ -0,0 +1,69 @@
+import json
+from datetime import date
+from pathlib import Path
+import pytest
+
+from app.models.email import Email
+from app.service.transaction_parsers import ParserRegistry, RegexParser, default_registry
+
+CORPUS_PATH = Path(__file__).parent.parent / "data" / "bank_email_corpus.json"
+CORPUS = json.loads(CORPUS_PATH.read_text())
+
+
+@pytest.mark.parametrize("case", CORPUS, ids=[case["id"] for case in CORPUS])
+def test_default_registry_matches_corpus(case):
+    email = Email(id=case["id"], body=case["body"], sender=case["sender"])
+
+    transaction = default_registry.parse("user123", email)
+
+    if case["expected"] is None:
+        assert transaction is None
+    else:
+        assert transaction is not None
+        assert transaction.user_id == "user123"
+        assert transaction.transaction_id == case["id"]
+        assert transaction.status is False
+        serialized = transaction.model_dump(mode="json")
+        assert {key: serialized[key] for key in case["expected"]} == case["expected"]
+
+
+def test_split_returns_unmatched_emails_for_gemini():
+    emails = [Email(id=case["id"], body=case["body"], sender=case["sender"]) for case in CORPUS]
+
+    parsed, unmatched = default_registry.split("user123", emails)
+
+    expected_parsed = [case["id"] for case in CORPUS if case["expected"]]
+    assert [t.transaction_id for t in parsed] == expected_parsed
+    assert [email.id for email in unmatched] == [
+        case["id"] for case in CORPUS if not case["expected"]]
+
+
+@pytest.mark.parametrize("sender", [
+    "Chase <no.reply.alerts@chase.com.attacker.example>",
+    "no.reply@notchase.com",
+    "Chase <alerts@chase.com> via <phish@attacker.example>",
+])
+def test_lookalike_senders_are_not_matched(sender):
+    chase = next(parser for parser in default_registry.parsers if parser.name == "Chase")
+
+    assert not chase.matches_sender(sender)
+
+
+def test_registered_parser_is_used():
+    registry = ParserRegistry()
+    registry.register(RegexParser(
+        name="Venmo",
+        sender_pattern=r"@venmo\.com",
+        body_pattern=r"You paid (?P<merchant>.+?) \$(?P<amount>[\d.]+) on (?P<date>\d{2}/\d{2}/\d{4})",
+        date_formats=("%m/%d/%Y",),
+    ))
+    email = Email(id="v1", body="You paid Alex $12.00 on 07/04/2025",
+                  sender="venmo@venmo.com")
+
+    transaction = registry.parse("user123", email)
+
+    assert transaction.title == "Alex"
+    assert transaction.amount_minor == 1200
+    assert transaction.currency == "USD"
+    assert transaction.date == date(2025, 7, 4)
+    assert transaction.description == "Venmo: Alex"
@@ -0,0 +1,170 @@
+from decimal import Decimal
+from unittest.mock import AsyncMock, MagicMock
+
+import pytest
+
+from app.migrations.transaction_rollups import rebuild_rollups
+from app.service.dynamodb import DynamoDBPool
+from app.service.transaction_rollups import (
+    ROLLUP_TABLE,
+    RollupDeltas,
+    RollupStore,
+    item_amount,
+    summary_from_item,
+)
+
+
+def transaction(transaction_id: str, amount: str, date: str = "01/15/2024",
+                title: str = "Coffee", status: bool = False) -> dict:
+    return {'user_id': 'user123', 'transaction_id': transaction_id, 'amount': amount,
+            'date': date, 'title': title, 'status': status}
+
+
+@pytest.fixture
+def tables():
+    return {'Transaction': AsyncMock(), ROLLUP_TABLE: AsyncMock()}
+
+
+@pytest.fixture
+def mock_dynamodb(tables):
+    mock_pool = AsyncMock(spec=DynamoDBPool)
+    mock_pool.table.side_effect = lambda name: tables[name]
+    return mock_pool
+
+
+def test_item_amount_prefers_minor_units():
+    assert item_amount({'amount_minor': Decimal(123450), 'currency': 'USD', 'amount': 'stale'}) == Decimal("1234.50")
+    assert item_amount({'amount_minor': 5000, 'currency': 'KRW'}) == Decimal(5000)
+    assert item_amount({'amount': "$4.50"}) == Decimal("4.50")
+    assert item_amount({'amount': "abc"}) is None
+    assert item_amount({}) is None
+
+
+def test_rollup_deltas_cancel_out_unchanged_buckets():
+    deltas = RollupDeltas()
+    deltas.remove(transaction("a", "10.00"))
+    deltas.add(transaction("a", "12.00"))
+
+    assert deltas.items() == [(("user123", "2024-01"), {
+        'amount': Decimal("2.00"),
+        'status#unsplit#amount': Decimal("2.00"),
+        'category#Coffee#amount': Decimal("2.00"),
+    })]
+
+
+def test_rollup_deltas_keep_currencies_apart():
+    deltas = RollupDeltas()
+    deltas.add(transaction("a", "10.00"))
+    deltas.add({**transaction("b", "500"), 'amount_minor': 500, 'currency': "JPY"})
+
+    (_, counters), = deltas.items()
+    assert counters['amount'] == Decimal("10.00")
+    assert counters['count'] == 1
+    assert counters['currency#JPY#amount'] == Decimal(500)
+    assert counters['currency#JPY#category#Coffee#count'] == 1
+
+
+def test_summary_from_item_reports_one_currency():
+    item = {
+        'amount': Decimal("10.00"), 'count': Decimal(1),
+        'status#unsplit#amount': Decimal("10.00"), 'status#unsplit#count': Decimal(1),
+        'currency#JPY#amount': Decimal(500), 'currency#JPY#count': Decimal(1),
+        'currency#JPY#status#unsplit#amount': Decimal(500), 'currency#JPY#status#unsplit#count': Decimal(1),
+    }
+
+    usd = summary_from_item("2024-01", item)
+    jpy = summary_from_item("2024-01", item, "JPY")
+
+    assert (usd.currency, usd.amount, usd.count) == ("USD", Decimal("10.00"), 1)
+    assert (jpy.currency, jpy.amount, jpy.count) == ("JPY", Decimal(500), 1)
+    assert jpy.by_status["unsplit"].amount == Decimal(500)
+    assert usd.currencies == jpy.currencies == ["JPY", "USD"]
+
+
+def test_rollup_deltas_unparseable_amount_counts_only():
+    deltas = RollupDeltas()
+    deltas.add(transaction("a", "n/a", date=None, title=None))
+
+    assert deltas.items() == [(("user123", "0000-00"), {
+        'count': 1, 'status#unsplit#count': 1, 'category#uncategorized#count': 1,
+    })]
+
+
+@pytest.mark.asyncio
+async def test_apply_issues_one_add_per_month(mock_dynamodb, tables):
+    deltas = RollupDeltas()
+    deltas.add(transaction("a", "10.00"))
+    deltas.add(transaction("b", "5.00", date="02/01/2024"))
+
+    await RollupStore(mock_dynamodb).apply(deltas)
+
+    rollup_table = tables[ROLLUP_TABLE]
+    assert rollup_table.update_item.await_count == 2
+    call = rollup_table.update_item.await_args_list[0].kwargs
+    assert call['Key'] == {'user_id': 'user123', 'month': '2024-01'}
+    assert call['UpdateExpression'].startswith("ADD #c0 :c0, ")
+    assert call['ExpressionAttributeNames']['#c0'] == 'amount'
+    assert call['ExpressionAttributeValues'][':c0'] == Decimal("10.00")
+
+
+@pytest.mark.asyncio
+async def test_apply_splits_a_month_with_many_titles(mock_dynamodb, tables):
+    deltas = RollupDeltas()
+    for i in range(500):
+        deltas.add(transaction(f"t{i}", "1.00", title=f"Shop {i}"))
+
+    await RollupStore(mock_dynamodb).apply(deltas)
+
+    calls = [call.kwargs for call in tables[ROLLUP_TABLE].update_item.await_args_list]
+    assert len(calls) > 1
+    assert all(len(call['UpdateExpression']) < 4096 for call in calls)
+    counters = {}
+    for call in calls:
+        assert call['Key'] == {'user_id': 'user123', 'month': '2024-01'}
+        for placeholder, name in call['ExpressionAttributeNames'].items():
+            counters[name] = call['ExpressionAttributeValues'][":" + placeholder[1:]]
+    assert counters['count'] == 500
+    assert counters['amount'] == Decimal("500.00")
+    assert counters['category#Shop 499#count'] == 1
+
+
+def test_summary_from_item_hides_emptied_buckets():
+    summary = summary_from_item("2024-01", {
+        'user_id': 'user123', 'month': '2024-01',
+        'amount': Decimal("15.00"), 'count': Decimal(2),
+        'status#split#amount': Decimal("15.00"), 'status#split#count': Decimal(2),
+        'category#Coffee#amount': Decimal("15.00"), 'category#Coffee#count': Decimal(2),
+        'category#Rent#amount': Decimal(0), 'category#Rent#count': Decimal(0),
+    })
+
+    assert summary.amount == Decimal("15.00")
+    assert summary.count == 2
+    assert summary.by_status["split"].count == 2
+    assert list(summary.by_category) == ["Coffee"]
+
+
+def test_summary_from_item_missing_month():
+    summary = summary_from_item("2024-03", {})
+
+    assert summary.count == 0
+    assert summary.by_category == {}
+
+
+@pytest.mark.asyncio
+async def test_rebuild_rollups_overwrites_and_deletes_stale(mock_dynamodb, tables):
+    tables['Transaction'].query.return_value = {'Items': [
+        transaction("a", "10.00"), transaction("b", "5.00", status=True)]}
+    tables[ROLLUP_TABLE].query.return_value = {'Items': [
+        {'user_id': 'user123', 'month': '2024-01'}, {'user_id': 'user123', 'month': '2023-12'}]}
+    batch = AsyncMock()
+    tables[ROLLUP_TABLE].batch_writer = MagicMock(return_value=batch)
+    batch.__aenter__.return_value = batch
+
+    stats = await rebuild_rollups(mock_dynamodb, user_id="user123")
+
+    assert (stats.transactions, stats.written, stats.deleted) == (2, 1, 1)
+    item = batch.put_item.await_args.kwargs['Item']
+    assert item['month'] == '2024-01'
+    assert item['amount'] == Decimal("15.00")
+    assert item['status#split#count'] == 1
+    batch.delete_item.assert_awaited_once_with(Key={'user_id': 'user123', 'month': '2023-12'})
@@ -3,12 +3,14 @@ import pytest_asyncio
 from unittest.mock import AsyncMock, patch, MagicMock
 
 from app.models.auth import UserInDB
-from app.service.user_db import UserDB
+from app.service.dynamodb import DynamoDBPool
+from app.service.user_cache import UserCache
+from app.service.user_db import GMAIL_ADDRESS_INDEX, UserDB
 
 
 @pytest_asyncio.fixture
-async def user_db():
-    return UserDB()
+async def user_db(mock_dynamodb):
+    return UserDB(mock_dynamodb)
 
 
 @pytest.fixture
@@ -18,35 +20,19 @@ def mock_table():
 
 
 @pytest.fixture
-def mock_dynamodb_resource(mock_table):
-    mock_dynamodb = AsyncMock()
-    mock_dynamodb.Table.return_value = mock_table
-    return mock_dynamodb
-
-
-@pytest.fixture
-def mock_async_context_manager(mock_dynamodb_resource):
-    mock_resource = AsyncMock()
-    mock_resource.__aenter__.return_value = mock_dynamodb_resource
-    mock_resource.__aexit__.return_value = None
-    return mock_resource
-
-
-@pytest.fixture
-def mock_session_with_resource(mock_async_context_manager):
-    mock_session = MagicMock()
-    mock_session.resource.return_value = mock_async_context_manager
-    return mock_session
+def mock_dynamodb(mock_table):
+    mock_pool = AsyncMock(spec=DynamoDBPool)
+    mock_pool.table.return_value = mock_table
+    return mock_pool
 
 
 @pytest.mark.asyncio
-async def test_get_user_by_userid_found(mock_session_with_resource, mock_table):
+async def test_get_user_by_userid_found(mock_dynamodb, mock_table):
     mock_table.get_item.return_value = {
         "Item": {"user_id": "123", "name": "Alice", "hashed_password": "hashed_pw"}
     }
 
-    user_db = UserDB()
-    user_db.session = mock_session_with_resource
+    user_db = UserDB(mock_dynamodb)
 
     user = await user_db.get_user_by_userid("123")
 
@@ -56,7 +42,7 @@ async def test_get_user_by_userid_found(mock_session_with_resource, mock_table):
 
 
 @pytest.mark.asyncio
-async def test_get_user_by_userid_not_found(user_db, mock_async_context_manager, mock_table):
+async def test_get_user_by_userid_not_found(user_db, mock_dynamodb, mock_table):
     mock_table.get_item.return_value = {}
 
     result = await user_db.get_user_by_userid("missing")
@@ -66,11 +52,10 @@ async def test_get_user_by_userid_not_found(user_db, mock_async_context_manager,
 
 
 @pytest.mark.asyncio
-async def test_create_user_success(user_db, mock_async_context_manager, mock_table):
+async def test_create_user_success(user_db, mock_dynamodb, mock_table):
     user = UserInDB(user_id="alice", hashed_password="pw123")
 
-    with patch.object(user_db.session, "resource", return_value=mock_async_context_manager):
-        await user_db.create_user(user)
+    await user_db.create_user(user)
 
     mock_table.put_item.assert_awaited_once_with(
         Item=user.model_dump(),
@@ -79,12 +64,114 @@ async def test_create_user_success(user_db, mock_async_context_manager, mock_tab
 
 
 @pytest.mark.asyncio
-async def test_update_user_credentials_success(user_db, mock_async_context_manager, mock_table):
-    with patch.object(user_db.session, "resource", return_value=mock_async_context_manager):
-        await user_db.update_user_credentials("bob", "secret-creds")
+async def test_update_user_credentials_success(user_db, mock_dynamodb, mock_table):
+    await user_db.update_user_credentials("bob", "secret-creds")
 
     mock_table.update_item.assert_awaited_once_with(
         Key={"user_id": "bob"},
         UpdateExpression="SET google_credentials = :val",
         ExpressionAttributeValues={":val": "secret-creds"}
     )
+
+
+@pytest.mark.asyncio
+async def test_update_gmail_history_id_success(user_db, mock_dynamodb, mock_table):
+    await user_db.update_gmail_history_id("bob", "12345")
+
+    mock_table.update_item.assert_awaited_once_with(
+        Key={"user_id": "bob"},
+        UpdateExpression="SET gmail_history_id = :val",
+        ExpressionAttributeValues={":val": "12345"}
+    )
+
+
+@pytest.mark.asyncio
+async def test_get_user_by_userid_served_from_cache(mock_dynamodb, mock_table):
+    mock_table.get_item.return_value = {
+        "Item": {"user_id": "123", "hashed_password": "hashed_pw"}
+    }
+    cache = UserCache()
+    user_db = UserDB(mock_dynamodb, cache=cache)
+
+    first = await user_db.get_user_by_userid("123")
+    second = await user_db.get_user_by_userid("123")
+
+    assert first == second == UserInDB(user_id="123", hashed_password="hashed_pw")
+    mock_table.get_item.assert_awaited_once()
+    assert cache.stats()["hits"] == 1
+    assert cache.stats()["misses"] == 1
+
+
+@pytest.mark.asyncio
+async def test_missing_user_is_not_cached(mock_dynamodb, mock_table):
+    mock_table.get_item.return_value = {}
+    user_db = UserDB(mock_dynamodb, cache=UserCache())
+
+    assert await user_db.get_user_by_userid("missing") is None
+    assert await user_db.get_user_by_userid("missing") is None
+
+    assert mock_table.get_item.await_count == 2
+
+
+@pytest.mark.asyncio
+async def test_writes_invalidate_cached_user(mock_dynamodb, mock_table):
+    mock_table.get_item.return_value = {
+        "Item": {"user_id": "bob", "hashed_password": "hashed_pw"}
+    }
+    cache = UserCache()
+    user_db = UserDB(mock_dynamodb, cache=cache)
+
+    await user_db.get_user_by_userid("bob")
+    await user_db.update_user_credentials("bob", "secret-creds")
+    await user_db.get_user_by_userid("bob")
+    await user_db.update_gmail_history_id("bob", "42")
+    await user_db.get_user_by_userid("bob")
+
+    assert mock_table.get_item.await_count == 3
+
+
+@pytest.mark.asyncio
+async def test_update_user_password_success(user_db, mock_dynamodb, mock_table):
+    await user_db.update_user_password("bob", "new-hash")
+
+    mock_table.update_item.assert_awaited_once_with(
+        Key={"user_id": "bob"},
+        UpdateExpression="SET hashed_password = :val",
+        ExpressionAttributeValues={":val": "new-hash"}
+    )
+
+
+@pytest.mark.asyncio
+async def test_get_user_by_gmail_address_reads_through_the_index(user_db, mock_table):
+    mock_table.query.return_value = {"Items": [{"user_id": "bob", "gmail_address": "bob@gmail.com"}]}
+    mock_table.get_item.return_value = {
+        "Item": {"user_id": "bob", "hashed_password": "hashed_pw", "gmail_address": "bob@gmail.com"}
+    }
+
+    user = await user_db.get_user_by_gmail_address("bob@gmail.com")
+
+    assert user.user_id == "bob"
+    assert mock_table.query.await_args.kwargs["IndexName"] == GMAIL_ADDRESS_INDEX
+    mock_table.get_item.assert_awaited_once_with(Key={"user_id": "bob"})
+
+
+@pytest.mark.asyncio
+async def test_get_user_by_unknown_gmail_address(user_db, mock_table):
+    mock_table.query.return_value = {"Items": []}
+
+    assert await user_db.get_user_by_gmail_address("nobody@gmail.com") is None
+    mock_table.get_item.assert_not_awaited()
+
+
+@pytest.mark.asyncio
+async def test_get_linked_users_pages_through_the_scan(user_db, mock_table):
+    mock_table.scan.side_effect = [
+        {"Items": [{"user_id": "alice", "hashed_password": "x", "google_credentials": "a"}],
+         "LastEvaluatedKey": {"user_id": "alice"}},
+        {"Items": [{"user_id": "bob", "hashed_password": "x", "google_credentials": "b"}]},
+    ]
+
+    users = await user_db.get_linked_users()
+
+    assert [user.user_id for user in users] == ["alice", "bob"]
+    assert mock_table.scan.await_args_list[1].kwargs["ExclusiveStartKey"] == {"user_id": "alice"}